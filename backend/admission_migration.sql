@@ -0,0 +1,51 @@
+-- Migration: Token buckets compartilhados para o controle de admissão das rotas de IA
+-- Date: 2026-10-18
+--
+-- Usado só com ADMISSION_STORE=supabase (vários workers/containers dividindo o mesmo
+-- limite por usuário). Sem isso cada processo mantém seus buckets em memória.
+-- Uma chamada de take_rate_limit_tokens por request admitido: repõe as fichas pelo
+-- tempo decorrido e tenta gastar `p_cost`, tudo sob o lock da linha do bucket.
+
+-- 1. Estado efêmero: UNLOGGED evita WAL (perder os buckets num crash só "reenche" todos)
+CREATE UNLOGGED TABLE IF NOT EXISTS public.rate_limit_buckets (
+    key TEXT PRIMARY KEY,  -- "<user_id>:<tipo de rota>"
+    tokens DOUBLE PRECISION NOT NULL,
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT clock_timestamp()
+);
+
+-- Só o backend (service role) acessa
+ALTER TABLE public.rate_limit_buckets ENABLE ROW LEVEL SECURITY;
+
+-- 2. Token bucket atômico
+CREATE OR REPLACE FUNCTION public.take_rate_limit_tokens(
+    p_key TEXT,
+    p_capacity DOUBLE PRECISION,
+    p_refill_per_sec DOUBLE PRECISION,
+    p_cost DOUBLE PRECISION DEFAULT 1
+)
+RETURNS TABLE (allowed BOOLEAN, retry_after DOUBLE PRECISION) AS $$
+DECLARE
+    v_now TIMESTAMPTZ := clock_timestamp();
+    v_tokens DOUBLE PRECISION;
+BEGIN
+    INSERT INTO public.rate_limit_buckets AS b (key, tokens, updated_at)
+    VALUES (p_key, p_capacity, v_now)
+    ON CONFLICT (key) DO UPDATE
+        SET tokens = LEAST(p_capacity, b.tokens + EXTRACT(EPOCH FROM (v_now - b.updated_at)) * p_refill_per_sec),
+            updated_at = v_now
+    RETURNING b.tokens INTO v_tokens;
+
+    IF v_tokens >= p_cost THEN
+        UPDATE public.rate_limit_buckets SET tokens = v_tokens - p_cost WHERE key = p_key;
+        RETURN QUERY SELECT TRUE, 0::DOUBLE PRECISION;
+    ELSE
+        RETURN QUERY SELECT FALSE, (p_cost - v_tokens) / p_refill_per_sec;
+    END IF;
+END;
+$$ LANGUAGE plpgsql;
+
+REVOKE EXECUTE ON FUNCTION public.take_rate_limit_tokens(TEXT, DOUBLE PRECISION, DOUBLE PRECISION, DOUBLE PRECISION)
+    FROM PUBLIC, anon, authenticated;
+
+-- 3. Limpeza periódica (buckets parados há mais de um dia já estariam cheios)
+--   DELETE FROM public.rate_limit_buckets WHERE updated_at < NOW() - INTERVAL '1 day';
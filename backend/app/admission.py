@@ -0,0 +1,246 @@
+import asyncio
+import os
+import threading
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, Callable, Dict, Optional, Tuple, Union
+
+from fastapi import Depends, HTTPException, Request
+from loguru import logger
+
+from .db import get_supabase_client
+from .deps import AuthUser, get_current_user
+
+# Controle de admissão das rotas que chamam o LLM dentro do request
+# (/analyze, /copilot/chat, /session/{id}/record...):
+#   1. token bucket por usuário e tipo de rota -> 429 com Retry-After;
+#   2. teto de chamadas em andamento no processo, com fila de espera limitada
+#      -> 503 com Retry-After quando a fila enche ou a espera estoura.
+# As rotas /jobs/... só enfileiram o mesmo trabalho: gastam fichas do mesmo bucket
+# (rate_limited), sem ocupar vaga, para que a fila de jobs não vire um atalho.
+# Os buckets ficam em memória (LocalBucketStore) ou, com ADMISSION_STORE=supabase,
+# numa tabela compartilhada entre workers (admission_migration.sql); se o banco
+# falhar, o bucket local assume até ele voltar.
+
+# Capacidade (rajada) e reposição (fichas/s) por tipo de rota
+ADMISSION_RATES: Dict[str, Dict[str, float]] = {
+    "analyze": {"capacity": 10, "refill_per_sec": 10 / 60},
+    "record": {"capacity": 20, "refill_per_sec": 20 / 60},
+    "copilot": {"capacity": 30, "refill_per_sec": 30 / 60},
+    "default": {"capacity": 20, "refill_per_sec": 20 / 60},
+}
+
+ADMISSION_ENABLED = os.getenv("ADMISSION_ENABLED", "1") == "1"
+ADMISSION_STORE = os.getenv("ADMISSION_STORE", "local")
+ADMISSION_MAX_INFLIGHT = int(os.getenv("ADMISSION_MAX_INFLIGHT", os.getenv("LLM_MAX_CONCURRENCY", "32")))
+ADMISSION_MAX_QUEUE = int(os.getenv("ADMISSION_MAX_QUEUE", "64"))
+ADMISSION_QUEUE_TIMEOUT = float(os.getenv("ADMISSION_QUEUE_TIMEOUT", "20"))
+# Tentativas de reconectar ao store compartilhado depois de uma falha
+ADMISSION_STORE_RETRY_SECONDS = 30.0
+
+
+class RateLimitedError(HTTPException):
+    """Usuário esgotou as fichas do tipo de rota."""
+
+    def __init__(self, retry_after: float):
+        super().__init__(
+            status_code=429,
+            detail="Muitas solicitações de IA em sequência. Aguarde alguns instantes.",
+            headers={"Retry-After": str(max(int(retry_after + 0.999), 1))},
+        )
+
+
+class OverloadedError(HTTPException):
+    """Todas as vagas de chamada ao LLM ocupadas e a fila de espera cheia (ou espera longa demais)."""
+
+    def __init__(self, retry_after: float):
+        super().__init__(
+            status_code=503,
+            detail="Serviço de IA sobrecarregado. Tente novamente em instantes.",
+            headers={"Retry-After": str(max(int(retry_after + 0.999), 1))},
+        )
+
+
+class LocalBucketStore:
+    """Token buckets em memória (um processo). Também é o substituto do store compartilhado."""
+
+    MAX_KEYS = 10_000
+
+    def __init__(self, clock: Callable[[], float] = time.monotonic):
+        self._clock = clock
+        self._buckets: Dict[str, Tuple[float, float, float]] = {}  # key -> (fichas, instante, cheio em)
+        self._lock = threading.Lock()
+
+    def take(self, key: str, capacity: float, refill_per_sec: float, cost: float = 1) -> Tuple[bool, float]:
+        """Tenta gastar `cost` fichas; devolve (permitido, segundos até haver fichas suficientes)."""
+        now = self._clock()
+        with self._lock:
+            tokens, updated, _ = self._buckets.get(key, (capacity, now, now))
+            tokens = min(capacity, tokens + (now - updated) * refill_per_sec)
+            if tokens >= cost:
+                tokens -= cost
+                allowed, retry_after = True, 0.0
+            else:
+                allowed, retry_after = False, (cost - tokens) / refill_per_sec
+            self._buckets[key] = (tokens, now, now + (capacity - tokens) / refill_per_sec)
+            if len(self._buckets) > self.MAX_KEYS:
+                # Bucket que já teria reenchido equivale a bucket inexistente
+                for stale in [k for k, (_, _, full_at) in self._buckets.items() if full_at <= now]:
+                    del self._buckets[stale]
+        return allowed, retry_after
+
+
+class SupabaseBucketStore:
+    """Token buckets numa tabela do Postgres (função take_rate_limit_tokens), compartilhados entre workers."""
+
+    def __init__(self, fallback: Optional[LocalBucketStore] = None):
+        self.fallback = fallback or LocalBucketStore()
+        self._failed_at: Optional[float] = None
+
+    def take(self, key: str, capacity: float, refill_per_sec: float, cost: float = 1) -> Tuple[bool, float]:
+        if self._failed_at is not None and time.monotonic() - self._failed_at < ADMISSION_STORE_RETRY_SECONDS:
+            return self.fallback.take(key, capacity, refill_per_sec, cost)
+        try:
+            res = get_supabase_client().rpc(
+                "take_rate_limit_tokens",
+                {"p_key": key, "p_capacity": capacity, "p_refill_per_sec": refill_per_sec, "p_cost": cost},
+            ).execute()
+            row = res.data[0] if isinstance(res.data, list) else res.data
+            self._failed_at = None
+            return bool(row["allowed"]), float(row["retry_after"])
+        except Exception as e:
+            if self._failed_at is None:
+                logger.warning(f"Store de rate limit indisponível, usando buckets locais: {e}")
+            self._failed_at = time.monotonic()
+            return self.fallback.take(key, capacity, refill_per_sec, cost)
+
+
+class AdmissionController:
+    """
+    Token bucket por usuário + teto de chamadas ao LLM em andamento com fila limitada.
+    Estado da fila vive no event loop do worker (sem locks); o bucket pode ser compartilhado.
+    """
+
+    def __init__(
+        self,
+        store: Any = None,
+        rates: Optional[Dict[str, Dict[str, float]]] = None,
+        max_inflight: int = ADMISSION_MAX_INFLIGHT,
+        max_queue: int = ADMISSION_MAX_QUEUE,
+        queue_timeout: float = ADMISSION_QUEUE_TIMEOUT,
+    ):
+        self.store = store or LocalBucketStore()
+        self.rates = rates or ADMISSION_RATES
+        self.max_inflight = max_inflight
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.inflight = 0
+        self._waiters: deque = deque()
+        self._avg_hold = 5.0  # média móvel (s) de quanto uma vaga fica ocupada
+        self.rejected = {"rate_limited": 0, "queue_full": 0, "queue_timeout": 0}
+
+    @property
+    def queued(self) -> int:
+        return len(self._waiters)
+
+    def _retry_after(self) -> float:
+        # Tempo estimado até a fila atual andar
+        return self._avg_hold * (len(self._waiters) + 1) / self.max_inflight
+
+    async def _take_tokens(self, user_id: str, kind: str, cost: float) -> None:
+        rate = self.rates.get(kind) or self.rates["default"]
+        cost = min(cost, rate["capacity"])  # pedido maior que a rajada inteira nunca passaria
+        key = f"{user_id}:{kind}"
+        if isinstance(self.store, LocalBucketStore):
+            allowed, retry_after = self.store.take(key, rate["capacity"], rate["refill_per_sec"], cost)
+        else:
+            allowed, retry_after = await asyncio.to_thread(
+                self.store.take, key, rate["capacity"], rate["refill_per_sec"], cost
+            )
+        if not allowed:
+            self.rejected["rate_limited"] += 1
+            # Um cliente em loop geraria um log por request: amostrado (ver logging_config)
+            logger.bind(hot=True).info(f"Rate limit ({kind}) para o usuário {user_id}: retry em {retry_after:.0f}s")
+            raise RateLimitedError(retry_after)
+
+    async def _acquire(self) -> None:
+        if self.inflight < self.max_inflight and not self._waiters:
+            self.inflight += 1
+            return
+        if len(self._waiters) >= self.max_queue:
+            self.rejected["queue_full"] += 1
+            raise OverloadedError(self._retry_after())
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            # A vaga é repassada diretamente por _release (inflight não muda)
+            await asyncio.wait_for(asyncio.shield(waiter), self.queue_timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if waiter.done() and not waiter.cancelled():
+                # A vaga chegou junto com o timeout/cancelamento: devolve
+                self._release()
+            else:
+                waiter.cancel()
+                self._waiters.remove(waiter)
+            if isinstance(e, asyncio.TimeoutError):
+                self.rejected["queue_timeout"] += 1
+                raise OverloadedError(self._retry_after())
+            raise
+
+    def _release(self) -> None:
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.inflight -= 1
+
+    @asynccontextmanager
+    async def admit(self, user_id: str, kind: str, cost: float = 1):
+        await self._take_tokens(user_id, kind, cost)
+        await self._acquire()
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self._avg_hold = 0.9 * self._avg_hold + 0.1 * (time.monotonic() - started)
+            self._release()
+
+
+def _default_store():
+    if ADMISSION_STORE == "supabase":
+        return SupabaseBucketStore()
+    return LocalBucketStore()
+
+
+controller = AdmissionController(store=_default_store())
+
+
+def admitted(kind: str, cost: Union[float, Callable[[Request], float]] = 1):
+    """
+    Dependência que autentica e admite o request (use no lugar de get_current_user).
+    A vaga fica ocupada até a rota terminar. `cost` pode depender do request
+    (ex.: quantidade de documentos pedidos).
+    """
+
+    async def dependency(request: Request, user: AuthUser = Depends(get_current_user)):
+        if not ADMISSION_ENABLED:
+            yield user
+            return
+        async with controller.admit(user.user_id, kind, cost(request) if callable(cost) else cost):
+            yield user
+
+    return dependency
+
+
+def rate_limited(kind: str, cost: float = 1):
+    """Como admitted, mas só cobra o bucket (para rotas que enfileiram o trabalho do LLM)."""
+
+    async def dependency(user: AuthUser = Depends(get_current_user)):
+        if ADMISSION_ENABLED:
+            await controller._take_tokens(user.user_id, kind, cost)
+        return user
+
+    return dependency
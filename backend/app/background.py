@@ -0,0 +1,89 @@
+import asyncio
+import os
+from typing import Any, Callable, List, Optional
+
+from fastapi import BackgroundTasks
+from loguru import logger
+
+# Pipeline para trabalho não crítico depois da resposta (títulos, contabilização, analytics).
+# Diferente da fila de jobs (jobs.py), nada aqui é persistido: se o processo cair, a tarefa se perde.
+
+POST_RESPONSE_CONCURRENCY = int(os.getenv("POST_RESPONSE_CONCURRENCY", "2"))
+POST_RESPONSE_MAX_QUEUE = int(os.getenv("POST_RESPONSE_MAX_QUEUE", "1000"))
+POST_RESPONSE_MAX_ATTEMPTS = int(os.getenv("POST_RESPONSE_MAX_ATTEMPTS", "3"))
+POST_RESPONSE_RETRY_BASE_SECONDS = float(os.getenv("POST_RESPONSE_RETRY_BASE_SECONDS", "1.0"))
+
+
+class PostResponsePipeline:
+    """Fila em memória com concorrência limitada e retries para tarefas síncronas."""
+
+    def __init__(
+        self,
+        concurrency: int = POST_RESPONSE_CONCURRENCY,
+        max_queue: int = POST_RESPONSE_MAX_QUEUE,
+        max_attempts: int = POST_RESPONSE_MAX_ATTEMPTS,
+        retry_base_seconds: float = POST_RESPONSE_RETRY_BASE_SECONDS,
+    ):
+        self.concurrency = concurrency
+        self.max_queue = max_queue
+        self.max_attempts = max_attempts
+        self.retry_base_seconds = retry_base_seconds
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers: List[asyncio.Task] = []
+
+    def start(self) -> None:
+        if self._workers:
+            return
+        self._queue = asyncio.Queue(maxsize=self.max_queue)
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self.concurrency)]
+
+    async def stop(self, drain_timeout: float = 5.0) -> None:
+        if not self._workers:
+            return
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout=drain_timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Encerrando com {self._queue.qsize()} tarefa(s) pós-resposta pendente(s)")
+        for task in self._workers:
+            task.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    def submit_nowait(self, name: str, fn: Callable[..., Any], *args, **kwargs) -> bool:
+        """Enfileira a tarefa (chamar de dentro do event loop). Retorna False se a fila estiver cheia."""
+        self.start()
+        try:
+            self._queue.put_nowait((name, fn, args, kwargs))
+            return True
+        except asyncio.QueueFull:
+            logger.warning(f"Fila pós-resposta cheia, tarefa {name} descartada")
+            return False
+
+    def after_response(self, background_tasks: BackgroundTasks, name: str, fn: Callable[..., Any], *args, **kwargs) -> None:
+        """Agenda a tarefa para ser enfileirada só depois que a resposta HTTP for enviada."""
+        async def enqueue():
+            self.submit_nowait(name, fn, *args, **kwargs)
+
+        background_tasks.add_task(enqueue)
+
+    async def _worker(self) -> None:
+        while True:
+            name, fn, args, kwargs = await self._queue.get()
+            try:
+                await self._run(name, fn, args, kwargs)
+            finally:
+                self._queue.task_done()
+
+    async def _run(self, name: str, fn: Callable[..., Any], args, kwargs) -> None:
+        for attempt in range(1, self.max_attempts + 1):
+            try:
+                await asyncio.to_thread(fn, *args, **kwargs)
+                return
+            except Exception as e:
+                if attempt == self.max_attempts:
+                    logger.error(f"Tarefa pós-resposta {name} falhou após {attempt} tentativa(s): {e}")
+                    return
+                await asyncio.sleep(self.retry_base_seconds * (2 ** (attempt - 1)))
+
+
+post_response = PostResponsePipeline()
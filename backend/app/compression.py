@@ -0,0 +1,116 @@
+import base64
+import os
+import re
+import threading
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional
+
+# Campos de texto longo de `sessions` guardados comprimidos com zstd e um dicionário
+# de português clínico. O valor continua em coluna TEXT, no formato
+# "zstd<versão do dicionário>:<base64>", e é descomprimido aqui, na leitura/escrita
+# das linhas; o resto do backend só vê texto puro. Valores sem o prefixo (linhas
+# antigas, ainda não migradas) passam direto.
+
+COMPRESSED_FIELDS = ("transcription", "registro_descritivo", "hipoteses_clinicas", "direcoes_intervencao")
+
+DICTIONARY_DIR = Path(__file__).parent / "data"
+# Versões nunca são removidas: linhas antigas continuam apontando para elas.
+# A v1 NÃO é um dicionário treinado: é conteúdo cru escrito à mão (frases e termos
+# comuns em registros clínicos), que o DICT_TYPE_AUTO trata como raw content. Serve até haver
+# sessões reais comprimíveis; a v2 em diante deve sair de `python compress_sessions.py train`
+# (zstandard.train_dictionary sobre uma amostra da tabela).
+DICTIONARIES = {
+    1: "ptbr_sessions_v1.dict",  # conteúdo cru escrito à mão, sem treino
+}
+DICTIONARY_VERSION = int(os.getenv("ZSTD_DICTIONARY_VERSION", str(max(DICTIONARIES))))
+COMPRESSION_LEVEL = int(os.getenv("ZSTD_LEVEL", "9"))
+# Abaixo disso o cabeçalho do frame + base64 não compensam
+MIN_COMPRESS_CHARS = int(os.getenv("ZSTD_MIN_CHARS", "200"))
+
+_MARKER = re.compile(r"zstd(\d+):")
+# ZstdCompressor/ZstdDecompressor não são thread-safe (rotas rodam em to_thread)
+_local = threading.local()
+
+
+@lru_cache(maxsize=None)
+def _dictionary(version: int):
+    import zstandard
+
+    data = (DICTIONARY_DIR / DICTIONARIES[version]).read_bytes()
+    # AUTO: dicionário treinado (magic do zstd) ou conteúdo cru
+    dictionary = zstandard.ZstdCompressionDict(data, dict_type=zstandard.DICT_TYPE_AUTO)
+    if version == DICTIONARY_VERSION:
+        dictionary.precompute_compress(level=COMPRESSION_LEVEL)
+    return dictionary
+
+
+def _compressor():
+    compressor = getattr(_local, "compressor", None)
+    if compressor is None:
+        import zstandard
+
+        compressor = zstandard.ZstdCompressor(
+            level=COMPRESSION_LEVEL, dict_data=_dictionary(DICTIONARY_VERSION), write_checksum=False
+        )
+        _local.compressor = compressor
+    return compressor
+
+
+def _decompressor(version: int):
+    decompressors = getattr(_local, "decompressors", None)
+    if decompressors is None:
+        decompressors = _local.decompressors = {}
+    if version not in decompressors:
+        import zstandard
+
+        decompressors[version] = zstandard.ZstdDecompressor(dict_data=_dictionary(version))
+    return decompressors[version]
+
+
+def is_compressed(value: Any) -> bool:
+    return isinstance(value, str) and _MARKER.match(value) is not None
+
+
+def compress_text(value: Optional[str]) -> Optional[str]:
+    """
+    Texto -> "zstdN:<base64>"; textos curtos (ou que não encolhem) ficam como estão.
+    Espera texto puro: um texto que por acaso comece com o prefixo é sempre comprimido,
+    para não ser confundido com um valor comprimido na leitura.
+    """
+    if not isinstance(value, str):
+        return value
+    looks_compressed = is_compressed(value)
+    if len(value) < MIN_COMPRESS_CHARS and not looks_compressed:
+        return value
+    payload = base64.b64encode(_compressor().compress(value.encode("utf-8"))).decode("ascii")
+    encoded = f"zstd{DICTIONARY_VERSION}:{payload}"
+    return encoded if looks_compressed or len(encoded) < len(value.encode("utf-8")) else value
+
+
+def decompress_text(value: Any) -> Any:
+    if not isinstance(value, str):
+        return value
+    match = _MARKER.match(value)
+    if match is None:
+        return value
+    data = base64.b64decode(value[match.end():])
+    return _decompressor(int(match.group(1))).decompress(data).decode("utf-8")
+
+
+def compress_row(row: Dict[str, Any]) -> Dict[str, Any]:
+    """Cópia da linha pronta para insert/update em `sessions`."""
+    return {key: compress_text(value) if key in COMPRESSED_FIELDS else value for key, value in row.items()}
+
+
+def decompress_row(row: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """Linha lida de `sessions` com os campos longos de volta em texto puro (altera in-place)."""
+    if row:
+        for key in COMPRESSED_FIELDS:
+            if key in row:
+                row[key] = decompress_text(row[key])
+    return row
+
+
+def decompress_rows(rows: Optional[Iterable[Dict[str, Any]]]) -> List[Dict[str, Any]]:
+    return [decompress_row(row) for row in rows or []]
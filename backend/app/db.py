@@ -1,10 +1,18 @@
 from functools import lru_cache
 import os
-from supabase import create_client, Client
+from typing import TYPE_CHECKING
+
+from .profiling import PROFILING_ENABLED, instrument_httpx
+
+if TYPE_CHECKING:
+    from supabase import Client
 
 
 @lru_cache
-def get_supabase_client() -> Client:
+def get_supabase_client() -> "Client":
+    # Import tardio: o SDK do supabase (postgrest, httpx, storage...) pesa no cold start
+    from supabase import create_client
+
     url = os.getenv("SUPABASE_URL")
     key = os.getenv("SUPABASE_SERVICE_ROLE_KEY")
 
@@ -12,4 +20,8 @@ def get_supabase_client() -> Client:
         # Não loga dados sensíveis, só mensagem genérica
         raise RuntimeError("Supabase environment variables are not configured")
 
-    return create_client(url, key)
\ No newline at end of file
+    client = create_client(url, key)
+    if PROFILING_ENABLED:
+        # Spans do Supabase nos perfis de request (app/profiling.py)
+        instrument_httpx(client.postgrest.session, "supabase")
+    return client
@@ -19,9 +19,10 @@ async def get_current_user(
     Decodifica usando SUPABASE_JWT_SECRET e extrai sub (user id).
     """
     from loguru import logger
-    
-    logger.info(f"Authorization header received: {authorization[:50]}...")
-    
+
+    # Logs de sucesso rodam em todo request: são amostrados (ver logging_config)
+    hot_logger = logger.bind(hot=True)
+
     if not authorization.startswith("Bearer "):
         logger.error("Authorization header does not start with 'Bearer '")
         raise HTTPException(
@@ -30,8 +31,7 @@ async def get_current_user(
         )
 
     token = authorization.split(" ", 1)[1]
-    logger.info(f"Token extracted, length: {len(token)}")
-    
+
     secret = os.getenv("SUPABASE_JWT_SECRET")
     if not secret:
         logger.error("SUPABASE_JWT_SECRET not configured")
@@ -47,7 +47,6 @@ async def get_current_user(
             algorithms=["HS256"],
             options={"verify_aud": False}  # Supabase tokens have 'aud' claim, disable verification
         )
-        logger.info(f"Token decoded successfully. Payload keys: {list(payload.keys())}")
     except JWTError as e:
         logger.error(f"JWT decode error: {str(e)}")
         raise HTTPException(
@@ -64,5 +63,5 @@ async def get_current_user(
             detail="Missing sub claim",
         )
 
-    logger.info(f"User authenticated: {sub}")
+    hot_logger.info(f"User authenticated: {sub}")
     return AuthUser(user_id=sub, email=email)
\ No newline at end of file
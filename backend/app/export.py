@@ -0,0 +1,219 @@
+import json
+import re
+import tempfile
+import zipfile
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterator, List, Optional
+
+from loguru import logger
+
+from .compression import decompress_row, decompress_rows
+from .db import get_supabase_client
+from .report_generator import generate_clinical_record_pdf, write_patient_record_pdf
+
+# Exportação em massa dos dados do terapeuta. Tudo é gerado sob demanda:
+# as tabelas são paginadas por cursor (keyset em id) e cada página vira bytes
+# para o StreamingResponse antes da próxima ser buscada, então a memória
+# não cresce com o tamanho do consultório.
+
+EXPORT_PAGE_SIZE = 500
+EXPORT_PATIENT_BATCH = 100  # pacientes por filtro IN ao paginar sessões
+EXPORT_CHUNK_SIZE = 256 * 1024
+RECORD_SPOOL_SIZE = 4 * 1024 * 1024  # acima disso o PDF do prontuário vai para disco
+
+SESSION_RECORD_FIELDS = ("registro_descritivo", "hipoteses_clinicas", "direcoes_intervencao")
+
+
+def _paginate(table: str, columns: str = "*", **filters) -> Iterator[Dict[str, Any]]:
+    """Percorre a tabela em páginas ordenadas por id (keyset, sem OFFSET)."""
+    supabase = get_supabase_client()
+    last_id = None
+    while True:
+        query = supabase.table(table).select(columns)
+        for column, value in filters.items():
+            query = query.in_(column, value) if isinstance(value, list) else query.eq(column, value)
+        if last_id is not None:
+            query = query.gt("id", last_id)
+        rows = query.order("id").limit(EXPORT_PAGE_SIZE).execute().data or []
+        yield from rows
+        if len(rows) < EXPORT_PAGE_SIZE:
+            return
+        last_id = rows[-1]["id"]
+
+
+def _iter_patient_ids(user_id: str) -> Iterator[List[str]]:
+    batch = []
+    for patient in _paginate("patients", "id", user_id=user_id):
+        batch.append(patient["id"])
+        if len(batch) == EXPORT_PATIENT_BATCH:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _iter_sessions(user_id: str) -> Iterator[Dict[str, Any]]:
+    # sessions não tem user_id: pagina por lotes de pacientes do terapeuta
+    for patient_ids in _iter_patient_ids(user_id):
+        for session in _paginate("sessions", patient_id=patient_ids):
+            yield decompress_row(session)
+
+
+def _line(record_type: str, data: Dict[str, Any]) -> bytes:
+    return (json.dumps({"type": record_type, "data": data}, ensure_ascii=False, default=str) + "\n").encode()
+
+
+def iter_ndjson(user_id: str) -> Iterator[bytes]:
+    """Uma linha JSON por registro: cabeçalho, pacientes, sessões e consultas."""
+    yield _line("export", {"version": 1, "generated_at": datetime.now(timezone.utc).isoformat()})
+    buffer = bytearray()
+    try:
+        for record_type, rows in (
+            ("patient", _paginate("patients", user_id=user_id)),
+            ("session", _iter_sessions(user_id)),
+            ("appointment", _paginate("appointments", user_id=user_id)),
+        ):
+            for row in rows:
+                buffer += _line(record_type, row)
+                if len(buffer) >= EXPORT_CHUNK_SIZE:
+                    yield bytes(buffer)
+                    buffer.clear()
+    except Exception as e:
+        # O status 200 já foi enviado: sinaliza a falha no próprio arquivo
+        logger.error(f"Erro na exportação: {e}")
+        buffer += _line("error", {"detail": "Exportação interrompida"})
+    yield bytes(buffer)
+
+
+class _ZipStream:
+    """Destino não-seekable do ZipFile: acumula bytes até serem drenados pelo gerador."""
+
+    def __init__(self):
+        self._buffer = bytearray()
+
+    def write(self, data) -> int:
+        self._buffer += data
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def __len__(self) -> int:
+        return len(self._buffer)
+
+    def drain(self) -> bytes:
+        data = bytes(self._buffer)
+        self._buffer.clear()
+        return data
+
+
+def _slug(value: Optional[str]) -> str:
+    return re.sub(r"[^A-Za-z0-9]+", "_", value or "paciente").strip("_")[:40] or "paciente"
+
+
+def _session_record(session: Dict[str, Any]) -> Dict[str, Any]:
+    """Conteúdo já salvo da sessão (sem chamar o LLM); sem campos CFP, usa a transcrição."""
+    record = {field: session.get(field) for field in SESSION_RECORD_FIELDS if session.get(field)}
+    return record or {"registro_descritivo": session.get("transcription") or ""}
+
+
+def iter_zip(user_id: str) -> Iterator[bytes]:
+    """ZIP com o export.ndjson e um PDF (registro documental) por sessão, montado em streaming."""
+    supabase = get_supabase_client()
+    therapist = supabase.table("profiles").select("*").eq("id", user_id).execute()
+    therapist_data = therapist.data[0] if therapist.data else {}
+
+    stream = _ZipStream()
+    with zipfile.ZipFile(stream, mode="w") as archive:
+        try:
+            ndjson_info = zipfile.ZipInfo("export.ndjson", date_time=datetime.now().timetuple()[:6])
+            ndjson_info.compress_type = zipfile.ZIP_DEFLATED
+            # Tamanho final desconhecido: zip64 evita o limite de 2 GiB por entrada
+            with archive.open(ndjson_info, "w", force_zip64=True) as entry:
+                for chunk in iter_ndjson(user_id):
+                    entry.write(chunk)
+                    if len(stream) >= EXPORT_CHUNK_SIZE:
+                        yield stream.drain()
+
+            for patient_ids in _iter_patient_ids(user_id):
+                names = supabase.table("patients").select("id, name").in_("id", patient_ids).execute()
+                patients = {p["id"]: p for p in names.data or []}
+                for session in map(decompress_row, _paginate("sessions", patient_id=patient_ids)):
+                    patient = patients.get(session["patient_id"], {})
+                    created_at = datetime.fromisoformat(session["created_at"].replace("Z", "+00:00"))
+                    try:
+                        pdf = generate_clinical_record_pdf(
+                            record_data=_session_record(session),
+                            patient_data=patient,
+                            session_date=created_at.strftime("%d/%m/%Y"),
+                            therapist_data=therapist_data,
+                        )
+                    except Exception as e:
+                        logger.error(f"Erro ao gerar PDF da sessão {session['id']} na exportação: {e}")
+                        continue
+                    name = (
+                        f"sessoes/{_slug(patient.get('name'))}_{session['patient_id'][:8]}/"
+                        f"{created_at.strftime('%Y-%m-%d')}_{session['id'][:8]}.pdf"
+                    )
+                    # PDF já é comprimido: STORED evita gastar CPU à toa
+                    archive.writestr(zipfile.ZipInfo(name, date_time=created_at.timetuple()[:6]), pdf)
+                    if len(stream) >= EXPORT_CHUNK_SIZE:
+                        yield stream.drain()
+        except Exception as e:
+            # Os bytes já enviados não voltam atrás (status 200 já saiu): registra a falha
+            # dentro do próprio ZIP e fecha o arquivo direito, em vez de um ZIP corrompido
+            logger.error(f"Exportação do usuário {user_id} interrompida: {e}")
+            archive.writestr(
+                zipfile.ZipInfo("erro.txt", date_time=datetime.now().timetuple()[:6]),
+                "A exportação foi interrompida por um erro e está incompleta. Tente novamente.\n",
+            )
+    yield stream.drain()
+
+
+def fetch_record_sessions(
+    patient_id: str,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+) -> List[Dict[str, Any]]:
+    """Sessões do paciente em ordem cronológica, já reduzidas ao conteúdo do registro."""
+    supabase = get_supabase_client()
+    query = (
+        supabase.table("sessions")
+        .select("id, created_at, " + ", ".join(SESSION_RECORD_FIELDS))
+        .eq("patient_id", patient_id)
+    )
+    if start_date:
+        query = query.gte("created_at", start_date.isoformat())
+    if end_date:
+        query = query.lte("created_at", end_date.isoformat())
+
+    rows = decompress_rows(query.order("created_at").execute().data)
+    # A transcrição (o campo mais pesado) só é buscada para as sessões sem campos CFP
+    missing = [row["id"] for row in rows if not any(row.get(field) for field in SESSION_RECORD_FIELDS)]
+    if missing:
+        transcriptions = supabase.table("sessions").select("id, transcription").in_("id", missing).execute()
+        by_id = {t["id"]: t["transcription"] for t in decompress_rows(transcriptions.data)}
+        for row in rows:
+            if row["id"] in by_id:
+                row["transcription"] = by_id[row["id"]]
+
+    sessions = []
+    for row in rows:
+        created_at = datetime.fromisoformat(row["created_at"].replace("Z", "+00:00"))
+        sessions.append({"date": created_at.strftime("%d/%m/%Y"), "record": _session_record(row)})
+    return sessions
+
+
+def iter_patient_record_pdf(
+    sessions: List[Dict[str, Any]],
+    patient_data: Dict[str, Any],
+    therapist_data: Dict[str, Any],
+    period: Optional[str] = None,
+) -> Iterator[bytes]:
+    """Prontuário completo em PDF, escrito num arquivo temporário e enviado em blocos."""
+    with tempfile.SpooledTemporaryFile(max_size=RECORD_SPOOL_SIZE) as spool:
+        pages = write_patient_record_pdf(spool, sessions, patient_data, therapist_data, period)
+        logger.info(f"Prontuário gerado: {len(sessions)} sessões, {pages} páginas")
+        spool.seek(0)
+        while chunk := spool.read(EXPORT_CHUNK_SIZE):
+            yield chunk
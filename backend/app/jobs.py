@@ -0,0 +1,324 @@
+import asyncio
+import os
+import socket
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from fastapi import HTTPException
+from loguru import logger
+
+from .db import get_supabase_client
+
+# Fila de jobs persistida na tabela public.jobs (ver jobs_migration.sql).
+# O claim é feito pela função claim_job (FOR UPDATE SKIP LOCKED), então
+# qualquer número de workers/processos pode consumir a mesma fila.
+
+JOBS_TABLE = "jobs"
+JOB_TERMINAL_STATUSES = ("succeeded", "failed")
+JOB_FILES_PREFIX = "jobs"
+JOB_FILES_BUCKET = os.getenv("SUPABASE_BUCKET", "theramind")
+
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", "1.0"))
+JOB_LOCK_TIMEOUT_SECONDS = int(os.getenv("JOB_LOCK_TIMEOUT_SECONDS", "600"))
+JOB_RETRY_BASE_SECONDS = float(os.getenv("JOB_RETRY_BASE_SECONDS", "5"))
+# Jobs terminados (e os arquivos gerados) são apagados depois disso: resultados têm dados clínicos
+JOB_RETENTION_DAYS = float(os.getenv("JOB_RETENTION_DAYS", "7"))
+JOB_PURGE_INTERVAL_SECONDS = float(os.getenv("JOB_PURGE_INTERVAL_SECONDS", "3600"))
+JOB_PURGE_BATCH = 200
+
+JobHandler = Callable[[Dict[str, Any], "JobContext"], Dict[str, Any]]
+
+_HANDLERS: Dict[str, JobHandler] = {}
+_PURGE_PAYLOAD: set = set()
+_PERIODIC: List[Tuple[float, Callable[[], Any]]] = []
+
+
+def job_handler(kind: str, purge_payload: bool = False):
+    """
+    Registra a função que executa jobs do tipo `kind`. Com `purge_payload`, o payload
+    (ex.: a transcrição inteira) é apagado quando o job termina, com sucesso ou não.
+    """
+    def decorator(func: JobHandler) -> JobHandler:
+        _HANDLERS[kind] = func
+        if purge_payload:
+            _PURGE_PAYLOAD.add(kind)
+        return func
+    return decorator
+
+
+def periodic_task(interval_seconds: float):
+    """Registra uma rotina de manutenção (síncrona) que o pool de workers roda a cada intervalo."""
+    def decorator(func: Callable[[], Any]) -> Callable[[], Any]:
+        _PERIODIC.append((interval_seconds, func))
+        return func
+    return decorator
+
+
+def _retryable(error: Exception) -> bool:
+    # Erros 4xx (paciente não encontrado, acesso negado...) não melhoram com retry
+    return not (isinstance(error, HTTPException) and error.status_code < 500)
+
+
+class JobContext:
+    """Informações do job em execução, passadas para o handler."""
+
+    def __init__(self, job: Dict[str, Any]):
+        self.job_id = job["id"]
+        self.user_id = job["user_id"]
+        self.attempt = job.get("attempts", 1)
+        self.max_attempts = job.get("max_attempts", 3)
+
+    def will_retry(self, error: Exception) -> bool:
+        """Se fail_job vai reagendar o job depois deste erro (ou se é a falha definitiva)."""
+        return _retryable(error) and self.attempt < self.max_attempts
+
+    def progress(self, value: int) -> None:
+        """Atualiza o progresso (0-100). Falhas aqui nunca derrubam o job."""
+        try:
+            get_supabase_client().table(JOBS_TABLE).update(
+                {"progress": max(0, min(int(value), 100))}
+            ).eq("id", self.job_id).execute()
+        except Exception as e:
+            logger.warning(f"Falha ao atualizar progresso do job {self.job_id}: {e}")
+
+    def store_file(self, content: bytes, filename: str, media_type: str = "application/pdf") -> Dict[str, Any]:
+        """Salva um arquivo gerado no storage e retorna o resultado do job que aponta para ele."""
+        path = f"{JOB_FILES_PREFIX}/{self.user_id}/{self.job_id}/{filename}"
+        get_supabase_client().storage.from_(JOB_FILES_BUCKET).upload(
+            path, content, {"content-type": media_type, "upsert": "true"}
+        )
+        return {"storage_path": path, "filename": filename, "media_type": media_type}
+
+
+def enqueue_job(
+    kind: str,
+    user_id: Optional[str],
+    payload: Dict[str, Any],
+    priority: int = 100,
+    max_attempts: int = 3,
+) -> Dict[str, Any]:
+    """Insere um job na fila e retorna a linha criada. `user_id` é None para jobs de sistema."""
+    if kind not in _HANDLERS:
+        raise ValueError(f"Tipo de job desconhecido: {kind}")
+
+    res = (
+        get_supabase_client()
+        .table(JOBS_TABLE)
+        .insert(
+            {
+                "user_id": user_id,
+                "kind": kind,
+                "payload": payload,
+                "priority": priority,
+                "max_attempts": max_attempts,
+            }
+        )
+        .execute()
+    )
+    job = res.data[0]
+    logger.info(f"Job {job['id']} ({kind}) enfileirado")
+    return job
+
+
+def get_job(job_id: str, user_id: str) -> Optional[Dict[str, Any]]:
+    """Busca um job garantindo que pertence ao usuário."""
+    res = (
+        get_supabase_client()
+        .table(JOBS_TABLE)
+        .select("id, user_id, kind, status, progress, result, error, attempts, max_attempts, created_at, updated_at")
+        .eq("id", job_id)
+        .eq("user_id", user_id)
+        .limit(1)
+        .execute()
+    )
+    return res.data[0] if res.data else None
+
+
+def download_job_file(job: Dict[str, Any]) -> bytes:
+    return get_supabase_client().storage.from_(JOB_FILES_BUCKET).download(job["result"]["storage_path"])
+
+
+def claim_job(worker_id: str) -> Optional[Dict[str, Any]]:
+    res = get_supabase_client().rpc(
+        "claim_job",
+        {"p_worker_id": worker_id, "p_lock_timeout_seconds": JOB_LOCK_TIMEOUT_SECONDS},
+    ).execute()
+    data = res.data
+    if isinstance(data, list):
+        return data[0] if data else None
+    return data or None
+
+
+def _finish(job: Dict[str, Any], update: Dict[str, Any]) -> bool:
+    """
+    Grava o desfecho só se este worker ainda detém o job (mesmo locked_by e tentativa).
+    Se o lock expirou e outro worker reassumiu, o resultado desta execução é descartado.
+    """
+    if update["status"] in JOB_TERMINAL_STATUSES and job["kind"] in _PURGE_PAYLOAD:
+        update["payload"] = {}
+    res = (
+        get_supabase_client()
+        .table(JOBS_TABLE)
+        .update(update)
+        .eq("id", job["id"])
+        .eq("locked_by", job.get("locked_by"))
+        .eq("attempts", job.get("attempts", 1))
+        .execute()
+    )
+    if not res.data:
+        logger.warning(f"Job {job['id']} não pertence mais a este worker (lock expirado): desfecho descartado")
+        return False
+    return True
+
+
+def complete_job(job: Dict[str, Any], result: Dict[str, Any]) -> bool:
+    return _finish(
+        job,
+        {
+            "status": "succeeded",
+            "progress": 100,
+            "result": result,
+            "error": None,
+            "locked_by": None,
+            "locked_at": None,
+        },
+    )
+
+
+def fail_job(job: Dict[str, Any], error: Exception) -> bool:
+    """Reagenda com backoff exponencial ou marca como falho se esgotou as tentativas."""
+    attempts = job.get("attempts", 1)
+    message = error.detail if isinstance(error, HTTPException) else str(error)
+
+    update: Dict[str, Any] = {"error": message, "locked_by": None, "locked_at": None}
+    if JobContext(job).will_retry(error):
+        delay = JOB_RETRY_BASE_SECONDS * (2 ** (attempts - 1))
+        update["status"] = "queued"
+        update["run_after"] = (datetime.now(timezone.utc) + timedelta(seconds=delay)).isoformat()
+        logger.warning(f"Job {job['id']} falhou (tentativa {attempts}), nova tentativa em {delay:.0f}s")
+    else:
+        update["status"] = "failed"
+        logger.error(f"Job {job['id']} falhou definitivamente após {attempts} tentativa(s)")
+
+    return _finish(job, update)
+
+
+@periodic_task(JOB_PURGE_INTERVAL_SECONDS)
+def purge_finished_jobs() -> int:
+    """Apaga jobs terminados há mais de JOB_RETENTION_DAYS e os arquivos que eles geraram."""
+    supabase = get_supabase_client()
+    cutoff = (datetime.now(timezone.utc) - timedelta(days=JOB_RETENTION_DAYS)).isoformat()
+    purged = 0
+    while True:
+        rows = (
+            supabase.table(JOBS_TABLE)
+            .select("id, result")
+            .in_("status", list(JOB_TERMINAL_STATUSES))
+            .lt("updated_at", cutoff)
+            .limit(JOB_PURGE_BATCH)
+            .execute()
+            .data
+            or []
+        )
+        if not rows:
+            break
+        paths = [row["result"]["storage_path"] for row in rows if (row.get("result") or {}).get("storage_path")]
+        if paths:
+            supabase.storage.from_(JOB_FILES_BUCKET).remove(paths)
+        supabase.table(JOBS_TABLE).delete().in_("id", [row["id"] for row in rows]).execute()
+        purged += len(rows)
+        if len(rows) < JOB_PURGE_BATCH:
+            break
+    if purged:
+        logger.info(f"{purged} job(s) antigos removidos")
+    return purged
+
+
+def run_job(job: Dict[str, Any]) -> None:
+    """Executa um job já reivindicado (síncrono; roda em thread do pool)."""
+    handler = _HANDLERS.get(job["kind"])
+    if handler is None:
+        fail_job(job, HTTPException(status_code=400, detail=f"Tipo de job desconhecido: {job['kind']}"))
+        return
+
+    try:
+        result = handler(job.get("payload") or {}, JobContext(job))
+    except Exception as e:
+        fail_job(job, e)
+        return
+    if complete_job(job, result):
+        logger.info(f"Job {job['id']} ({job['kind']}) concluído")
+
+
+class JobWorkerPool:
+    """Pool de workers in-process que consome a fila de jobs."""
+
+    def __init__(self, concurrency: int = JOB_WORKERS, poll_interval: float = JOB_POLL_INTERVAL):
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self.worker_id = f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+        self._tasks: List[asyncio.Task] = []
+        self._stopping = asyncio.Event()
+
+    def start(self) -> None:
+        if self._tasks:
+            return
+        self._stopping.clear()
+        for index in range(self.concurrency):
+            self._tasks.append(asyncio.create_task(self._worker_loop(index)))
+        for interval, func in _PERIODIC:
+            self._tasks.append(asyncio.create_task(self._periodic_loop(interval, func)))
+        logger.info(f"Job workers iniciados: {self.concurrency} ({self.worker_id})")
+
+    async def stop(self) -> None:
+        self._stopping.set()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _periodic_loop(self, interval: float, func: Callable[[], Any]) -> None:
+        while not self._stopping.is_set():
+            try:
+                await asyncio.wait_for(self._stopping.wait(), timeout=interval)
+                return
+            except asyncio.TimeoutError:
+                pass
+            try:
+                await asyncio.to_thread(func)
+            except Exception as e:
+                logger.error(f"Erro na rotina periódica {func.__name__}: {e}")
+
+    async def _worker_loop(self, index: int) -> None:
+        worker_id = f"{self.worker_id}-{index}"
+        while not self._stopping.is_set():
+            try:
+                job = await asyncio.to_thread(claim_job, worker_id)
+            except Exception as e:
+                logger.error(f"Erro ao buscar job na fila: {e}")
+                job = None
+
+            if job is None:
+                try:
+                    await asyncio.wait_for(self._stopping.wait(), timeout=self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            try:
+                await asyncio.to_thread(run_job, job)
+            except Exception as e:
+                # Lock expira e outro worker reassume o job
+                logger.error(f"Erro ao finalizar job {job.get('id')}: {e}")
+
+
+async def run_forever(concurrency: int = JOB_WORKERS) -> None:
+    """Executa apenas os workers (processo separado do servidor web)."""
+    pool = JobWorkerPool(concurrency=max(concurrency, 1))
+    pool.start()
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await pool.stop()
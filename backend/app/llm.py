@@ -0,0 +1,345 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from types import SimpleNamespace
+from typing import Any, Callable, Dict, Optional
+
+from fastapi import HTTPException
+from loguru import logger
+
+from .profiling import span
+
+# Orçamento de latência (s) por tipo de chamada e se ela é idempotente (pode ser "hedged")
+LLM_POLICIES: Dict[str, Dict[str, Any]] = {
+    "analyze": {"budget": 60.0, "hedge": True},
+    "record": {"budget": 60.0, "hedge": True},
+    "title": {"budget": 10.0, "hedge": True},
+    "copilot": {"budget": 30.0, "hedge": False},
+    "default": {"budget": 45.0, "hedge": False},
+}
+
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "1"))
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "32"))
+LLM_HEDGE_MIN_DELAY = float(os.getenv("LLM_HEDGE_MIN_DELAY", "2.0"))
+LLM_HEDGE_MIN_SAMPLES = 20
+LLM_BREAKER_FAILURE_THRESHOLD = int(os.getenv("LLM_BREAKER_FAILURE_THRESHOLD", "5"))
+LLM_BREAKER_COOLDOWN = float(os.getenv("LLM_BREAKER_COOLDOWN", "30"))
+
+
+class LLMUnavailableError(HTTPException):
+    """Circuit breaker aberto: o provedor está degradado, falhamos rápido."""
+
+    def __init__(self, retry_after: float):
+        super().__init__(
+            status_code=503,
+            detail="Serviço de IA temporariamente indisponível. Tente novamente em instantes.",
+            headers={"Retry-After": str(max(int(retry_after), 1))},
+        )
+
+
+class LLMTimeoutError(HTTPException):
+    """A chamada estourou o orçamento de latência do endpoint."""
+
+    def __init__(self, budget: float):
+        super().__init__(
+            status_code=504,
+            detail=f"O serviço de IA não respondeu em {budget:.0f}s. Tente novamente.",
+        )
+
+
+def _json_default(value: Any):
+    # Mensagens do histórico podem ser objetos do SDK (ex: ChatCompletionMessage)
+    if hasattr(value, "model_dump"):
+        return value.model_dump()
+    return str(value)
+
+
+def prompt_fingerprint(params: Dict[str, Any]) -> str:
+    """
+    Hash estável dos parâmetros da chamada (modelo, mensagens, formato...).
+    Usado só como chave em memória: NUNCA logar, pois deriva do conteúdo clínico.
+    """
+    raw = json.dumps(params, sort_keys=True, ensure_ascii=False, default=_json_default)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class _Flight:
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class SingleFlight:
+    """
+    Coalesce chamadas idênticas em andamento: a primeira executa,
+    as concorrentes com a mesma chave esperam e recebem o mesmo resultado (ou erro).
+    Nada é cacheado depois que a chamada termina.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flights: Dict[str, _Flight] = {}
+
+    def do(self, key: str, fn: Callable[[], Any]) -> Any:
+        with self._lock:
+            flight = self._flights.get(key)
+            is_leader = flight is None
+            if is_leader:
+                flight = _Flight()
+                self._flights[key] = flight
+
+        if not is_leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+
+        try:
+            flight.result = fn()
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                self._flights.pop(key, None)
+            flight.done.set()
+        return flight.result
+
+    def in_flight(self) -> int:
+        with self._lock:
+            return len(self._flights)
+
+
+class LatencyTracker:
+    """Janela deslizante das latências de sucesso por endpoint (para o p95)."""
+
+    def __init__(self, window: int = 200):
+        self._lock = threading.Lock()
+        self._samples: Dict[str, deque] = {}
+        self._window = window
+
+    def record(self, endpoint: str, seconds: float) -> None:
+        with self._lock:
+            self._samples.setdefault(endpoint, deque(maxlen=self._window)).append(seconds)
+
+    def percentile(self, endpoint: str, pct: float = 0.95) -> Optional[float]:
+        with self._lock:
+            samples = sorted(self._samples.get(endpoint, ()))
+        if len(samples) < LLM_HEDGE_MIN_SAMPLES:
+            return None
+        return samples[min(int(len(samples) * pct), len(samples) - 1)]
+
+
+class CircuitBreaker:
+    """
+    closed -> open após N falhas consecutivas; open -> half_open após o cooldown;
+    em half_open uma única chamada de teste decide se fecha ou reabre.
+    """
+
+    def __init__(self, failure_threshold: int = LLM_BREAKER_FAILURE_THRESHOLD, cooldown: float = LLM_BREAKER_COOLDOWN):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._trial_in_progress = False
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._state()
+
+    def _state(self) -> str:
+        if self._opened_at is None:
+            return "closed"
+        if time.monotonic() - self._opened_at >= self.cooldown:
+            return "half_open"
+        return "open"
+
+    def before_call(self) -> bool:
+        """Levanta 503 com o circuito aberto; devolve True se esta chamada é o teste do half-open."""
+        with self._lock:
+            state = self._state()
+            if state == "closed":
+                return False
+            if state == "half_open" and not self._trial_in_progress:
+                self._trial_in_progress = True
+                return True
+            retry_after = self.cooldown - (time.monotonic() - self._opened_at)
+        raise LLMUnavailableError(retry_after)
+
+    def release_trial(self) -> None:
+        """Devolve o teste do half-open sem contar sucesso nem falha (a chamada não chegou ao provedor)."""
+        with self._lock:
+            self._trial_in_progress = False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_in_progress = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            was_trial = self._trial_in_progress
+            self._trial_in_progress = False
+            if was_trial or self._failures >= self.failure_threshold:
+                if self._opened_at is None or was_trial:
+                    logger.warning("Circuit breaker do OpenAI aberto")
+                self._opened_at = time.monotonic()
+
+
+def _is_provider_failure(error: BaseException) -> bool:
+    """Timeouts, erros de conexão, 429 e 5xx indicam degradação; 4xx é erro nosso."""
+    if isinstance(error, LLMTimeoutError):
+        return True
+    status_code = getattr(error, "status_code", None)
+    if status_code is None:
+        return True
+    return status_code >= 500 or status_code == 429
+
+
+class LLMGateway:
+    """
+    Ponto único de acesso ao OpenAI.
+    Expõe a mesma interface do SDK (`gateway.chat.completions.create(...)`),
+    então pode ser passado onde hoje se passa o `client` (ex: report_generator).
+    """
+
+    def __init__(
+        self,
+        client_factory: Optional[Callable[[], Any]] = None,
+        policies: Optional[Dict[str, Dict[str, Any]]] = None,
+        breaker: Optional[CircuitBreaker] = None,
+        hedge_min_delay: float = LLM_HEDGE_MIN_DELAY,
+        max_concurrency: int = LLM_MAX_CONCURRENCY,
+    ):
+        self._client_factory = client_factory or self._default_client
+        self._client = None
+        self._client_lock = threading.Lock()
+        self._inflight = SingleFlight()
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="llm")
+        self.policies = policies or LLM_POLICIES
+        self.breaker = breaker or CircuitBreaker()
+        self.latency = LatencyTracker()
+        self.hedge_min_delay = hedge_min_delay
+        self.hedges_sent = 0
+        self._stats_lock = threading.Lock()
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create_chat_completion))
+
+    @staticmethod
+    def _default_client():
+        from openai import OpenAI
+
+        return OpenAI(api_key=os.getenv("OPENAI_API_KEY"), max_retries=LLM_MAX_RETRIES)
+
+    def for_endpoint(self, endpoint: str):
+        """Visão com a interface do SDK amarrada a uma política (ex: para o report_generator)."""
+        def create(**params):
+            return self.create_chat_completion(endpoint=endpoint, **params)
+        return SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+
+    def ensure_available(self) -> None:
+        """Levanta 503 se o circuit breaker estiver aberto (sem consumir o teste do half-open)."""
+        if self.breaker.state == "open":
+            self.breaker.before_call()
+
+    def _hedge_delay(self, endpoint: str, budget: float) -> float:
+        p95 = self.latency.percentile(endpoint)
+        if p95 is None:
+            # Sem histórico suficiente: espera metade do orçamento antes de duplicar
+            return budget / 2
+        return min(max(p95, self.hedge_min_delay), budget / 2)
+
+    def _attempt(self, endpoint: str, budget: float, params: Dict[str, Any], attempt_started: threading.Event):
+        attempt_started.set()
+        started = time.monotonic()
+        result = self.client.chat.completions.create(timeout=budget, **params)
+        self.latency.record(endpoint, time.monotonic() - started)
+        return result
+
+    def _call_resilient(self, endpoint: str, params: Dict[str, Any]):
+        policy = self.policies.get(endpoint) or self.policies["default"]
+        budget = policy["budget"]
+        deadline = time.monotonic() + budget
+
+        is_trial = self.breaker.before_call()
+
+        # Marcado quando alguma tentativa sai da fila do executor e chama o provedor
+        attempt_started = threading.Event()
+        pending = {self._executor.submit(self._attempt, endpoint, budget, params, attempt_started)}
+        if policy.get("hedge"):
+            done, pending = wait(pending, timeout=self._hedge_delay(endpoint, budget))
+            # Ainda na fila do executor (todas as threads ocupadas): duplicar só aumentaria a fila
+            if not done and attempt_started.is_set():
+                # A primeira tentativa passou do p95: dispara uma duplicata e fica com a mais rápida
+                with self._stats_lock:
+                    self.hedges_sent += 1
+                pending.add(self._executor.submit(self._attempt, endpoint, budget, params, attempt_started))
+            pending |= done
+
+        error: Optional[BaseException] = None
+        while pending:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            done, pending = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    self.breaker.record_success()
+                    return future.result()
+                error = future.exception()
+
+        if pending or error is None:
+            # Tentativas ainda na fila nem chegam a rodar; as que começaram seguem até o
+            # timeout do SDK, mas ninguém mais espera por elas
+            for future in pending:
+                future.cancel()
+            error = LLMTimeoutError(budget)
+            if not attempt_started.is_set():
+                # O orçamento acabou na fila local (LLM_MAX_CONCURRENCY threads ocupadas):
+                # sobrecarga nossa, não do provedor, então o circuit breaker não conta
+                logger.warning(f"Chamada ao LLM ({endpoint}) expirou na fila local sem chegar ao provedor")
+                if is_trial:
+                    self.breaker.release_trial()
+                raise error
+
+        if _is_provider_failure(error):
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+        raise error
+
+    @property
+    def client(self):
+        if self._client is None:
+            with self._client_lock:
+                if self._client is None:
+                    self._client = self._client_factory()
+        return self._client
+
+    def create_chat_completion(self, coalesce: bool = True, endpoint: str = "default", **params):
+        """
+        Chama chat.completions.create dentro do orçamento de latência de `endpoint`,
+        com hedge (se a política permitir) e circuit breaker.
+        Com `coalesce=True` (default), requisições idênticas simultâneas (duplo clique,
+        retry do frontend) compartilham uma única chamada upstream.
+        Use `coalesce=False` para chamadas não idempotentes.
+        """
+        with span("openai", endpoint):
+            if not coalesce:
+                return self._call_resilient(endpoint, params)
+
+            key = prompt_fingerprint({"endpoint": endpoint, **params})
+            return self._inflight.do(key, lambda: self._call_resilient(endpoint, params))
+
+
+gateway = LLMGateway()
@@ -0,0 +1,262 @@
+import atexit
+import json
+import os
+import queue
+import random
+import re
+import sys
+import threading
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Any, Dict, Optional, TextIO
+
+from loguru import logger
+
+# NUNCA logar conteúdo sensível: além de só logarmos metadados, todo registro
+# passa por um filtro que remove campos de PHI antes de ser serializado.
+
+LOG_FILE = os.getenv("LOG_FILE", "theramind.log")
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+LOG_ROTATION_BYTES = 10 * 1024 * 1024
+# Arquivos rotacionados mantidos (os mais antigos são apagados)
+LOG_RETENTION_FILES = int(os.getenv("LOG_RETENTION_FILES", "10"))
+# Registros aguardando a thread de escrita; com a fila cheia, novos logs são descartados
+# (e contados) em vez de crescer a memória ou bloquear o request
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+# Fração dos logs de "hot path" (bind(hot=True)) mantidos, p.ex. autenticação a cada request
+LOG_HOT_PATH_SAMPLE_RATE = float(os.getenv("LOG_HOT_PATH_SAMPLE_RATE", "0.05"))
+# Sobrescreve por rota: "/copilot/chat=0.5,/analyze=1"
+LOG_ROUTE_SAMPLE_RATES = os.getenv("LOG_ROUTE_SAMPLE_RATES", "")
+
+PHI_FIELDS = {
+    "name", "email", "phone", "query", "note", "text", "message", "content",
+    "transcription", "summary", "insights", "registro_descritivo", "hipoteses_clinicas",
+    "direcoes_intervencao", "authorization", "token", "cpf",
+}
+REDACTED = "[REDACTED]"
+
+_EMAIL_RE = re.compile(r"[\w.+-]+@[\w-]+\.[\w.-]+")
+_PHONE_RE = re.compile(r"(?<![\w-])(?:\+?55\s?)?\(?\d{2}\)?\s?9?\d{4}[-\s]?\d{4}(?![\w-])")
+_BEARER_RE = re.compile(r"Bearer\s+[\w.-]+", re.IGNORECASE)
+_CPF_RE = re.compile(r"(?<![\w.-])\d{3}\.?\d{3}\.?\d{3}-?\d{2}(?![\w-])")
+
+current_route: ContextVar[str] = ContextVar("log_route", default="-")
+
+
+def _parse_route_rates(raw: str) -> Dict[str, float]:
+    rates = {}
+    for item in raw.split(","):
+        if "=" in item:
+            route, rate = item.rsplit("=", 1)
+            rates[route.strip()] = float(rate)
+    return rates
+
+
+_ROUTE_RATES = _parse_route_rates(LOG_ROUTE_SAMPLE_RATES)
+
+
+def redact(value: Any) -> Any:
+    """Remove campos de PHI (por nome) e e-mails/telefones/tokens em texto livre."""
+    if isinstance(value, dict):
+        return {
+            k: (REDACTED if str(k).lower() in PHI_FIELDS else redact(v))
+            for k, v in value.items()
+        }
+    if isinstance(value, (list, tuple)):
+        return [redact(v) for v in value]
+    if isinstance(value, str):
+        return redact_text(value)
+    return value
+
+
+def redact_text(text: str) -> str:
+    if "@" in text:
+        text = _EMAIL_RE.sub(REDACTED, text)
+    text = _BEARER_RE.sub(f"Bearer {REDACTED}", text)
+    text = _CPF_RE.sub(REDACTED, text)
+    return _PHONE_RE.sub(REDACTED, text)
+
+
+def _sample_rate(route: str) -> float:
+    for prefix, rate in _ROUTE_RATES.items():
+        if route.startswith(prefix):
+            return rate
+    return LOG_HOT_PATH_SAMPLE_RATE
+
+
+def _log_filter(record: Dict[str, Any]) -> bool:
+    extra = record["extra"]
+    route = current_route.get()
+
+    # Amostragem: só logs de hot path abaixo de WARNING são descartados
+    if extra.get("hot") and record["level"].no < 30:
+        # Decisão guardada no registro para que todos os sinks concordem
+        if "sampled" not in extra:
+            extra["sampled"] = random.random() < _sample_rate(route)
+        if not extra["sampled"]:
+            return False
+
+    extra["route"] = route
+    for key in list(extra):
+        if key.lower() in PHI_FIELDS:
+            extra[key] = REDACTED
+        else:
+            extra[key] = redact(extra[key])
+    record["message"] = redact_text(record["message"])
+    return True
+
+
+class RouteContextMiddleware:
+    """Middleware ASGI que expõe a rota atual para a amostragem/contexto dos logs."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        token = current_route.set(scope["path"])
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            current_route.reset(token)
+
+
+class BackgroundSink:
+    """
+    Sink do loguru que só enfileira o registro; uma thread dedicada serializa
+    (JSON, se `serialize`) e escreve em lote. O request nunca espera por I/O.
+    A fila é limitada: se o disco não der conta, o excedente é descartado e a
+    quantidade descartada é registrada no próprio log assim que houver espaço.
+    """
+
+    def __init__(self, path: Optional[str] = None, stream: Optional[TextIO] = None,
+                 serialize: bool = False, rotation_bytes: int = LOG_ROTATION_BYTES,
+                 max_queue: int = LOG_QUEUE_SIZE, retention: int = LOG_RETENTION_FILES):
+        self.path = path
+        self.serialize = serialize
+        self.rotation_bytes = rotation_bytes
+        self.retention = retention
+        self._stream = stream
+        self._queue: "queue.Queue" = queue.Queue(maxsize=max_queue)
+        # O sink é chamado de várias threads (to_thread, workers); o lock só é usado no descarte
+        self._dropped_lock = threading.Lock()
+        self._dropped_total = 0
+        self._dropped_reported = 0
+        self._thread = threading.Thread(target=self._run, name="log-writer", daemon=True)
+        self._thread.start()
+        atexit.register(self.stop)
+
+    def __call__(self, message) -> None:
+        try:
+            self._queue.put_nowait(message.record if self.serialize else str(message))
+        except queue.Full:
+            with self._dropped_lock:
+                self._dropped_total += 1
+
+    @property
+    def dropped(self) -> int:
+        """Registros descartados por fila cheia desde a criação do sink."""
+        return self._dropped_total
+
+    def stop(self) -> None:
+        if self._thread.is_alive():
+            try:
+                self._queue.put(None, timeout=5)
+            except queue.Full:
+                return
+            self._thread.join(timeout=5)
+
+    @staticmethod
+    def _to_json(record: Dict[str, Any]) -> str:
+        data = {
+            "time": record["time"].isoformat(),
+            "level": record["level"].name,
+            "message": record["message"],
+            "module": record["name"],
+            "function": record["function"],
+            "line": record["line"],
+            "extra": record["extra"],
+        }
+        if record["exception"] is not None:
+            data["exception"] = repr(record["exception"].value)
+        return json.dumps(data, ensure_ascii=False, default=str) + "\n"
+
+    def _dropped_notice(self) -> Optional[str]:
+        dropped = self._dropped_total - self._dropped_reported
+        if dropped <= 0:
+            return None
+        self._dropped_reported += dropped
+        message = f"{dropped} registro(s) de log descartado(s): fila de escrita cheia"
+        if not self.serialize:
+            return f"{datetime.now().isoformat(sep=' ', timespec='milliseconds')} | WARNING  | {message}\n"
+        return json.dumps({"time": datetime.now().astimezone().isoformat(), "level": "WARNING",
+                           "message": message, "extra": {"dropped": dropped}}, ensure_ascii=False) + "\n"
+
+    def _open(self) -> TextIO:
+        if self._stream is None:
+            self._stream = open(self.path, "a", encoding="utf-8")
+        return self._stream
+
+    def _rotate_if_needed(self, stream: TextIO) -> TextIO:
+        if self.path is None or stream.tell() < self.rotation_bytes:
+            return stream
+        stream.close()
+        os.replace(self.path, f"{self.path}.{datetime.now().strftime('%Y-%m-%d_%H-%M-%S_%f')}")
+        self._prune_rotated()
+        self._stream = None
+        return self._open()
+
+    def _prune_rotated(self) -> None:
+        directory = os.path.dirname(self.path) or "."
+        prefix = os.path.basename(self.path) + "."
+        # O sufixo é a data da rotação: a ordem alfabética é a cronológica
+        rotated = sorted(name for name in os.listdir(directory) if name.startswith(prefix))
+        for name in rotated[:max(len(rotated) - self.retention, 0)]:
+            try:
+                os.remove(os.path.join(directory, name))
+            except OSError:
+                pass
+
+    def _run(self) -> None:
+        stream = self._open()
+        while True:
+            item = self._queue.get()
+            # Drena o que já estiver na fila e escreve em lote
+            batch = [item]
+            while item is not None:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                batch.append(item)
+            try:
+                notice = self._dropped_notice()
+                if notice:
+                    stream.write(notice)
+                for entry in batch:
+                    if entry is None:
+                        stream.flush()
+                        return
+                    stream.write(self._to_json(entry) if self.serialize else entry)
+                stream.flush()
+            except (ValueError, OSError):
+                # Destino já fechado (ex.: stderr encerrado no shutdown): descarta o lote
+                if batch[-1] is None:
+                    return
+                continue
+            stream = self._rotate_if_needed(stream)
+
+
+_sinks = []
+
+
+def setup_logging() -> None:
+    """Troca os sinks padrão por sinks não bloqueantes: texto no stderr e JSON no arquivo."""
+    logger.remove()
+    for sink in _sinks:
+        sink.stop()
+    _sinks[:] = [BackgroundSink(stream=sys.stderr), BackgroundSink(path=LOG_FILE, serialize=True)]
+
+    logger.add(_sinks[0], level=LOG_LEVEL, filter=_log_filter, backtrace=False, diagnose=False)
+    logger.add(_sinks[1], level=LOG_LEVEL, filter=_log_filter, backtrace=False, diagnose=False)
@@ -1,20 +1,39 @@
 import os
-from typing import List, Optional
+import io
+import asyncio
+import zipfile
+from contextlib import asynccontextmanager
+from typing import Any, List, Optional
 from datetime import datetime
 
 from dotenv import load_dotenv
-from fastapi import FastAPI, HTTPException, Depends, status, Response, Request
+from fastapi import APIRouter, FastAPI, HTTPException, Depends, status, Response, Request, BackgroundTasks
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from loguru import logger
-from openai import OpenAI
 import json
 
 from .db import get_supabase_client
 from .deps import get_current_user, AuthUser
 from . import schemas
 from . import tools
+from . import jobs
+from . import payment
+from . import export
+from .admission import admitted, rate_limited
+from .background import post_response
+from .compression import compress_row, decompress_row, decompress_rows, decompress_text
+from .llm import gateway as llm_gateway
+from .logging_config import setup_logging, RouteContextMiddleware
+from . import profiling
+from .serialization import fast_json_response
+from .pdf_templates import DOCUMENT_TITLES, get_styles, get_table_style, warm_templates
 
 from .services.cfp_service import CFPService
+from .services.scheduling_service import SchedulingService
+from .services.financial_service import FinancialService
+from .services.patient_import_service import PatientImportService
+from .services.session_document_service import SessionDocumentService
 
 from .report_generator import (
     calculate_sentiment_trends,
@@ -26,7 +45,8 @@ from .report_generator import (
 
 load_dotenv()
 
-app = FastAPI(title="TheraMind API")
+# Rotas registradas no router e montadas pela factory (create_app, no fim do arquivo)
+router = APIRouter()
 
 # CORS
 origins_env = os.getenv("BACKEND_CORS_ORIGINS", "")
@@ -49,22 +69,10 @@ if not origins or "*" in origins:
 else:
     cors_params["allow_origins"] = origins
 
-app.add_middleware(
-    CORSMiddleware,
-    **cors_params
-)
-
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+# Gateway do OpenAI (mesma interface do SDK) com coalescing de chamadas idênticas
+client = llm_gateway
 BUCKET = os.getenv("SUPABASE_BUCKET", "theramind")
-
-# NUNCA logar conteúdo sensível: só metadados
-logger.add(
-    "theramind.log",
-    rotation="10 MB",
-    level="INFO",
-    backtrace=False,
-    diagnose=False,
-)
+SESSION_PREVIEW_CHARS = 200  # trecho do registro descritivo em GET /sessions/recent
 
 # --- Tool Definitions ---
 TOOLS_SCHEMA = [
@@ -102,7 +110,7 @@ TOOLS_SCHEMA = [
         "type": "function",
         "function": {
             "name": "create_appointment",
-            "description": "Agenda uma consulta para um paciente existente. Requer patient_id (use search_patients se não souber).",
+            "description": "Agenda uma consulta para um paciente existente. Requer patient_id (use search_patients se não souber). Recusa horários que conflitam com outra consulta.",
             "parameters": {
                 "type": "object",
                 "properties": {
@@ -116,6 +124,43 @@ TOOLS_SCHEMA = [
             }
         }
     },
+    {
+        "type": "function",
+        "function": {
+            "name": "create_recurring_appointments",
+            "description": "Agenda várias consultas de uma vez para um paciente existente (semanal ou quinzenal), numa única chamada. Use em vez de chamar create_appointment repetidamente.",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "patient_id": {"type": "string", "description": "UUID do paciente"},
+                    "date": {"type": "string", "description": "Data da primeira consulta no formato YYYY-MM-DD"},
+                    "time": {"type": "string", "description": "Hora no formato HH:MM"},
+                    "frequency": {"type": "string", "enum": ["weekly", "biweekly"], "description": "weekly (semanal) ou biweekly (quinzenal)", "default": "weekly"},
+                    "count": {"type": "integer", "description": "Número de ocorrências (máx. 60). Informe count ou until."},
+                    "until": {"type": "string", "description": "Data da última consulta possível, YYYY-MM-DD (inclusive)"},
+                    "exceptions": {"type": "array", "items": {"type": "string"}, "description": "Datas a pular (YYYY-MM-DD), ex: feriados"},
+                    "duration_minutes": {"type": "integer", "description": "Duração em minutos (default 50)", "default": 50},
+                    "price": {"type": "number", "description": "Valor da consulta (default 150.0)", "default": 150.0},
+                    "skip_conflicts": {"type": "boolean", "description": "Se true, pula datas com conflito em vez de não agendar nada", "default": False}
+                },
+                "required": ["patient_id", "date", "time"]
+            }
+        }
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "find_free_slots",
+            "description": "Lista os próximos horários livres da agenda do terapeuta (horário de Brasília, dias úteis). Use antes de sugerir ou agendar um horário; nunca invente horários disponíveis.",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "days": {"type": "integer", "description": "Quantos dias à frente buscar (default 7, máx. 60)", "default": 7},
+                    "duration_minutes": {"type": "integer", "description": "Duração da consulta em minutos (default 50)", "default": 50}
+                }
+            }
+        }
+    },
     {
         "type": "function",
         "function": {
@@ -133,241 +178,158 @@ TOOLS_SCHEMA = [
     }
 ]
 
-@app.post("/analyze", response_model=schemas.AnalyzeResponse)
-async def analyze_transcription(
-    body: schemas.AnalyzeRequest,
-    user: AuthUser = Depends(get_current_user),
-):
-    # Enforce AI Analysis permission and Daily Limit
-    # Enforce AI Analysis permission and Daily Limit
-    # Removed subscription checks
-    
-    transcription = body.transcription
 
-    # Fetch Therapist theoretical approach
+def _get_therapist_approach(user_id: str) -> str:
+    """Busca a abordagem teórica do terapeuta (default: Integrativa)."""
     supabase = get_supabase_client()
     therapist = (
         supabase.table("profiles")
         .select("theoretical_approach")
-        .eq("id", user.user_id)
+        .eq("id", user_id)
         .single()
         .execute()
     )
-    approach = therapist.data.get("theoretical_approach", "Integrativa") if therapist.data else "Integrativa"
+    return therapist.data.get("theoretical_approach", "Integrativa") if therapist.data else "Integrativa"
+
+
+def _run_analysis(text: str, approach: str, text_label: str) -> schemas.AnalyzeResponse:
+    """Executa a análise CFP do texto da sessão. Compartilhado entre os endpoints e o job 'analyze'."""
+    system_prompt = (
+        "Você é um assistente de apoio ao raciocínio clínico e à elaboração de prontuários e documentos psicológicos, "
+        f"especialista na abordagem {approach}, com base nas normas éticas e técnicas do Conselho Federal de Psicologia (CFP), especialmente:\n\n"
+        "• Resolução CFP nº 01/2009 (registro documental obrigatório)\n"
+        "• Resolução CFP nº 06/2019 (elaboração de documentos psicológicos)\n"
+        "• Manual Orientativo de Registro e Elaboração de Documentos Psicológicos publicado pelo CFP.\n\n"
+        "Sua função é auxiliar o psicólogo(a) a organizar, qualificar e formular textos de prontuário, relatórios e "
+        f"documentos psicológicos de acordo com os relatos do profissional no prontuário e na abordagem {approach}, "
+        "dando oportunidade para o profissional editar. Você sugere possibilidades diagnósticas e sugere intervenções "
+        f"de acordo com a abordagem {approach}.\n\n"
+        "LINGUAGEM ÉTICA E TÉCNICA OBRIGATÓRIA:\n"
+        "Sempre use expressões condicionais e não conclusivas, como:\n"
+        "'observa-se', 'levanta-se hipótese', 'pode indicar', 'sugere possibilidade'.\n"
+        "Nunca use linguagem determinista, diagnóstica ou prescritiva.\n\n"
+        "Responda SEMPRE em JSON com as chaves:\n"
+        "- registro_descritivo (descrição factual dos eventos, verbatim importantes, afetos e comportamentos observados)\n"
+        f"- hipoteses_clinicas (formulação aberta e condicional, conectada com a abordagem {approach}, sugerindo possibilidades diagnósticas)\n"
+        f"- direcoes_intervencao (sugestões hipotéticas compatíveis com a abordagem {approach}, indicando possíveis intervenções)\n"
+        "- temas_relevantes (lista de strings com temas identificados)"
+    )
 
-    try:
-        system_prompt = (
-            "Você é um assistente de apoio ao raciocínio clínico e à elaboração de prontuários e documentos psicológicos, "
-            f"especialista na abordagem {approach}, com base nas normas éticas e técnicas do Conselho Federal de Psicologia (CFP), especialmente:\n\n"
-            "• Resolução CFP nº 01/2009 (registro documental obrigatório)\n"
-            "• Resolução CFP nº 06/2019 (elaboração de documentos psicológicos)\n"
-            "• Manual Orientativo de Registro e Elaboração de Documentos Psicológicos publicado pelo CFP.\n\n"
-            "Sua função é auxiliar o psicólogo(a) a organizar, qualificar e formular textos de prontuário, relatórios e "
-            f"documentos psicológicos de acordo com os relatos do profissional no prontuário e na abordagem {approach}, "
-            "dando oportunidade para o profissional editar. Você sugere possibilidades diagnósticas e sugere intervenções "
-            f"de acordo com a abordagem {approach}.\n\n"
-            "LINGUAGEM ÉTICA E TÉCNICA OBRIGATÓRIA:\n"
-            "Sempre use expressões condicionais e não conclusivas, como:\n"
-            "'observa-se', 'levanta-se hipótese', 'pode indicar', 'sugere possibilidade'.\n"
-            "Nunca use linguagem determinista, diagnóstica ou prescritiva.\n\n"
-            "Responda SEMPRE em JSON com as chaves:\n"
-            "- registro_descritivo (descrição factual dos eventos, verbatim importantes, afetos e comportamentos observados)\n"
-            f"- hipoteses_clinicas (formulação aberta e condicional, conectada com a abordagem {approach}, sugerindo possibilidades diagnósticas)\n"
-            f"- direcoes_intervencao (sugestões hipotéticas compatíveis com a abordagem {approach}, indicando possíveis intervenções)\n"
-            "- temas_relevantes (lista de strings com temas identificados)"
-        )
+    registro_prompt = (
+        "Elabore um registro descritivo da sessão (5 a 10 linhas), documentando de forma factual e objetiva:\n"
+        "- Os eventos relatados pelo paciente\n"
+        "- Verbalizações importantes (verbatim quando relevante)\n"
+        "- Afetos predominantes observados\n"
+        "- Comportamentos não-verbais significativos\n"
+        "Use linguagem técnica e factual, sem interpretações nesta seção."
+    )
 
-        registro_prompt = (
-            "Elabore um registro descritivo da sessão (5 a 10 linhas), documentando de forma factual e objetiva:\n"
-            "- Os eventos relatados pelo paciente\n"
-            "- Verbalizações importantes (verbatim quando relevante)\n"
-            "- Afetos predominantes observados\n"
-            "- Comportamentos não-verbais significativos\n"
-            "Use linguagem técnica e factual, sem interpretações nesta seção."
-        )
+    hipoteses_prompt = (
+        "Formule hipóteses clínicas de forma narrativa e condicional (NÃO use listas ou tópicos):\n"
+        "1. Integre organicamente os conceitos teóricos mais pertinentes ao conteúdo trazido.\n"
+        "2. Sugira possibilidades diagnósticas usando linguagem condicional ('pode indicar', 'sugere', 'observa-se padrão compatível com').\n"
+        "3. Se houver crise de identidade ou vazio existencial, considere perspectivas existenciais (sentido, responsabilidade).\n"
+        "4. Se houver material onírico ou simbólico rico, considere aspectos arquetípicos e simbólicos.\n"
+        "5. Para conflitos relacionais, dinâmicas de desejo ou mecanismos de defesa, considere perspectivas psicodinâmicas.\n"
+        "6. Evite frases clichês. Prefira construções como 'Observa-se...', 'Levanta-se a hipótese de...', 'O discurso sugere...'.\n"
+        "Escreva um texto fluido, elegante e clinicamente preciso."
+    )
 
-        hipoteses_prompt = (
-            "Formule hipóteses clínicas de forma narrativa e condicional (NÃO use listas ou tópicos):\n"
-            "1. Integre organicamente os conceitos teóricos mais pertinentes ao conteúdo trazido.\n"
-            "2. Sugira possibilidades diagnósticas usando linguagem condicional ('pode indicar', 'sugere', 'observa-se padrão compatível com').\n"
-            "3. Se houver crise de identidade ou vazio existencial, considere perspectivas existenciais (sentido, responsabilidade).\n"
-            "4. Se houver material onírico ou simbólico rico, considere aspectos arquetípicos e simbólicos.\n"
-            "5. Para conflitos relacionais, dinâmicas de desejo ou mecanismos de defesa, considere perspectivas psicodinâmicas.\n"
-            "6. Evite frases clichês. Prefira construções como 'Observa-se...', 'Levanta-se a hipótese de...', 'O discurso sugere...'.\n"
-            "Escreva um texto fluido, elegante e clinicamente preciso."
-        )
+    intervencoes_prompt = (
+        "Sugira direções de intervenção de forma hipotética e condicional:\n"
+        "1. Apresente possibilidades de intervenção compatíveis com as hipóteses levantadas.\n"
+        "2. Use linguagem sugestiva: 'Pode-se considerar', 'Sugere-se explorar', 'Seria pertinente investigar'.\n"
+        "3. Indique técnicas ou abordagens que possam ser úteis, sem prescrever.\n"
+        "4. Mantenha o tom de sugestão, deixando a decisão final ao psicólogo responsável.\n"
+        "Escreva de forma narrativa e profissional."
+    )
 
-        intervencoes_prompt = (
-            "Sugira direções de intervenção de forma hipotética e condicional:\n"
-            "1. Apresente possibilidades de intervenção compatíveis com as hipóteses levantadas.\n"
-            "2. Use linguagem sugestiva: 'Pode-se considerar', 'Sugere-se explorar', 'Seria pertinente investigar'.\n"
-            "3. Indique técnicas ou abordagens que possam ser úteis, sem prescrever.\n"
-            "4. Mantenha o tom de sugestão, deixando a decisão final ao psicólogo responsável.\n"
-            "Escreva de forma narrativa e profissional."
-        )
+    messages = [
+        {"role": "system", "content": system_prompt},
+        {
+            "role": "user",
+            "content": (
+                f"{registro_prompt}\n\n{hipoteses_prompt}\n\n{intervencoes_prompt}\n\n"
+                f"{text_label} (NÃO logar este conteúdo em lugar nenhum):\n"
+                f"{text}\n\n"
+                "Responda apenas em JSON válido, por exemplo:\n"
+                '{ "registro_descritivo": "...", "hipoteses_clinicas": "...", "direcoes_intervencao": "...", "temas_relevantes": ["tema1", "tema2"] }'
+            ),
+        },
+    ]
 
-        messages = [
-            {"role": "system", "content": system_prompt},
-            {
-                "role": "user",
-                "content": (
-                    f"{registro_prompt}\n\n{hipoteses_prompt}\n\n{intervencoes_prompt}\n\n"
-                    "Transcrição completa da sessão (NÃO logar este conteúdo em lugar nenhum):\n"
-                    f"{transcription}\n\n"
-                    "Responda apenas em JSON válido, por exemplo:\n"
-                    '{ "registro_descritivo": "...", "hipoteses_clinicas": "...", "direcoes_intervencao": "...", "temas_relevantes": ["tema1", "tema2"] }'
-                ),
-            },
-        ]
+    completion = client.chat.completions.create(
+        model="gpt-4o-mini",
+        messages=messages,
+        response_format={"type": "json_object"},
+        endpoint="analyze",
+    )
 
-        completion = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=messages,
-            response_format={"type": "json_object"},
-        )
+    content = completion.choices[0].message.content or "{}"
+    data = json.loads(content)
 
-        content = completion.choices[0].message.content or "{}"
-        data = json.loads(content)
+    registro_descritivo = data.get("registro_descritivo", "")
+    hipoteses_clinicas = data.get("hipoteses_clinicas", "")
+    direcoes_intervencao = data.get("direcoes_intervencao", "")
+    temas_relevantes = data.get("temas_relevantes", []) or []
 
-        registro_descritivo = data.get("registro_descritivo", "")
-        hipoteses_clinicas = data.get("hipoteses_clinicas", "")
-        direcoes_intervencao = data.get("direcoes_intervencao", "")
-        temas_relevantes = data.get("temas_relevantes", []) or []
+    if not isinstance(temas_relevantes, list):
+        temas_relevantes = [str(temas_relevantes)]
 
-        if not isinstance(temas_relevantes, list):
-            temas_relevantes = [str(temas_relevantes)]
+    return schemas.AnalyzeResponse(
+        registro_descritivo=registro_descritivo,
+        hipoteses_clinicas=hipoteses_clinicas,
+        direcoes_intervencao=direcoes_intervencao,
+        temas_relevantes=[str(t) for t in temas_relevantes],
+    )
 
-        return schemas.AnalyzeResponse(
-            registro_descritivo=registro_descritivo,
-            hipoteses_clinicas=hipoteses_clinicas,
-            direcoes_intervencao=direcoes_intervencao,
-            temas_relevantes=[str(t) for t in temas_relevantes],
-        )
+
+@router.post("/analyze", response_model=schemas.AnalyzeResponse)
+async def analyze_transcription(
+    body: schemas.AnalyzeRequest,
+    user: AuthUser = Depends(admitted("analyze")),
+):
+    # Enforce AI Analysis permission and Daily Limit
+    # Removed subscription checks
+
+    approach = _get_therapist_approach(user.user_id)
+
+    try:
+        # Em thread para não bloquear o event loop e permitir coalescer requisições duplicadas
+        return await asyncio.to_thread(_run_analysis, body.transcription, approach, "Transcrição completa da sessão")
+    except HTTPException:
+        # 503/504 do gateway (circuit breaker aberto ou orçamento de latência estourado)
+        raise
     except Exception as e:
         logger.error(f"Erro análise GPT: {e}")
         raise HTTPException(status_code=500, detail="Erro ao analisar sessão")
 
 
-
-@app.post("/analyze-text", response_model=schemas.AnalyzeResponse)
+@router.post("/analyze-text", response_model=schemas.AnalyzeResponse)
 async def analyze_text(
     body: schemas.AnalyzeTextRequest,
-    user: AuthUser = Depends(get_current_user),
+    user: AuthUser = Depends(admitted("analyze")),
 ):
-    # Enforce AI Analysis permission and Daily Limit
     # Enforce AI Analysis permission and Daily Limit
     # Removed subscription checks
-    
-    text = body.text
 
-    # Fetch Therapist theoretical approach
-    supabase = get_supabase_client()
-    therapist = (
-        supabase.table("profiles")
-        .select("theoretical_approach")
-        .eq("id", user.user_id)
-        .single()
-        .execute()
-    )
-    approach = therapist.data.get("theoretical_approach", "Integrativa") if therapist.data else "Integrativa"
+    approach = _get_therapist_approach(user.user_id)
 
     try:
-        system_prompt = (
-            "Você é um assistente de apoio ao raciocínio clínico e à elaboração de prontuários e documentos psicológicos, "
-            f"especialista na abordagem {approach}, com base nas normas éticas e técnicas do Conselho Federal de Psicologia (CFP), especialmente:\n\n"
-            "• Resolução CFP nº 01/2009 (registro documental obrigatório)\n"
-            "• Resolução CFP nº 06/2019 (elaboração de documentos psicológicos)\n"
-            "• Manual Orientativo de Registro e Elaboração de Documentos Psicológicos publicado pelo CFP.\n\n"
-            "Sua função é auxiliar o psicólogo(a) a organizar, qualificar e formular textos de prontuário, relatórios e "
-            f"documentos psicológicos de acordo com os relatos do profissional no prontuário e na abordagem {approach}, "
-            "dando oportunidade para o profissional editar. Você sugere possibilidades diagnósticas e sugere intervenções "
-            f"de acordo com a abordagem {approach}.\n\n"
-            "LINGUAGEM ÉTICA E TÉCNICA OBRIGATÓRIA:\n"
-            "Sempre use expressões condicionais e não conclusivas, como:\n"
-            "'observa-se', 'levanta-se hipótese', 'pode indicar', 'sugere possibilidade'.\n"
-            "Nunca use linguagem determinista, diagnóstica ou prescritiva.\n\n"
-            "Responda SEMPRE em JSON com as chaves:\n"
-            "- registro_descritivo (descrição factual dos eventos, verbatim importantes, afetos e comportamentos observados)\n"
-            f"- hipoteses_clinicas (formulação aberta e condicional, conectada com a abordagem {approach}, sugerindo possibilidades diagnósticas)\n"
-            f"- direcoes_intervencao (sugestões hipotéticas compatíveis com a abordagem {approach}, indicando possíveis intervenções)\n"
-            "- temas_relevantes (lista de strings com temas identificados)"
-        )
-
-        registro_prompt = (
-            "Elabore um registro descritivo da sessão (5 a 10 linhas), documentando de forma factual e objetiva:\n"
-            "- Os eventos relatados pelo paciente\n"
-            "- Verbalizações importantes (verbatim quando relevante)\n"
-            "- Afetos predominantes observados\n"
-            "- Comportamentos não-verbais significativos\n"
-            "Use linguagem técnica e factual, sem interpretações nesta seção."
-        )
-
-        hipoteses_prompt = (
-            "Formule hipóteses clínicas de forma narrativa e condicional (NÃO use listas ou tópicos):\n"
-            "1. Integre organicamente os conceitos teóricos mais pertinentes ao conteúdo trazido.\n"
-            "2. Sugira possibilidades diagnósticas usando linguagem condicional ('pode indicar', 'sugere', 'observa-se padrão compatível com').\n"
-            "3. Se houver crise de identidade ou vazio existencial, considere perspectivas existenciais (sentido, responsabilidade).\n"
-            "4. Se houver material onírico ou simbólico rico, considere aspectos arquetípicos e simbólicos.\n"
-            "5. Para conflitos relacionais, dinâmicas de desejo ou mecanismos de defesa, considere perspectivas psicodinâmicas.\n"
-            "6. Evite frases clichês. Prefira construções como 'Observa-se...', 'Levanta-se a hipótese de...', 'O discurso sugere...'.\n"
-            "Escreva um texto fluido, elegante e clinicamente preciso."
-        )
-
-        intervencoes_prompt = (
-            "Sugira direções de intervenção de forma hipotética e condicional:\n"
-            "1. Apresente possibilidades de intervenção compatíveis com as hipóteses levantadas.\n"
-            "2. Use linguagem sugestiva: 'Pode-se considerar', 'Sugere-se explorar', 'Seria pertinente investigar'.\n"
-            "3. Indique técnicas ou abordagens que possam ser úteis, sem prescrever.\n"
-            "4. Mantenha o tom de sugestão, deixando a decisão final ao psicólogo responsável.\n"
-            "Escreva de forma narrativa e profissional."
-        )
-
-        messages = [
-            {"role": "system", "content": system_prompt},
-            {
-                "role": "user",
-                "content": (
-                    f"{registro_prompt}\n\n{hipoteses_prompt}\n\n{intervencoes_prompt}\n\n"
-                    "Texto completo da sessão (NÃO logar este conteúdo em lugar nenhum):\n"
-                    f"{text}\n\n"
-                    "Responda apenas em JSON válido, por exemplo:\n"
-                    '{ "registro_descritivo": "...", "hipoteses_clinicas": "...", "direcoes_intervencao": "...", "temas_relevantes": ["tema1", "tema2"] }'
-                ),
-            },
-        ]
-
-        completion = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=messages,
-            response_format={"type": "json_object"},
-        )
-
-        content = completion.choices[0].message.content or "{}"
-        data = json.loads(content)
-
-        registro_descritivo = data.get("registro_descritivo", "")
-        hipoteses_clinicas = data.get("hipoteses_clinicas", "")
-        direcoes_intervencao = data.get("direcoes_intervencao", "")
-        temas_relevantes = data.get("temas_relevantes", []) or []
-
-        if not isinstance(temas_relevantes, list):
-            temas_relevantes = [str(temas_relevantes)]
-
-        return schemas.AnalyzeResponse(
-            registro_descritivo=registro_descritivo,
-            hipoteses_clinicas=hipoteses_clinicas,
-            direcoes_intervencao=direcoes_intervencao,
-            temas_relevantes=[str(t) for t in temas_relevantes],
-        )
+        return await asyncio.to_thread(_run_analysis, body.text, approach, "Texto completo da sessão")
+    except HTTPException:
+        # 503/504 do gateway (circuit breaker aberto ou orçamento de latência estourado)
+        raise
     except Exception as e:
         logger.error(f"Erro análise GPT: {e}")
         raise HTTPException(status_code=500, detail="Erro ao analisar texto")
 
 
 
-@app.post("/save-text-session", status_code=status.HTTP_201_CREATED)
+@router.post("/save-text-session", status_code=status.HTTP_201_CREATED)
 async def save_text_session(
     body: schemas.SaveTextSessionRequest,
+    background_tasks: BackgroundTasks,
     user: AuthUser = Depends(get_current_user),
 ):
     # Enforce Daily Charts Limit
@@ -396,28 +358,24 @@ async def save_text_session(
     if body.insights and not body.hipoteses_clinicas:
         hipoteses_clinicas = body.insights
 
-    themes_text = ", ".join(temas_relevantes)
-    full_insights = f"{hipoteses_clinicas}\n\n{direcoes_intervencao}\n\nTemas recorrentes: {themes_text}"
-    
     try:
         res = (
             supabase.table("sessions")
             .insert(
-                {
+                compress_row({
                     "patient_id": body.patient_id,
                     "audio_url": None,
                     "transcription": body.text,
-                    "summary": registro_descritivo,      # Now also used for legacy summary field
-                    "insights": full_insights,           # Now also used for legacy insights field
                     "themes": temas_relevantes,          # Shared themes field
                     "registro_descritivo": registro_descritivo,
                     "hipoteses_clinicas": hipoteses_clinicas,
                     "direcoes_intervencao": direcoes_intervencao,
-                }
+                })
             )
             .execute()
         )
 
+        _schedule_record_prefetch(background_tasks, user.user_id, res.data[0]["id"])
         return {"id": res.data[0]["id"]}
     except HTTPException:
         raise
@@ -426,9 +384,10 @@ async def save_text_session(
         raise HTTPException(status_code=500, detail="Erro interno")
 
 
-@app.post("/save-session", status_code=status.HTTP_201_CREATED)
+@router.post("/save-session", status_code=status.HTTP_201_CREATED)
 async def save_session(
     body: schemas.SaveSessionRequest,
+    background_tasks: BackgroundTasks,
     user: AuthUser = Depends(get_current_user),
 ):
     # Enforce Daily Charts Limit
@@ -456,30 +415,26 @@ async def save_session(
     # For legacy compatibility, combine insights if using old format
     if body.insights and not body.hipoteses_clinicas:
         hipoteses_clinicas = body.insights
-    # Definir themes_text sempre antes de usar
-    themes_text = ", ".join(temas_relevantes)
-    full_insights = f"{hipoteses_clinicas}\n\n{direcoes_intervencao}\n\nTemas recorrentes: {themes_text}"
     audio_url_value = str(body.audio_url) if body.audio_url is not None else None
     
     try:
         res = (
             supabase.table("sessions")
             .insert(
-                {
+                compress_row({
                     "patient_id": body.patient_id,
                     "audio_url": audio_url_value,
                     "transcription": body.transcription,
-                    "summary": registro_descritivo,      # Now also used for legacy summary field
-                    "insights": full_insights,           # Now also used for legacy insights field
                     "themes": temas_relevantes,          # Shared themes field
                     "registro_descritivo": registro_descritivo,
                     "hipoteses_clinicas": hipoteses_clinicas,
                     "direcoes_intervencao": direcoes_intervencao,
-                }
+                })
             )
             .execute()
         )
 
+        _schedule_record_prefetch(background_tasks, user.user_id, res.data[0]["id"])
         return {"id": res.data[0]["id"]}
     except HTTPException:
         raise
@@ -488,7 +443,20 @@ async def save_session(
         raise HTTPException(status_code=500, detail="Erro interno")
 
 
-@app.get("/patient/{patient_id}", response_model=schemas.PatientOut)
+@router.post("/api/patients/import", response_model=schemas.PatientImportResponse)
+async def import_patients(
+    request: Request,
+    user: AuthUser = Depends(get_current_user),
+):
+    """
+    Importa pacientes de um CSV enviado como corpo da requisição (Content-Type: text/csv).
+    Colunas reconhecidas: nome, email, telefone, observacoes. O arquivo é lido em streaming
+    e gravado em lotes; a resposta traz o resultado de cada linha.
+    """
+    return await PatientImportService.import_csv(user.user_id, request.stream())
+
+
+@router.get("/patient/{patient_id}", response_model=schemas.PatientOut)
 async def get_patient(
     patient_id: str,
     user: AuthUser = Depends(get_current_user),
@@ -509,12 +477,14 @@ async def get_patient(
     return patient.data
 
 
-@app.get(
+@router.get(
     "/patient/{patient_id}/sessions",
     response_model=schemas.SessionsListResponse,
 )
 async def get_patient_sessions(
     patient_id: str,
+    request: Request,
+    legacy_fields: bool = True,
     user: AuthUser = Depends(get_current_user),
 ):
     supabase = get_supabase_client()
@@ -533,22 +503,63 @@ async def get_patient_sessions(
         res = (
             supabase.table("sessions")
             .select(
-                "id, patient_id, audio_url, transcription, summary, insights, themes, registro_descritivo, hipoteses_clinicas, direcoes_intervencao, created_at"
+                "id, patient_id, audio_url, transcription, themes, registro_descritivo, hipoteses_clinicas, direcoes_intervencao, created_at"
             )
             .eq("patient_id", patient_id)
             .order("created_at", desc=True)
             .execute()
         )
 
-        return schemas.SessionsListResponse(sessions=res.data or [])
+        sessions = decompress_rows(res.data)
+        if legacy_fields:
+            sessions = [schemas.with_legacy_fields(session) for session in sessions]
+        return fast_json_response(request, schemas.SessionsListResponse, {"sessions": sessions})
     except Exception as e:
         logger.error(f"Erro listar sessões: {e}")
         raise HTTPException(status_code=500, detail="Erro interno")
 
 
-@app.get("/session/{session_id}", response_model=schemas.SessionOut)
+@router.get(
+    "/sessions/recent",
+    response_model=schemas.SessionPreviewListResponse,
+)
+async def get_recent_sessions(
+    request: Request,
+    limit: int = 20,
+    user: AuthUser = Depends(get_current_user),
+):
+    """Últimas sessões de todos os pacientes do terapeuta, só com um trecho do registro descritivo."""
+    supabase = get_supabase_client()
+    patients = supabase.table("patients").select("id, name").eq("user_id", user.user_id).execute().data or []
+    if not patients:
+        return fast_json_response(request, schemas.SessionPreviewListResponse, {"sessions": []})
+    names = {p["id"]: p["name"] for p in patients}
+
+    res = (
+        supabase.table("sessions")
+        .select("id, patient_id, created_at, registro_descritivo")
+        .in_("patient_id", list(names))
+        .order("created_at", desc=True)
+        .limit(min(max(limit, 1), 100))
+        .execute()
+    )
+    sessions = [
+        {
+            "id": row["id"],
+            "patient_id": row["patient_id"],
+            "patient_name": names.get(row["patient_id"]),
+            "created_at": row["created_at"],
+            "preview": (decompress_text(row.get("registro_descritivo")) or "")[:SESSION_PREVIEW_CHARS],
+        }
+        for row in res.data or []
+    ]
+    return fast_json_response(request, schemas.SessionPreviewListResponse, {"sessions": sessions})
+
+
+@router.get("/session/{session_id}", response_model=schemas.SessionOut)
 async def get_session(
     session_id: str,
+    legacy_fields: bool = True,
     user: AuthUser = Depends(get_current_user),
 ):
     supabase = get_supabase_client()
@@ -575,16 +586,12 @@ async def get_session(
     if not patient.data or patient.data["user_id"] != user.user_id:
         raise HTTPException(status_code=403, detail="Acesso negado à sessão")
 
-    return session.data
+    session_data = decompress_row(session.data)
+    return schemas.with_legacy_fields(session_data) if legacy_fields else session_data
 
 
-@app.get("/session/{session_id}/record")
-async def get_session_record(
-    session_id: str,
-    format: str = "pdf",
-    document_type: str = "registro_documental",
-    user: AuthUser = Depends(get_current_user),
-):
+def _load_record_sources(session_id: str, user_id: str):
+    """Carrega sessão, paciente e terapeuta usados na geração de documentos (valida o acesso)."""
     supabase = get_supabase_client()
 
     session = (
@@ -604,39 +611,92 @@ async def get_session_record(
         .single()
         .execute()
     )
-    if not patient.data or patient.data["user_id"] != user.user_id:
+    if not patient.data or patient.data["user_id"] != user_id:
         raise HTTPException(status_code=403, detail="Acesso negado")
 
     # Fetch Therapist Data
     therapist = (
         supabase.table("profiles")
         .select("*")
-        .eq("id", user.user_id)
+        .eq("id", user_id)
         .single()
         .execute()
     )
     therapist_data = therapist.data if therapist.data else {}
+    return decompress_row(session.data), patient.data, therapist_data
+
+
+def _render_record_pdf(content, session_data, patient_data, therapist_data, document_type: str) -> bytes:
+    return generate_clinical_record_pdf(
+        record_data=content,
+        patient_data=patient_data,
+        session_date=datetime.fromisoformat(session_data["created_at"]).strftime("%d/%m/%Y"),
+        therapist_data=therapist_data,
+        document_type=document_type
+    )
+
+
+def _record_content(session_data, patient_data, therapist_data, document_type: str, user_id: str, refresh: bool = False) -> dict:
+    """Conteúdo do documento: reaproveita o já gerado (inclusive o pré-gerado) se a sessão não mudou."""
     approach = therapist_data.get("theoretical_approach", "Integrativa")
+    fingerprint = SessionDocumentService.fingerprint(session_data, patient_data, approach, document_type)
+    if not refresh:
+        try:
+            cached = SessionDocumentService.get(session_data["id"], document_type, fingerprint)
+            if cached is not None:
+                return cached
+        except Exception as e:
+            logger.warning(f"Falha ao ler documento salvo da sessão {session_data['id']}: {e}")
+
+    content = generate_clinical_record_content(
+        session_data=session_data,
+        patient_data=patient_data,
+        client=client.for_endpoint("record"),
+        document_type=document_type,
+        approach=approach
+    )
+    try:
+        SessionDocumentService.store(session_data["id"], user_id, document_type, fingerprint, content)
+    except Exception as e:
+        logger.warning(f"Falha ao salvar documento da sessão {session_data['id']}: {e}")
+    return content
+
+
+def _schedule_record_prefetch(background_tasks: BackgroundTasks, user_id: str, session_id: str) -> None:
+    """Depois da resposta, enfileira (prioridade baixa) a geração especulativa do registro documental."""
+    if not SessionDocumentService.PREFETCH_ENABLED:
+        return
+    post_response.after_response(
+        background_tasks,
+        "record_prefetch",
+        jobs.enqueue_job,
+        "session_record_prefetch",
+        user_id,
+        {"session_id": session_id},
+        priority=SessionDocumentService.PREFETCH_JOB_PRIORITY,
+        max_attempts=1,  # especulativo: falhou, o usuário gera sob demanda
+    )
+
+
+@router.get("/session/{session_id}/record")
+async def get_session_record(
+    session_id: str,
+    format: str = "pdf",
+    document_type: str = "registro_documental",
+    refresh: bool = False,
+    user: AuthUser = Depends(admitted("record")),
+):
+    session_data, patient_data, therapist_data = _load_record_sources(session_id, user.user_id)
 
     try:
-        content = generate_clinical_record_content(
-            session_data=session.data,
-            patient_data=patient.data,
-            client=client,
-            document_type=document_type,
-            approach=approach
+        content = await asyncio.to_thread(
+            _record_content, session_data, patient_data, therapist_data, document_type, user.user_id, refresh
         )
         
         if format == "json":
             return content
 
-        pdf_bytes = generate_clinical_record_pdf(
-            record_data=content,
-            patient_data=patient.data,
-            session_date=datetime.fromisoformat(session.data["created_at"]).strftime("%d/%m/%Y"),
-            therapist_data=therapist_data,
-            document_type=document_type
-        )
+        pdf_bytes = _render_record_pdf(content, session_data, patient_data, therapist_data, document_type)
         
         filename = f"{document_type}_{session_id[:8]}.pdf"
         return Response(
@@ -644,47 +704,166 @@ async def get_session_record(
             media_type="application/pdf",
             headers={"Content-Disposition": f"attachment; filename={filename}"}
         )
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Erro ao gerar documento {document_type}: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@app.get("/api/patients/{patient_id}/reports")
-async def generate_patient_report(
+def _records_zip(session_id: str, documents: dict, errors: dict, session_data, patient_data, therapist_data) -> bytes:
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as archive:
+        for document_type, content in documents.items():
+            pdf = _render_record_pdf(content, session_data, patient_data, therapist_data, document_type)
+            archive.writestr(f"{document_type}_{session_id[:8]}.pdf", pdf)
+        if errors:
+            archive.writestr("erros.json", json.dumps(errors, ensure_ascii=False, indent=2))
+    return buffer.getvalue()
+
+
+def _requested_document_count(request: Request) -> int:
+    """Custo em fichas de /records: uma por documento pedido (default: todos)."""
+    types = request.query_params.get("types")
+    return len({t.strip() for t in types.split(",") if t.strip()}) if types else len(DOCUMENT_TITLES)
+
+
+@router.get("/session/{session_id}/records")
+async def get_session_records(
+    session_id: str,
+    types: Optional[str] = None,
+    format: str = "json",
+    user: AuthUser = Depends(admitted("record", cost=_requested_document_count)),
+):
+    """
+    Gera vários documentos CFP da mesma sessão em uma requisição: os dados são
+    carregados uma vez e as chamadas ao LLM rodam em paralelo, então o tempo total
+    é o do documento mais lento. `types` separado por vírgula (default: todos).
+    Retorna JSON {documents, errors} ou, com format=zip, um ZIP com um PDF por tipo.
+    """
+    document_types = [t.strip() for t in types.split(",") if t.strip()] if types else list(DOCUMENT_TITLES)
+    document_types = list(dict.fromkeys(document_types))
+    unknown = [t for t in document_types if t not in DOCUMENT_TITLES]
+    if unknown or not document_types:
+        raise HTTPException(status_code=400, detail=f"Tipos de documento inválidos: {', '.join(unknown)}")
+    if format not in ("json", "zip"):
+        raise HTTPException(status_code=400, detail="Formato inválido (use json ou zip)")
+
+    session_data, patient_data, therapist_data = _load_record_sources(session_id, user.user_id)
+
+    results = await asyncio.gather(
+        *(
+            asyncio.to_thread(_record_content, session_data, patient_data, therapist_data, document_type, user.user_id)
+            for document_type in document_types
+        ),
+        return_exceptions=True,
+    )
+
+    documents, errors = {}, {}
+    for document_type, result in zip(document_types, results):
+        if isinstance(result, Exception):
+            logger.error(f"Erro ao gerar documento {document_type}: {result}")
+            errors[document_type] = result.detail if isinstance(result, HTTPException) else "Erro ao gerar documento"
+        else:
+            documents[document_type] = result
+
+    if not documents:
+        # Nada foi gerado: propaga o erro do LLM (503/504 com Retry-After) se houver
+        first_error = next(r for r in results if isinstance(r, Exception))
+        if isinstance(first_error, HTTPException):
+            raise first_error
+        raise HTTPException(status_code=500, detail="Erro ao gerar documentos")
+
+    if format == "json":
+        return {"documents": documents, "errors": errors}
+
+    archive = await asyncio.to_thread(
+        _records_zip, session_id, documents, errors, session_data, patient_data, therapist_data
+    )
+    return Response(
+        content=archive,
+        media_type="application/zip",
+        headers={"Content-Disposition": f"attachment; filename=documentos_{session_id[:8]}.zip"},
+    )
+
+
+@router.get("/api/patients/{patient_id}/record")
+async def get_patient_full_record(
     patient_id: str,
     start_date: Optional[datetime] = None,
     end_date: Optional[datetime] = None,
-    report_type: str = "summary",
-    user: AuthUser = Depends(get_current_user)
+    user: AuthUser = Depends(get_current_user),
 ):
+    """Prontuário completo (todas as sessões ou um período) em um único PDF com sumário."""
     supabase = get_supabase_client()
-    try:
-        patient = supabase.table("patients").select("*").eq("id", patient_id).single().execute()
-        if not patient.data or patient.data["user_id"] != user.user_id:
-            raise HTTPException(status_code=403, detail="Acesso negado")
+    patient = supabase.table("patients").select("*").eq("id", patient_id).single().execute()
+    if not patient.data or patient.data["user_id"] != user.user_id:
+        raise HTTPException(status_code=403, detail="Acesso negado")
+
+    sessions = export.fetch_record_sessions(patient_id, start_date, end_date)
+    if not sessions:
+        raise HTTPException(status_code=404, detail="Nenhuma sessão encontrada no período")
+
+    therapist = supabase.table("profiles").select("*").eq("id", user.user_id).execute()
+    period = None
+    if start_date or end_date:
+        period = (
+            f"{start_date.strftime('%d/%m/%Y') if start_date else 'início'} a "
+            f"{end_date.strftime('%d/%m/%Y') if end_date else 'hoje'}"
+        )
+
+    return StreamingResponse(
+        export.iter_patient_record_pdf(sessions, patient.data, therapist.data[0] if therapist.data else {}, period),
+        media_type="application/pdf",
+        headers={"Content-Disposition": f"attachment; filename=prontuario_{patient_id[:8]}.pdf"},
+    )
 
-        query = supabase.table("sessions").select("*").eq("patient_id", patient_id)
+
+def _build_patient_report(
+    patient_id: str,
+    user_id: str,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+):
+    supabase = get_supabase_client()
+    patient = supabase.table("patients").select("*").eq("id", patient_id).single().execute()
+    if not patient.data or patient.data["user_id"] != user_id:
+        raise HTTPException(status_code=403, detail="Acesso negado")
+
+    query = supabase.table("sessions").select("*").eq("patient_id", patient_id)
+    
+    if start_date:
+        query = query.gte("created_at", start_date.isoformat())
+    if end_date:
+        query = query.lte("created_at", end_date.isoformat())
         
-        if start_date:
-            query = query.gte("created_at", start_date.isoformat())
-        if end_date:
-            query = query.lte("created_at", end_date.isoformat())
-            
-        sessions = query.execute().data
-
-        report = {
-            "patient": patient.data,
-            "sessions_count": len(sessions),
-            "period": {
-                "start": start_date.isoformat() if start_date else None,
-                "end": end_date.isoformat() if end_date else None
-            },
-            "analysis": {
-                "sentiment_trends": calculate_sentiment_trends(sessions),
-                "topics": extract_common_topics(sessions),
-                "session_frequency": calculate_session_frequency(sessions)
-            }
+    sessions = decompress_rows(query.execute().data)
+
+    return {
+        "patient": patient.data,
+        "sessions_count": len(sessions),
+        "period": {
+            "start": start_date.isoformat() if start_date else None,
+            "end": end_date.isoformat() if end_date else None
+        },
+        "analysis": {
+            "sentiment_trends": calculate_sentiment_trends(sessions),
+            "topics": extract_common_topics(sessions),
+            "session_frequency": calculate_session_frequency(sessions)
         }
+    }
+
+
+@router.get("/api/patients/{patient_id}/reports")
+async def generate_patient_report(
+    patient_id: str,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+    report_type: str = "summary",
+    user: AuthUser = Depends(get_current_user)
+):
+    try:
+        report = _build_patient_report(patient_id, user.user_id, start_date, end_date)
 
         if report_type == "pdf":
             pdf_content = generate_pdf_report(report)
@@ -700,36 +879,21 @@ async def generate_patient_report(
         logger.error(f"Erro ao gerar relatório: {str(e)}")
         raise HTTPException(status_code=500, detail="Erro ao gerar relatório")
 
+@profiling.traced("reportlab")
 def generate_pdf_report(report_data):
     try:
         from reportlab.lib.pagesizes import letter
-        from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
-        from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-        from reportlab.lib import colors
+        from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table
         from io import BytesIO
         
         buffer = BytesIO()
         doc = SimpleDocTemplate(buffer, pagesize=letter)
-        styles = getSampleStyleSheet()
+        styles = get_styles()
         elements = []
         
-        title_style = ParagraphStyle(
-            'Title',
-            parent=styles['Heading1'],
-            fontSize=18,
-            spaceAfter=20,
-            alignment=1
-        )
-        
-        subtitle_style = ParagraphStyle(
-            'Subtitle',
-            parent=styles['Heading2'],
-            fontSize=14,
-            spaceAfter=10,
-            textColor=colors.darkblue
-        )
-        
-        normal_style = styles['Normal']
+        title_style = styles['report_title']
+        subtitle_style = styles['report_subtitle']
+        normal_style = styles['normal']
         
         elements.append(Paragraph("Relatório de Sessões Terapêuticas", title_style))
         
@@ -753,16 +917,7 @@ def generate_pdf_report(report_data):
         ]
         
         table = Table(stats_data, colWidths=[200, 100])
-        table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.lightgrey),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.black),
-            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-            ('BACKGROUND', (0, 1), (-1, -1), colors.white),
-            ('GRID', (0, 0), (-1, -1), 1, colors.black),
-            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-        ]))
+        table.setStyle(get_table_style())
         elements.append(table)
         
         sentiment = report_data.get('analysis', {}).get('sentiment_trends', {})
@@ -781,16 +936,7 @@ def generate_pdf_report(report_data):
                 topics_data.append([topic['topic'].capitalize(), str(topic['count'])])
             
             table = Table(topics_data, colWidths=[300, 100])
-            table.setStyle(TableStyle([
-                ('BACKGROUND', (0, 0), (-1, 0), colors.lightgrey),
-                ('TEXTCOLOR', (0, 0), (-1, 0), colors.black),
-                ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-                ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-                ('BACKGROUND', (0, 1), (-1, -1), colors.white),
-                ('GRID', (0, 0), (-1, -1), 1, colors.black),
-                ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-            ]))
+            table.setStyle(get_table_style())
             elements.append(table)
         
         doc.build(elements)
@@ -801,13 +947,329 @@ def generate_pdf_report(report_data):
         logger.error(f"Erro ao gerar PDF: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Erro ao gerar relatório em PDF: {str(e)}")
 
+# --- Jobs assíncronos (análise, documentos e relatórios) ---
+
+_job_pool = jobs.JobWorkerPool()
+
+
+# Módulos pesados (import de ~1s somados) carregados em background depois que o
+# servidor já aceita conexões, para que o primeiro request não pague o import
+WARM_IMPORTS = os.getenv("WARM_IMPORTS", "1") == "1"
+
+
+def _warm_heavy_modules():
+    import openai  # noqa: F401
+    import stripe  # noqa: F401
+    import supabase  # noqa: F401
+    import reportlab.platypus  # noqa: F401
+    warm_templates()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    post_response.start()
+    # Referências guardadas: o event loop só mantém referência fraca às tasks
+    startup_tasks = [
+        # Valida preços do Stripe em background para não atrasar o startup
+        asyncio.create_task(payment.load_price_metadata()),
+    ]
+    # JOB_WORKERS=0 quando os workers rodam em processo separado (python -m app.worker)
+    if jobs.JOB_WORKERS > 0:
+        _job_pool.start()
+    if WARM_IMPORTS:
+        startup_tasks.append(asyncio.create_task(asyncio.to_thread(_warm_heavy_modules)))
+
+    yield
+
+    # Shutdown antes do fim do warm-up/validação: não há o que esperar
+    for task in startup_tasks:
+        task.cancel()
+    await asyncio.gather(*startup_tasks, return_exceptions=True)
+    await _job_pool.stop()
+    await post_response.stop()
+    await CFPService.aclose()
+    await payment.aclose()
+
+
+# A transcrição vai no payload: apagada quando o job termina
+@jobs.job_handler("analyze", purge_payload=True)
+def _analyze_job(payload, ctx: jobs.JobContext):
+    approach = _get_therapist_approach(ctx.user_id)
+    ctx.progress(20)
+    result = _run_analysis(payload["text"], approach, payload.get("text_label", "Transcrição completa da sessão"))
+    return result.model_dump()
+
+
+@jobs.job_handler("session_record")
+def _session_record_job(payload, ctx: jobs.JobContext):
+    session_id = payload["session_id"]
+    document_type = payload.get("document_type", "registro_documental")
+
+    session_data, patient_data, therapist_data = _load_record_sources(session_id, ctx.user_id)
+    ctx.progress(10)
+    content = _record_content(session_data, patient_data, therapist_data, document_type, ctx.user_id)
+    if payload.get("format") == "json":
+        return content
+
+    ctx.progress(70)
+    pdf_bytes = _render_record_pdf(content, session_data, patient_data, therapist_data, document_type)
+    return ctx.store_file(pdf_bytes, f"{document_type}_{session_id[:8]}.pdf")
+
+
+@jobs.job_handler("session_record_prefetch")
+def _session_record_prefetch_job(payload, ctx: jobs.JobContext):
+    """Geração especulativa do registro documental logo após salvar a sessão."""
+    session_id = payload["session_id"]
+    document_type = SessionDocumentService.PREFETCH_DOCUMENT_TYPE
+
+    session_data, patient_data, therapist_data = _load_record_sources(session_id, ctx.user_id)
+    approach = therapist_data.get("theoretical_approach", "Integrativa")
+    fingerprint = SessionDocumentService.fingerprint(session_data, patient_data, approach, document_type)
+    if SessionDocumentService.get(session_id, document_type, fingerprint) is not None:
+        return {"skipped": "já gerado"}
+
+    # Por último: se permitido, já consome uma unidade da cota diária
+    allowed, reason = SessionDocumentService.prefetch_allowed(ctx.user_id, session_data, therapist_data)
+    if not allowed:
+        logger.info(f"Pré-geração do documento da sessão {session_id} ignorada: {reason}")
+        return {"skipped": reason}
+
+    # Prompt idêntico ao de GET /session/{id}/record: se o usuário pedir enquanto
+    # isto roda, o gateway junta as duas chamadas em uma (single-flight)
+    content = generate_clinical_record_content(
+        session_data=session_data,
+        patient_data=patient_data,
+        client=client.for_endpoint("record"),
+        document_type=document_type,
+        approach=approach
+    )
+    SessionDocumentService.store(session_id, ctx.user_id, document_type, fingerprint, content, speculative=True)
+    return {"session_id": session_id, "document_type": document_type}
+
+
+@jobs.job_handler("patient_report")
+def _patient_report_job(payload, ctx: jobs.JobContext):
+    patient_id = payload["patient_id"]
+    start_date = datetime.fromisoformat(payload["start_date"]) if payload.get("start_date") else None
+    end_date = datetime.fromisoformat(payload["end_date"]) if payload.get("end_date") else None
+
+    report = _build_patient_report(patient_id, ctx.user_id, start_date, end_date)
+    if payload.get("report_type") != "pdf":
+        return report
+
+    ctx.progress(60)
+    return ctx.store_file(generate_pdf_report(report), f"relatorio_{patient_id}.pdf")
+
+
+def _submit_job(kind: str, user_id: str, payload: dict) -> schemas.JobSubmitResponse:
+    try:
+        job = jobs.enqueue_job(kind, user_id, payload)
+    except Exception as e:
+        logger.error(f"Erro ao enfileirar job {kind}: {e}")
+        raise HTTPException(status_code=500, detail="Erro ao enfileirar tarefa")
+    return schemas.JobSubmitResponse(job_id=job["id"], status=job["status"])
+
+
+@router.post("/jobs/analyze", response_model=schemas.JobSubmitResponse, status_code=status.HTTP_202_ACCEPTED)
+async def submit_analyze_job(
+    body: schemas.AnalyzeRequest,
+    user: AuthUser = Depends(rate_limited("analyze")),
+):
+    return _submit_job("analyze", user.user_id, {"text": body.transcription})
+
+
+@router.post("/jobs/session/{session_id}/record", response_model=schemas.JobSubmitResponse, status_code=status.HTTP_202_ACCEPTED)
+async def submit_session_record_job(
+    session_id: str,
+    format: str = "pdf",
+    document_type: str = "registro_documental",
+    user: AuthUser = Depends(rate_limited("record")),
+):
+    return _submit_job(
+        "session_record",
+        user.user_id,
+        {"session_id": session_id, "format": format, "document_type": document_type},
+    )
+
+
+@router.post("/jobs/patients/{patient_id}/reports", response_model=schemas.JobSubmitResponse, status_code=status.HTTP_202_ACCEPTED)
+async def submit_patient_report_job(
+    patient_id: str,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+    report_type: str = "pdf",
+    user: AuthUser = Depends(rate_limited("record")),
+):
+    return _submit_job(
+        "patient_report",
+        user.user_id,
+        {
+            "patient_id": patient_id,
+            "start_date": start_date.isoformat() if start_date else None,
+            "end_date": end_date.isoformat() if end_date else None,
+            "report_type": report_type,
+        },
+    )
+
+
+def _get_user_job(job_id: str, user_id: str) -> dict:
+    job = jobs.get_job(job_id, user_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Tarefa não encontrada")
+    return job
+
+
+@router.get("/jobs/{job_id}", response_model=schemas.JobOut)
+async def get_job_status(
+    job_id: str,
+    user: AuthUser = Depends(get_current_user),
+):
+    return _get_user_job(job_id, user.user_id)
+
+
+@router.get("/jobs/{job_id}/events")
+async def stream_job_events(
+    job_id: str,
+    user: AuthUser = Depends(get_current_user),
+):
+    """Server-Sent Events com o status/progresso do job até ele terminar."""
+    _get_user_job(job_id, user.user_id)
+
+    async def event_stream():
+        last_snapshot = None
+        while True:
+            job = await asyncio.to_thread(jobs.get_job, job_id, user.user_id)
+            if job is None:
+                break
+            snapshot = (job["status"], job["progress"])
+            if snapshot != last_snapshot:
+                payload = schemas.JobOut(**job).model_dump_json()
+                yield f"event: {job['status']}\ndata: {payload}\n\n"
+                last_snapshot = snapshot
+            else:
+                yield ": keep-alive\n\n"
+            if job["status"] in jobs.JOB_TERMINAL_STATUSES:
+                break
+            await asyncio.sleep(jobs.JOB_POLL_INTERVAL)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.get("/jobs/{job_id}/download")
+async def download_job_result(
+    job_id: str,
+    user: AuthUser = Depends(get_current_user),
+):
+    job = _get_user_job(job_id, user.user_id)
+    result = job.get("result") or {}
+    if job["status"] != "succeeded" or "storage_path" not in result:
+        raise HTTPException(status_code=409, detail="Arquivo ainda não disponível para esta tarefa")
+
+    try:
+        content = jobs.download_job_file(job)
+    except Exception as e:
+        logger.error(f"Erro ao baixar arquivo do job {job_id}: {e}")
+        raise HTTPException(status_code=500, detail="Erro ao baixar arquivo")
+
+    return Response(
+        content=content,
+        media_type=result.get("media_type", "application/pdf"),
+        headers={"Content-Disposition": f"attachment; filename={result['filename']}"}
+    )
+
+
 # --- Copilot Chat Endpoints ---
 
-@app.post("/copilot/chat", response_model=schemas.CopilotResponse)
+def _update_conversation_title(conversation_id: str, first_message: str) -> None:
+    """Tarefa pós-resposta: gera um título curto para a conversa a partir da primeira mensagem."""
+    title_comp = client.chat.completions.create(
+        model="gpt-4o-mini",
+        messages=[
+            {"role": "system", "content": "Resuma a mensagem do usuário em um título curto de 3-5 palavras para uma conversa."},
+            {"role": "user", "content": first_message}
+        ],
+        endpoint="title",
+    )
+    new_title = title_comp.choices[0].message.content.strip('"')
+    get_supabase_client().table("copilot_conversations").update({"title": new_title}).eq("id", conversation_id).execute()
+
+
+def _log_copilot_usage(user_id: str, conversation_id: str, iterations: int, total_tokens: int) -> None:
+    """Tarefa pós-resposta: registra o uso no log (só metadados, nunca conteúdo; nada é persistido)."""
+    logger.info(
+        f"Copilot usage: user={user_id} conversation={conversation_id} "
+        f"iterations={iterations} tokens={total_tokens}"
+    )
+
+
+def _run_copilot_tool(function_name: str, function_args: dict, user_id: str) -> Any:
+    """Executa uma ferramenta pedida pelo modelo; erros voltam como texto para o modelo."""
+    tool_output = f"Erro: Ferramenta {function_name} desconhecida."
+
+    try:
+        if function_name == "search_patients":
+            tool_output = tools.search_patients(function_args.get("query"), user_id)
+        elif function_name == "create_patient":
+            tool_output = tools.create_patient(
+                function_args.get("name"), 
+                function_args.get("email"), 
+                function_args.get("phone"), 
+                user_id
+            )
+        elif function_name == "create_appointment":
+            tool_output = tools.create_appointment(
+                function_args.get("patient_id"),
+                function_args.get("date"),
+                function_args.get("time"),
+                function_args.get("duration_minutes", 50),
+                function_args.get("price", 150.0),
+                user_id
+            )
+        elif function_name == "create_recurring_appointments":
+            tool_output = tools.create_recurring_appointments(
+                function_args.get("patient_id"),
+                function_args.get("date"),
+                function_args.get("time"),
+                user_id,
+                frequency=function_args.get("frequency", "weekly"),
+                count=function_args.get("count"),
+                until_str=function_args.get("until"),
+                exceptions=function_args.get("exceptions") or [],
+                duration_minutes=function_args.get("duration_minutes", 50),
+                price=function_args.get("price", 150.0),
+                skip_conflicts=function_args.get("skip_conflicts", False)
+            )
+        elif function_name == "find_free_slots":
+            tool_output = tools.find_free_slots(
+                user_id,
+                function_args.get("days", 7),
+                function_args.get("duration_minutes", 50)
+            )
+        elif function_name == "create_session_note":
+            tool_output = tools.create_session_note(
+                function_args.get("patient_id"),
+                function_args.get("note"),
+                user_id
+            )
+    except Exception as e:
+        tool_output = f"Erro na execução da ferramenta: {str(e)}"
+        logger.error(f"Tool Execution Error: {e}")
+    return tool_output
+
+
+@router.post("/copilot/chat", response_model=schemas.CopilotResponse)
 async def chat_copilot(
     body: schemas.ChatRequest,
-    user: AuthUser = Depends(get_current_user),
+    background_tasks: BackgroundTasks,
+    user: AuthUser = Depends(admitted("copilot")),
 ):
+    # Falha rápido (503) se o provedor estiver degradado, antes de gravar qualquer coisa
+    client.ensure_available()
+
     supabase = get_supabase_client()
     conversation_id = body.conversation_id
 
@@ -855,7 +1317,7 @@ Você é um assistente especializado em apoio ao raciocínio clínico, gestão d
 
 Sua função é auxiliar o psicólogo(a) em duas frentes:
 1. **Raciocínio Clínico e Documentação**: Apoiar na organização de prontuários e documentos, usando linguagem ética e técnica (expressões condicionais como 'observa-se', 'sugere-se', 'levanta-se hipótese'). Você pode sugerir possibilidades diagnósticas e intervenções baseadas na abordagem teórica do profissional.
-2. **Gestão Administrativa**: Auxiliar no agendamento, cadastro de pacientes e registro de queixas usando as ferramentas disponíveis.
+2. **Gestão Administrativa**: Auxiliar no agendamento, cadastro de pacientes e registro de queixas usando as ferramentas disponíveis. Para sugerir horários, consulte sempre find_free_slots em vez de supor a disponibilidade.
 
 LINGUAGEM OBRIGATÓRIA:
 - NUNCA seja determinista, diagnóstico ou prescritivo em tom conclusivo.
@@ -890,19 +1352,26 @@ LINGUAGEM OBRIGATÓRIA:
     final_reply = ""
     MAX_ITERATIONS = 5
     iteration = 0
+    total_tokens = 0
     
     try:
         while iteration < MAX_ITERATIONS:
             iteration += 1
             
-            # Chama o modelo
-            completion = client.chat.completions.create(
+            # Chama o modelo (o gateway bloqueia esperando a resposta: roda em thread)
+            completion = await asyncio.to_thread(
+                client.chat.completions.create,
                 model="gpt-4o-mini",
                 messages=messages,
                 tools=TOOLS_SCHEMA,
                 tool_choice="auto", 
+                endpoint="copilot",
+                coalesce=False,  # o loop executa ferramentas com efeitos colaterais
             )
             
+            usage = getattr(completion, "usage", None)
+            total_tokens += getattr(usage, "total_tokens", 0) or 0
+
             response_message = completion.choices[0].message
             tool_calls = response_message.tool_calls
             
@@ -918,38 +1387,11 @@ LINGUAGEM OBRIGATÓRIA:
                 function_name = tool_call.function.name
                 function_args = json.loads(tool_call.function.arguments)
                 
-                logger.info(f"TOOL CALL: {function_name} | ARGS: {function_args}")
-                
-                tool_output = f"Erro: Ferramenta {function_name} desconhecida."
+                # Argumentos vão como extra: campos de PHI (nome, email, telefone...) são removidos pelo filtro
+                logger.bind(tool_args=function_args).info(f"TOOL CALL: {function_name}")
                 
-                try:
-                    if function_name == "search_patients":
-                        tool_output = tools.search_patients(function_args.get("query"), user.user_id)
-                    elif function_name == "create_patient":
-                        tool_output = tools.create_patient(
-                            function_args.get("name"), 
-                            function_args.get("email"), 
-                            function_args.get("phone"), 
-                            user.user_id
-                        )
-                    elif function_name == "create_appointment":
-                        tool_output = tools.create_appointment(
-                            function_args.get("patient_id"),
-                            function_args.get("date"),
-                            function_args.get("time"),
-                            function_args.get("duration_minutes", 50),
-                            function_args.get("price", 150.0),
-                            user.user_id
-                        )
-                    elif function_name == "create_session_note":
-                        tool_output = tools.create_session_note(
-                            function_args.get("patient_id"),
-                            function_args.get("note"),
-                            user.user_id
-                        )
-                except Exception as e:
-                    tool_output = f"Erro na execução da ferramenta: {str(e)}"
-                    logger.error(f"Tool Execution Error: {e}")
+                # Ferramentas fazem I/O síncrono no Supabase: fora do event loop
+                tool_output = await asyncio.to_thread(_run_copilot_tool, function_name, function_args, user.user_id)
                 
                 # Adiciona resultado ao histórico
                 messages.append({
@@ -972,26 +1414,21 @@ LINGUAGEM OBRIGATÓRIA:
         "content": final_reply
     }).execute()
 
-    # Atualiza titulo se for a primeira troca
+    # Trabalho não crítico roda depois que a resposta for enviada
     if len(history_res.data) <= 2:
-        try:
-             title_comp = client.chat.completions.create(
-                 model="gpt-4o-mini",
-                 messages=[
-                     {"role": "system", "content": "Resuma a mensagem do usuário em um título curto de 3-5 palavras para uma conversa."},
-                     {"role": "user", "content": body.message}
-                 ]
-             )
-             new_title = title_comp.choices[0].message.content.strip('"')
-             supabase.table("copilot_conversations").update({"title": new_title}).eq("id", conversation_id).execute()
-        except:
-            pass
+        post_response.after_response(
+            background_tasks, "conversation_title", _update_conversation_title, conversation_id, body.message
+        )
+    post_response.after_response(
+        background_tasks, "copilot_usage_log", _log_copilot_usage, user.user_id, conversation_id, iteration, total_tokens
+    )
 
     return schemas.CopilotResponse(conversation_id=conversation_id, reply=final_reply)
 
 
-@app.get("/copilot/conversations", response_model=List[schemas.ConversationOut])
+@router.get("/copilot/conversations", response_model=List[schemas.ConversationOut])
 async def list_conversations(
+    request: Request,
     user: AuthUser = Depends(get_current_user),
 ):
     supabase = get_supabase_client()
@@ -1002,12 +1439,13 @@ async def list_conversations(
         .order("updated_at", desc=True)
         .execute()
     )
-    return res.data
+    return fast_json_response(request, List[schemas.ConversationOut], res.data or [])
 
 
-@app.get("/copilot/conversations/{conversation_id}/messages", response_model=List[schemas.MessageOut])
+@router.get("/copilot/conversations/{conversation_id}/messages", response_model=List[schemas.MessageOut])
 async def get_conversation_messages(
     conversation_id: str,
+    request: Request,
     user: AuthUser = Depends(get_current_user),
 ):
     supabase = get_supabase_client()
@@ -1024,9 +1462,9 @@ async def get_conversation_messages(
         .order("created_at", desc=False)
         .execute()
     )
-    return res.data
+    return fast_json_response(request, List[schemas.MessageOut], res.data or [])
 
-@app.get("/api/profile", response_model=schemas.ProfileOut)
+@router.get("/api/profile", response_model=schemas.ProfileOut)
 async def get_profile(user: AuthUser = Depends(get_current_user)):
     supabase = get_supabase_client()
     res = supabase.table("profiles").select("*").eq("id", user.user_id).single().execute()
@@ -1034,7 +1472,7 @@ async def get_profile(user: AuthUser = Depends(get_current_user)):
         raise HTTPException(status_code=404, detail="Perfil não encontrado")
     return res.data
 
-@app.put("/api/profile", response_model=schemas.ProfileOut)
+@router.put("/api/profile", response_model=schemas.ProfileOut)
 async def update_profile(
     body: schemas.ProfileUpdate,
     user: AuthUser = Depends(get_current_user)
@@ -1048,7 +1486,7 @@ async def update_profile(
         raise HTTPException(status_code=500, detail="Erro ao atualizar perfil")
     return res.data[0]
 
-@app.post("/api/validate-crp", response_model=schemas.CRPValidationResponse)
+@router.post("/api/validate-crp", response_model=schemas.CRPValidationResponse)
 async def validate_crp(
     body: schemas.CRPValidationRequest,
     # user: AuthUser = Depends(get_current_user) # Comentado para permitir validação antes do login se necessário no onboarding
@@ -1094,3 +1532,167 @@ async def validate_crp(
             error=cfp_res["error"]
         )
 
+
+# --- Agenda ---
+
+@router.get("/api/appointments/free-slots", response_model=schemas.FreeSlotsResponse)
+async def get_free_slots(
+    days: int = 7,
+    duration_minutes: int = 50,
+    limit: int = 20,
+    user: AuthUser = Depends(get_current_user),
+):
+    slots = SchedulingService.find_free_slots(user.user_id, days, duration_minutes, min(limit, 100))
+    return schemas.FreeSlotsResponse(slots=[schemas.FreeSlot(start=s, end=e) for s, e in slots])
+
+
+@router.post("/api/appointments", response_model=schemas.AppointmentOut, status_code=status.HTTP_201_CREATED)
+async def create_appointment(
+    body: schemas.AppointmentCreate,
+    user: AuthUser = Depends(get_current_user),
+):
+    return SchedulingService.create_appointment(
+        user.user_id,
+        body.patient_id,
+        body.appointment_date,
+        body.duration_minutes,
+        body.price,
+        body.notes,
+    )
+
+
+@router.post(
+    "/api/appointments/recurring",
+    response_model=schemas.RecurringAppointmentsResponse,
+    status_code=status.HTTP_201_CREATED,
+)
+async def create_recurring_appointments(
+    body: schemas.RecurringAppointmentCreate,
+    user: AuthUser = Depends(get_current_user),
+):
+    return SchedulingService.create_recurring_appointments(
+        user.user_id,
+        body.patient_id,
+        body.first_date,
+        frequency=body.frequency,
+        duration_minutes=body.duration_minutes,
+        price=body.price,
+        notes=body.notes,
+        count=body.count,
+        until=body.until,
+        exceptions=body.exceptions,
+        skip_conflicts=body.skip_conflicts,
+    )
+
+
+@router.put("/api/appointments/{appointment_id}", response_model=schemas.AppointmentOut)
+async def update_appointment(
+    appointment_id: str,
+    body: schemas.AppointmentUpdate,
+    user: AuthUser = Depends(get_current_user),
+):
+    updates = body.model_dump(exclude_unset=True)
+    if not updates:
+        raise HTTPException(status_code=400, detail="Nada para atualizar")
+    return SchedulingService.update_appointment(user.user_id, appointment_id, updates)
+
+
+# --- Exportação ---
+
+@router.get("/api/export")
+async def export_practice_data(
+    format: str = "ndjson",
+    user: AuthUser = Depends(get_current_user),
+):
+    """Exporta pacientes, sessões e consultas em streaming (NDJSON, ou ZIP com os PDFs das sessões)."""
+    stamp = datetime.now().strftime("%Y%m%d")
+    logger.info(f"Exportação ({format}) solicitada")
+    if format == "ndjson":
+        return StreamingResponse(
+            export.iter_ndjson(user.user_id),
+            media_type="application/x-ndjson",
+            headers={"Content-Disposition": f"attachment; filename=theramind_export_{stamp}.ndjson"},
+        )
+    if format == "zip":
+        return StreamingResponse(
+            export.iter_zip(user.user_id),
+            media_type="application/zip",
+            headers={"Content-Disposition": f"attachment; filename=theramind_export_{stamp}.zip"},
+        )
+    raise HTTPException(status_code=400, detail="Formato inválido (use ndjson ou zip)")
+
+
+# --- Financeiro ---
+
+@router.get("/api/financial/summary", response_model=schemas.FinancialSummaryResponse)
+async def get_financial_summary(
+    response: Response,
+    months: int = 12,
+    user: AuthUser = Depends(get_current_user),
+):
+    summary = FinancialService.get_summary(user.user_id, months)
+    response.headers["Cache-Control"] = f"private, max-age={int(FinancialService.CACHE_TTL)}"
+    return summary
+
+
+@router.post("/api/stripe/checkout", response_model=schemas.CheckoutResponse)
+async def create_checkout(
+    body: schemas.CheckoutRequest,
+    user: AuthUser = Depends(get_current_user),
+):
+    url = await payment.create_checkout_session(user.user_id, user.email, body.plan)
+    return schemas.CheckoutResponse(url=url)
+
+
+@router.post("/api/stripe/webhook")
+async def stripe_webhook(request: Request):
+    # Sem auth: a autenticidade vem da assinatura do Stripe
+    return await payment.handle_stripe_webhook(request)
+
+
+# --- Profiling sob demanda (app/profiling.py) ---
+
+@router.get("/admin/profiles", dependencies=[Depends(profiling.require_admin)])
+async def list_request_profiles(limit: int = 50):
+    return {"profiles": await asyncio.to_thread(profiling.store.list, min(max(limit, 1), 200))}
+
+
+@router.get("/admin/profiles/{profile_id}", dependencies=[Depends(profiling.require_admin)])
+async def get_request_profile(profile_id: str, format: str = "html"):
+    if format == "json":
+        data = await asyncio.to_thread(profiling.store.read, profile_id)
+        if data is None:
+            raise HTTPException(status_code=404, detail="Perfil não encontrado")
+        return data
+
+    path = profiling.store.path(profile_id, "html")
+    if path is None:
+        raise HTTPException(status_code=404, detail="Perfil não encontrado (sem árvore de chamadas? use format=json)")
+    with open(path, encoding="utf-8") as f:
+        return Response(content=f.read(), media_type="text/html")
+
+
+@router.get("/admin/metrics", dependencies=[Depends(profiling.require_admin)])
+async def get_metrics():
+    # Latência (p50/p95) e erros das últimas criações de checkout neste worker
+    return {"checkout": payment.checkout_metrics()}
+
+
+def create_app() -> FastAPI:
+    # NUNCA logar conteúdo sensível: só metadados (o filtro de logging_config ainda remove PHI)
+    setup_logging()
+
+    app = FastAPI(title="TheraMind API", lifespan=lifespan)
+    app.add_middleware(
+        CORSMiddleware,
+        **cors_params
+    )
+    app.add_middleware(RouteContextMiddleware)
+    if profiling.PROFILING_ENABLED:
+        # Só instalado com PROFILING_SECRET/PROFILING_SAMPLE_RATE: desligado não custa nada por request
+        app.add_middleware(profiling.ProfilingMiddleware)
+    app.include_router(router)
+    return app
+
+
+app = create_app()
@@ -1,62 +1,178 @@
+import asyncio
 import os
-import stripe
+import json
+import time
+from collections import deque
+from datetime import datetime, timezone
+from typing import TYPE_CHECKING, Any, Dict, Optional
 from fastapi import Request, HTTPException, status
 from .db import get_supabase_client
+from .jobs import job_handler, periodic_task
 from loguru import logger
 from dotenv import load_dotenv
 
+if TYPE_CHECKING:
+    import stripe
+
 load_dotenv()
 
 # Configuração Stripe
-stripe.api_key = os.getenv("STRIPE_SECRET_KEY")
+STRIPE_SECRET_KEY = os.getenv("STRIPE_SECRET_KEY")
 WEBHOOK_SECRET = os.getenv("STRIPE_WEBHOOK_SECRET")
+# Permite apontar para o stripe-mock (ex: http://localhost:12111) em testes locais
+STRIPE_API_BASE = os.getenv("STRIPE_API_BASE")
 
 # IDs dos Preços (Devem estar no .env)
 PRICE_ID_PLUS = os.getenv("STRIPE_PRICE_ID_PLUS")
 PRICE_ID_PREMIUM = os.getenv("STRIPE_PRICE_ID_PREMIUM")
 
+STRIPE_EVENTS_TABLE = "stripe_events"
+STRIPE_EVENT_JOB_PRIORITY = 10 # Pagamentos passam na frente da geração de documentos
+STRIPE_EVENT_MAX_ATTEMPTS = 5
+# Eventos 'pending' sem job ativo há mais que isso são reenfileirados pela varredura
+STRIPE_SWEEP_INTERVAL_SECONDS = 60.0
+STRIPE_SWEEP_STALE_SECONDS = 300
+
+_stripe_client: Optional["stripe.StripeClient"] = None
+_stripe_http_client: Optional["stripe.HTTPXClient"] = None
+
+# Metadados dos preços validados no startup: plano -> {price_id, unit_amount, currency, interval}
+PRICE_METADATA: Dict[str, Dict[str, Any]] = {}
+
+# Latência das criações de checkout (s), servida em GET /admin/metrics
+CHECKOUT_LATENCIES: deque = deque(maxlen=500)
+CHECKOUT_ERRORS = 0
+
+
+def _plan_price_ids() -> Dict[str, Optional[str]]:
+    return {"plus": PRICE_ID_PLUS, "premium": PRICE_ID_PREMIUM}
+
+
+def _stripe():
+    """Importa o SDK do Stripe no primeiro uso: o import custa quase 1s no cold start."""
+    import stripe
+    return stripe
+
+
+def _get_stripe_client() -> "stripe.StripeClient":
+    """Cliente Stripe assíncrono (HTTPX) reutilizado entre requisições, mantendo as conexões abertas."""
+    global _stripe_client, _stripe_http_client
+    if _stripe_client is None:
+        stripe = _stripe()
+        _stripe_http_client = stripe.HTTPXClient(timeout=20)
+        options: Dict[str, Any] = {
+            "http_client": _stripe_http_client,
+            "max_network_retries": 2,
+        }
+        if STRIPE_API_BASE:
+            options["base_addresses"] = {"api": STRIPE_API_BASE}
+        _stripe_client = stripe.StripeClient(STRIPE_SECRET_KEY, **options)
+    return _stripe_client
+
+
+async def aclose():
+    global _stripe_client, _stripe_http_client
+    if _stripe_http_client is not None:
+        await _stripe_http_client.close_async()
+    _stripe_client = None
+    _stripe_http_client = None
+
+
+async def load_price_metadata():
+    """Valida e cacheia os preços configurados (chamado em background no startup)."""
+    if not STRIPE_SECRET_KEY:
+        return
+
+    client = _get_stripe_client()
+    for plan, price_id in _plan_price_ids().items():
+        if not price_id:
+            logger.warning(f"Preço do plano {plan} não configurado")
+            continue
+        try:
+            price = await client.prices.retrieve_async(price_id)
+        except Exception as e:
+            logger.error(f"Erro ao validar preço do plano {plan}: {e}")
+            continue
+
+        recurring = price.get("recurring") or {}
+        if not price.get("active") or not recurring:
+            logger.error(f"Preço do plano {plan} inativo ou não recorrente: {price_id}")
+            continue
+
+        PRICE_METADATA[plan] = {
+            "price_id": price_id,
+            "unit_amount": price.get("unit_amount"),
+            "currency": price.get("currency"),
+            "interval": recurring.get("interval"),
+        }
+    logger.info(f"Preços Stripe validados: {sorted(PRICE_METADATA)}")
+
+
+def checkout_metrics() -> Dict[str, Any]:
+    samples = sorted(CHECKOUT_LATENCIES)
+    if not samples:
+        return {"count": 0, "errors": CHECKOUT_ERRORS}
+    return {
+        "count": len(samples),
+        "errors": CHECKOUT_ERRORS,
+        "p50_ms": round(samples[len(samples) // 2] * 1000, 1),
+        "p95_ms": round(samples[min(int(len(samples) * 0.95), len(samples) - 1)] * 1000, 1),
+    }
+
+
 async def create_checkout_session(user_id: str, email: str, plan_type: str):
     """Cria uma sessão de checkout do Stripe."""
-    if not stripe.api_key:
+    global CHECKOUT_ERRORS
+    if not STRIPE_SECRET_KEY:
         raise HTTPException(status_code=500, detail="Stripe não configurado no servidor.")
 
-    price_id = None
-    if plan_type == "plus":
-        price_id = PRICE_ID_PLUS
-    elif plan_type == "premium":
-        price_id = PRICE_ID_PREMIUM
+    if PRICE_METADATA:
+        # Preços já validados no startup: só aceita planos com preço ativo
+        price_id = PRICE_METADATA.get(plan_type, {}).get("price_id")
+    else:
+        price_id = _plan_price_ids().get(plan_type)
     
     if not price_id:
         raise HTTPException(status_code=400, detail="Plano inválido ou preço não configurado.")
 
+    started = time.monotonic()
     try:
-        checkout_session = stripe.checkout.Session.create(
-            payment_method_types=['card'],
-            customer_email=email,
-            client_reference_id=user_id,
-            line_items=[
+        checkout_session = await _get_stripe_client().checkout.sessions.create_async(params={
+            "payment_method_types": ['card'],
+            "customer_email": email,
+            "client_reference_id": user_id,
+            "line_items": [
                 {
                     'price': price_id,
                     'quantity': 1,
                 },
             ],
-            mode='subscription',
-            success_url=f"{os.getenv('FRONTEND_URL', 'http://localhost:3000')}/pricing?success=true",
-            cancel_url=f"{os.getenv('FRONTEND_URL', 'http://localhost:3000')}/pricing?canceled=true",
-            metadata={
+            "mode": 'subscription',
+            "success_url": f"{os.getenv('FRONTEND_URL', 'http://localhost:3000')}/pricing?success=true",
+            "cancel_url": f"{os.getenv('FRONTEND_URL', 'http://localhost:3000')}/pricing?canceled=true",
+            "metadata": {
                 "user_id": user_id,
                 "plan": plan_type
             }
-        )
+        })
         return checkout_session.url
     except Exception as e:
+        CHECKOUT_ERRORS += 1
         logger.error(f"Erro ao criar checkout Stripe: {e}")
         raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        elapsed = time.monotonic() - started
+        CHECKOUT_LATENCIES.append(elapsed)
+        logger.info(f"Checkout Stripe ({plan_type}) em {elapsed * 1000:.0f}ms")
 
 async def handle_stripe_webhook(request: Request):
-    """Processa webhooks do Stripe para atualizar o plano do usuário."""
+    """
+    Valida a assinatura, persiste o evento (deduplicado pelo id do Stripe) e responde na hora.
+    O processamento acontece no worker da fila de jobs (process_stripe_event).
+    """
     payload = await request.body()
     sig_header = request.headers.get("stripe-signature")
+    stripe = _stripe()
 
     try:
         event = stripe.Webhook.construct_event(
@@ -69,41 +185,176 @@ async def handle_stripe_webhook(request: Request):
         # Invalid signature
         raise HTTPException(status_code=400, detail="Invalid signature")
 
-    logger.info(f"Stripe Webhook Recebido: {event['type']}")
+    logger.info(f"Stripe Webhook Recebido: {event['type']} ({event['id']})")
 
-    # Handle the event
-    if event['type'] == 'checkout.session.completed':
-        session = event['data']['object']
-        await _fulfill_checkout(session)
-    elif event['type'] == 'customer.subscription.updated':
-        # Pode ser usado para tratar cancelamentos ou mudanças de status
-        pass
-    elif event['type'] == 'customer.subscription.deleted':
-        subscription = event['data']['object']
-        # Buscar usuário pelo customer_id e reverter para free
-        pass
+    try:
+        outcome = await asyncio.to_thread(_record_event, event["id"], event["type"], json.loads(payload))
+    except Exception as e:
+        # Nada foi gravado (evento e job são uma transação só): o reenvio do Stripe tenta de novo
+        logger.error(f"Erro ao registrar evento Stripe {event['id']}: {e}")
+        raise HTTPException(status_code=500, detail="Erro ao registrar evento")
 
+    if outcome == "duplicate":
+        # Reenvio de evento já processado ou com job ainda na fila
+        return {"status": "duplicate"}
     return {"status": "success"}
 
-async def _fulfill_checkout(session):
+
+def _record_event(event_id: str, event_type: str, payload: Dict[str, Any]) -> str:
+    """
+    Grava o evento e enfileira o job na mesma transação (função record_stripe_event).
+    Retorna 'created', 'requeued' (reenvio de evento ainda não processado e sem job ativo)
+    ou 'duplicate'.
+    """
+    res = get_supabase_client().rpc("record_stripe_event", {
+        "p_id": event_id,
+        "p_type": event_type,
+        "p_payload": payload,
+        "p_priority": STRIPE_EVENT_JOB_PRIORITY,
+        "p_max_attempts": STRIPE_EVENT_MAX_ATTEMPTS,
+    }).execute()
+    outcome = res.data[0] if isinstance(res.data, list) else res.data
+    if outcome == "requeued":
+        logger.warning(f"Evento Stripe {event_id} reenviado sem job ativo: reenfileirado")
+    return outcome
+
+
+@periodic_task(STRIPE_SWEEP_INTERVAL_SECONDS)
+def sweep_stripe_events() -> int:
+    """Reenfileira eventos 'pending' que ficaram sem job (ex.: job perdido com o worker)."""
+    res = get_supabase_client().rpc("requeue_stale_stripe_events", {
+        "p_older_than_seconds": STRIPE_SWEEP_STALE_SECONDS,
+        "p_priority": STRIPE_EVENT_JOB_PRIORITY,
+        "p_max_attempts": STRIPE_EVENT_MAX_ATTEMPTS,
+    }).execute()
+    count = (res.data[0] if isinstance(res.data, list) else res.data) or 0
+    if count:
+        logger.warning(f"{count} evento(s) Stripe pendente(s) reenfileirado(s)")
+    return count
+
+
+@job_handler("stripe_event")
+def process_stripe_event(payload, ctx):
+    """Processa um evento persistido. Eventos já processados são ignorados (idempotente)."""
+    event_id = payload["event_id"]
+    supabase = get_supabase_client()
+    res = (
+        supabase.table(STRIPE_EVENTS_TABLE)
+        .select("id, type, payload, status")
+        .eq("id", event_id)
+        .limit(1)
+        .execute()
+    )
+    if not res.data:
+        logger.warning(f"Evento Stripe {event_id} não encontrado")
+        return {"event_id": event_id, "skipped": True}
+
+    stored = res.data[0]
+    if stored["status"] == "processed":
+        return {"event_id": event_id, "skipped": True}
+
+    event_type = stored["type"]
+    obj = stored["payload"]["data"]["object"]
+    created_at = datetime.fromtimestamp(stored["payload"]["created"], tz=timezone.utc).isoformat()
+    try:
+        if event_type == 'checkout.session.completed':
+            _fulfill_checkout(obj)
+        elif event_type == 'customer.subscription.updated':
+            _sync_subscription(obj, created_at)
+        elif event_type == 'customer.subscription.deleted':
+            _cancel_subscription(obj, created_at)
+    except Exception as e:
+        update = {"error": str(e)}
+        if not ctx.will_retry(e):
+            # Última tentativa: fica registrado para reprocessamento manual (a varredura ignora 'failed')
+            update["status"] = "failed"
+        supabase.table(STRIPE_EVENTS_TABLE).update(update).eq("id", event_id).execute()
+        raise
+
+    supabase.table(STRIPE_EVENTS_TABLE).update({
+        "status": "processed",
+        "error": None,
+        "processed_at": datetime.now(timezone.utc).isoformat(),
+    }).eq("id", event_id).execute()
+    logger.info(f"Evento Stripe {event_id} ({event_type}) processado")
+    return {"event_id": event_id, "type": event_type}
+
+def _fulfill_checkout(session):
     """Atualiza o banco de dados após pagamento com sucesso."""
     user_id = session.get("client_reference_id")
     customer_id = session.get("customer")
     # Tenta pegar do metadata, se não existe, inferir (mas metadata é mais seguro se passamos)
-    plan_type = session.get("metadata", {}).get("plan") 
+    plan_type = (session.get("metadata") or {}).get("plan")
 
     if not user_id or not plan_type:
         logger.warning("Webhook Checkout sem user_id ou plan no metadata.")
         return
 
-    supabase = get_supabase_client()
-    try:
-        supabase.table("profiles").update({
-            "subscription_plan": plan_type,
-            "stripe_customer_id": customer_id,
-            "subscription_status": "active",
-            "daily_requests_count": 0 # Resetamos contagem ao dar upgrade? Opcional. Melhor não, ou sim.
-        }).eq("id", user_id).execute()
-        logger.info(f"Usuário {user_id} atualizado para plano {plan_type}")
-    except Exception as e:
-        logger.error(f"Erro ao atualizar profile no webhook: {e}")
+    # Erros sobem para o job ser reprocessado
+    get_supabase_client().table("profiles").update({
+        "subscription_plan": plan_type,
+        "stripe_customer_id": customer_id,
+        "subscription_status": "active",
+        "daily_requests_count": 0 # Resetamos contagem ao dar upgrade? Opcional. Melhor não, ou sim.
+    }).eq("id", user_id).execute()
+    logger.info(f"Usuário {user_id} atualizado para plano {plan_type}")
+
+def _stale_event_warning(customer_id, created_at):
+    # Sem linha atualizada: customer desconhecido ou já existe evento mais novo aplicado
+    exists = (
+        get_supabase_client().table("profiles")
+        .select("id")
+        .eq("stripe_customer_id", customer_id)
+        .limit(1)
+        .execute()
+    )
+    if exists.data:
+        logger.info(f"Evento de assinatura de {created_at} ignorado: já há um mais recente para {customer_id}")
+    else:
+        logger.warning(f"Nenhum usuário com stripe_customer_id {customer_id}")
+
+def _sync_subscription(subscription, created_at):
+    """Reflete status e fim do período da assinatura (lookup pelo índice de stripe_customer_id)."""
+    customer_id = subscription.get("customer")
+    if not customer_id:
+        return
+
+    update = {"subscription_status": subscription.get("status"), "subscription_event_at": created_at}
+    if subscription.get("current_period_end"):
+        update["current_period_end"] = datetime.fromtimestamp(
+            subscription["current_period_end"], tz=timezone.utc
+        ).isoformat()
+
+    # Só aplica se for mais novo que o último evento (retries rodam fora de ordem)
+    res = (
+        get_supabase_client().table("profiles")
+        .update(update)
+        .eq("stripe_customer_id", customer_id)
+        .lt("subscription_event_at", created_at)
+        .execute()
+    )
+    if not res.data:
+        _stale_event_warning(customer_id, created_at)
+
+def _cancel_subscription(subscription, created_at):
+    """Assinatura encerrada: volta o usuário para o plano free."""
+    customer_id = subscription.get("customer")
+    if not customer_id:
+        return
+
+    # lte: o `created` do Stripe tem resolução de segundos; no empate com um updated, o cancelamento vence
+    res = (
+        get_supabase_client().table("profiles")
+        .update({
+            "subscription_plan": "free",
+            "subscription_status": "canceled",
+            "subscription_event_at": created_at,
+        })
+        .eq("stripe_customer_id", customer_id)
+        .lte("subscription_event_at", created_at)
+        .execute()
+    )
+    if res.data:
+        logger.info(f"Usuário {res.data[0]['id']} revertido para plano free")
+    else:
+        _stale_event_warning(customer_id, created_at)
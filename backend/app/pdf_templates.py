@@ -0,0 +1,184 @@
+import os
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Dict, Tuple
+
+# Layouts, estilos e fontes dos PDFs. Tudo é montado uma vez por processo
+# (lru_cache) e reaproveitado por todas as renderizações; antes cada PDF
+# reconstruía getSampleStyleSheet(), os ParagraphStyle e os mapas de rótulos.
+# reportlab continua sendo importado só na primeira renderização.
+
+# Fontes padrão do PDF (Helvetica, WinAnsi) por default: cobrem o português e não
+# são embutidas. Uma TTF (ex.: DejaVuSans, que desenha alguns símbolos dos rótulos)
+# pode ser configurada; é embutida como subset, mas custa ~2x o tempo de
+# renderização e ~40 KB por PDF (ver bench_pdf.py).
+FONT_PATH = os.getenv("PDF_FONT_PATH")
+FONT_BOLD_PATH = os.getenv("PDF_FONT_BOLD_PATH") or FONT_PATH
+FONT_NAME = "TheraSans"
+FONT_NAME_BOLD = "TheraSans-Bold"
+
+DOCUMENT_TITLES = {
+    "registro_documental": "Registro Documental de Sessão",
+    "relatorio": "Relatório Psicológico",
+    "laudo": "Laudo Psicológico",
+    "parecer": "Parecer Psicológico",
+    "declaracao": "Declaração",
+    "atestado": "Atestado Psicológico",
+}
+
+# Estrutura de cada tipo de documento CFP (Resolução CFP nº 06/2019)
+DOCUMENT_FIELDS = {
+    "registro_documental": ("registro_descritivo", "hipoteses_clinicas", "direcoes_intervencao"),
+    "relatorio": ("identificacao", "descricao_demanda", "procedimento", "analise", "conclusao"),
+    "laudo": ("identificacao", "descricao_demanda", "procedimento", "analise", "diagnostico_provisorio", "conclusao"),
+    "parecer": ("identificacao", "quesitos_analise", "analise_tecnica", "conclusao"),
+    "declaracao": ("finalidade", "informacoes_atendimento"),
+    "atestado": ("finalidade", "justificativa_ausencia_ou_aptidao"),
+}
+
+# Field Mappings (technical to display name)
+FIELD_LABELS = {
+    "identificacao": "👤 Identificação",
+    "registro_descritivo": "📝 Registro Descritivo",
+    "hipoteses_clinicas": "🧠 Hipóteses Clínicas",
+    "direcoes_intervencao": "🎯 Direções de Intervenção",
+    "descricao_demanda": "📋 Descrição da Demanda",
+    "procedimento": "⚙️ Procedimento",
+    "analise": "🔍 Análise",
+    "conclusao": "✅ Conclusão",
+    "diagnostico_provisorio": "🩺 Diagnóstico Provisório",
+    "quesitos_analise": "❓ Quesitos de Análise",
+    "analise_tecnica": "🔬 Análise Técnica",
+    "finalidade": "🎯 Finalidade",
+    "informacoes_atendimento": "ℹ️ Informações de Atendimento",
+    "justificativa_ausencia_ou_aptidao": "✔️ Justificativa",
+}
+
+
+@dataclass(frozen=True)
+class Fonts:
+    regular: str
+    bold: str
+    glyphs: frozenset  # codepoints que a fonte regular sabe desenhar
+
+
+@dataclass(frozen=True)
+class DocumentLayout:
+    document_type: str
+    title: str
+    fields: Tuple[str, ...]
+    labels: Dict[str, str]  # já sem os símbolos que a fonte não tem
+
+    def label(self, field: str) -> str:
+        return self.labels.get(field) or get_label(field)
+
+
+@lru_cache(maxsize=1)
+def get_fonts() -> Fonts:
+    """Resolve (e registra, se for TTF) a família de fontes uma vez por processo."""
+    if FONT_PATH:
+        from reportlab.pdfbase import pdfmetrics
+        from reportlab.pdfbase.ttfonts import TTFont
+        from reportlab.lib.fonts import addMapping
+
+        regular = TTFont(FONT_NAME, FONT_PATH)
+        pdfmetrics.registerFont(regular)
+        pdfmetrics.registerFont(TTFont(FONT_NAME_BOLD, FONT_BOLD_PATH))
+        # <b> dentro de Paragraph passa a usar a variante negrito registrada
+        addMapping(FONT_NAME, 0, 0, FONT_NAME)
+        addMapping(FONT_NAME, 1, 0, FONT_NAME_BOLD)
+        addMapping(FONT_NAME, 0, 1, FONT_NAME)
+        addMapping(FONT_NAME, 1, 1, FONT_NAME_BOLD)
+        return Fonts(FONT_NAME, FONT_NAME_BOLD, frozenset(regular.face.charToGlyph))
+
+    winansi = bytes(range(32, 256)).decode("cp1252", errors="ignore")
+    return Fonts("Helvetica", "Helvetica-Bold", frozenset(map(ord, winansi)))
+
+
+def _drawable(text: str, glyphs: frozenset) -> str:
+    """Remove os caracteres sem glifo na fonte (emojis dos rótulos) em vez de desenhar caixas pretas."""
+    return "".join(ch for ch in text if ord(ch) in glyphs).strip()
+
+
+# Chave do layout genérico: tipos desconhecidos vêm da query string e das respostas do
+# modelo, então não viram chaves de cache (que cresceria sem limite)
+GENERIC_DOCUMENT_TYPE = "documento"
+
+
+def get_label(field: str) -> str:
+    if field in FIELD_LABELS:
+        return _known_label(field)
+    # Campos fora do mapa (chaves do JSON do modelo) são montados na hora, sem cache
+    return _drawable(field.replace('_', ' ').title(), get_fonts().glyphs)
+
+
+@lru_cache(maxsize=None)
+def _known_label(field: str) -> str:
+    return _drawable(FIELD_LABELS[field], get_fonts().glyphs)
+
+
+def get_layout(document_type: str) -> DocumentLayout:
+    """Layout do tipo de documento; tipos desconhecidos usam o registro documental com título genérico."""
+    return _layout(document_type if document_type in DOCUMENT_FIELDS else GENERIC_DOCUMENT_TYPE)
+
+
+@lru_cache(maxsize=None)
+def _layout(document_type: str) -> DocumentLayout:
+    fields = DOCUMENT_FIELDS.get(document_type, DOCUMENT_FIELDS["registro_documental"])
+    return DocumentLayout(
+        document_type=document_type,
+        title=DOCUMENT_TITLES.get(document_type, "Documento Psicológico"),
+        fields=fields,
+        labels={field: get_label(field) for field in fields},
+    )
+
+
+@lru_cache(maxsize=1)
+def get_styles() -> Dict[str, "ParagraphStyle"]:
+    """ParagraphStyles pré-compilados de todos os documentos, já com a fonte registrada."""
+    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+    from reportlab.lib import colors
+
+    fonts = get_fonts()
+    sample = getSampleStyleSheet()
+    base = {"fontName": fonts.regular}
+    heading = {"fontName": fonts.bold}
+    return {
+        # Documentos CFP / prontuário
+        "title": ParagraphStyle('Title', parent=sample['Heading1'], fontSize=16, spaceAfter=20, alignment=1, **heading),
+        "session": ParagraphStyle('Session', parent=sample['Heading1'], fontSize=14, spaceAfter=10, **heading),
+        "section": ParagraphStyle('Section', parent=sample['Heading2'], fontSize=12, spaceBefore=15, spaceAfter=10, textColor=colors.darkblue, **heading),
+        "text": ParagraphStyle('Text', parent=sample['Normal'], fontSize=11, leading=14, **base),
+        # Relatório de evolução (GET /api/patients/{id}/reports?report_type=pdf)
+        "report_title": ParagraphStyle('ReportTitle', parent=sample['Heading1'], fontSize=18, spaceAfter=20, alignment=1, **heading),
+        "report_subtitle": ParagraphStyle('ReportSubtitle', parent=sample['Heading2'], fontSize=14, spaceAfter=10, textColor=colors.darkblue, **heading),
+        "normal": ParagraphStyle('Normal', parent=sample['Normal'], **base),
+    }
+
+
+@lru_cache(maxsize=1)
+def get_table_style() -> "TableStyle":
+    """Estilo das tabelas do relatório de evolução (cabeçalho cinza com grade)."""
+    from reportlab.platypus import TableStyle
+    from reportlab.lib import colors
+
+    fonts = get_fonts()
+    return TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), colors.lightgrey),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.black),
+        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+        ('FONTNAME', (0, 0), (-1, -1), fonts.regular),
+        ('FONTNAME', (0, 0), (-1, 0), fonts.bold),
+        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+        ('BACKGROUND', (0, 1), (-1, -1), colors.white),
+        ('GRID', (0, 0), (-1, -1), 1, colors.black),
+        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+    ])
+
+
+def warm_templates() -> None:
+    """Carrega fontes, estilos e os seis layouts (chamado no aquecimento do lifespan)."""
+    get_styles()
+    get_table_style()
+    for document_type in DOCUMENT_TITLES:
+        get_layout(document_type)
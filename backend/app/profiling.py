@@ -0,0 +1,311 @@
+import asyncio
+import contextvars
+import hashlib
+import hmac
+import json
+import os
+import random
+import re
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from functools import wraps
+from typing import Any, Dict, List, Optional
+
+from fastapi import Header, HTTPException
+from loguru import logger
+
+# Profiling sob demanda de requests individuais, para depurar "o relatório demora" em produção.
+# Desligado por padrão: sem PROFILING_SECRET nem PROFILING_SAMPLE_RATE o middleware nem é
+# instalado e os spans abaixo só consultam um ContextVar vazio.
+#   - header X-Profile com token assinado (python -m app.profiling token) -> perfila o request;
+#   - PROFILING_SAMPLE_RATE=0.001 -> perfila essa fração dos requests.
+# Cada perfil traz a árvore de chamadas do pyinstrument (opcional; amostra só o event loop,
+# um request por vez) e spans de Supabase, OpenAI e ReportLab, que também contam o tempo em
+# threads (asyncio.to_thread copia o contexto). Ficam em PROFILE_DIR e saem por /admin/profiles.
+
+PROFILING_SECRET = os.getenv("PROFILING_SECRET", "")
+PROFILING_SAMPLE_RATE = float(os.getenv("PROFILING_SAMPLE_RATE", "0"))
+PROFILING_ENABLED = bool(PROFILING_SECRET) or PROFILING_SAMPLE_RATE > 0
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+PROFILE_MAX_FILES = int(os.getenv("PROFILE_MAX_FILES", "200"))
+PROFILE_INTERVAL = float(os.getenv("PROFILE_INTERVAL", "0.001"))
+
+PROFILE_HEADER = "X-Profile"
+ADMIN_PREFIX = "/admin/profiles"
+_PROFILE_ID = re.compile(r"^\d{8}T\d{12}-[0-9a-f]{6}$")
+
+_current: contextvars.ContextVar[Optional["RequestProfile"]] = contextvars.ContextVar("profile", default=None)
+
+
+def make_token(ttl: int = 900, secret: Optional[str] = None, now: Optional[float] = None) -> str:
+    """Token `<expira>.<hmac>` para o header X-Profile, válido por `ttl` segundos."""
+    expires = str(int((now or time.time()) + ttl))
+    signature = hmac.new((secret or PROFILING_SECRET).encode(), expires.encode(), hashlib.sha256).hexdigest()
+    return f"{expires}.{signature}"
+
+
+def verify_token(token: str, secret: Optional[str] = None, now: Optional[float] = None) -> bool:
+    secret = secret or PROFILING_SECRET
+    expires, _, signature = (token or "").partition(".")
+    if not secret or not expires.isdigit() or int(expires) < (now or time.time()):
+        return False
+    expected = hmac.new(secret.encode(), expires.encode(), hashlib.sha256).hexdigest()
+    return hmac.compare_digest(signature, expected)
+
+
+def _new_profile_id() -> str:
+    # Ordenável pelo horário (com microssegundos): a retenção apaga os mais antigos pelo id
+    now = time.time()
+    return f"{time.strftime('%Y%m%dT%H%M%S', time.gmtime(now))}{int(now * 1e6) % 1_000_000:06d}-{uuid.uuid4().hex[:6]}"
+
+
+@dataclass
+class RequestProfile:
+    method: str
+    path: str
+    id: str = field(default_factory=_new_profile_id)
+    started: float = field(default_factory=time.perf_counter)
+    spans: List[Dict[str, Any]] = field(default_factory=list)
+    status: Optional[int] = None
+    duration_ms: Optional[float] = None
+
+    def add_span(self, kind: str, label: str, started: float, seconds: float) -> None:
+        # list.append é atômico: spans chegam de threads do to_thread e do gateway do LLM
+        self.spans.append({
+            "kind": kind,
+            "label": label,
+            "start_ms": round((started - self.started) * 1000, 2),
+            "duration_ms": round(seconds * 1000, 2),
+            "thread": threading.current_thread().name,
+        })
+
+    def finish(self, status: int) -> None:
+        self.status = status
+        self.duration_ms = round((time.perf_counter() - self.started) * 1000, 2)
+
+    def summary(self) -> Dict[str, Any]:
+        totals: Dict[str, Dict[str, float]] = {}
+        for span_ in self.spans:
+            total = totals.setdefault(span_["kind"], {"count": 0, "duration_ms": 0.0})
+            total["count"] += 1
+            total["duration_ms"] = round(total["duration_ms"] + span_["duration_ms"], 2)
+        return {
+            "id": self.id,
+            "method": self.method,
+            "path": self.path,
+            "status": self.status,
+            "duration_ms": self.duration_ms,
+            "totals": totals,
+        }
+
+
+@contextmanager
+def span(kind: str, label: str = ""):
+    """Mede o trecho no perfil do request atual (sem perfil ativo, não faz nada)."""
+    profile = _current.get()
+    if profile is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        profile.add_span(kind, label, started, time.perf_counter() - started)
+
+
+def traced(kind: str):
+    """Decorator equivalente a `with span(kind, nome da função)`."""
+
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            if _current.get() is None:
+                return fn(*args, **kwargs)
+            with span(kind, fn.__name__):
+                return fn(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def instrument_httpx(client, kind: str) -> None:
+    """Registra um span por request de um httpx.Client síncrono (até os headers da resposta)."""
+
+    def on_request(request):
+        if _current.get() is not None:
+            request.extensions["profile_started"] = time.perf_counter()
+
+    def on_response(response):
+        profile = _current.get()
+        started = response.request.extensions.get("profile_started")
+        if profile is not None and started is not None:
+            # Só método e path (ex.: GET /rest/v1/sessions): a query string pode ter dados do paciente
+            label = f"{response.request.method} {response.request.url.path}"
+            profile.add_span(kind, label, started, time.perf_counter() - started)
+
+    hooks = client.event_hooks
+    client.event_hooks = {
+        "request": [*hooks.get("request", []), on_request],
+        "response": [*hooks.get("response", []), on_response],
+    }
+
+
+class ProfileStore:
+    """Perfis em disco: <id>.json (resumo, spans e árvore em texto) e <id>.html (pyinstrument)."""
+
+    def __init__(self, directory: str = PROFILE_DIR, max_files: int = PROFILE_MAX_FILES):
+        self.directory = directory
+        self.max_files = max_files
+
+    def save(self, profile: RequestProfile, tree_text: Optional[str] = None, tree_html: Optional[str] = None) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        if tree_html is not None:
+            with open(os.path.join(self.directory, f"{profile.id}.html"), "w", encoding="utf-8") as f:
+                f.write(tree_html)
+        data = {**profile.summary(), "spans": profile.spans, "call_tree": tree_text}
+        with open(os.path.join(self.directory, f"{profile.id}.json"), "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False)
+        self._prune()
+
+    def _prune(self) -> None:
+        ids = self.ids()
+        for stale in ids[self.max_files:]:
+            for ext in ("json", "html"):
+                try:
+                    os.remove(os.path.join(self.directory, f"{stale}.{ext}"))
+                except FileNotFoundError:
+                    pass
+
+    def ids(self) -> List[str]:
+        """Ids do mais recente para o mais antigo."""
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return []
+        return sorted((n[:-5] for n in names if n.endswith(".json")), reverse=True)
+
+    def list(self, limit: int = 50) -> List[Dict[str, Any]]:
+        summaries = []
+        for profile_id in self.ids()[:limit]:
+            data = self.read(profile_id)
+            if data is not None:
+                data.pop("spans", None)
+                data.pop("call_tree", None)
+                summaries.append(data)
+        return summaries
+
+    def path(self, profile_id: str, ext: str) -> Optional[str]:
+        if not _PROFILE_ID.match(profile_id):
+            return None
+        path = os.path.join(self.directory, f"{profile_id}.{ext}")
+        return path if os.path.exists(path) else None
+
+    def read(self, profile_id: str) -> Optional[Dict[str, Any]]:
+        path = self.path(profile_id, "json")
+        if path is None:
+            return None
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+
+
+store = ProfileStore()
+
+
+class ProfilingMiddleware:
+    """
+    Middleware ASGI que perfila o request com X-Profile válido ou sorteado pela taxa de
+    amostragem. A resposta ganha o header X-Profile-Id; o perfil é gravado depois do envio.
+    """
+
+    def __init__(self, app, sample_rate: Optional[float] = None, secret: Optional[str] = None,
+                 profile_store: Optional[ProfileStore] = None):
+        self.app = app
+        self.sample_rate = PROFILING_SAMPLE_RATE if sample_rate is None else sample_rate
+        self.secret = PROFILING_SECRET if secret is None else secret
+        self.store = profile_store or store
+        self._tree_busy = False
+        self._pyinstrument_missing = False
+
+    def _wanted(self, scope) -> bool:
+        if scope["path"].startswith(ADMIN_PREFIX):
+            return False
+        for name, value in scope["headers"]:
+            if name == b"x-profile":
+                return verify_token(value.decode("latin-1"), self.secret)
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    def _start_tree(self):
+        # pyinstrument aceita um profiler por thread: requests simultâneos ficam só com os spans
+        if self._tree_busy or self._pyinstrument_missing:
+            return None
+        try:
+            from pyinstrument import Profiler
+        except ImportError:
+            self._pyinstrument_missing = True
+            logger.warning("pyinstrument não instalado: perfis terão só os spans")
+            return None
+        self._tree_busy = True
+        profiler = Profiler(interval=PROFILE_INTERVAL, async_mode="enabled")
+        profiler.start()
+        return profiler
+
+    def _stop_tree(self, profiler):
+        if profiler is None:
+            return None, None
+        try:
+            profiler.stop()
+            return profiler.output_text(unicode=True, color=False), profiler.output_html()
+        finally:
+            self._tree_busy = False
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self._wanted(scope):
+            return await self.app(scope, receive, send)
+
+        profile = RequestProfile(scope["method"], scope["path"])
+        status = 500
+
+        async def send_with_id(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                message["headers"] = [*message.get("headers", []), (b"x-profile-id", profile.id.encode())]
+            await send(message)
+
+        token = _current.set(profile)
+        profiler = self._start_tree()
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            _current.reset(token)
+            profile.finish(status)
+            tree_text, tree_html = self._stop_tree(profiler)
+            try:
+                await asyncio.to_thread(self.store.save, profile, tree_text, tree_html)
+                logger.info(f"Perfil {profile.id}: {profile.method} {profile.path} {profile.duration_ms}ms")
+            except Exception as e:
+                logger.warning(f"Falha ao gravar perfil {profile.id}: {e}")
+
+
+async def require_admin(x_profile: Optional[str] = Header(None, alias=PROFILE_HEADER)) -> None:
+    """Dependência das rotas /admin/profiles: mesmo token assinado do header X-Profile."""
+    if not PROFILING_ENABLED:
+        raise HTTPException(status_code=404, detail="Profiling desativado")
+    if not verify_token(x_profile or ""):
+        raise HTTPException(status_code=403, detail="Token de profiling inválido ou expirado")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Gera o token do header X-Profile (usa PROFILING_SECRET)")
+    parser.add_argument("command", choices=["token"])
+    parser.add_argument("--ttl", type=int, default=900, help="validade em segundos")
+    args = parser.parse_args()
+    if not PROFILING_SECRET:
+        raise SystemExit("PROFILING_SECRET não configurado")
+    print(make_token(args.ttl))
@@ -1,9 +1,13 @@
 from datetime import datetime, timedelta
 from collections import defaultdict, Counter
 from typing import List, Dict, Any
+import itertools
 import re
 from datetime import datetime
 
+from .pdf_templates import get_fonts, get_label, get_layout, get_styles
+from .profiling import traced
+
 # Padrões para análise de tópicos
 TOPIC_KEYWORDS = {
     'ansiedade': ['ansio', 'preocup', 'nervos', 'medo', 'pânico', 'angústia', 'tensão', 'inquietação'],
@@ -59,8 +63,8 @@ def calculate_sentiment_trends(sessions: List[Dict[str, Any]]) -> Dict[str, Any]
              sentiment = session['analysis'].get('sentiment', {})
              score = sentiment.get('score', 0)
         else:
-             # Fallback: calcula na hora usando transcrição ou resumo
-             text = session.get('transcription') or session.get('summary') or ""
+             # Fallback: calcula na hora usando transcrição ou registro descritivo
+             text = session.get('transcription') or session.get('registro_descritivo') or ""
              score = estimate_sentiment(text)
             
         try:
@@ -202,16 +206,7 @@ def generate_clinical_record_content(
     Tipos: registro_documental, relatorio, laudo, parecer, declaracao, atestado.
     """
     
-    document_structures = {
-        "registro_documental": "- registro_descritivo\n- hipoteses_clinicas\n- direcoes_intervencao",
-        "relatorio": "- identificacao\n- descricao_demanda\n- procedimento\n- analise\n- conclusao",
-        "laudo": "- identificacao\n- descricao_demanda\n- procedimento\n- analise\n- diagnostico_provisorio\n- conclusao",
-        "parecer": "- identificacao\n- quesitos_analise\n- analise_tecnica\n- conclusao",
-        "declaracao": "- finalidade\n- informacoes_atendimento",
-        "atestado": "- finalidade\n- justificativa_ausencia_ou_aptidao"
-    }
-    
-    structure = document_structures.get(document_type, document_structures["registro_documental"])
+    structure = "\n".join(f"- {field}" for field in get_layout(document_type).fields)
     
     system_prompt = (
         "Você é um assistente especializado em redação de documentos psicológicos conforme as normas do "
@@ -224,8 +219,8 @@ def generate_clinical_record_content(
     Tipo de Documento: {document_type}
     Dados do Paciente: {patient_data.get('name')}
     Abordagem do Terapeuta: {approach}
-    Conteúdo Base da Sessão: {session_data.get('transcription') or session_data.get('summary')}
-    Hipóteses e Direções: {session_data.get('insights') or (session_data.get('hipoteses_clinicas', '') + ' ' + session_data.get('direcoes_intervencao', ''))}
+    Conteúdo Base da Sessão: {session_data.get('transcription') or session_data.get('registro_descritivo')}
+    Hipóteses e Direções: {(session_data.get('hipoteses_clinicas') or '') + ' ' + (session_data.get('direcoes_intervencao') or '')}
     
     Gere um JSON com os campos correspondentes a esta estrutura:
     {structure}
@@ -248,6 +243,7 @@ def generate_clinical_record_content(
     import json
     return json.loads(response.choices[0].message.content)
 
+@traced("reportlab")
 def generate_clinical_record_pdf(
     record_data: Dict[str, Any], 
     patient_data: Dict[str, Any], 
@@ -258,33 +254,19 @@ def generate_clinical_record_pdf(
     """Generates the PDF file for the clinical record / psychological document."""
     from reportlab.lib.pagesizes import letter
     from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer
-    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-    from reportlab.lib import colors
     from io import BytesIO
     
     buffer = BytesIO()
     doc = SimpleDocTemplate(buffer, pagesize=letter)
-    styles = getSampleStyleSheet()
+    styles = get_styles()
+    layout = get_layout(document_type)
     elements = []
     
-    document_titles = {
-        "registro_documental": "Registro Documental de Sessão",
-        "relatorio": "Relatório Psicológico",
-        "laudo": "Laudo Psicológico",
-        "parecer": "Parecer Psicológico",
-        "declaracao": "Declaração",
-        "atestado": "Atestado Psicológico"
-    }
-    
-    title_text = document_titles.get(document_type, "Documento Psicológico")
-    
     # Styles
-    title_style = ParagraphStyle('Title', parent=styles['Heading1'], fontSize=16, spaceAfter=20, alignment=1)
-    section_style = ParagraphStyle('Section', parent=styles['Heading2'], fontSize=12, spaceBefore=15, spaceAfter=10, textColor=colors.darkblue)
-    text_style = ParagraphStyle('Text', parent=styles['Normal'], fontSize=11, leading=14)
+    title_style, section_style, text_style = styles["title"], styles["section"], styles["text"]
     
     # Header Info
-    elements.append(Paragraph(title_text, title_style))
+    elements.append(Paragraph(layout.title, title_style))
     elements.append(Spacer(1, 10))
     
     # Format Patient Data for the section
@@ -292,29 +274,12 @@ def generate_clinical_record_pdf(
         f"<b>Nome:</b> {patient_data.get('name') or 'N/A'}\n"
         f"<b>Data:</b> {session_date}"
     )
-    elements.append(Paragraph("👤 Identificação", section_style))
+    elements.append(Paragraph(get_label("identificacao"), section_style))
     elements.append(Paragraph(patient_info, text_style))
 
-    # Field Mappings (technical to display name)
-    field_labels = {
-        "registro_descritivo": "📝 Registro Descritivo",
-        "hipoteses_clinicas": "🧠 Hipóteses Clínicas",
-        "direcoes_intervencao": "🎯 Direções de Intervenção",
-        "descricao_demanda": "📋 Descrição da Demanda",
-        "procedimento": "⚙️ Procedimento",
-        "analise": "🔍 Análise",
-        "conclusao": "✅ Conclusão",
-        "diagnostico_provisorio": "🩺 Diagnóstico Provisório",
-        "quesitos_analise": "❓ Quesitos de Análise",
-        "analise_tecnica": "🔬 Análise Técnica",
-        "finalidade": "🎯 Finalidade",
-        "informacoes_atendimento": "ℹ️ Informações de Atendimento",
-        "justificativa_ausencia_ou_aptidao": "✔️ Justificativa"
-    }
-
     for key, value in record_data.items():
         if key in ["identificacao", "id"]: continue
-        label = field_labels.get(key, key.replace('_', ' ').title())
+        label = layout.label(key)
         elements.append(Paragraph(label, section_style))
         elements.append(Paragraph(str(value).replace('\n', '<br/>'), text_style))
         elements.append(Spacer(1, 10))
@@ -341,4 +306,160 @@ def generate_clinical_record_pdf(
     
     doc.build(elements)
     buffer.seek(0)
-    return buffer.getvalue()
\ No newline at end of file
+    return buffer.getvalue()
+
+class _NullSink:
+    """Destino descartável: usado nas passagens que só medem a paginação."""
+
+    def write(self, data) -> int:
+        return len(data)
+
+
+class _LazyStory(list):
+    """
+    Story do platypus que só materializa os flowables do próximo grupo (uma sessão)
+    quando o anterior já foi paginado, em vez de montar o prontuário inteiro de uma vez.
+    """
+
+    def __init__(self, groups):
+        super().__init__()
+        self._groups = iter(groups)
+
+    def __len__(self):
+        while not list.__len__(self):
+            group = next(self._groups, None)
+            if group is None:
+                break
+            self.extend(group)
+        return list.__len__(self)
+
+
+def write_patient_record_pdf(
+    output,
+    sessions: List[Dict[str, Any]],
+    patient_data: Dict[str, Any],
+    therapist_data: Dict[str, Any] = None,
+    period: str = None,
+) -> int:
+    """
+    Gera o prontuário completo (capa, sumário e uma seção por sessão) em `output`.
+    Cada item de `sessions` traz 'date' (dd/mm/aaaa) e 'record' (campos do registro).
+    O sumário precisa das páginas finais: uma primeira passagem só pagina as sessões
+    (saída descartada) e a segunda escreve o documento. Retorna o total de páginas.
+    """
+    from reportlab.lib.pagesizes import letter
+    from reportlab.platypus import BaseDocTemplate, Frame, PageTemplate, Paragraph, Spacer, PageBreak, Table, TableStyle
+    from reportlab.platypus.flowables import Flowable
+    from reportlab.lib import colors
+    from xml.sax.saxutils import escape
+
+    styles = get_styles()
+    fonts = get_fonts()
+    title_style, session_style = styles["title"], styles["session"]
+    section_style, text_style = styles["section"], styles["text"]
+
+    patient_name = patient_data.get('name') or 'N/A'
+
+    class SessionAnchor(Flowable):
+        """Marca o início de uma sessão: registra a página, o destino do link e o item do índice do PDF."""
+
+        def __init__(self, key: str, title: str, pages: Dict[str, int]):
+            super().__init__()
+            self.key, self.title, self.pages = key, title, pages
+
+        def wrap(self, available_width, available_height):
+            return 0, 0
+
+        def draw(self):
+            self.pages[self.key] = self.canv.getPageNumber()
+            self.canv.bookmarkPage(self.key)
+            self.canv.addOutlineEntry(self.title, self.key, level=0)
+
+    def footer(canvas, doc):
+        canvas.saveState()
+        canvas.setFont(fonts.regular, 8)
+        canvas.setFillColor(colors.grey)
+        canvas.drawString(doc.leftMargin, 30, f"Prontuário - {patient_name}")
+        canvas.drawRightString(doc.leftMargin + doc.width, 30, f"Página {doc.page}")
+        canvas.restoreState()
+
+    def render(story, target) -> int:
+        doc = BaseDocTemplate(target, pagesize=letter, title=f"Prontuário - {patient_name}")
+        frame = Frame(doc.leftMargin, doc.bottomMargin, doc.width, doc.height)
+        doc.addPageTemplates([PageTemplate(id='prontuario', frames=[frame], onPage=footer)])
+        doc.build(story)
+        return doc.page
+
+    def prefix(page_numbers: Dict[str, int], links: bool = True) -> list:
+        details = [f"<b>Paciente:</b> {escape(patient_name)}"]
+        if patient_data.get('email'):
+            details.append(f"<b>E-mail:</b> {escape(patient_data['email'])}")
+        if patient_data.get('phone'):
+            details.append(f"<b>Telefone:</b> {escape(patient_data['phone'])}")
+        details.append(f"<b>Período:</b> {period or 'Todo o acompanhamento'}")
+        details.append(f"<b>Sessões:</b> {len(sessions)}")
+        details.append(f"<b>Emitido em:</b> {datetime.now().strftime('%d/%m/%Y')}")
+
+        story = [
+            Paragraph("Prontuário Psicológico", title_style),
+            Spacer(1, 10),
+            Paragraph(get_label("identificacao"), section_style),
+            Paragraph("<br/>".join(details), text_style),
+            PageBreak(),
+            Paragraph("Sumário", title_style),
+        ]
+        if not sessions:
+            story.append(Paragraph("Nenhuma sessão registrada no período.", text_style))
+            return story
+        rows = []
+        for i, session in enumerate(sessions):
+            entry = f'Sessão {i + 1} - {session["date"]}'
+            if links:
+                entry = f'<a href="#sessao_{i}">{entry}</a>'
+            rows.append([Paragraph(entry, text_style), str(page_numbers.get(f"sessao_{i}", ""))])
+        table = Table(rows, colWidths=['85%', '15%'])
+        table.setStyle(TableStyle([
+            ('FONTNAME', (0, 0), (-1, -1), fonts.regular),
+            ('ALIGN', (1, 0), (1, -1), 'RIGHT'),
+            ('LINEBELOW', (0, 0), (-1, -1), 0.25, colors.lightgrey),
+        ]))
+        story.append(table)
+        return story
+
+    def session_groups(pages: Dict[str, int], break_first: bool):
+        for i, session in enumerate(sessions):
+            title = f"Sessão {i + 1} - {session['date']}"
+            group = [PageBreak()] if (i or break_first) else []
+            group += [SessionAnchor(f"sessao_{i}", title, pages), Paragraph(title, session_style)]
+            for key, value in session['record'].items():
+                if key in ["identificacao", "id"] or not value:
+                    continue
+                label = get_label(key)
+                group.append(Paragraph(label, section_style))
+                group.append(Paragraph(escape(str(value)).replace('\n', '<br/>'), text_style))
+                group.append(Spacer(1, 10))
+            yield group
+        yield signature()
+
+    def signature() -> list:
+        group = [Spacer(1, 30)]
+        if therapist_data:
+            details = [f"<b>{escape(therapist_data.get('name') or 'Terapeuta')}</b>"]
+            if therapist_data.get('crp'):
+                details.append(f"CRP: {escape(therapist_data['crp'])}")
+            group += [Paragraph("<br/>".join(details), text_style), Spacer(1, 15)]
+        group += [
+            Paragraph("_______________________________", text_style),
+            Paragraph("Assinatura do Profissional", text_style),
+        ]
+        return group
+
+    # 1ª passagem: página relativa de início de cada sessão (cada uma começa em página nova)
+    relative_pages: Dict[str, int] = {}
+    render(_LazyStory(session_groups(relative_pages, break_first=False)), _NullSink())
+    # Capa + sumário ocupam as mesmas páginas qualquer que seja a numeração (sem links: não há destinos)
+    prefix_pages = render(prefix(relative_pages, links=False), _NullSink())
+    final_pages = {key: prefix_pages + page for key, page in relative_pages.items()}
+
+    groups = session_groups({}, break_first=True)
+    return render(_LazyStory(itertools.chain([prefix(final_pages)], groups)), output)
@@ -1,7 +1,7 @@
 
 from pydantic import BaseModel, HttpUrl, Field
-from typing import List, Optional
-from datetime import datetime
+from typing import Any, List, Literal, Optional
+from datetime import date, datetime
 
 
 class AnalyzeRequest(BaseModel):
@@ -74,11 +74,31 @@ class PatientOut(BaseModel):
     created_at: datetime
 
 
+class PatientImportRow(BaseModel):
+    row: int  # linha de dados no CSV (1 = primeira após o cabeçalho)
+    status: str  # created | existing | duplicate | invalid
+    patient_id: Optional[str] = None
+    error: Optional[str] = None
+
+
+class PatientImportResponse(BaseModel):
+    total_rows: int
+    created: int
+    existing: int
+    duplicate: int
+    invalid: int
+    # True se o arquivo passou de MAX_ROWS: só as primeiras linhas foram importadas
+    truncated: bool = False
+    rows: List[PatientImportRow]
+
+
 class SessionOut(BaseModel):
     id: str
     patient_id: str
     audio_url: Optional[str] = None
     transcription: Optional[str] = None
+    # Deprecated: não são mais armazenados; derivados dos campos CFP na leitura
+    # (clientes novos pedem ?legacy_fields=false e recebem null)
     summary: Optional[str] = None
     insights: Optional[str] = None
     themes: Optional[List[str]] = None
@@ -89,10 +109,47 @@ class SessionOut(BaseModel):
     updated_at: Optional[datetime] = None
 
 
+def with_legacy_fields(session: dict) -> dict:
+    """Deriva summary/insights dos campos CFP (mesma regra de AnalyzeResponse), para clientes antigos."""
+    session["summary"] = session.get("registro_descritivo")
+    if session.get("hipoteses_clinicas") or session.get("direcoes_intervencao"):
+        session["insights"] = f"{session.get('hipoteses_clinicas') or ''}\n\n{session.get('direcoes_intervencao') or ''}"
+    return session
+
+
 class SessionsListResponse(BaseModel):
     sessions: List[SessionOut]
 
 
+class SessionPreviewOut(BaseModel):
+    id: str
+    patient_id: str
+    patient_name: Optional[str] = None
+    created_at: datetime
+    preview: str  # início do registro descritivo
+
+
+class SessionPreviewListResponse(BaseModel):
+    sessions: List[SessionPreviewOut]
+
+
+class JobSubmitResponse(BaseModel):
+    job_id: str
+    status: str
+
+
+class JobOut(BaseModel):
+    id: str
+    kind: str
+    status: str  # queued, running, succeeded, failed
+    progress: int = 0
+    result: Optional[Any] = None
+    error: Optional[str] = None
+    attempts: int = 0
+    created_at: datetime
+    updated_at: Optional[datetime] = None
+
+
 class ReportRequest(BaseModel):
     start_date: Optional[datetime] = None
     end_date: Optional[datetime] = None
@@ -138,14 +195,24 @@ class ProfileOut(BaseModel):
     name: Optional[str] = None
     crp: Optional[str] = None
     theoretical_approach: Optional[str] = "Integrativa"
+    prefetch_documents: Optional[bool] = True
     updated_at: Optional[datetime] = None
 
 class ProfileUpdate(BaseModel):
     name: Optional[str] = None
     crp: Optional[str] = None
     theoretical_approach: Optional[str] = None
+    prefetch_documents: Optional[bool] = None  # pré-gerar o registro documental ao salvar a sessão
+
+
+
+
+class CheckoutRequest(BaseModel):
+    plan: str  # plus, premium
 
 
+class CheckoutResponse(BaseModel):
+    url: str
 
 
 class CRPValidationRequest(BaseModel):
@@ -158,3 +225,90 @@ class CRPValidationResponse(BaseModel):
     professional_name: Optional[str] = None
     error: Optional[str] = None
 
+
+
+class AppointmentCreate(BaseModel):
+    patient_id: str
+    appointment_date: datetime  # sem fuso = horário de Brasília
+    duration_minutes: int = Field(default=50, ge=10, le=240)
+    price: float = 0.0
+    notes: Optional[str] = None
+
+
+class AppointmentUpdate(BaseModel):
+    appointment_date: Optional[datetime] = None
+    duration_minutes: Optional[int] = Field(default=None, ge=10, le=240)
+    status: Optional[str] = None  # scheduled, completed, cancelled, no_show
+    payment_status: Optional[str] = None  # pending, paid, cancelled
+    payment_method: Optional[str] = None
+    paid_at: Optional[datetime] = None
+    price: Optional[float] = None
+    notes: Optional[str] = None
+
+
+class RecurringAppointmentCreate(BaseModel):
+    patient_id: str
+    first_date: datetime  # primeira ocorrência; sem fuso = horário de Brasília
+    frequency: Literal["weekly", "biweekly"] = "weekly"
+    count: Optional[int] = Field(default=None, ge=1, le=60)
+    until: Optional[date] = None  # inclusivo
+    exceptions: List[date] = []  # datas puladas (feriados, férias)
+    duration_minutes: int = Field(default=50, ge=10, le=240)
+    price: float = 0.0
+    notes: Optional[str] = None
+    skip_conflicts: bool = False  # True: pula horários ocupados em vez de recusar tudo
+
+
+class AppointmentOut(BaseModel):
+    id: str
+    patient_id: str
+    appointment_date: datetime
+    duration_minutes: Optional[int] = None
+    status: Optional[str] = None
+    price: Optional[float] = None
+    payment_status: Optional[str] = None
+    payment_method: Optional[str] = None
+    paid_at: Optional[datetime] = None
+    notes: Optional[str] = None
+    recurrence_id: Optional[str] = None
+
+
+class RecurringAppointmentsResponse(BaseModel):
+    recurrence_id: str
+    created: List[AppointmentOut]
+    skipped: List[datetime]
+
+
+class FreeSlot(BaseModel):
+    start: datetime
+    end: datetime
+
+
+class FreeSlotsResponse(BaseModel):
+    slots: List[FreeSlot]
+
+
+class FinancialFigures(BaseModel):
+    appointments_count: int = 0
+    completed_count: int = 0
+    cancelled_count: int = 0
+    no_show_count: int = 0
+    billed_amount: float = 0.0
+    paid_amount: float = 0.0
+    pending_amount: float = 0.0
+    no_show_rate: float = 0.0
+
+
+class MonthlyFinancials(FinancialFigures):
+    month: date
+
+
+class PatientFinancials(FinancialFigures):
+    patient_id: str
+    patient_name: Optional[str] = None
+
+
+class FinancialSummaryResponse(BaseModel):
+    month_to_date: MonthlyFinancials
+    months: List[MonthlyFinancials]
+    patients: List[PatientFinancials]
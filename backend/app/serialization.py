@@ -0,0 +1,44 @@
+import gzip
+import os
+from functools import lru_cache
+from typing import Any
+
+from fastapi import Request, Response
+from pydantic import TypeAdapter
+
+# Caminho rápido para respostas grandes em lista (sessões, conversas, mensagens):
+# valida o lote inteiro de uma vez com um TypeAdapter em cache e serializa direto
+# para bytes no pydantic-core, sem o jsonable_encoder + json.dumps do response_model.
+# A saída é idêntica byte a byte à do caminho padrão do FastAPI.
+
+GZIP_MIN_SIZE = int(os.getenv("GZIP_MIN_SIZE", "1024"))
+GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", "3"))
+
+
+@lru_cache(maxsize=None)
+def get_adapter(tp: Any) -> TypeAdapter:
+    """TypeAdapter por tipo, construído uma única vez (a construção do schema é cara)."""
+    return TypeAdapter(tp)
+
+
+def dump_json(tp: Any, data: Any) -> bytes:
+    adapter = get_adapter(tp)
+    return adapter.dump_json(adapter.validate_python(data))
+
+
+def _accepts_gzip(request: Request) -> bool:
+    return "gzip" in request.headers.get("accept-encoding", "").lower()
+
+
+def fast_json_response(request: Request, tp: Any, data: Any, status_code: int = 200) -> Response:
+    """
+    Valida `data` como `tp` e devolve o JSON já codificado, comprimido com gzip
+    quando o cliente aceita e o corpo passa de GZIP_MIN_SIZE bytes.
+    Manter o `response_model` na rota para o OpenAPI; a Response direta não é revalidada.
+    """
+    body = dump_json(tp, data)
+    headers = {"Vary": "Accept-Encoding"}
+    if len(body) >= GZIP_MIN_SIZE and _accepts_gzip(request):
+        body = gzip.compress(body, compresslevel=GZIP_LEVEL)
+        headers["Content-Encoding"] = "gzip"
+    return Response(content=body, status_code=status_code, media_type="application/json", headers=headers)
@@ -1,56 +1,193 @@
-import httpx
+import asyncio
+import os
+import time
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Optional, Dict, Any, Tuple
+
 from loguru import logger
-from typing import Optional, Dict, Any
+
+if TYPE_CHECKING:
+    import httpx
+
+
+class _RateLimiter:
+    """Token bucket assíncrono para as chamadas de saída ao CFP."""
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated_at = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self, timeout: float) -> bool:
+        deadline = time.monotonic() + timeout
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated_at) * self.rate)
+                self._updated_at = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return True
+                wait = (1 - self._tokens) / self.rate
+                if now + wait > deadline:
+                    return False
+                await asyncio.sleep(wait)
+
 
 class CFPService:
     BASE_URL = "https://cadastro.cfp.org.br/api/profissionais/pesquisar"
-    
-    @staticmethod
-    async def validate_crp(registro: str, uf: str) -> Dict[str, Any]:
+
+    HEADERS = {
+        "Content-Type": "application/json",
+        "Referer": "https://cadastro.cfp.org.br/",
+        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
+    }
+
+    # Resultado válido muda raramente; "não encontrado" expira antes (registro pode ser recém-emitido)
+    CACHE_TTL = float(os.getenv("CFP_CACHE_TTL", str(24 * 3600)))
+    NEGATIVE_CACHE_TTL = float(os.getenv("CFP_NEGATIVE_CACHE_TTL", "600"))
+    CACHE_MAX_ENTRIES = 2048
+    RATE_LIMIT_PER_SECOND = float(os.getenv("CFP_RATE_LIMIT_PER_SECOND", "2"))
+    RATE_LIMIT_BURST = int(os.getenv("CFP_RATE_LIMIT_BURST", "5"))
+    RATE_LIMIT_MAX_WAIT = 5.0
+
+    _client: Optional["httpx.AsyncClient"] = None
+    _rate_limiter: Optional[_RateLimiter] = None
+    _cache: "OrderedDict[Tuple[str, str], Tuple[float, Dict[str, Any]]]" = OrderedDict()
+    _inflight: Dict[Tuple[str, str], "asyncio.Future"] = {}
+    upstream_calls = 0
+
+    @classmethod
+    def _get_client(cls) -> "httpx.AsyncClient":
+        # Cliente único com pool de conexões: evita um handshake TLS por consulta
+        if cls._client is None or cls._client.is_closed:
+            import httpx  # import tardio: pesa no cold start e só é usado aqui
+
+            cls._client = httpx.AsyncClient(
+                headers=cls.HEADERS,
+                timeout=10.0,
+                limits=httpx.Limits(max_connections=10, max_keepalive_connections=5),
+            )
+        return cls._client
+
+    @classmethod
+    def _get_rate_limiter(cls) -> _RateLimiter:
+        if cls._rate_limiter is None:
+            cls._rate_limiter = _RateLimiter(cls.RATE_LIMIT_PER_SECOND, cls.RATE_LIMIT_BURST)
+        return cls._rate_limiter
+
+    @classmethod
+    async def aclose(cls) -> None:
+        """Fecha o pool de conexões (shutdown da aplicação)."""
+        if cls._client is not None:
+            await cls._client.aclose()
+        cls._client = None
+        cls._rate_limiter = None
+
+    @classmethod
+    def clear_cache(cls) -> None:
+        cls._cache.clear()
+
+    @classmethod
+    def _cache_get(cls, key: Tuple[str, str]) -> Optional[Dict[str, Any]]:
+        entry = cls._cache.get(key)
+        if entry is None:
+            return None
+        expires_at, result = entry
+        if expires_at <= time.monotonic():
+            cls._cache.pop(key, None)
+            return None
+        cls._cache.move_to_end(key)
+        return result
+
+    @classmethod
+    def _cache_set(cls, key: Tuple[str, str], result: Dict[str, Any]) -> None:
+        if result["valid"]:
+            ttl = cls.CACHE_TTL
+        elif result.get("not_found"):
+            ttl = cls.NEGATIVE_CACHE_TTL
+        else:
+            # Falhas transitórias (status != 200, rede) não são cacheadas
+            return
+        cls._cache[key] = (time.monotonic() + ttl, result)
+        cls._cache.move_to_end(key)
+        while len(cls._cache) > cls.CACHE_MAX_ENTRIES:
+            cls._cache.popitem(last=False)
+
+    @classmethod
+    async def validate_crp(cls, registro: str, uf: str) -> Dict[str, Any]:
         """
         Consulta o Cadastro Nacional de Psicólogos do CFP.
+        Resultados ficam em cache (TTL menor para "não encontrado") e consultas
+        simultâneas ao mesmo CRP compartilham uma única chamada externa.
         """
         # Limpa o registro para remover pontos, traços ou barras se vierem do frontend
         registro_clean = "".join(filter(str.isdigit, registro))
         uf_clean = "".join(filter(str.isdigit, uf)) # Assume que UF pode vir como "04"
-        
-        headers = {
-            "Content-Type": "application/json",
-            "Referer": "https://cadastro.cfp.org.br/",
-            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
-        }
-        
+        key = (uf_clean, registro_clean)
+
+        cached = cls._cache_get(key)
+        if cached is not None:
+            return cached
+
+        pending = cls._inflight.get(key)
+        if pending is not None:
+            return await asyncio.shield(pending)
+
+        future = asyncio.get_running_loop().create_future()
+        cls._inflight[key] = future
+        try:
+            result = await cls._fetch(registro_clean, uf_clean)
+            cls._cache_set(key, result)
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            future.set_exception(e)
+            # Evita "Future exception was never retrieved" quando ninguém mais esperava
+            future.exception()
+            raise
+        finally:
+            cls._inflight.pop(key, None)
+
+    @classmethod
+    async def _fetch(cls, registro_clean: str, uf_clean: str) -> Dict[str, Any]:
         payload = {
             "registro": registro_clean,
             "uf": uf_clean
         }
-        
+
+        if not await cls._get_rate_limiter().acquire(timeout=cls.RATE_LIMIT_MAX_WAIT):
+            logger.warning("Limite de consultas ao CFP atingido")
+            return {"valid": False, "error": "Serviço de consulta CFP temporariamente indisponível"}
+
         logger.info(f"Consultando CFP para CRP {registro_clean} na região {uf_clean}")
-        
+        cls.upstream_calls += 1
+
         try:
-            async with httpx.AsyncClient() as client:
-                # Nota: Este endpoint pode variar ou requerer tokens. 
-                # Se falhar 404, precisaremos do endpoint exato do portal de transparência.
-                response = await client.post(CFPService.BASE_URL, json=payload, headers=headers, timeout=10.0)
-                
-                if response.status_code == 200:
-                    data = response.json()
-                    # A estrutura comum retornada é uma lista de profissionais
-                    # Exemplo: [{"situacao": "ATIVO", "Nome": "ISA LETICIA MELO", ...}]
-                    if isinstance(data, list) and len(data) > 0:
-                        prof = data[0]
-                        return {
-                            "valid": True,
-                            "name": prof.get("Nome"),
-                            "status": prof.get("situacao"),
-                            "region": prof.get("nomeregional"),
-                            "raw": prof
-                        }
-                    return {"valid": False, "error": "Profissional não encontrado no CFP"}
-                
-                logger.warning(f"CFP API retornou status {response.status_code}")
-                return {"valid": False, "error": f"Erro na consulta externa (Status {response.status_code})"}
-                
+            # Nota: Este endpoint pode variar ou requerer tokens.
+            # Se falhar 404, precisaremos do endpoint exato do portal de transparência.
+            response = await cls._get_client().post(cls.BASE_URL, json=payload)
+
+            if response.status_code == 200:
+                data = response.json()
+                # A estrutura comum retornada é uma lista de profissionais
+                # Exemplo: [{"situacao": "ATIVO", "Nome": "ISA LETICIA MELO", ...}]
+                if isinstance(data, list) and len(data) > 0:
+                    prof = data[0]
+                    return {
+                        "valid": True,
+                        "name": prof.get("Nome"),
+                        "status": prof.get("situacao"),
+                        "region": prof.get("nomeregional"),
+                        "raw": prof
+                    }
+                return {"valid": False, "not_found": True, "error": "Profissional não encontrado no CFP"}
+
+            logger.warning(f"CFP API retornou status {response.status_code}")
+            return {"valid": False, "error": f"Erro na consulta externa (Status {response.status_code})"}
+
         except Exception as e:
             logger.error(f"Erro ao consultar CFP: {e}")
             return {"valid": False, "error": "Serviço de consulta CFP temporariamente indisponível"}
@@ -0,0 +1,115 @@
+import os
+import threading
+import time
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, Dict, List, Tuple
+
+from ..db import get_supabase_client
+
+# Horário de Brasília, mesmo critério de mês usado pelo trigger (financial_rollups_migration.sql)
+LOCAL_TZ = timezone(timedelta(hours=-3))
+
+COUNTER_FIELDS = ("appointments_count", "completed_count", "cancelled_count", "no_show_count")
+AMOUNT_FIELDS = ("billed_amount", "paid_amount", "pending_amount")
+
+
+def _month_start(value: date, months_back: int = 0) -> date:
+    month_index = value.year * 12 + value.month - 1 - months_back
+    return date(month_index // 12, month_index % 12 + 1, 1)
+
+
+def _figures(row: Dict[str, Any]) -> Dict[str, Any]:
+    """Normaliza uma linha de rollup e calcula a taxa de faltas (faltas / consultas realizadas ou faltadas)."""
+    figures = {field: int(row.get(field) or 0) for field in COUNTER_FIELDS}
+    figures.update({field: round(float(row.get(field) or 0), 2) for field in AMOUNT_FIELDS})
+    attended_or_missed = figures["completed_count"] + figures["no_show_count"]
+    figures["no_show_rate"] = round(figures["no_show_count"] / attended_or_missed, 4) if attended_or_missed else 0.0
+    return figures
+
+
+class FinancialService:
+    """Resumo financeiro lido dos rollups mantidos por trigger; nunca varre appointments."""
+
+    MONTHLY_TABLE = "financial_monthly_rollups"
+    PATIENT_TABLE = "financial_patient_rollups"
+    CACHE_TTL = float(os.getenv("FINANCIAL_CACHE_TTL", "30"))
+    MAX_MONTHS = 36
+    MAX_PATIENTS = 100
+
+    # (user_id, months) -> (expira_em, resumo)
+    _cache: Dict[Tuple[str, int], Tuple[float, Dict[str, Any]]] = {}
+    _lock = threading.Lock()
+
+    @classmethod
+    def invalidate(cls, user_id: str) -> None:
+        with cls._lock:
+            for key in [k for k in cls._cache if k[0] == user_id]:
+                cls._cache.pop(key, None)
+
+    @classmethod
+    def get_summary(cls, user_id: str, months: int = 12) -> Dict[str, Any]:
+        months = max(1, min(months, cls.MAX_MONTHS))
+        key = (user_id, months)
+        with cls._lock:
+            cached = cls._cache.get(key)
+            if cached is not None and cached[0] > time.monotonic():
+                return cached[1]
+
+        summary = cls._build_summary(user_id, months)
+        with cls._lock:
+            cls._cache[key] = (time.monotonic() + cls.CACHE_TTL, summary)
+        return summary
+
+    @classmethod
+    def _build_summary(cls, user_id: str, months: int) -> Dict[str, Any]:
+        supabase = get_supabase_client()
+        current_month = _month_start(datetime.now(LOCAL_TZ).date())
+        first_month = _month_start(current_month, months - 1)
+
+        # Uma linha por mês (PK user_id, month): o custo não depende do histórico
+        monthly = (
+            supabase.table(cls.MONTHLY_TABLE)
+            .select("*")
+            .eq("user_id", user_id)
+            .gte("month", first_month.isoformat())
+            .lte("month", current_month.isoformat())
+            .execute()
+        )
+        by_month = {row["month"]: row for row in monthly.data or []}
+        month_list = []
+        for offset in range(months - 1, -1, -1):
+            month = _month_start(current_month, offset)
+            month_list.append({"month": month, **_figures(by_month.get(month.isoformat(), {}))})
+
+        patients = (
+            supabase.table(cls.PATIENT_TABLE)
+            .select("*")
+            .eq("user_id", user_id)
+            .gt("appointments_count", 0)
+            .order("pending_amount", desc=True)
+            .order("billed_amount", desc=True)
+            .limit(cls.MAX_PATIENTS)
+            .execute()
+        )
+        patient_rows = patients.data or []
+        names = {}
+        if patient_rows:
+            res = (
+                supabase.table("patients")
+                .select("id, name")
+                .in_("id", [row["patient_id"] for row in patient_rows])
+                .execute()
+            )
+            names = {p["id"]: p["name"] for p in res.data or []}
+
+        patient_list: List[Dict[str, Any]] = [
+            {"patient_id": row["patient_id"], "patient_name": names.get(row["patient_id"]), **_figures(row)}
+            for row in patient_rows
+            if row["patient_id"] in names  # paciente excluído: rollup zerado fica para trás
+        ]
+
+        return {
+            "month_to_date": month_list[-1],
+            "months": month_list,
+            "patients": patient_list,
+        }
@@ -0,0 +1,222 @@
+import asyncio
+import codecs
+import csv
+import re
+import unicodedata
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+from fastapi import HTTPException
+from loguru import logger
+
+from ..db import get_supabase_client
+
+# Sem vírgulas/parênteses/aspas: os e-mails vão direto no filtro email.in.(...) do PostgREST
+_EMAIL_RE = re.compile(r'^[^@\s,;()"<>]+@[^@\s,;()"<>]+\.[^@\s,;()"<>]+$')
+
+# Cabeçalhos aceitos (sem acento, minúsculos) -> campo do paciente
+HEADER_ALIASES = {
+    "nome": "name", "name": "name", "paciente": "name", "nome completo": "name",
+    "email": "email", "e-mail": "email", "e mail": "email",
+    "telefone": "phone", "phone": "phone", "celular": "phone", "whatsapp": "phone", "fone": "phone",
+    "observacoes": "notes", "observacao": "notes", "notas": "notes", "notes": "notes",
+}
+
+
+def normalize_email(value: Optional[str]) -> Optional[str]:
+    """E-mail em minúsculas e sem espaços; None se vazio. Levanta ValueError se inválido."""
+    email = (value or "").strip().lower()
+    if not email:
+        return None
+    if not _EMAIL_RE.match(email):
+        raise ValueError("E-mail inválido")
+    return email
+
+
+def normalize_phone(value: Optional[str]) -> Optional[str]:
+    """Só dígitos, DDD + número (10 ou 11 dígitos), sem o +55. Levanta ValueError se inválido."""
+    digits = re.sub(r"\D", "", value or "")
+    if not digits:
+        return None
+    if len(digits) in (12, 13) and digits.startswith("55"):
+        digits = digits[2:]
+    if len(digits) not in (10, 11):
+        raise ValueError("Telefone inválido (use DDD + número)")
+    return digits
+
+
+def _header_key(value: str) -> str:
+    plain = unicodedata.normalize("NFKD", value).encode("ascii", "ignore").decode()
+    return plain.strip().lower()
+
+
+class PatientImportService:
+    """Importação de pacientes via CSV em lotes, com deduplicação por e-mail/telefone."""
+
+    BATCH_SIZE = 500
+    MAX_ROWS = 10000
+
+    @staticmethod
+    async def iter_csv_records(chunks: AsyncIterator[bytes]) -> AsyncIterator[List[str]]:
+        """
+        Converte o corpo da requisição (bytes chegando aos poucos) em registros CSV sem
+        carregar o arquivo inteiro. Linhas com aspas em aberto (campo com quebra de linha)
+        são acumuladas até o registro fechar. Aceita ',' ou ';' (Excel pt-BR).
+        """
+        decoder = codecs.getincrementaldecoder("utf-8-sig")(errors="replace")
+        pending, record, delimiter = "", "", None
+        final = False
+        while not final:
+            try:
+                pending += decoder.decode(await chunks.__anext__())
+            except StopAsyncIteration:
+                pending += decoder.decode(b"", final=True)
+                final = True
+            lines = pending.splitlines(keepends=True)
+            pending = "" if final or not lines or lines[-1].endswith(("\n", "\r")) else lines.pop()
+            for line in lines:
+                record += line
+                if record.count('"') % 2:
+                    continue  # campo entre aspas continua na próxima linha
+                if record.strip():
+                    if delimiter is None:
+                        delimiter = ";" if record.count(";") > record.count(",") else ","
+                    yield next(csv.reader([record], delimiter=delimiter))
+                record = ""
+        if record.strip():
+            yield next(csv.reader([record], delimiter=delimiter or ","))
+
+    @classmethod
+    async def import_csv(cls, user_id: str, chunks: AsyncIterator[bytes]) -> Dict[str, Any]:
+        report: List[Dict[str, Any]] = []
+        seen_emails: Dict[str, int] = {}
+        seen_phones: Dict[str, int] = {}
+        batch: List[Tuple[int, Dict[str, Any]]] = []
+        columns: Optional[List[Optional[str]]] = None
+        row_number = 0
+        truncated = False
+
+        async for record in cls.iter_csv_records(chunks):
+            if columns is None:
+                columns = [HEADER_ALIASES.get(_header_key(h)) for h in record]
+                if "name" not in columns:
+                    raise HTTPException(status_code=400, detail="CSV sem coluna de nome (ex: nome,email,telefone)")
+                continue
+
+            if row_number >= cls.MAX_ROWS:
+                # Os lotes anteriores já foram gravados: para aqui e devolve o relatório
+                # parcial (truncated) em vez de um erro que esconderia o que foi importado
+                truncated = True
+                break
+            row_number += 1
+
+            raw = {field: value for field, value in zip(columns, record) if field}
+            try:
+                patient = cls._normalize_row(raw)
+            except ValueError as e:
+                report.append({"row": row_number, "status": "invalid", "error": str(e)})
+                continue
+
+            first_seen = (
+                seen_emails.get(patient["email"]) if patient["email"]
+                else seen_phones.get(patient["phone"]) if patient["phone"] else None
+            )
+            if first_seen is not None:
+                report.append({"row": row_number, "status": "duplicate", "error": f"Repetido da linha {first_seen}"})
+                continue
+            if patient["email"]:
+                seen_emails[patient["email"]] = row_number
+            if patient["phone"]:
+                seen_phones.setdefault(patient["phone"], row_number)
+
+            batch.append((row_number, patient))
+            if len(batch) >= cls.BATCH_SIZE:
+                report.extend(await asyncio.to_thread(cls._import_batch, user_id, batch))
+                batch = []
+
+        if columns is None:
+            raise HTTPException(status_code=400, detail="Arquivo CSV vazio")
+        if batch:
+            report.extend(await asyncio.to_thread(cls._import_batch, user_id, batch))
+
+        report.sort(key=lambda r: r["row"])
+        counts = {status: 0 for status in ("created", "existing", "duplicate", "invalid")}
+        for entry in report:
+            counts[entry["status"]] += 1
+        if truncated:
+            logger.warning(f"Importação de pacientes truncada em {cls.MAX_ROWS} linhas")
+        logger.info(f"Importação de pacientes: {counts}")
+        return {"total_rows": row_number, **counts, "truncated": truncated, "rows": report}
+
+    @staticmethod
+    def _normalize_row(raw: Dict[str, str]) -> Dict[str, Any]:
+        name = " ".join((raw.get("name") or "").split())
+        if not name:
+            raise ValueError("Nome obrigatório")
+        return {
+            "name": name,
+            "email": normalize_email(raw.get("email")),
+            "phone": normalize_phone(raw.get("phone")),
+            "notes": (raw.get("notes") or "").strip() or None,
+        }
+
+    @classmethod
+    def _import_batch(cls, user_id: str, batch: List[Tuple[int, Dict[str, Any]]]) -> List[Dict[str, Any]]:
+        """Um SELECT para achar os que já existem e um INSERT ... ON CONFLICT DO NOTHING para o resto."""
+        supabase = get_supabase_client()
+        emails = [p["email"] for _, p in batch if p["email"]]
+        phones = [p["phone"] for _, p in batch if not p["email"] and p["phone"]]
+
+        existing_by_email: Dict[str, str] = {}
+        existing_by_phone: Dict[str, str] = {}
+        if emails or phones:
+            conditions = []
+            if emails:
+                conditions.append(f"email.in.({','.join(emails)})")
+            if phones:
+                conditions.append(f"phone.in.({','.join(phones)})")
+            res = (
+                supabase.table("patients")
+                .select("id, email, phone")
+                .eq("user_id", user_id)
+                .or_(",".join(conditions))
+                .execute()
+            )
+            for row in res.data or []:
+                if row.get("email"):
+                    existing_by_email[row["email"]] = row["id"]
+                if row.get("phone"):
+                    existing_by_phone.setdefault(row["phone"], row["id"])
+
+        report, to_insert = [], []
+        for row_number, patient in batch:
+            existing_id = (
+                existing_by_email.get(patient["email"]) if patient["email"]
+                else existing_by_phone.get(patient["phone"]) if patient["phone"] else None
+            )
+            if existing_id:
+                report.append({"row": row_number, "status": "existing", "patient_id": existing_id})
+            else:
+                to_insert.append((row_number, patient))
+
+        if to_insert:
+            # ON CONFLICT (user_id, email) DO NOTHING: uma importação concorrente não duplica
+            res = (
+                supabase.table("patients")
+                .upsert(
+                    [{"user_id": user_id, **patient} for _, patient in to_insert],
+                    on_conflict="user_id,email",
+                    ignore_duplicates=True,
+                )
+                .execute()
+            )
+            created_by_email = {row["email"]: row["id"] for row in res.data or [] if row.get("email")}
+            created_without_email = [row["id"] for row in res.data or [] if not row.get("email")]
+            for row_number, patient in to_insert:
+                if patient["email"]:
+                    patient_id = created_by_email.get(patient["email"])
+                    status = "created" if patient_id else "existing"
+                else:
+                    # Sem e-mail não há conflito possível: o retorno vem na ordem do envio
+                    patient_id, status = created_without_email.pop(0), "created"
+                report.append({"row": row_number, "status": status, "patient_id": patient_id})
+        return report
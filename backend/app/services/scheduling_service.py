@@ -0,0 +1,384 @@
+import bisect
+import os
+import threading
+import time
+import uuid
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from fastapi import HTTPException
+from loguru import logger
+
+from ..db import get_supabase_client
+from .financial_service import FinancialService
+
+# Horário de Brasília (sem horário de verão desde 2019), mesmo offset usado em tools.py
+LOCAL_TZ = timezone(timedelta(hours=-3))
+
+Interval = Tuple[datetime, datetime, str]  # (início, fim, appointment_id), fim exclusivo
+
+# Frequência -> intervalo em semanas (equivalente a RRULE FREQ=WEEKLY;INTERVAL=n)
+RECURRENCE_INTERVALS = {"weekly": 1, "biweekly": 2}
+MAX_OCCURRENCES = 60
+
+
+def _parse_hhmm(value: str) -> timedelta:
+    hours, minutes = value.split(":")
+    return timedelta(hours=int(hours), minutes=int(minutes))
+
+
+def _parse_dt(value: str) -> datetime:
+    # PostgREST devolve "2026-10-18T13:00:00+00:00"; versões antigas do Python não aceitam "Z"
+    return datetime.fromisoformat(value.replace("Z", "+00:00"))
+
+
+def expand_occurrences(
+    first: datetime,
+    frequency: str,
+    count: Optional[int] = None,
+    until: Optional[date] = None,
+    exceptions: Iterable[date] = (),
+) -> List[datetime]:
+    """
+    Expande uma recorrência semanal/quinzenal a partir de `first`, como RRULE
+    COUNT/UNTIL + EXDATE: `count` inclui as datas de exceção, que só são removidas
+    do resultado. `until` é inclusivo (data local).
+    """
+    if frequency not in RECURRENCE_INTERVALS:
+        raise HTTPException(status_code=400, detail="Frequência inválida (use weekly ou biweekly)")
+    if count is None and until is None:
+        raise HTTPException(status_code=400, detail="Informe o número de ocorrências ou a data final")
+
+    step = timedelta(weeks=RECURRENCE_INTERVALS[frequency])
+    skip = set(exceptions)
+    occurrences = []
+    current, generated = first, 0
+    while (count is None or generated < count) and (until is None or current.astimezone(LOCAL_TZ).date() <= until):
+        generated += 1
+        if generated > MAX_OCCURRENCES:
+            raise HTTPException(status_code=400, detail=f"Recorrência limitada a {MAX_OCCURRENCES} ocorrências")
+        if current.astimezone(LOCAL_TZ).date() not in skip:
+            occurrences.append(current)
+        current += step
+    return occurrences
+
+
+class TherapistCalendar:
+    """
+    Intervalos ocupados de um terapeuta, ordenados por início.
+    A constraint do banco garante que não se sobrepõem, então conflito e
+    lacunas saem com bisect em O(log n + k).
+    """
+
+    def __init__(self, intervals: Optional[List[Interval]] = None):
+        self._intervals: List[Interval] = sorted(intervals or [])
+        self._starts: List[datetime] = [i[0] for i in self._intervals]
+
+    def __len__(self) -> int:
+        return len(self._intervals)
+
+    def add(self, start: datetime, end: datetime, appointment_id: str) -> None:
+        idx = bisect.bisect_right(self._starts, start)
+        self._starts.insert(idx, start)
+        self._intervals.insert(idx, (start, end, appointment_id))
+
+    def conflicts(self, start: datetime, end: datetime) -> List[Interval]:
+        """Intervalos que se sobrepõem a [start, end)."""
+        idx = bisect.bisect_left(self._starts, end)
+        found = []
+        # Anda para trás a partir do último início < end até achar um que termina antes
+        while idx > 0:
+            idx -= 1
+            interval = self._intervals[idx]
+            if interval[1] <= start:
+                break
+            found.append(interval)
+        found.reverse()
+        return found
+
+    def free_slots(
+        self,
+        window_start: datetime,
+        window_end: datetime,
+        duration: timedelta,
+        step: timedelta,
+    ) -> List[Tuple[datetime, datetime]]:
+        """Horários livres de tamanho `duration` dentro da janela, alinhados em `step` a partir do início dela."""
+        slots = []
+        idx = max(bisect.bisect_left(self._starts, window_start) - 1, 0)
+        cursor = window_start
+        while cursor + duration <= window_end:
+            # Pula intervalos que já terminaram antes do cursor
+            while idx < len(self._intervals) and self._intervals[idx][1] <= cursor:
+                idx += 1
+            if idx < len(self._intervals) and self._intervals[idx][0] < cursor + duration:
+                # Conflita: avança para o próximo passo da grade depois do fim da consulta
+                busy_end = self._intervals[idx][1]
+                steps = -(-(busy_end - window_start) // step)  # arredonda para cima
+                cursor = window_start + steps * step
+                continue
+            slots.append((cursor, cursor + duration))
+            cursor += step
+        return slots
+
+
+class SchedulingService:
+    """Agenda por terapeuta: criação sem sobreposição e busca de horários livres em memória."""
+
+    TABLE = "appointments"
+    CANCELLED = "cancelled"
+
+    WORK_START = _parse_hhmm(os.getenv("SCHEDULING_WORK_START", "08:00"))
+    WORK_END = _parse_hhmm(os.getenv("SCHEDULING_WORK_END", "20:00"))
+    # 0 = segunda ... 6 = domingo
+    WORK_DAYS = {int(d) for d in os.getenv("SCHEDULING_WORK_DAYS", "0,1,2,3,4").split(",") if d.strip()}
+    SLOT_STEP_MINUTES = int(os.getenv("SCHEDULING_SLOT_STEP_MINUTES", "30"))
+    MAX_DAYS = 60
+    CACHE_TTL = float(os.getenv("SCHEDULING_CACHE_TTL", "60"))
+
+    # user_id -> (carregado_em, calendário com consultas de agora até MAX_DAYS)
+    _calendars: Dict[str, Tuple[float, TherapistCalendar]] = {}
+    _lock = threading.Lock()
+
+    @staticmethod
+    def to_local(value) -> datetime:
+        """Datetime (ou ISO string do PostgREST) no horário de Brasília."""
+        if isinstance(value, str):
+            value = _parse_dt(value)
+        return value.astimezone(LOCAL_TZ)
+
+    @classmethod
+    def invalidate(cls, user_id: str) -> None:
+        with cls._lock:
+            cls._calendars.pop(user_id, None)
+
+    @classmethod
+    def _fetch_calendar(cls, user_id: str, start: datetime, end: datetime) -> TherapistCalendar:
+        """Consultas ativas do terapeuta que podem se sobrepor a [start, end), numa única query."""
+        supabase = get_supabase_client()
+        res = (
+            supabase.table(cls.TABLE)
+            .select("id, appointment_date, duration_minutes")
+            .eq("user_id", user_id)
+            .neq("status", cls.CANCELLED)
+            # Consultas que começaram até 1 dia antes ainda podem estar em andamento
+            .gte("appointment_date", (start - timedelta(days=1)).isoformat())
+            .lt("appointment_date", end.isoformat())
+            .order("appointment_date")
+            .execute()
+        )
+        intervals = []
+        for row in res.data or []:
+            begin = _parse_dt(row["appointment_date"])
+            intervals.append((begin, begin + timedelta(minutes=row.get("duration_minutes") or 50), row["id"]))
+        return TherapistCalendar(intervals)
+
+    @classmethod
+    def _load(cls, user_id: str) -> TherapistCalendar:
+        now = datetime.now(timezone.utc)
+        return cls._fetch_calendar(user_id, now, now + timedelta(days=cls.MAX_DAYS + 1))
+
+    @classmethod
+    def get_calendar(cls, user_id: str) -> TherapistCalendar:
+        with cls._lock:
+            cached = cls._calendars.get(user_id)
+            if cached is not None and time.monotonic() - cached[0] < cls.CACHE_TTL:
+                return cached[1]
+        calendar = cls._load(user_id)
+        with cls._lock:
+            cls._calendars[user_id] = (time.monotonic(), calendar)
+        return calendar
+
+    @classmethod
+    def find_free_slots(
+        cls,
+        user_id: str,
+        days: int = 7,
+        duration_minutes: int = 50,
+        limit: int = 20,
+        now: Optional[datetime] = None,
+    ) -> List[Tuple[datetime, datetime]]:
+        """Próximos horários livres no expediente (horário de Brasília) dos próximos `days` dias."""
+        if not 1 <= days <= cls.MAX_DAYS:
+            raise HTTPException(status_code=400, detail=f"Período deve ser entre 1 e {cls.MAX_DAYS} dias")
+        if not 10 <= duration_minutes <= 240:
+            raise HTTPException(status_code=400, detail="Duração deve ser entre 10 e 240 minutos")
+
+        calendar = cls.get_calendar(user_id)
+        now = (now or datetime.now(timezone.utc)).astimezone(LOCAL_TZ)
+        duration = timedelta(minutes=duration_minutes)
+        step = timedelta(minutes=cls.SLOT_STEP_MINUTES)
+
+        slots: List[Tuple[datetime, datetime]] = []
+        day = now.replace(hour=0, minute=0, second=0, microsecond=0)
+        for _ in range(days):
+            if day.weekday() in cls.WORK_DAYS:
+                window_start = day + cls.WORK_START
+                if now > window_start:
+                    # Hoje: começa no próximo passo da grade depois de agora
+                    window_start += -(-(now - window_start) // step) * step
+                slots.extend(calendar.free_slots(window_start, day + cls.WORK_END, duration, step))
+                if len(slots) >= limit:
+                    return slots[:limit]
+            day += timedelta(days=1)
+        return slots
+
+    @classmethod
+    def create_appointment(
+        cls,
+        user_id: str,
+        patient_id: str,
+        start: datetime,
+        duration_minutes: int = 50,
+        price: float = 0.0,
+        notes: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        """Cria a consulta. 409 se o horário conflitar com outra consulta ativa do terapeuta."""
+        if start.tzinfo is None:
+            start = start.replace(tzinfo=LOCAL_TZ)
+        end = start + timedelta(minutes=duration_minutes)
+        cls._ensure_patient(user_id, patient_id)
+
+        # Checagem rápida em memória; a constraint do banco é quem garante de fato
+        calendar = cls.get_calendar(user_id)
+        if calendar.conflicts(start, end):
+            raise HTTPException(status_code=409, detail="Horário indisponível: conflita com outro agendamento")
+
+        data = {
+            "user_id": user_id,
+            "patient_id": patient_id,
+            "appointment_date": start.isoformat(),
+            "duration_minutes": duration_minutes,
+            "price": price,
+            "status": "scheduled",
+            "payment_status": "pending",
+            "notes": notes,
+        }
+        try:
+            res = get_supabase_client().table(cls.TABLE).insert(data).execute()
+        except Exception as e:
+            cls._raise_if_overlap(user_id, e)
+            raise
+
+        appointment = res.data[0]
+        FinancialService.invalidate(user_id)
+        with cls._lock:
+            cached = cls._calendars.get(user_id)
+            if cached is not None and cached[1] is calendar:
+                calendar.add(start, end, appointment["id"])
+        return appointment
+
+    @classmethod
+    def create_recurring_appointments(
+        cls,
+        user_id: str,
+        patient_id: str,
+        first: datetime,
+        frequency: str = "weekly",
+        duration_minutes: int = 50,
+        price: float = 0.0,
+        notes: Optional[str] = None,
+        count: Optional[int] = None,
+        until: Optional[date] = None,
+        exceptions: Iterable[date] = (),
+        skip_conflicts: bool = False,
+    ) -> Dict[str, Any]:
+        """
+        Cria todas as ocorrências de uma recorrência com uma query de conflitos e um
+        único INSERT (atômico: se a constraint barrar uma linha, nenhuma é criada).
+        Com `skip_conflicts`, ocorrências em horários ocupados são puladas e devolvidas em `skipped`;
+        sem ele, qualquer conflito resulta em 409.
+        """
+        if first.tzinfo is None:
+            first = first.replace(tzinfo=LOCAL_TZ)
+        occurrences = expand_occurrences(first, frequency, count, until, exceptions)
+        if not occurrences:
+            raise HTTPException(status_code=400, detail="A recorrência não gera nenhuma ocorrência")
+        cls._ensure_patient(user_id, patient_id)
+
+        duration = timedelta(minutes=duration_minutes)
+        existing = cls._fetch_calendar(user_id, occurrences[0], occurrences[-1] + duration)
+        free, skipped = [], []
+        for start in occurrences:
+            (skipped if existing.conflicts(start, start + duration) else free).append(start)
+        if skipped and not skip_conflicts:
+            dates = ", ".join(s.astimezone(LOCAL_TZ).strftime("%d/%m %H:%M") for s in skipped)
+            raise HTTPException(status_code=409, detail=f"Horários indisponíveis: {dates}")
+
+        recurrence_id = str(uuid.uuid4())
+        created = []
+        if free:
+            rows = [
+                {
+                    "user_id": user_id,
+                    "patient_id": patient_id,
+                    "appointment_date": start.isoformat(),
+                    "duration_minutes": duration_minutes,
+                    "price": price,
+                    "status": "scheduled",
+                    "payment_status": "pending",
+                    "notes": notes,
+                    "recurrence_id": recurrence_id,
+                }
+                for start in free
+            ]
+            try:
+                res = get_supabase_client().table(cls.TABLE).insert(rows).execute()
+            except Exception as e:
+                cls._raise_if_overlap(user_id, e)
+                raise
+            created = res.data or []
+            cls.invalidate(user_id)
+            FinancialService.invalidate(user_id)
+
+        logger.info(f"Recorrência {recurrence_id}: {len(created)} criada(s), {len(skipped)} pulada(s)")
+        return {"recurrence_id": recurrence_id, "created": created, "skipped": skipped}
+
+    @classmethod
+    def update_appointment(cls, user_id: str, appointment_id: str, updates: Dict[str, Any]) -> Dict[str, Any]:
+        """Atualiza status/pagamento/horário. Reagendamentos passam pela mesma constraint."""
+        updates = dict(updates)
+        for key, value in updates.items():
+            if isinstance(value, datetime):
+                updates[key] = (value if value.tzinfo else value.replace(tzinfo=LOCAL_TZ)).isoformat()
+
+        supabase = get_supabase_client()
+        try:
+            res = (
+                supabase.table(cls.TABLE)
+                .update(updates)
+                .eq("id", appointment_id)
+                .eq("user_id", user_id)
+                .execute()
+            )
+        except Exception as e:
+            cls._raise_if_overlap(user_id, e)
+            raise
+
+        if not res.data:
+            raise HTTPException(status_code=404, detail="Agendamento não encontrado")
+        FinancialService.invalidate(user_id)
+        if {"status", "appointment_date", "duration_minutes"} & updates.keys():
+            cls.invalidate(user_id)
+        return res.data[0]
+
+    @classmethod
+    def _ensure_patient(cls, user_id: str, patient_id: str) -> None:
+        patient = (
+            get_supabase_client()
+            .table("patients")
+            .select("id")
+            .eq("id", patient_id)
+            .eq("user_id", user_id)
+            .execute()
+        )
+        if not patient.data:
+            raise HTTPException(status_code=404, detail="Paciente não encontrado")
+
+    @classmethod
+    def _raise_if_overlap(cls, user_id: str, error: Exception) -> None:
+        # 23P01 = exclusion_violation (appointments_no_overlap): outra escrita ganhou a corrida
+        if getattr(error, "code", None) == "23P01":
+            logger.info("Conflito de agenda barrado pela constraint")
+            cls.invalidate(user_id)
+            raise HTTPException(status_code=409, detail="Horário indisponível: conflita com outro agendamento")
@@ -0,0 +1,103 @@
+import hashlib
+import json
+import os
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional, Tuple
+
+from loguru import logger
+
+from ..db import get_supabase_client
+
+# Campos da sessão que entram no prompt de generate_clinical_record_content:
+# se algum mudar, o documento salvo deixa de valer
+SOURCE_FIELDS = ("transcription", "registro_descritivo", "hipoteses_clinicas", "direcoes_intervencao")
+
+
+class SessionDocumentService:
+    """
+    Conteúdo de documentos CFP já gerado por sessão (tabela session_documents).
+    Serve de cache para GET /session/{id}/record e guarda o registro documental
+    pré-gerado em background logo depois que a sessão é salva.
+    """
+
+    TABLE = "session_documents"
+    PREFETCH_DOCUMENT_TYPE = "registro_documental"
+    PREFETCH_ENABLED = os.getenv("PREFETCH_RECORDS", "1") == "1"
+    PREFETCH_JOB_PRIORITY = 500  # abaixo de qualquer job pedido pelo usuário (default 100)
+    # Limites de custo da geração especulativa (por dia, horário UTC)
+    PREFETCH_DAILY_LIMIT_PER_USER = int(os.getenv("PREFETCH_DAILY_LIMIT_PER_USER", "15"))
+    PREFETCH_DAILY_LIMIT = int(os.getenv("PREFETCH_DAILY_LIMIT", "1000"))
+    PREFETCH_MAX_SOURCE_CHARS = int(os.getenv("PREFETCH_MAX_SOURCE_CHARS", "40000"))
+    _LIMIT_REASONS = {"user_limit": "limite diário do terapeuta", "global_limit": "limite diário global"}
+
+    @staticmethod
+    def fingerprint(session: Dict[str, Any], patient: Dict[str, Any], approach: str, document_type: str) -> str:
+        source = {field: session.get(field) for field in SOURCE_FIELDS}
+        source.update(patient_name=patient.get("name"), approach=approach, document_type=document_type)
+        return hashlib.sha256(json.dumps(source, sort_keys=True, default=str).encode()).hexdigest()
+
+    @classmethod
+    def get(cls, session_id: str, document_type: str, fingerprint: str) -> Optional[Dict[str, Any]]:
+        """Conteúdo salvo, se ainda corresponder aos dados atuais da sessão."""
+        res = (
+            get_supabase_client()
+            .table(cls.TABLE)
+            .select("content, fingerprint, speculative")
+            .eq("session_id", session_id)
+            .eq("document_type", document_type)
+            .limit(1)
+            .execute()
+        )
+        if not res.data or res.data[0]["fingerprint"] != fingerprint:
+            return None
+        if res.data[0]["speculative"]:
+            logger.info(f"Documento {document_type} da sessão {session_id} servido da pré-geração")
+        return res.data[0]["content"]
+
+    @classmethod
+    def store(
+        cls,
+        session_id: str,
+        user_id: str,
+        document_type: str,
+        fingerprint: str,
+        content: Dict[str, Any],
+        speculative: bool = False,
+    ) -> None:
+        get_supabase_client().table(cls.TABLE).upsert(
+            {
+                "session_id": session_id,
+                "user_id": user_id,
+                "document_type": document_type,
+                "fingerprint": fingerprint,
+                "content": content,
+                "speculative": speculative,
+                "created_at": datetime.now(timezone.utc).isoformat(),
+            },
+            on_conflict="session_id,document_type",
+        ).execute()
+
+    @classmethod
+    def prefetch_allowed(cls, user_id: str, session: Dict[str, Any], therapist: Dict[str, Any]) -> Tuple[bool, str]:
+        """
+        Opt-out do terapeuta e tetos de gasto; o motivo volta para o log. Se permitido, a
+        pré-geração já fica reservada nos contadores diários (chame só antes de gerar).
+        """
+        if not cls.PREFETCH_ENABLED:
+            return False, "desativada"
+        if therapist.get("prefetch_documents") is False:
+            return False, "opt-out do terapeuta"
+        source_chars = sum(len(session.get(field) or "") for field in SOURCE_FIELDS)
+        if source_chars > cls.PREFETCH_MAX_SOURCE_CHARS:
+            return False, f"sessão longa demais ({source_chars} caracteres)"
+
+        outcome = get_supabase_client().rpc("reserve_document_prefetch", {
+            "p_user_id": user_id,
+            "p_user_limit": cls.PREFETCH_DAILY_LIMIT_PER_USER,
+            "p_global_limit": cls.PREFETCH_DAILY_LIMIT,
+        }).execute().data
+        if isinstance(outcome, list):
+            outcome = outcome[0] if outcome else None
+        if outcome != "ok":
+            return False, cls._LIMIT_REASONS.get(outcome, "limite diário")
+        return True, ""
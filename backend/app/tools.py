@@ -1,12 +1,18 @@
 import json
 from datetime import datetime, timedelta
 from typing import Dict, Any, List, Optional
+from fastapi import HTTPException
+from .compression import compress_row
 from .db import get_supabase_client
+from .services.scheduling_service import SchedulingService
+from .services.patient_import_service import normalize_email, normalize_phone
 from loguru import logger
 
+WEEKDAYS_PT = ["segunda", "terça", "quarta", "quinta", "sexta", "sábado", "domingo"]
+
 def search_patients(query: str, user_id: str) -> str:
     """Busca pacientes pelo nome."""
-    logger.info(f"Tool search_patients: query={query}")
+    logger.info("Tool search_patients")
     supabase = get_supabase_client()
     try:
         response = (
@@ -26,27 +32,28 @@ def search_patients(query: str, user_id: str) -> str:
 
 def create_patient(name: str, email: str, phone: str, user_id: str) -> str:
     """Cria um novo paciente."""
-    logger.info(f"Tool create_patient: name={name}, email={email}")
+    logger.info("Tool create_patient")
     supabase = get_supabase_client()
     try:
-        # Verifica se já existe
-        existing = (
-            supabase.table("patients")
-            .select("id")
-            .eq("user_id", user_id)
-            .eq("email", email)
-            .execute()
-        )
-        if existing.data:
-            return f"Erro: Já existe um paciente com o email {email}."
-
+        email = normalize_email(email)
+        phone = normalize_phone(phone)
+    except ValueError as e:
+        return f"Erro: {e}."
+    try:
         data = {
             "user_id": user_id,
             "name": name,
             "email": email,
             "phone": phone
         }
-        res = supabase.table("patients").insert(data).execute()
+        # Um só round trip: o índice único (user_id, email) decide se já existe, sem corrida
+        res = (
+            supabase.table("patients")
+            .upsert(data, on_conflict="user_id,email", ignore_duplicates=True)
+            .execute()
+        )
+        if not res.data:
+            return f"Erro: Já existe um paciente com o email {email}."
         return f"Paciente {name} cadastrado com sucesso! ID: {res.data[0]['id']}"
     except Exception as e:
         return f"Erro ao cadastrar paciente: {str(e)}"
@@ -54,7 +61,6 @@ def create_patient(name: str, email: str, phone: str, user_id: str) -> str:
 def create_appointment(patient_id: str, date_str: str, time_str: str, duration_minutes: int, price: float, user_id: str) -> str:
     """Cria um agendamento. date_str no formato YYYY-MM-DD, time_str no formato HH:MM."""
     logger.info(f"Tool create_appointment: patient_id={patient_id}, date={date_str}, time={time_str}")
-    supabase = get_supabase_client()
     try:
         # Validação básica de data/hora
         try:
@@ -64,43 +70,100 @@ def create_appointment(patient_id: str, date_str: str, time_str: str, duration_m
             # Tenta parsear para validar
             dt = datetime.fromisoformat(full_date_str)
             iso_date = dt.isoformat()
-            logger.info(f"Generated ISO Date with offset: {iso_date}")
+            logger.bind(hot=True).debug(f"Generated ISO Date with offset: {iso_date}")
         except ValueError:
             return "Erro: Formato de data (YYYY-MM-DD) ou hora (HH:MM) inválido."
 
-        data = {
-            "user_id": user_id,
-            "patient_id": patient_id,
-            "appointment_date": iso_date,
-            "duration_minutes": duration_minutes,
-            "price": price,
-            "status": "scheduled",
-            "payment_status": "pending"
-        }
-        
-        res = supabase.table("appointments").insert(data).execute()
+        SchedulingService.create_appointment(user_id, patient_id, dt, duration_minutes, price)
         return f"Agendamento criado com sucesso para {date_str} às {time_str}."
+    except HTTPException as e:
+        if e.status_code == 409:
+            return f"Erro: {e.detail}. Use find_free_slots para sugerir outro horário."
+        return f"Erro ao criar agendamento: {e.detail}"
     except Exception as e:
         logger.error(f"Tool create_appointment ERROR: {e}")
         return f"Erro ao criar agendamento: {str(e)}"
 
+def create_recurring_appointments(
+    patient_id: str,
+    date_str: str,
+    time_str: str,
+    user_id: str,
+    frequency: str = "weekly",
+    count: Optional[int] = None,
+    until_str: Optional[str] = None,
+    exceptions: Optional[List[str]] = None,
+    duration_minutes: int = 50,
+    price: float = 150.0,
+    skip_conflicts: bool = False,
+) -> str:
+    """Cria uma série semanal/quinzenal de consultas num único INSERT."""
+    logger.info(f"Tool create_recurring_appointments: patient_id={patient_id}, frequency={frequency}")
+    try:
+        first = datetime.fromisoformat(f"{date_str}T{time_str}:00-03:00")
+        until = datetime.strptime(until_str, "%Y-%m-%d").date() if until_str else None
+        skip_dates = [datetime.strptime(d, "%Y-%m-%d").date() for d in exceptions or []]
+    except ValueError:
+        return "Erro: Formato de data (YYYY-MM-DD) ou hora (HH:MM) inválido."
+
+    try:
+        result = SchedulingService.create_recurring_appointments(
+            user_id, patient_id, first,
+            frequency=frequency,
+            duration_minutes=duration_minutes,
+            price=price,
+            count=count,
+            until=until,
+            exceptions=skip_dates,
+            skip_conflicts=skip_conflicts,
+        )
+    except HTTPException as e:
+        if e.status_code == 409:
+            return f"Erro: {e.detail}. Nada foi agendado; peça confirmação para pular esses horários (skip_conflicts) ou use find_free_slots."
+        return f"Erro ao criar agendamentos: {e.detail}"
+    except Exception as e:
+        logger.error(f"Tool create_recurring_appointments ERROR: {e}")
+        return f"Erro ao criar agendamentos: {str(e)}"
+
+    created = [
+        SchedulingService.to_local(a["appointment_date"]).strftime("%d/%m/%Y %H:%M") for a in result["created"]
+    ]
+    message = f"{len(created)} consulta(s) agendada(s): {', '.join(created)}."
+    if result["skipped"]:
+        skipped = ", ".join(SchedulingService.to_local(s).strftime("%d/%m/%Y %H:%M") for s in result["skipped"])
+        message += f" Puladas por conflito: {skipped}."
+    return message
+
+def find_free_slots(user_id: str, days: int = 7, duration_minutes: int = 50, limit: int = 10) -> str:
+    """Lista os próximos horários livres do terapeuta (horário de Brasília)."""
+    logger.info("Tool find_free_slots")
+    try:
+        slots = SchedulingService.find_free_slots(user_id, days, duration_minutes, limit)
+    except HTTPException as e:
+        return f"Erro: {e.detail}"
+    if not slots:
+        return f"Nenhum horário livre de {duration_minutes} minutos nos próximos {days} dias."
+    return json.dumps([
+        {"date": start.strftime("%Y-%m-%d"), "time": start.strftime("%H:%M"), "weekday": WEEKDAYS_PT[start.weekday()]}
+        for start, _ in slots
+    ], ensure_ascii=False)
+
 def create_session_note(patient_id: str, note: str, user_id: str) -> str:
     """Cria uma nota de sessão (usada para registrar Queixa Principal e outros registros rápidos)."""
     supabase = get_supabase_client()
     try:
         # Usaremos a estrutura de sessions para isso.
-        # Transcription será a nota, insights/summary podem ser gerados depois ou deixados como placeholder.
+        # Transcription será a nota; os campos CFP ficam vazios para que exportação,
+        # prontuário e telas usem a própria nota (e não um texto fixo).
         # Vamos marcar 'Queixa Principal' nos temas para facilitar identificação
         
         data = {
             "patient_id": patient_id,
             "transcription": note,
-            "summary": "Registro via Chat (Queixa Principal/Nota Rápida)",
-            "insights": "Registro manual via chat.",
             "themes": ["Chat", "Queixa Principal"]
         }
         
-        res = supabase.table("sessions").insert(data).execute()
+        res = supabase.table("sessions").insert(compress_row(data)).execute()
         return "Registro (Queixa Principal) salvo com sucesso nas sessões do paciente."
     except Exception as e:
         return f"Erro ao salvar registro: {str(e)}"
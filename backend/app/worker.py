@@ -0,0 +1,9 @@
+import asyncio
+
+from .jobs import run_forever, JOB_WORKERS
+# Importa a API para registrar os handlers de job definidos em main.py
+from . import main  # noqa: F401
+
+# Uso: python -m app.worker  (com JOB_WORKERS=0 no servidor web)
+if __name__ == "__main__":
+    asyncio.run(run_forever(JOB_WORKERS))
@@ -0,0 +1,75 @@
+"""
+Mede o custo de logging por request (caminho de autenticação + uma tool call),
+comparando a configuração antiga (sink de arquivo síncrono, 5 INFO por request)
+com a nova (sink JSON com escrita em thread dedicada, amostragem de hot path e redação de PHI).
+
+Uso: python bench_logging.py [requests] [threads]
+"""
+import os
+import sys
+import tempfile
+import threading
+import time
+
+from loguru import logger
+
+from app import logging_config
+
+USER_ID = "8f14e45f-ceea-467f-a0e6-1d3b2f1c9a10"
+TOOL_ARGS = {"name": "Maria Souza", "email": "maria@example.com", "phone": "11999998888"}
+
+
+def legacy_request():
+    logger.info("Authorization header received: Bearer eyJhbGciOiJIUzI1NiIsInR5cCI6IkpXVCJ9...")
+    logger.info("Token extracted, length: 412")
+    logger.info("Token decoded successfully. Payload keys: ['sub', 'email', 'aud', 'role', 'exp']")
+    logger.info(f"User authenticated: {USER_ID}")
+    logger.info(f"TOOL CALL: create_patient | ARGS: {TOOL_ARGS}")
+
+
+def new_request():
+    logger.bind(hot=True).info(f"User authenticated: {USER_ID}")
+    logger.bind(tool_args=TOOL_ARGS).info("TOOL CALL: create_patient")
+
+
+def run(request_fn, total, threads):
+    per_thread = total // threads
+
+    def worker():
+        for _ in range(per_thread):
+            request_fn()
+
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    started = time.perf_counter()
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    elapsed = time.perf_counter() - started
+    return elapsed / (per_thread * threads) * 1e6
+
+
+def main():
+    total = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    threads = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+
+    with tempfile.TemporaryDirectory() as tmp:
+        logger.remove()
+        logger.add(os.path.join(tmp, "legacy.log"), rotation="10 MB", level="INFO", backtrace=False, diagnose=False)
+        legacy_us = run(legacy_request, total, threads)
+        logger.remove()
+
+        # Mesmo sink de arquivo de setup_logging (sem stderr, como na configuração antiga)
+        sink = logging_config.BackgroundSink(path=os.path.join(tmp, "new.log"), serialize=True)
+        logger.add(sink, level="INFO", filter=logging_config._log_filter, backtrace=False, diagnose=False)
+        new_us = run(new_request, total, threads)
+        logger.remove()
+        sink.stop()
+
+    print(f"requests={total} threads={threads}")
+    print(f"antes:  {legacy_us:8.1f} µs/request")
+    print(f"depois: {new_us:8.1f} µs/request")
+
+
+if __name__ == "__main__":
+    main()
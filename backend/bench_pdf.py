@@ -0,0 +1,72 @@
+"""
+Mede a vazão de renderização de PDFs (renders/s em um único núcleo) para os seis tipos
+de documento CFP e para o relatório de evolução, comparando:
+  - sem cache: estilos, layouts e rótulos reconstruídos a cada PDF (comportamento antigo);
+  - templates: tudo carregado uma vez por processo (app/pdf_templates.py).
+
+Com PDF_FONT_PATH apontando para uma TTF (ex.: /usr/share/fonts/truetype/dejavu/DejaVuSans.ttf)
+mede o custo da fonte embutida como subset.
+
+Uso: python bench_pdf.py [renders por tipo]
+"""
+import os
+import sys
+import time
+
+os.environ.setdefault("LOG_FILE", os.devnull)
+
+from app import pdf_templates
+from app.main import generate_pdf_report
+from app.report_generator import generate_clinical_record_pdf
+
+PARAGRAPH = (
+    "Paciente relata melhora no sono, mas mantém ruminação sobre o trabalho. "
+    "Discutimos estratégias de reestruturação cognitiva e exposição gradual. "
+)
+PATIENT = {"name": "Maria Souza"}
+THERAPIST = {"name": "Dra. Ana Lima", "crp": "06/123456", "email": "ana@example.com"}
+REPORT = {
+    "patient": {"name": "Maria Souza"},
+    "sessions_count": 12,
+    "period": {"start": "2026-01-01", "end": "2026-06-30"},
+    "analysis": {
+        "sentiment_trends": {"average_score": 0.2, "trend": "melhorando"},
+        "topics": [{"topic": "ansiedade", "count": 8}, {"topic": "trabalho", "count": 5}],
+        "session_frequency": {"sessions_per_week": 1.0, "most_common_day": {"day": "Tuesday"}},
+    },
+}
+
+
+def render_all():
+    for document_type, fields in pdf_templates.DOCUMENT_FIELDS.items():
+        record = {field: PARAGRAPH * 2 for field in fields}
+        generate_clinical_record_pdf(record, PATIENT, "10/03/2026", THERAPIST, document_type)
+    generate_pdf_report(REPORT)
+
+
+def uncached():
+    # Simula o comportamento antigo: nada sobrevive entre renderizações
+    for cached in (pdf_templates.get_styles, pdf_templates.get_table_style, pdf_templates._layout, pdf_templates._known_label):
+        cached.cache_clear()
+    render_all()
+
+
+def measure(fn, repeat):
+    render_all()  # aquecimento (imports do reportlab, registro de fontes)
+    started = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    elapsed = time.perf_counter() - started
+    return repeat * (len(pdf_templates.DOCUMENT_FIELDS) + 1) / elapsed
+
+
+def main():
+    repeat = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    fonts = pdf_templates.get_fonts()
+    print(f"fonte={fonts.regular} ({'TTF subset' if pdf_templates.FONT_PATH else 'padrão do PDF'}) repetições={repeat}")
+    for name, fn in (("sem cache", uncached), ("templates", render_all)):
+        print(f"{name:12s} {measure(fn, repeat):8.1f} renders/s")
+
+
+if __name__ == "__main__":
+    main()
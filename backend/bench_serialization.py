@@ -0,0 +1,87 @@
+"""
+Mede o custo de serializar a resposta de GET /patient/{id}/sessions com 1.000 sessões,
+comparando o caminho padrão do FastAPI (response_model + jsonable_encoder + json.dumps)
+com o caminho rápido de app/serialization.py (TypeAdapter em lote + gzip).
+
+Uso: python bench_serialization.py [sessões] [repetições]
+"""
+import asyncio
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+from fastapi import Request
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_model_field
+
+from app import schemas
+from app.serialization import fast_json_response
+
+PARAGRAPH = (
+    "Paciente relata melhora no sono, mas mantém ruminação sobre o trabalho. "
+    "Discutimos estratégias de reestruturação cognitiva e exposição gradual. "
+)
+
+
+def make_sessions(n):
+    start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    return [
+        {
+            "id": f"00000000-0000-0000-0000-{i:012d}",
+            "patient_id": "11111111-1111-1111-1111-111111111111",
+            "audio_url": None,
+            "transcription": PARAGRAPH * 20,
+            "themes": ["ansiedade", "sono", "trabalho"],
+            "registro_descritivo": PARAGRAPH * 4,
+            "hipoteses_clinicas": PARAGRAPH,
+            "direcoes_intervencao": PARAGRAPH,
+            "created_at": (start + timedelta(days=i)).isoformat(),
+        }
+        for i in range(n)
+    ]
+
+
+def make_request(accept_encoding):
+    headers = [(b"accept-encoding", accept_encoding.encode())] if accept_encoding else []
+    return Request({"type": "http", "method": "GET", "path": "/", "headers": headers})
+
+
+def default_path(rows):
+    # Equivalente ao que o FastAPI faz com `return SessionsListResponse(...)` + response_model
+    field = create_model_field(name="response", type_=schemas.SessionsListResponse, mode="serialization")
+    content = asyncio.run(serialize_response(
+        field=field,
+        response_content=schemas.SessionsListResponse(sessions=rows),
+        is_coroutine=True,
+    ))
+    return JSONResponse(content)
+
+
+def measure(fn, repeat):
+    fn()  # aquecimento (constrói schemas/adapters)
+    started = time.perf_counter()
+    for _ in range(repeat):
+        response = fn()
+    return (time.perf_counter() - started) / repeat * 1000, len(response.body)
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    repeat = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    rows = make_sessions(n)
+    plain, gzip_req = make_request(""), make_request("gzip, br")
+
+    results = [
+        ("padrão (response_model)", measure(lambda: default_path(rows), repeat)),
+        ("rápido", measure(lambda: fast_json_response(plain, schemas.SessionsListResponse, {"sessions": rows}), repeat)),
+        ("rápido + gzip", measure(lambda: fast_json_response(gzip_req, schemas.SessionsListResponse, {"sessions": rows}), repeat)),
+    ]
+
+    print(f"sessões={n} repetições={repeat}")
+    for name, (ms, size) in results:
+        print(f"{name:24s} {ms:8.1f} ms  {size / 1024:9.1f} KiB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""
+Mede o tamanho das sessões com os campos longos em texto puro e comprimidos
+(app/compression.py): bytes guardados nas colunas e bytes que trafegam do PostgREST
+para o backend num select("*") (JSON, com e sem gzip), além do custo de CPU.
+
+O texto é sintético (frases montadas a partir de vocabulário clínico); com dados reais,
+`python compress_sessions.py migrate --dry-run` dá a taxa de compressão de produção.
+
+Uso: python bench_storage.py [sessões]
+"""
+import gzip
+import json
+import os
+import random
+import sys
+import time
+
+os.environ.setdefault("LOG_FILE", os.devnull)
+
+from app import compression
+
+SUBJECTS = ["Paciente", "Ela", "Ele", "A paciente", "O paciente", "Relata que a mãe", "Conta que o chefe", "Refere que o marido"]
+VERBS = ["relata", "menciona", "percebe", "descreve", "nega", "reconhece", "associa", "evita", "retoma", "questiona"]
+OBJECTS = [
+    "dificuldade para dormir", "medo de ser demitida", "conflitos com a irmã", "crises de choro no trânsito",
+    "cansaço constante", "vontade de largar a faculdade", "culpa por não visitar o pai", "irritação com os filhos",
+    "palpitações antes das reuniões", "pensamentos repetitivos sobre dinheiro", "sensação de vazio aos domingos",
+    "episódios de compulsão alimentar", "briga com a sogra no aniversário", "preocupação com a saúde da avó",
+    "insegurança no novo emprego", "saudade da cidade natal", "tristeza ao lembrar do divórcio",
+    "receio de dirigir na estrada", "falta de apetite pela manhã", "ciúmes da namorada", "vergonha de falar em público",
+    "discussões sobre a divisão das tarefas de casa", "dores de cabeça frequentes", "lembranças do acidente de 2019",
+    "planos de voltar a estudar inglês", "ressentimento com o irmão mais velho", "alívio depois de conversar com a amiga",
+    "medo de engravidar", "desânimo com o tratamento", "excesso de trabalho no plantão", "vontade de mudar de cidade",
+]
+NAMES = ["Carla", "Joana", "Pedro", "Marcos", "Luiza", "Rafael", "Beatriz", "Tiago", "Fernanda", "Gustavo", "Helena", "Otávio"]
+TAILS = [
+    "durante a semana", "desde a última sessão", "quando está sozinha", "nos últimos dias",
+    "principalmente à noite", "ao falar sobre a infância", "depois da consulta com o psiquiatra", "",
+]
+
+
+def sentence(rng):
+    tail = rng.choice(TAILS)
+    if rng.random() < 0.3:
+        tail = f"desde que {rng.choice(NAMES)} {rng.choice(VERBS)} {rng.choice(OBJECTS)} em {rng.randint(1, 28)}/{rng.randint(1, 12)}"
+    return f"{rng.choice(SUBJECTS)} {rng.choice(VERBS)} {rng.choice(OBJECTS)}{' ' + tail if tail else ''}, com intensidade {rng.randint(1, 10)}/10."
+
+
+def text(rng, sentences):
+    return " ".join(sentence(rng) for _ in range(sentences))
+
+
+def make_sessions(n):
+    rng = random.Random(42)
+    sessions = []
+    for i in range(n):
+        registro, hipoteses, direcoes = text(rng, 12), text(rng, 6), text(rng, 6)
+        sessions.append({
+            "id": f"00000000-0000-0000-0000-{i:012d}",
+            "patient_id": "11111111-1111-1111-1111-111111111111",
+            "audio_url": None,
+            "transcription": text(rng, 120),
+            "themes": ["ansiedade", "sono", "trabalho"],
+            "registro_descritivo": registro,
+            "hipoteses_clinicas": hipoteses,
+            "direcoes_intervencao": direcoes,
+            "created_at": "2026-03-10T14:00:00+00:00",
+        })
+    return sessions
+
+
+def column_bytes(rows):
+    return sum(len(row[field].encode("utf-8")) for row in rows for field in compression.COMPRESSED_FIELDS)
+
+
+def wire_bytes(rows):
+    body = json.dumps(rows, ensure_ascii=False).encode("utf-8")
+    return len(body), len(gzip.compress(body, 6))
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    plain = make_sessions(n)
+
+    started = time.perf_counter()
+    packed = [compression.compress_row(row) for row in plain]
+    compress_ms = (time.perf_counter() - started) * 1000
+    started = time.perf_counter()
+    unpacked = compression.decompress_rows([dict(row) for row in packed])
+    decompress_ms = (time.perf_counter() - started) * 1000
+    assert unpacked == plain
+
+    print(f"{n} sessões (dicionário v{compression.DICTIONARY_VERSION}, nível {compression.COMPRESSION_LEVEL})")
+    print(f"{'':22s} {'texto puro':>12s} {'zstd':>12s}")
+    print(f"{'colunas (KB)':22s} {column_bytes(plain) / 1024:12.0f} {column_bytes(packed) / 1024:12.0f}")
+    for label, index in (("select * JSON (KB)", 0), ("select * gzip (KB)", 1)):
+        print(f"{label:22s} {wire_bytes(plain)[index] / 1024:12.0f} {wire_bytes(packed)[index] / 1024:12.0f}")
+    print(f"compressão {compress_ms / n:.2f} ms/sessão, descompressão {decompress_ms / n:.2f} ms/sessão")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""
+Migração dos campos longos de `sessions` para o formato comprimido (app/compression.py)
+e treino de novas versões do dicionário zstd. Usa a service role (SUPABASE_* do .env).
+
+  python compress_sessions.py migrate [--dry-run]
+      Comprime as linhas ainda em texto puro (e as de dicionários antigos), uma a uma,
+      paginando por id; pode ser interrompida e rodada de novo. Com --dry-run só mede.
+      Cada update só vale se a linha não mudou desde a leitura (mesmo updated_at);
+      linhas editadas no meio do caminho são puladas e contadas: rode de novo depois.
+
+  python compress_sessions.py train [--samples N] [--size BYTES]
+      Treina um dicionário com uma amostra das sessões e grava
+      app/data/ptbr_sessions_v<N>.dict. Registre a versão em compression.DICTIONARIES
+      e faça o deploy antes de rodar `migrate` para recomprimir.
+"""
+import argparse
+import os
+
+os.environ.setdefault("LOG_FILE", os.devnull)
+
+from app import compression
+from app.db import get_supabase_client
+from app.export import _paginate
+
+
+def _current(value: str) -> bool:
+    return value.startswith(f"zstd{compression.DICTIONARY_VERSION}:")
+
+
+def migrate(dry_run: bool) -> None:
+    supabase = get_supabase_client()
+    columns = "id, updated_at, " + ", ".join(compression.COMPRESSED_FIELDS)
+    rows = updated = conflicts = before = after = 0
+    for row in _paginate("sessions", columns):
+        rows += 1
+        changes = {}
+        for field in compression.COMPRESSED_FIELDS:
+            stored = row.get(field)
+            if not isinstance(stored, str):
+                continue
+            if _current(stored):
+                before += len(stored)
+                after += len(stored)
+                continue
+            encoded = compression.compress_text(compression.decompress_text(stored))
+            before += len(stored.encode("utf-8"))
+            after += len(encoded.encode("utf-8"))
+            if encoded != stored:
+                changes[field] = encoded
+        if changes and not dry_run:
+            # Guarda pelo updated_at lido (o trigger de sessions o renova a cada update):
+            # não sobrescreve uma edição feita pela aplicação depois da leitura
+            query = supabase.table("sessions").update(changes).eq("id", row["id"])
+            if row.get("updated_at") is None:
+                query = query.is_("updated_at", "null")
+            else:
+                query = query.eq("updated_at", row["updated_at"])
+            if not query.execute().data:
+                conflicts += 1
+                continue
+        updated += bool(changes)
+    ratio = before / after if after else 1
+    print(f"{rows} sessões, {updated} {'a atualizar' if dry_run else 'atualizadas'}: "
+          f"{before / 1024:.0f} KB -> {after / 1024:.0f} KB ({ratio:.1f}x)")
+    if conflicts:
+        print(f"{conflicts} sessões alteradas durante a migração foram puladas: rode `migrate` de novo")
+
+
+def train(samples: int, size: int) -> None:
+    import zstandard
+
+    corpus = []
+    for row in _paginate("sessions", ", ".join(compression.COMPRESSED_FIELDS)):
+        corpus.extend(
+            compression.decompress_text(row[field]).encode("utf-8")
+            for field in compression.COMPRESSED_FIELDS
+            if row.get(field)
+        )
+        if len(corpus) >= samples:
+            break
+    dictionary = zstandard.train_dictionary(size, corpus)
+    version = max(compression.DICTIONARIES) + 1
+    path = compression.DICTIONARY_DIR / f"ptbr_sessions_v{version}.dict"
+    path.write_bytes(dictionary.as_bytes())
+    print(f"{path} ({len(corpus)} amostras): adicione {version}: \"{path.name}\" em compression.DICTIONARIES")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("migrate").add_argument("--dry-run", action="store_true")
+    trainer = commands.add_parser("train")
+    trainer.add_argument("--samples", type=int, default=5000)
+    trainer.add_argument("--size", type=int, default=64 * 1024)
+    args = parser.parse_args()
+    if args.command == "migrate":
+        migrate(args.dry_run)
+    else:
+        train(args.samples, args.size)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+"""
+Servidor OpenAI falso para testes de carga (loadtest.py): responde POST /v1/chat/completions
+sem chave nem rede, com latência configurável. O app usa o servidor quando
+OPENAI_BASE_URL=http://127.0.0.1:<porta>/v1, lido pelo próprio SDK, sem mudar o código.
+
+A resposta depende do formato do request, como acontece no app:
+  - response_format json_object (análise e documentos CFP) -> JSON com todos os campos;
+  - com tools (copilot) -> segue o roteiro de tool calls. Cada passo já respondido pelo
+    app (mensagem do assistente com tool_calls depois da última mensagem do usuário)
+    avança o roteiro. Ao terminar, devolve a resposta final em texto;
+  - demais (título da conversa) -> texto curto.
+
+  python fake_openai.py [--port 8100] [--latency-ms 800] [--jitter-ms 300]
+                        [--error-rate 0.0] [--responses respostas.json]
+
+`--responses` sobrescreve as respostas prontas com as chaves "json", "tool_script" e "text"
+(mesmo formato de DEFAULT_RESPONSES). GET /stats devolve as chamadas recebidas por tipo.
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+import uuid
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+from app.pdf_templates import DOCUMENT_FIELDS
+
+PARAGRAPH = (
+    "Paciente relata aumento da ansiedade no trabalho e dificuldade para dormir. "
+    "Observa-se padrão compatível com ruminação; sugere-se explorar gatilhos e estratégias de regulação."
+)
+
+DEFAULT_RESPONSES: Dict[str, Any] = {
+    # Uma resposta serve para /analyze e para todos os tipos de documento: campos a mais são ignorados
+    "json": {
+        **{name: PARAGRAPH for fields in DOCUMENT_FIELDS.values() for name in fields},
+        "registro_descritivo": PARAGRAPH * 3,
+        "temas_relevantes": ["ansiedade", "trabalho", "sono"],
+    },
+    # Passos do copilot: cada passo é uma lista de tool calls paralelas
+    "tool_script": [
+        [{"name": "search_patients", "arguments": {"query": "Maria"}}],
+        [{"name": "find_free_slots", "arguments": {"days": 7, "duration_minutes": 50}}],
+    ],
+    "text": "Encontrei a paciente e estes são os próximos horários livres da semana.",
+}
+
+
+@dataclass
+class FakeOpenAIConfig:
+    latency_ms: float = 800.0
+    jitter_ms: float = 300.0
+    error_rate: float = 0.0
+    responses: Dict[str, Any] = field(default_factory=lambda: dict(DEFAULT_RESPONSES))
+    seed: Optional[int] = None
+
+
+def _tool_steps_done(messages: List[Dict[str, Any]]) -> int:
+    done = 0
+    for message in reversed(messages):
+        if message.get("role") == "user":
+            break
+        if message.get("role") == "assistant" and message.get("tool_calls"):
+            done += 1
+    return done
+
+
+def _completion(model: str, message: Dict[str, Any], finish_reason: str, prompt_chars: int) -> Dict[str, Any]:
+    completion_tokens = len(json.dumps(message, ensure_ascii=False)) // 4
+    prompt_tokens = prompt_chars // 4
+    return {
+        "id": f"chatcmpl-{uuid.uuid4().hex[:24]}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{"index": 0, "message": message, "finish_reason": finish_reason, "logprobs": None}],
+        "usage": {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        },
+    }
+
+
+def create_app(config: Optional[FakeOpenAIConfig] = None) -> FastAPI:
+    config = config or FakeOpenAIConfig()
+    rng = random.Random(config.seed)
+    calls: Counter = Counter()
+    app = FastAPI(title="Fake OpenAI")
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        messages = body.get("messages") or []
+        delay = max(0.0, rng.gauss(config.latency_ms, config.jitter_ms)) / 1000
+        if delay:
+            await asyncio.sleep(delay)
+
+        if rng.random() < config.error_rate:
+            calls["error"] += 1
+            return JSONResponse(
+                status_code=500,
+                content={"error": {"message": "Falha simulada", "type": "server_error", "code": None}},
+            )
+
+        model = body.get("model", "gpt-4o-mini")
+        prompt_chars = sum(len(str(m.get("content") or "")) for m in messages)
+        if (body.get("response_format") or {}).get("type") == "json_object":
+            calls["json"] += 1
+            message = {"role": "assistant", "content": json.dumps(config.responses["json"], ensure_ascii=False)}
+            return _completion(model, message, "stop", prompt_chars)
+
+        script = config.responses["tool_script"]
+        step = _tool_steps_done(messages)
+        if body.get("tools") and step < len(script):
+            calls["tool_call"] += 1
+            tool_calls = [
+                {
+                    "id": f"call_{uuid.uuid4().hex[:24]}",
+                    "type": "function",
+                    "function": {"name": c["name"], "arguments": json.dumps(c["arguments"], ensure_ascii=False)},
+                }
+                for c in script[step]
+            ]
+            message = {"role": "assistant", "content": None, "tool_calls": tool_calls}
+            return _completion(model, message, "tool_calls", prompt_chars)
+
+        calls["text"] += 1
+        return _completion(model, {"role": "assistant", "content": config.responses["text"]}, "stop", prompt_chars)
+
+    @app.get("/stats")
+    async def stats():
+        return dict(calls)
+
+    return app
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--latency-ms", type=float, default=800.0)
+    parser.add_argument("--jitter-ms", type=float, default=300.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--responses", help="JSON com as respostas prontas (chaves json, tool_script, text)")
+    args = parser.parse_args()
+
+    responses = dict(DEFAULT_RESPONSES)
+    if args.responses:
+        with open(args.responses, encoding="utf-8") as f:
+            responses.update(json.load(f))
+
+    import uvicorn
+
+    config = FakeOpenAIConfig(args.latency_ms, args.jitter_ms, args.error_rate, responses)
+    uvicorn.run(create_app(config), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
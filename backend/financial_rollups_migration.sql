@@ -0,0 +1,169 @@
+-- Migration: Rollups financeiros mantidos incrementalmente (mensal e por paciente)
+-- Date: 2026-10-18
+--
+-- Cada INSERT/UPDATE/DELETE em appointments subtrai a contribuição antiga da linha
+-- e soma a nova, então o resumo do mês é uma leitura por chave primária,
+-- independente do tamanho do histórico.
+-- Base: mês da consulta (appointment_date, horário de Brasília), não o mês do pagamento.
+-- Status 'no_show' (falta) passa a ser aceito em appointments.status.
+-- As funções são SECURITY DEFINER porque o frontend ainda escreve em appointments
+-- com a role do usuário, que não tem permissão de escrita nos rollups (RLS).
+-- Roda numa transação só: a tabela appointments fica travada para escrita (leituras
+-- continuam) do momento em que o trigger é criado até o fim do backfill, para que
+-- nenhuma consulta gravada no meio seja contada duas vezes ou fique de fora.
+
+BEGIN;
+
+-- 1. Tabelas de rollup
+CREATE TABLE IF NOT EXISTS public.financial_monthly_rollups (
+    user_id UUID NOT NULL,
+    month DATE NOT NULL, -- primeiro dia do mês
+    appointments_count INTEGER NOT NULL DEFAULT 0,
+    completed_count INTEGER NOT NULL DEFAULT 0,
+    cancelled_count INTEGER NOT NULL DEFAULT 0,
+    no_show_count INTEGER NOT NULL DEFAULT 0,
+    billed_amount DECIMAL(12,2) NOT NULL DEFAULT 0, -- consultas não canceladas
+    paid_amount DECIMAL(12,2) NOT NULL DEFAULT 0,
+    pending_amount DECIMAL(12,2) NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    PRIMARY KEY (user_id, month)
+);
+
+CREATE TABLE IF NOT EXISTS public.financial_patient_rollups (
+    user_id UUID NOT NULL,
+    patient_id UUID NOT NULL, -- sem FK: o trigger ainda escreve aqui durante o DELETE em cascata do paciente
+    appointments_count INTEGER NOT NULL DEFAULT 0,
+    completed_count INTEGER NOT NULL DEFAULT 0,
+    cancelled_count INTEGER NOT NULL DEFAULT 0,
+    no_show_count INTEGER NOT NULL DEFAULT 0,
+    billed_amount DECIMAL(12,2) NOT NULL DEFAULT 0,
+    paid_amount DECIMAL(12,2) NOT NULL DEFAULT 0,
+    pending_amount DECIMAL(12,2) NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    PRIMARY KEY (user_id, patient_id)
+);
+
+ALTER TABLE public.financial_monthly_rollups ENABLE ROW LEVEL SECURITY;
+ALTER TABLE public.financial_patient_rollups ENABLE ROW LEVEL SECURITY;
+
+CREATE POLICY "Users can view their own monthly rollups"
+    ON public.financial_monthly_rollups FOR SELECT
+    USING (auth.uid() = user_id);
+
+CREATE POLICY "Users can view their own patient rollups"
+    ON public.financial_patient_rollups FOR SELECT
+    USING (auth.uid() = user_id);
+
+-- 2. Soma (p_sign = 1) ou subtrai (p_sign = -1) a contribuição de uma consulta
+CREATE OR REPLACE FUNCTION public.apply_appointment_financials(
+    p_row public.appointments,
+    p_sign INTEGER
+)
+RETURNS VOID AS $$
+DECLARE
+    v_month DATE := date_trunc('month', p_row.appointment_date AT TIME ZONE 'America/Sao_Paulo')::date;
+    v_price DECIMAL(12,2) := COALESCE(p_row.price, 0);
+    v_status TEXT := COALESCE(p_row.status, 'scheduled');
+    v_payment_status TEXT := COALESCE(p_row.payment_status, 'pending');
+    v_active BOOLEAN := v_status <> 'cancelled';
+    v_completed INTEGER := (v_status = 'completed')::int * p_sign;
+    v_cancelled INTEGER := (v_status = 'cancelled')::int * p_sign;
+    v_no_show INTEGER := (v_status = 'no_show')::int * p_sign;
+    v_billed DECIMAL(12,2) := CASE WHEN v_active THEN v_price ELSE 0 END * p_sign;
+    v_paid DECIMAL(12,2) := CASE WHEN v_payment_status = 'paid' THEN v_price ELSE 0 END * p_sign;
+    v_pending DECIMAL(12,2) := CASE WHEN v_active AND v_payment_status = 'pending' THEN v_price ELSE 0 END * p_sign;
+BEGIN
+    INSERT INTO public.financial_monthly_rollups AS r (
+        user_id, month, appointments_count, completed_count, cancelled_count, no_show_count,
+        billed_amount, paid_amount, pending_amount
+    )
+    VALUES (p_row.user_id, v_month, p_sign, v_completed, v_cancelled, v_no_show, v_billed, v_paid, v_pending)
+    ON CONFLICT (user_id, month) DO UPDATE SET
+        appointments_count = r.appointments_count + EXCLUDED.appointments_count,
+        completed_count = r.completed_count + EXCLUDED.completed_count,
+        cancelled_count = r.cancelled_count + EXCLUDED.cancelled_count,
+        no_show_count = r.no_show_count + EXCLUDED.no_show_count,
+        billed_amount = r.billed_amount + EXCLUDED.billed_amount,
+        paid_amount = r.paid_amount + EXCLUDED.paid_amount,
+        pending_amount = r.pending_amount + EXCLUDED.pending_amount,
+        updated_at = NOW();
+
+    INSERT INTO public.financial_patient_rollups AS r (
+        user_id, patient_id, appointments_count, completed_count, cancelled_count, no_show_count,
+        billed_amount, paid_amount, pending_amount
+    )
+    VALUES (p_row.user_id, p_row.patient_id, p_sign, v_completed, v_cancelled, v_no_show, v_billed, v_paid, v_pending)
+    ON CONFLICT (user_id, patient_id) DO UPDATE SET
+        appointments_count = r.appointments_count + EXCLUDED.appointments_count,
+        completed_count = r.completed_count + EXCLUDED.completed_count,
+        cancelled_count = r.cancelled_count + EXCLUDED.cancelled_count,
+        no_show_count = r.no_show_count + EXCLUDED.no_show_count,
+        billed_amount = r.billed_amount + EXCLUDED.billed_amount,
+        paid_amount = r.paid_amount + EXCLUDED.paid_amount,
+        pending_amount = r.pending_amount + EXCLUDED.pending_amount,
+        updated_at = NOW();
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+-- Não pode ser chamada via RPC pelos clientes (só pelo trigger, como owner)
+REVOKE EXECUTE ON FUNCTION public.apply_appointment_financials(public.appointments, INTEGER) FROM PUBLIC, anon, authenticated;
+
+CREATE OR REPLACE FUNCTION public.appointments_financial_rollup()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        PERFORM public.apply_appointment_financials(OLD, -1);
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        PERFORM public.apply_appointment_financials(NEW, 1);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+-- Bloqueia INSERT/UPDATE/DELETE em appointments até o COMMIT (SELECTs seguem livres)
+LOCK TABLE public.appointments IN SHARE ROW EXCLUSIVE MODE;
+
+-- Só colunas que afetam os números disparam o trigger (notes, updated_at... não)
+DROP TRIGGER IF EXISTS appointments_financial_rollup ON public.appointments;
+CREATE TRIGGER appointments_financial_rollup
+    AFTER INSERT OR DELETE OR UPDATE OF user_id, patient_id, appointment_date, status, price, payment_status
+    ON public.appointments
+    FOR EACH ROW
+    EXECUTE PROCEDURE public.appointments_financial_rollup();
+
+-- 3. Backfill a partir do histórico existente (mesmas regras de apply_appointment_financials,
+--    agregadas numa passada só em vez de um upsert por consulta)
+TRUNCATE public.financial_monthly_rollups, public.financial_patient_rollups;
+
+CREATE TEMP TABLE appointment_financials ON COMMIT DROP AS
+SELECT
+    a.user_id,
+    a.patient_id,
+    date_trunc('month', a.appointment_date AT TIME ZONE 'America/Sao_Paulo')::date AS month,
+    (COALESCE(a.status, 'scheduled') = 'completed')::int AS completed,
+    (COALESCE(a.status, 'scheduled') = 'cancelled')::int AS cancelled,
+    (COALESCE(a.status, 'scheduled') = 'no_show')::int AS no_show,
+    CASE WHEN COALESCE(a.status, 'scheduled') <> 'cancelled' THEN COALESCE(a.price, 0) ELSE 0 END AS billed,
+    CASE WHEN COALESCE(a.payment_status, 'pending') = 'paid' THEN COALESCE(a.price, 0) ELSE 0 END AS paid,
+    CASE WHEN COALESCE(a.status, 'scheduled') <> 'cancelled'
+          AND COALESCE(a.payment_status, 'pending') = 'pending' THEN COALESCE(a.price, 0) ELSE 0 END AS pending
+FROM public.appointments a;
+
+INSERT INTO public.financial_monthly_rollups (
+    user_id, month, appointments_count, completed_count, cancelled_count, no_show_count,
+    billed_amount, paid_amount, pending_amount
+)
+SELECT user_id, month, count(*), sum(completed), sum(cancelled), sum(no_show), sum(billed), sum(paid), sum(pending)
+FROM appointment_financials
+GROUP BY user_id, month;
+
+INSERT INTO public.financial_patient_rollups (
+    user_id, patient_id, appointments_count, completed_count, cancelled_count, no_show_count,
+    billed_amount, paid_amount, pending_amount
+)
+SELECT user_id, patient_id, count(*), sum(completed), sum(cancelled), sum(no_show), sum(billed), sum(paid), sum(pending)
+FROM appointment_financials
+GROUP BY user_id, patient_id;
+
+COMMIT;
@@ -0,0 +1,94 @@
+-- Migration: Fila de jobs assíncronos (análise, documentos e relatórios)
+-- Date: 2026-10-18
+
+-- 1. Tabela de jobs
+CREATE TABLE IF NOT EXISTS public.jobs (
+    id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+    user_id UUID NOT NULL,
+    kind TEXT NOT NULL, -- 'analyze', 'session_record', 'patient_report'
+    payload JSONB NOT NULL DEFAULT '{}'::jsonb,
+    status TEXT NOT NULL DEFAULT 'queued', -- 'queued', 'running', 'succeeded', 'failed'
+    priority INTEGER NOT NULL DEFAULT 100, -- menor valor = executa antes
+    progress INTEGER NOT NULL DEFAULT 0,
+    result JSONB,
+    error TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL DEFAULT 3,
+    run_after TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT NOW(),
+    locked_by TEXT,
+    locked_at TIMESTAMP WITH TIME ZONE,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    CONSTRAINT check_job_status CHECK (status IN ('queued', 'running', 'succeeded', 'failed'))
+);
+
+-- 2. Índices: fila (parcial, só pendentes) e consulta por usuário
+CREATE INDEX IF NOT EXISTS idx_jobs_queue
+    ON public.jobs (priority, run_after, created_at)
+    WHERE status = 'queued';
+
+CREATE INDEX IF NOT EXISTS idx_jobs_running_locked_at
+    ON public.jobs (locked_at)
+    WHERE status = 'running';
+
+CREATE INDEX IF NOT EXISTS idx_jobs_user_id ON public.jobs (user_id, created_at DESC);
+
+-- 3. RLS: o backend usa a service role; usuários só leem os próprios jobs
+ALTER TABLE public.jobs ENABLE ROW LEVEL SECURITY;
+
+CREATE POLICY "Users can view their own jobs"
+    ON public.jobs FOR SELECT
+    USING (auth.uid() = user_id);
+
+CREATE TRIGGER update_jobs_updated_at
+    BEFORE UPDATE ON public.jobs
+    FOR EACH ROW
+    EXECUTE PROCEDURE update_updated_at_column();
+
+-- 4. Claim atômico de um job com SKIP LOCKED.
+-- Vários workers podem chamar em paralelo sem disputar a mesma linha.
+-- Jobs 'running' com lock expirado (worker morto) voltam a ser elegíveis, a menos que
+-- já tenham usado todas as tentativas: esses passam a 'failed' (attempts nunca passa de
+-- max_attempts). complete/fail no backend filtram por locked_by + attempts, então o
+-- worker antigo, se voltar, não sobrescreve o desfecho de quem reassumiu o job.
+CREATE OR REPLACE FUNCTION public.claim_job(
+    p_worker_id TEXT,
+    p_lock_timeout_seconds INTEGER DEFAULT 600
+)
+RETURNS SETOF public.jobs AS $$
+BEGIN
+    UPDATE public.jobs
+    SET status = 'failed',
+        error = 'Tempo limite excedido na última tentativa',
+        locked_by = NULL,
+        locked_at = NULL
+    WHERE status = 'running'
+      AND locked_at < NOW() - make_interval(secs => p_lock_timeout_seconds)
+      AND attempts >= max_attempts;
+
+    RETURN QUERY
+    UPDATE public.jobs j
+    SET status = 'running',
+        attempts = j.attempts + 1,
+        locked_by = p_worker_id,
+        locked_at = NOW()
+    WHERE j.id = (
+        SELECT c.id
+        FROM public.jobs c
+        WHERE (c.status = 'queued' AND c.run_after <= NOW())
+           OR (c.status = 'running'
+               AND c.locked_at < NOW() - make_interval(secs => p_lock_timeout_seconds)
+               AND c.attempts < c.max_attempts)
+        ORDER BY c.priority, c.run_after, c.created_at
+        FOR UPDATE SKIP LOCKED
+        LIMIT 1
+    )
+    RETURNING j.*;
+END;
+$$ LANGUAGE plpgsql;
+
+-- 5. Retenção: jobs terminados são apagados pelo backend após JOB_RETENTION_DAYS
+--    (jobs.purge_finished_jobs); payload e resultado podem conter dados clínicos.
+CREATE INDEX IF NOT EXISTS idx_jobs_finished_updated_at
+    ON public.jobs (updated_at)
+    WHERE status IN ('succeeded', 'failed');
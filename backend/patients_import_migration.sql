@@ -0,0 +1,35 @@
+-- Migration: Importação de pacientes (e-mail/telefone normalizados e índice único por terapeuta)
+-- Date: 2026-10-18
+--
+-- A importação em lote e a tool create_patient usam INSERT ... ON CONFLICT (user_id, email)
+-- DO NOTHING, então a deduplicação é feita pelo banco em um único round trip, sem corrida.
+-- E-mails vazios viram NULL (NULLs não conflitam: pacientes sem e-mail continuam permitidos).
+--
+-- Antes de aplicar, confira se já existem duplicados (o índice único falha se houver):
+--   SELECT user_id, lower(trim(email)) AS email, count(*), array_agg(id)
+--     FROM patients
+--    WHERE NULLIF(trim(email), '') IS NOT NULL
+--    GROUP BY 1, 2 HAVING count(*) > 1;
+
+-- 1. Mesma normalização do backend (app/services/patient_import_service.py)
+UPDATE public.patients
+   SET email = NULLIF(lower(trim(email)), '')
+ WHERE email IS DISTINCT FROM NULLIF(lower(trim(email)), '');
+
+UPDATE public.patients
+   SET phone = CASE
+           WHEN length(regexp_replace(phone, '\D', '', 'g')) IN (12, 13)
+            AND regexp_replace(phone, '\D', '', 'g') LIKE '55%'
+           THEN substr(regexp_replace(phone, '\D', '', 'g'), 3)
+           ELSE NULLIF(regexp_replace(phone, '\D', '', 'g'), '')
+       END
+ WHERE phone IS NOT NULL AND phone ~ '\D|^$';
+
+-- 2. Alvo do ON CONFLICT e da busca em conjunto (email IN (...)) da importação
+CREATE UNIQUE INDEX IF NOT EXISTS patients_user_email_key
+    ON public.patients (user_id, email);
+
+-- 3. Deduplicação por telefone de pacientes sem e-mail
+CREATE INDEX IF NOT EXISTS patients_user_phone_idx
+    ON public.patients (user_id, phone)
+    WHERE phone IS NOT NULL;
@@ -0,0 +1,10 @@
+-- Migration: Consultas recorrentes (semanal/quinzenal) criadas em lote
+-- Date: 2026-10-18
+-- Requer scheduling_migration.sql
+
+-- Agrupa as ocorrências de uma mesma recorrência (ex: cancelar a série inteira)
+ALTER TABLE public.appointments ADD COLUMN IF NOT EXISTS recurrence_id UUID;
+
+CREATE INDEX IF NOT EXISTS idx_appointments_recurrence_id
+    ON public.appointments (recurrence_id)
+    WHERE recurrence_id IS NOT NULL;
@@ -0,0 +1,58 @@
+-- Migration: Agenda sem sobreposição (constraint de exclusão em tstzrange)
+-- Date: 2026-10-18
+--
+-- Antes de aplicar, confira se já existem conflitos (a constraint falha se houver):
+--   SELECT a.id, b.id FROM appointments a JOIN appointments b
+--     ON a.user_id = b.user_id AND a.id < b.id
+--    AND a.status <> 'cancelled' AND b.status <> 'cancelled'
+--    AND tstzrange(a.appointment_date, a.appointment_date + make_interval(mins => COALESCE(a.duration_minutes, 50)))
+--     && tstzrange(b.appointment_date, b.appointment_date + make_interval(mins => COALESCE(b.duration_minutes, 50)));
+
+-- 1. Igualdade de UUID dentro de um índice GiST
+CREATE EXTENSION IF NOT EXISTS btree_gist;
+
+-- 2. Intervalo ocupado [início, fim) de cada consulta.
+-- Mantido por trigger: timestamptz + interval não é IMMUTABLE, então não pode ser coluna gerada.
+ALTER TABLE public.appointments ADD COLUMN IF NOT EXISTS time_range TSTZRANGE;
+
+CREATE OR REPLACE FUNCTION public.set_appointment_time_range()
+RETURNS TRIGGER AS $$
+BEGIN
+    NEW.time_range = tstzrange(
+        NEW.appointment_date,
+        NEW.appointment_date + make_interval(mins => COALESCE(NEW.duration_minutes, 50)),
+        '[)'
+    );
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS set_appointments_time_range ON public.appointments;
+CREATE TRIGGER set_appointments_time_range
+    BEFORE INSERT OR UPDATE OF appointment_date, duration_minutes ON public.appointments
+    FOR EACH ROW
+    EXECUTE PROCEDURE public.set_appointment_time_range();
+
+UPDATE public.appointments
+SET time_range = tstzrange(
+    appointment_date,
+    appointment_date + make_interval(mins => COALESCE(duration_minutes, 50)),
+    '[)'
+)
+WHERE time_range IS NULL;
+
+ALTER TABLE public.appointments ALTER COLUMN time_range SET NOT NULL;
+
+-- 3. Nenhum terapeuta com duas consultas ativas no mesmo horário.
+-- Vale também para escritas diretas pelo Supabase (frontend antigo); o índice GiST
+-- gerado pela constraint também atende as buscas de agenda por intervalo.
+ALTER TABLE public.appointments DROP CONSTRAINT IF EXISTS appointments_no_overlap;
+ALTER TABLE public.appointments
+    ADD CONSTRAINT appointments_no_overlap
+    EXCLUDE USING gist (user_id WITH =, time_range WITH &&)
+    WHERE (status <> 'cancelled');
+
+-- 4. Carga da agenda do terapeuta (próximos dias, sem canceladas)
+CREATE INDEX IF NOT EXISTS idx_appointments_user_date
+    ON public.appointments (user_id, appointment_date)
+    WHERE status <> 'cancelled';
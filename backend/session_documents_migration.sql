@@ -0,0 +1,79 @@
+-- Migration: Documentos CFP gerados por sessão (cache e pré-geração do registro documental)
+-- Date: 2026-10-18
+--
+-- Depois de salvar uma sessão, um job de prioridade baixa ("session_record_prefetch") gera o
+-- registro documental e grava aqui; GET /session/{id}/record devolve o conteúdo salvo na hora
+-- enquanto o fingerprint (hash dos campos da sessão usados no prompt) continuar igual.
+-- Os limites diários da pré-geração (PREFETCH_DAILY_LIMIT_PER_USER / PREFETCH_DAILY_LIMIT)
+-- usam contadores próprios, reservados atomicamente por reserve_document_prefetch: contar
+-- linhas speculative seria check-then-act (jobs simultâneos passariam juntos do teto) e
+-- um documento regerado sob demanda apagaria a pré-geração da contagem.
+
+CREATE TABLE IF NOT EXISTS public.session_documents (
+    id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+    session_id UUID NOT NULL REFERENCES public.sessions(id) ON DELETE CASCADE,
+    user_id UUID NOT NULL REFERENCES auth.users(id) ON DELETE CASCADE,
+    document_type TEXT NOT NULL,
+    content JSONB NOT NULL,
+    fingerprint TEXT NOT NULL,
+    speculative BOOLEAN NOT NULL DEFAULT FALSE,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    UNIQUE (session_id, document_type)
+);
+
+ALTER TABLE public.session_documents ENABLE ROW LEVEL SECURITY;
+
+CREATE POLICY "Users can view their own session documents"
+    ON public.session_documents FOR SELECT
+    USING (auth.uid() = user_id);
+
+-- Opt-out da pré-geração (Configurações)
+ALTER TABLE public.profiles ADD COLUMN IF NOT EXISTS prefetch_documents BOOLEAN DEFAULT TRUE;
+
+-- Contadores diários da pré-geração (dia UTC): scope = user_id ou '*' (global)
+CREATE TABLE IF NOT EXISTS public.document_prefetch_usage (
+    day DATE NOT NULL,
+    scope TEXT NOT NULL,
+    count INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (day, scope)
+);
+
+-- Só o backend (service role) acessa
+ALTER TABLE public.document_prefetch_usage ENABLE ROW LEVEL SECURITY;
+
+-- Reserva uma pré-geração se os dois tetos permitirem: 'ok', 'user_limit' ou 'global_limit'.
+-- Cada contador é incrementado por um único UPDATE condicional (trava a linha), então dois
+-- jobs simultâneos nunca passam juntos do limite.
+CREATE OR REPLACE FUNCTION public.reserve_document_prefetch(
+    p_user_id UUID,
+    p_user_limit INTEGER,
+    p_global_limit INTEGER
+)
+RETURNS TEXT
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_day DATE := (NOW() AT TIME ZONE 'UTC')::date;
+BEGIN
+    INSERT INTO public.document_prefetch_usage (day, scope)
+    VALUES (v_day, p_user_id::text), (v_day, '*')
+    ON CONFLICT (day, scope) DO NOTHING;
+
+    UPDATE public.document_prefetch_usage SET count = count + 1
+    WHERE day = v_day AND scope = p_user_id::text AND count < p_user_limit;
+    IF NOT FOUND THEN
+        RETURN 'user_limit';
+    END IF;
+
+    UPDATE public.document_prefetch_usage SET count = count + 1
+    WHERE day = v_day AND scope = '*' AND count < p_global_limit;
+    IF NOT FOUND THEN
+        -- Devolve a reserva do terapeuta (mesma transação)
+        UPDATE public.document_prefetch_usage SET count = count - 1
+        WHERE day = v_day AND scope = p_user_id::text;
+        RETURN 'global_limit';
+    END IF;
+
+    RETURN 'ok';
+END;
+$$;
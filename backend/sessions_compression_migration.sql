@@ -0,0 +1,32 @@
+-- Migration: Campos longos de sessions comprimidos (zstd + dicionário de português)
+-- Date: 2026-10-18
+--
+-- transcription, insights, registro_descritivo, hipoteses_clinicas e direcoes_intervencao
+-- passam a ser gravados pelo backend como "zstd<versão>:<base64>" (app/compression.py).
+-- As colunas continuam TEXT e linhas antigas em texto puro continuam legíveis; o Postgres
+-- não tem zstd, então a conversão das linhas existentes é feita pelo script:
+--
+--   python compress_sessions.py migrate --dry-run   -- mede o ganho
+--   python compress_sessions.py migrate
+--
+-- Aplique este SQL depois do deploy do backend e antes do script.
+
+-- 1. O valor já vem comprimido: sem recompressão pglz no TOAST (só gastaria CPU),
+--    mas ainda fora da linha, para não inflar as páginas lidas em varreduras.
+ALTER TABLE public.sessions
+    ALTER COLUMN transcription SET STORAGE EXTERNAL,
+    ALTER COLUMN insights SET STORAGE EXTERNAL,
+    ALTER COLUMN registro_descritivo SET STORAGE EXTERNAL,
+    ALTER COLUMN hipoteses_clinicas SET STORAGE EXTERNAL,
+    ALTER COLUMN direcoes_intervencao SET STORAGE EXTERNAL;
+
+COMMENT ON COLUMN public.sessions.transcription IS
+    'Texto puro ou "zstd<versão>:<base64>" (ver backend/app/compression.py)';
+
+-- 2. Acompanhamento da migração: linhas ainda em texto puro
+--   SELECT count(*) FILTER (WHERE transcription !~ '^zstd[0-9]+:') AS pendentes,
+--          pg_size_pretty(pg_total_relation_size('public.sessions')) AS tamanho
+--     FROM public.sessions;
+--
+-- 3. Depois do script, VACUUM FULL (ou pg_repack) devolve o espaço ao disco:
+--   VACUUM (FULL, ANALYZE) public.sessions;
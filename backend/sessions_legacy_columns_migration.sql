@@ -0,0 +1,34 @@
+-- Migration: Remove as colunas legadas summary/insights de sessions
+-- Date: 2026-10-18
+--
+-- save_session/save_text_session gravavam o registro descritivo de novo em `summary` e
+-- hipóteses + direções (+ temas) em `insights`: todo texto gerado ficava duas vezes na linha.
+-- O backend não grava nem lê mais essas colunas: GET /session/{id} e
+-- GET /patient/{id}/sessions continuam devolvendo os valores, derivados dos campos CFP
+-- (schemas.with_legacy_fields), a menos que o cliente peça ?legacy_fields=false (o
+-- frontend atual pede). O SessionsPage usa GET /sessions/recent.
+--
+-- Aplique depois do deploy do backend (o anterior ainda seleciona as colunas).
+
+-- 1. Linhas sem campos CFP (sessões anteriores ao cfp_migration.sql): o conteúdo legado
+--    passa para os campos CFP antes de sair. Valores comprimidos ("zstd<versão>:...",
+--    ver compression.py) podem ser copiados como estão.
+--    Os textos fixos das notas do chat ficam de fora: sem campos CFP, exportação e
+--    prontuário usam a transcrição, que é a nota de fato.
+UPDATE public.sessions
+   SET registro_descritivo = summary
+ WHERE registro_descritivo IS NULL AND summary IS NOT NULL
+   AND summary <> 'Registro via Chat (Queixa Principal/Nota Rápida)';
+
+UPDATE public.sessions
+   SET hipoteses_clinicas = insights
+ WHERE hipoteses_clinicas IS NULL AND insights IS NOT NULL
+   AND insights <> 'Registro manual via chat.';
+
+-- 2. Remove a cópia
+ALTER TABLE public.sessions
+    DROP COLUMN IF EXISTS summary,
+    DROP COLUMN IF EXISTS insights;
+
+-- 3. O espaço volta ao disco só depois de reescrever a tabela:
+--   VACUUM (FULL, ANALYZE) public.sessions;
@@ -0,0 +1,114 @@
+-- Migration: Webhook Stripe idempotente (eventos persistidos + lookup indexado por customer)
+-- Date: 2026-10-18
+-- Requer jobs_migration.sql
+
+-- 1. Eventos recebidos do Stripe, chaveados pelo id do evento (deduplica reenvios)
+CREATE TABLE IF NOT EXISTS public.stripe_events (
+    id TEXT PRIMARY KEY, -- evt_...
+    type TEXT NOT NULL,
+    payload JSONB NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending', -- 'pending', 'processed', 'failed'
+    error TEXT,
+    received_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    processed_at TIMESTAMP WITH TIME ZONE
+);
+
+-- Só o backend (service role) acessa
+ALTER TABLE public.stripe_events ENABLE ROW LEVEL SECURITY;
+
+CREATE INDEX IF NOT EXISTS idx_stripe_events_pending
+    ON public.stripe_events (received_at)
+    WHERE status <> 'processed';
+
+-- 2. Lookup de usuário por customer do Stripe sem scan
+CREATE UNIQUE INDEX IF NOT EXISTS idx_profiles_stripe_customer_id
+    ON public.profiles (stripe_customer_id)
+    WHERE stripe_customer_id IS NOT NULL;
+
+-- 3. Jobs de sistema (ex: eventos do Stripe) não pertencem a um usuário
+ALTER TABLE public.jobs ALTER COLUMN user_id DROP NOT NULL;
+
+-- 4. Evento e job gravados na mesma transação: se o processo cair entre os dois,
+--    nada fica gravado e o reenvio do Stripe tenta de novo.
+--    Retorna 'created', 'requeued' (evento pendente sem job ativo) ou 'duplicate'.
+CREATE INDEX IF NOT EXISTS idx_jobs_stripe_event
+    ON public.jobs ((payload->>'event_id'))
+    WHERE kind = 'stripe_event';
+
+CREATE OR REPLACE FUNCTION public.record_stripe_event(
+    p_id TEXT,
+    p_type TEXT,
+    p_payload JSONB,
+    p_priority INTEGER DEFAULT 10,
+    p_max_attempts INTEGER DEFAULT 5
+)
+RETURNS TEXT
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_status TEXT;
+BEGIN
+    INSERT INTO public.stripe_events (id, type, payload)
+    VALUES (p_id, p_type, p_payload)
+    ON CONFLICT (id) DO NOTHING;
+
+    IF NOT FOUND THEN
+        SELECT status INTO v_status FROM public.stripe_events WHERE id = p_id FOR UPDATE;
+        IF v_status = 'processed' OR EXISTS (
+            SELECT 1 FROM public.jobs
+            WHERE kind = 'stripe_event'
+              AND payload->>'event_id' = p_id
+              AND status IN ('queued', 'running')
+        ) THEN
+            RETURN 'duplicate';
+        END IF;
+        -- Pendente ou falho sem job ativo: o reenvio do Stripe é uma nova chance
+        UPDATE public.stripe_events SET status = 'pending' WHERE id = p_id;
+    END IF;
+
+    INSERT INTO public.jobs (user_id, kind, payload, priority, max_attempts)
+    VALUES (NULL, 'stripe_event', jsonb_build_object('event_id', p_id), p_priority, p_max_attempts);
+
+    RETURN CASE WHEN v_status IS NULL THEN 'created' ELSE 'requeued' END;
+END;
+$$;
+
+-- 5. Varredura (rodada pelo pool de workers): eventos 'pending' antigos sem job ativo
+--    voltam para a fila. Usa idx_stripe_events_pending.
+CREATE OR REPLACE FUNCTION public.requeue_stale_stripe_events(
+    p_older_than_seconds INTEGER DEFAULT 300,
+    p_priority INTEGER DEFAULT 10,
+    p_max_attempts INTEGER DEFAULT 5
+)
+RETURNS INTEGER
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_count INTEGER;
+BEGIN
+    -- Uma varredura por vez, mesmo com vários processos de workers
+    PERFORM pg_advisory_xact_lock(hashtext('requeue_stale_stripe_events'));
+
+    INSERT INTO public.jobs (user_id, kind, payload, priority, max_attempts)
+    SELECT NULL, 'stripe_event', jsonb_build_object('event_id', e.id), p_priority, p_max_attempts
+    FROM public.stripe_events e
+    WHERE e.status <> 'processed' -- predicado do índice parcial
+      AND e.status = 'pending'
+      AND e.received_at < NOW() - make_interval(secs => p_older_than_seconds)
+      AND NOT EXISTS (
+          SELECT 1 FROM public.jobs j
+          WHERE j.kind = 'stripe_event'
+            AND j.payload->>'event_id' = e.id
+            AND j.status IN ('queued', 'running')
+      );
+
+    GET DIAGNOSTICS v_count = ROW_COUNT;
+    RETURN v_count;
+END;
+$$;
+
+-- 6. Ordem dos eventos de assinatura: jobs são reprocessados e podem rodar fora de ordem.
+--    Guarda o `created` do último evento aplicado; o backend só aplica eventos mais novos
+--    (filtro no próprio UPDATE). '-infinity' deixa o primeiro evento passar sem caso especial.
+ALTER TABLE public.profiles
+    ADD COLUMN IF NOT EXISTS subscription_event_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT '-infinity';
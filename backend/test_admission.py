@@ -0,0 +1,125 @@
+import asyncio
+
+from fastapi import Depends, FastAPI
+from fastapi.testclient import TestClient
+
+from app import admission
+from app.admission import AdmissionController, LocalBucketStore, OverloadedError, SupabaseBucketStore, admitted
+from app.deps import AuthUser, get_current_user
+
+RATES = {"default": {"capacity": 3, "refill_per_sec": 1.0}}
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_bucket_allows_burst_then_refills():
+    clock = FakeClock()
+    store = LocalBucketStore(clock)
+
+    assert [store.take("u1:analyze", 3, 0.5)[0] for _ in range(4)] == [True, True, True, False]
+    assert store.take("u1:analyze", 3, 0.5) == (False, 2.0)
+    # Outro usuário tem o próprio bucket
+    assert store.take("u2:analyze", 3, 0.5)[0]
+
+    clock.now = 2.0
+    assert store.take("u1:analyze", 3, 0.5) == (True, 0.0)
+
+
+def test_inflight_cap_queues_then_rejects():
+    controller = AdmissionController(rates={"default": {"capacity": 100, "refill_per_sec": 1}}, max_inflight=2, max_queue=1)
+    peak = 0
+
+    async def call(i):
+        nonlocal peak
+        async with controller.admit(f"u{i}", "analyze"):
+            peak = max(peak, controller.inflight)
+            await asyncio.sleep(0.05)
+
+    async def run():
+        return await asyncio.gather(*(call(i) for i in range(4)), return_exceptions=True)
+
+    results = asyncio.run(run())
+
+    rejected = [r for r in results if isinstance(r, OverloadedError)]
+    assert len(rejected) == 1 and rejected[0].status_code == 503
+    assert int(rejected[0].headers["Retry-After"]) >= 1
+    assert peak == 2
+    assert controller.inflight == 0 and controller.queued == 0
+
+
+def test_queue_wait_is_bounded():
+    controller = AdmissionController(rates=RATES, max_inflight=1, max_queue=5, queue_timeout=0.05)
+
+    async def run():
+        async def hold():
+            async with controller.admit("u1", "analyze"):
+                await asyncio.sleep(0.3)
+
+        holder = asyncio.create_task(hold())
+        await asyncio.sleep(0.01)
+        try:
+            async with controller.admit("u2", "analyze"):
+                pass
+        except OverloadedError:
+            await holder
+            return "rejected"
+
+    assert asyncio.run(run()) == "rejected"
+    assert controller.rejected["queue_timeout"] == 1
+    assert controller.inflight == 0 and controller.queued == 0
+
+
+def test_route_returns_429_with_retry_after(monkeypatch):
+    monkeypatch.setattr(admission, "controller", AdmissionController(rates=RATES, max_inflight=4))
+    app = FastAPI()
+    app.dependency_overrides[get_current_user] = lambda: AuthUser("u1")
+
+    @app.post("/analyze")
+    async def analyze(user: AuthUser = Depends(admitted("analyze"))):
+        return {"user": user.user_id, "inflight": admission.controller.inflight}
+
+    client = TestClient(app)
+    responses = [client.post("/analyze") for _ in range(4)]
+
+    assert [r.status_code for r in responses] == [200, 200, 200, 429]
+    assert responses[0].json() == {"user": "u1", "inflight": 1}
+    assert responses[3].headers["Retry-After"] == "1"
+    assert admission.controller.inflight == 0
+
+
+def test_shared_store_falls_back_to_local_buckets(monkeypatch):
+    def unavailable():
+        raise RuntimeError("Supabase environment variables are not configured")
+
+    monkeypatch.setattr(admission, "get_supabase_client", unavailable)
+    store = SupabaseBucketStore(LocalBucketStore(FakeClock()))
+
+    assert [store.take("u1:record", 2, 1)[0] for _ in range(3)] == [True, True, False]
+
+
+def test_job_submissions_spend_the_same_bucket_as_the_sync_route(monkeypatch):
+    from app import main
+
+    monkeypatch.setattr(admission, "controller", AdmissionController(rates=RATES, max_inflight=4))
+    monkeypatch.setattr(main.jobs, "enqueue_job", lambda kind, user_id, payload: {"id": "j1", "status": "queued"})
+    app = FastAPI()
+    app.include_router(main.router)
+    app.dependency_overrides[get_current_user] = lambda: AuthUser("u1")
+    client = TestClient(app)
+
+    responses = [client.post("/jobs/analyze", json={"transcription": "Paciente relata insônia."}) for _ in range(4)]
+
+    assert [r.status_code for r in responses] == [202, 202, 202, 429]
+    assert responses[3].headers["Retry-After"] == "1"
+    # Fila de jobs não ocupa vaga de chamada ao LLM
+    assert admission.controller.inflight == 0
+    # Rota síncrona e fila dividem as fichas do usuário
+    assert client.post("/analyze", json={"transcription": "Paciente relata insônia."}).status_code == 429
+    assert client.post("/jobs/patients/p1/reports").status_code == 202
+    assert client.post("/jobs/session/s1/record").status_code == 202
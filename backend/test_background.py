@@ -0,0 +1,78 @@
+import asyncio
+import threading
+import time
+
+from app.background import PostResponsePipeline
+
+
+class Tracker:
+    """Tarefa síncrona que mede quantas execuções rodam ao mesmo tempo."""
+
+    def __init__(self, seconds=0.05, failures=0):
+        self.seconds, self.failures = seconds, failures
+        self.calls = self.running = self.peak = 0
+        self.lock = threading.Lock()
+
+    def __call__(self, value, done):
+        with self.lock:
+            self.calls += 1
+            self.running += 1
+            self.peak = max(self.peak, self.running)
+            fail = self.calls <= self.failures
+        try:
+            time.sleep(self.seconds)
+            if fail:
+                raise RuntimeError("supabase fora do ar")
+            done.append(value)
+        finally:
+            with self.lock:
+                self.running -= 1
+
+
+def test_concurrency_is_bounded_and_stop_drains_the_queue():
+    async def scenario():
+        pipeline = PostResponsePipeline(concurrency=2, max_queue=100)
+        task, done = Tracker(), []
+        for i in range(6):
+            assert pipeline.submit_nowait("teste", task, i, done)
+        await pipeline.stop(drain_timeout=5)
+        return task, done
+
+    task, done = asyncio.run(scenario())
+
+    assert task.peak == 2
+    assert sorted(done) == list(range(6))
+
+
+def test_failures_are_retried_with_backoff():
+    async def scenario(failures):
+        pipeline = PostResponsePipeline(concurrency=1, max_attempts=3, retry_base_seconds=0.01)
+        task, done = Tracker(seconds=0, failures=failures), []
+        pipeline.submit_nowait("teste", task, "ok", done)
+        await pipeline.stop()
+        return task, done
+
+    task, done = asyncio.run(scenario(failures=2))
+    assert (task.calls, done) == (3, ["ok"])
+
+    # Esgotou as tentativas: desiste sem derrubar o worker
+    task, done = asyncio.run(scenario(failures=5))
+    assert (task.calls, done) == (3, [])
+
+
+def test_full_queue_rejects_and_stop_gives_up_after_the_timeout():
+    async def scenario():
+        pipeline = PostResponsePipeline(concurrency=1, max_queue=2)
+        task, done = Tracker(seconds=0.2), []
+        accepted = [pipeline.submit_nowait("teste", task, i, done) for i in range(4)]
+        await asyncio.sleep(0)  # o worker pega a primeira tarefa
+        accepted.append(pipeline.submit_nowait("teste", task, 4, done))
+        started = time.monotonic()
+        await pipeline.stop(drain_timeout=0.1)
+        return accepted, done, time.monotonic() - started
+
+    accepted, done, elapsed = asyncio.run(scenario())
+
+    assert accepted == [True, True, False, False, True]
+    # Não espera a fila inteira (3 x 0.2s): cancela depois do drain_timeout
+    assert elapsed < 0.5 and len(done) < 3
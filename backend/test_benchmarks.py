@@ -0,0 +1,140 @@
+"""
+Benchmarks (pytest-benchmark) dos caminhos quentes de report_generator e dos PDFs,
+sobre um corpus sintético de sessões em português com tamanhos reais: transcrição de
+~50 minutos (~6.000 palavras) e históricos de 12, 52 e 200 sessões.
+
+  pip install -r requirements-dev.txt
+  pytest test_benchmarks.py --benchmark-only                            # mede
+  pytest test_benchmarks.py --benchmark-only --benchmark-save=baseline  # grava em .benchmarks/
+  pytest test_benchmarks.py --benchmark-only --benchmark-compare --benchmark-compare-fail=min:20%
+
+O último comando compara com o baseline mais recente da mesma plataforma/Python
+(.benchmarks/<plataforma>/) e falha se o tempo mínimo de algum benchmark piorar mais
+de 20%. O mínimo é a estatística menos sensível a ruído de VM compartilhada; média e
+mediana oscilam 50%+ entre execuções idênticas.
+Baselines só são comparáveis no mesmo hardware, por isso não ficam no repositório: o
+workflow .github/workflows/benchmarks.yml grava um a cada push na main (no cache do
+Actions) e roda a comparação acima em todo PR. Localmente, grave o seu antes de comparar.
+Sem pytest-benchmark instalado o módulo é ignorado.
+"""
+import random
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+pytest.importorskip("pytest_benchmark")
+
+from app import report_generator
+from app.main import generate_pdf_report
+from app.pdf_templates import DOCUMENT_FIELDS
+
+# Rodadas limitadas para caber na suíte normal (~10s); baseline e comparação usam as mesmas
+pytestmark = pytest.mark.benchmark(min_rounds=5, max_time=0.5)
+
+THERAPIST_LINES = [
+    "Como você se sentiu durante a semana?",
+    "E o que passou pela sua cabeça naquele momento?",
+    "Você percebe alguma relação entre isso e o que conversamos na última sessão?",
+    "Como foi colocar em prática o exercício de respiração?",
+    "O que você gostaria de trabalhar hoje?",
+    "Parece que isso mexeu bastante com você.",
+]
+PATIENT_FRAGMENTS = [
+    "eu fiquei muito ansiosa antes da reunião com o chefe",
+    "não consegui dormir direito, acordava de madrugada preocupada",
+    "a minha mãe ligou de novo cobrando a visita e eu me senti culpada",
+    "no trabalho a pressão está enorme, estou sobrecarregada",
+    "consegui conversar com o meu marido sem brigar, foi um alívio",
+    "às vezes bate um vazio, uma tristeza que eu não sei explicar",
+    "senti medo de ser demitida depois da reestruturação",
+    "fui caminhar três vezes e me senti mais tranquila",
+    "a minha filha começou a escola nova e está se adaptando bem",
+    "me achei feia na foto e fiquei insegura o resto do dia",
+    "entendi que eu não preciso agradar todo mundo",
+    "o cansaço está demais, parece que nada anda",
+    "tive uma crise de pânico no metrô na terça-feira",
+    "descobri que gosto de escrever sobre o que sinto",
+]
+CONNECTIVES = ["Então,", "Sabe,", "Aí", "E também", "Mas", "Porque", "Só que", "Acho que"]
+
+
+def _transcription(rng: random.Random, words: int = 6000) -> str:
+    lines, count = [], 0
+    while count < words:
+        line = f"Terapeuta: {rng.choice(THERAPIST_LINES)}"
+        answer = " ".join(
+            f"{rng.choice(CONNECTIVES)} {rng.choice(PATIENT_FRAGMENTS)}." for _ in range(rng.randint(2, 6))
+        )
+        lines.append(f"{line}\nPaciente: {answer}")
+        count += len(line.split()) + len(answer.split())
+    return "\n".join(lines)
+
+
+def _sessions(n: int, seed: int = 7):
+    rng = random.Random(seed)
+    # Algumas transcrições distintas reaproveitadas: o corpus fica realista sem custar segundos para montar
+    transcriptions = [_transcription(rng) for _ in range(min(n, 8))]
+    start = datetime(2024, 1, 2, 14, tzinfo=timezone.utc)
+    return [
+        {
+            "id": f"s{i}",
+            "created_at": (start + timedelta(days=7 * i + rng.randint(-1, 1))).isoformat(),
+            "transcription": transcriptions[i % len(transcriptions)],
+        }
+        for i in range(n)
+    ]
+
+
+CORPORA = {n: _sessions(n) for n in (12, 52, 200)}
+TRANSCRIPTION = CORPORA[12][0]["transcription"]
+PARAGRAPH = " ".join(PATIENT_FRAGMENTS[:5]).capitalize() + ". "
+PATIENT = {"name": "Maria Souza"}
+THERAPIST = {"name": "Dra. Ana Lima", "crp": "06/123456", "email": "ana@example.com"}
+
+
+def test_estimate_sentiment(benchmark):
+    score = benchmark(report_generator.estimate_sentiment, TRANSCRIPTION)
+    assert -1.0 <= score <= 1.0
+
+
+@pytest.mark.parametrize("size", sorted(CORPORA))
+def test_extract_common_topics(benchmark, size):
+    topics = benchmark(report_generator.extract_common_topics, CORPORA[size])
+    assert topics and topics[0]["count"] <= size
+
+
+@pytest.mark.parametrize("size", sorted(CORPORA))
+def test_calculate_sentiment_trends(benchmark, size):
+    trends = benchmark(report_generator.calculate_sentiment_trends, CORPORA[size])
+    assert trends["total_sessions_analyzed"] == size
+
+
+@pytest.mark.parametrize("size", sorted(CORPORA))
+def test_calculate_session_frequency(benchmark, size):
+    frequency = benchmark(report_generator.calculate_session_frequency, CORPORA[size])
+    assert frequency["total_sessions"] == size
+
+
+@pytest.mark.parametrize("document_type", ["registro_documental", "laudo"])
+def test_generate_clinical_record_pdf(benchmark, document_type):
+    record = {field: PARAGRAPH * 4 for field in DOCUMENT_FIELDS[document_type]}
+    pdf = benchmark(
+        report_generator.generate_clinical_record_pdf, record, PATIENT, "10/03/2026", THERAPIST, document_type
+    )
+    assert pdf.startswith(b"%PDF")
+
+
+def test_generate_pdf_report(benchmark):
+    sessions = CORPORA[52]
+    report = {
+        "patient": PATIENT,
+        "sessions_count": len(sessions),
+        "period": {"start": sessions[0]["created_at"], "end": sessions[-1]["created_at"]},
+        "analysis": {
+            "sentiment_trends": report_generator.calculate_sentiment_trends(sessions),
+            "topics": report_generator.extract_common_topics(sessions),
+            "session_frequency": report_generator.calculate_session_frequency(sessions),
+        },
+    }
+    pdf = benchmark(generate_pdf_report, report)
+    assert pdf.startswith(b"%PDF")
@@ -0,0 +1,130 @@
+import asyncio
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from app.services.cfp_service import CFPService
+
+
+class CFPStub:
+    """Stub local do endpoint de pesquisa do CFP. `registry` mapeia (uf, registro) -> nome."""
+
+    def __init__(self, registry, delay=0.0, status=200):
+        self.registry = registry
+        self.delay = delay
+        self.status = status
+        self.requests = 0
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+                stub.requests += 1
+                time.sleep(stub.delay)
+                name = stub.registry.get((body["uf"], body["registro"]))
+                data = [{"Nome": name, "situacao": "ATIVO", "nomeregional": "CRP-04"}] if name else []
+                raw = json.dumps(data).encode()
+                self.send_response(stub.status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(raw)))
+                self.end_headers()
+                self.wfile.write(raw)
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.httpd.server_address[1]}/api/profissionais/pesquisar"
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+@pytest.fixture
+def cfp_stub(monkeypatch):
+    stub = CFPStub({("04", "44606"): "ISA LETICIA MELO"})
+    monkeypatch.setattr(CFPService, "BASE_URL", stub.url)
+    CFPService.clear_cache()
+    yield stub
+    CFPService.clear_cache()
+    stub.close()
+
+
+def _run(coro):
+    async def wrapper():
+        try:
+            return await coro
+        finally:
+            await CFPService.aclose()
+    return asyncio.run(wrapper())
+
+
+def test_valid_crp_is_cached(cfp_stub):
+    async def lookups():
+        return [await CFPService.validate_crp("44.606", "04") for _ in range(5)]
+
+    results = _run(lookups())
+
+    assert all(r["valid"] and r["name"] == "ISA LETICIA MELO" for r in results)
+    assert cfp_stub.requests == 1
+
+
+def test_concurrent_lookups_for_same_crp_are_coalesced(cfp_stub):
+    cfp_stub.delay = 0.2
+
+    async def lookups():
+        return await asyncio.gather(*[CFPService.validate_crp("44606", "04") for _ in range(10)])
+
+    results = _run(lookups())
+
+    assert all(r["valid"] for r in results)
+    assert cfp_stub.requests == 1
+
+
+def test_not_found_uses_shorter_negative_ttl(cfp_stub, monkeypatch):
+    monkeypatch.setattr(CFPService, "NEGATIVE_CACHE_TTL", 0.1)
+
+    async def lookups():
+        first = await CFPService.validate_crp("99999", "04")
+        second = await CFPService.validate_crp("99999", "04")
+        await asyncio.sleep(0.15)
+        third = await CFPService.validate_crp("99999", "04")
+        return first, second, third
+
+    first, second, third = _run(lookups())
+
+    assert not first["valid"] and first["error"] == "Profissional não encontrado no CFP"
+    assert second == first
+    assert not third["valid"]
+    assert cfp_stub.requests == 2
+
+
+def test_upstream_errors_are_not_cached(cfp_stub):
+    cfp_stub.status = 500
+
+    async def lookups():
+        return [await CFPService.validate_crp("44606", "04") for _ in range(2)]
+
+    results = _run(lookups())
+
+    assert all(not r["valid"] and "Status 500" in r["error"] for r in results)
+    assert cfp_stub.requests == 2
+
+
+def test_outbound_calls_are_rate_limited(cfp_stub, monkeypatch):
+    monkeypatch.setattr(CFPService, "RATE_LIMIT_PER_SECOND", 1.0)
+    monkeypatch.setattr(CFPService, "RATE_LIMIT_BURST", 2)
+    monkeypatch.setattr(CFPService, "RATE_LIMIT_MAX_WAIT", 0.05)
+
+    async def lookups():
+        return [await CFPService.validate_crp(str(registro), "04") for registro in (1001, 1002, 1003)]
+
+    results = _run(lookups())
+
+    assert cfp_stub.requests == 2
+    assert results[2]["error"] == "Serviço de consulta CFP temporariamente indisponível"
@@ -0,0 +1,105 @@
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+from app import compression
+from app.compression import COMPRESSED_FIELDS, compress_row, compress_text, decompress_row, decompress_text, is_compressed
+
+TEXT = (
+    "Paciente relata melhora no sono, mas mantém ruminação sobre o trabalho. "
+    "Discutimos estratégias de reestruturação cognitiva e exposição gradual. "
+) * 10
+
+
+def test_long_text_round_trip_is_smaller():
+    encoded = compress_text(TEXT)
+
+    assert encoded.startswith(f"zstd{compression.DICTIONARY_VERSION}:")
+    assert len(encoded) < len(TEXT.encode("utf-8")) / 3
+    assert decompress_text(encoded) == TEXT
+
+
+def test_short_and_legacy_values_pass_through():
+    assert compress_text("Registro manual via chat.") == "Registro manual via chat."
+    assert compress_text(None) is None
+    # Linhas gravadas antes da migração continuam legíveis
+    assert decompress_text(TEXT) == TEXT
+    assert decompress_text(None) is None
+
+
+def test_plain_text_that_looks_compressed_survives():
+    tricky = "zstd1: anotação da paciente"
+
+    encoded = compress_text(tricky)
+
+    assert encoded != tricky
+    assert decompress_text(encoded) == tricky
+
+
+def test_rows_only_touch_long_text_fields():
+    row = {"id": "s1", "summary": TEXT, "themes": ["sono"], **{field: TEXT for field in COMPRESSED_FIELDS}}
+
+    packed = compress_row(row)
+
+    assert packed["summary"] == TEXT and packed["themes"] == ["sono"]
+    assert all(is_compressed(packed[field]) for field in COMPRESSED_FIELDS)
+    assert decompress_row(dict(packed)) == row
+
+
+def test_concurrent_use_from_worker_threads():
+    texts = [f"{TEXT} Sessão {i}." for i in range(64)]
+
+    with ThreadPoolExecutor(8) as pool:
+        decoded = list(pool.map(lambda t: decompress_text(compress_text(t)), texts))
+
+    assert decoded == texts
+
+
+class FakeSessions:
+    """update().eq().eq().execute() sobre linhas em memória, como o PostgREST."""
+
+    def __init__(self, rows):
+        self.rows = {row["id"]: dict(row) for row in rows}
+
+    def table(self, name):
+        assert name == "sessions"
+        return self
+
+    def update(self, values):
+        self.values, self.filters = values, {}
+        return self
+
+    def eq(self, column, value):
+        self.filters[column] = value
+        return self
+
+    def is_(self, column, value):
+        self.filters[column] = None
+        return self
+
+    def execute(self):
+        matched = [r for r in self.rows.values() if all(r.get(k) == v for k, v in self.filters.items())]
+        for row in matched:
+            row.update(self.values, updated_at="depois-da-migracao")
+        return SimpleNamespace(data=matched)
+
+
+def test_migrate_skips_rows_edited_after_the_read(monkeypatch, capsys):
+    import compress_sessions
+
+    read = [
+        {"id": "s1", "updated_at": "t1", "transcription": TEXT},
+        {"id": "s2", "updated_at": "t2", "transcription": TEXT},
+        {"id": "s3", "updated_at": None, "transcription": TEXT},
+    ]
+    db = FakeSessions(read)
+    # A aplicação edita s2 entre a leitura do script e o update
+    db.rows["s2"].update(transcription="Texto novo do terapeuta.", updated_at="t2-editado")
+    monkeypatch.setattr(compress_sessions, "get_supabase_client", lambda: db)
+    monkeypatch.setattr(compress_sessions, "_paginate", lambda table, columns: iter(read))
+
+    compress_sessions.migrate(dry_run=False)
+
+    assert is_compressed(db.rows["s1"]["transcription"]) and is_compressed(db.rows["s3"]["transcription"])
+    assert db.rows["s2"]["transcription"] == "Texto novo do terapeuta."
+    out = capsys.readouterr().out
+    assert "3 sessões, 2 atualizadas" in out and "1 sessões alteradas" in out
@@ -0,0 +1,257 @@
+import io
+import json
+import re
+import uuid
+import zipfile
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from reportlab import rl_config
+
+from app import export, tools
+from app.report_generator import write_patient_record_pdf
+
+USER_ID = "user-1"
+
+
+class FakeTable:
+    """Subconjunto do query builder do PostgREST usado pela exportação (eq, in_, gt, order, limit)."""
+
+    def __init__(self, rows, calls, name):
+        self.rows, self.calls, self.name = rows, calls, name
+        self.filters, self._limit = [], None
+
+    def select(self, columns):
+        return self
+
+    def eq(self, column, value):
+        self.filters.append(lambda r: r.get(column) == value)
+        return self
+
+    def in_(self, column, values):
+        self.filters.append(lambda r: r.get(column) in values)
+        return self
+
+    def gt(self, column, value):
+        self.filters.append(lambda r: r[column] > value)
+        return self
+
+    def order(self, column):
+        self._order = column
+        return self
+
+    def limit(self, n):
+        self._limit = n
+        return self
+
+    def execute(self):
+        self.calls.append(self.name)
+        rows = sorted((r for r in self.rows if all(f(r) for f in self.filters)), key=lambda r: r["id"])
+        return type("Res", (), {"data": rows[: self._limit] if self._limit else rows})()
+
+
+@pytest.fixture
+def practice(monkeypatch):
+    start = datetime(2025, 1, 6, 14, tzinfo=timezone.utc)
+    patients = [{"id": str(uuid.uuid4()), "user_id": USER_ID, "name": f"Paciente {i}"} for i in range(7)]
+    patients.append({"id": str(uuid.uuid4()), "user_id": "other", "name": "Outro"})
+    sessions = [
+        {
+            "id": str(uuid.uuid4()),
+            "patient_id": p["id"],
+            "registro_descritivo": "Paciente relata melhora do sono.",
+            "hipoteses_clinicas": "Levanta-se hipótese de ansiedade situacional.",
+            "created_at": (start + timedelta(weeks=w)).isoformat(),
+        }
+        for p in patients for w in range(5)
+    ]
+    appointments = [{"id": str(uuid.uuid4()), "user_id": USER_ID, "patient_id": patients[0]["id"]} for _ in range(3)]
+    tables = {"patients": patients, "sessions": sessions, "appointments": appointments, "profiles": [{"id": USER_ID, "name": "Dra. Ana"}]}
+    calls = []
+    fake = type("Supabase", (), {"table": lambda self, name: FakeTable(tables[name], calls, name)})()
+    monkeypatch.setattr(export, "get_supabase_client", lambda: fake)
+    monkeypatch.setattr(export, "EXPORT_PAGE_SIZE", 4)
+    monkeypatch.setattr(export, "EXPORT_PATIENT_BATCH", 3)
+    return calls
+
+
+def test_ndjson_export_pages_through_only_the_therapists_data(practice):
+    lines = [json.loads(line) for line in b"".join(export.iter_ndjson(USER_ID)).splitlines()]
+
+    types = [line["type"] for line in lines]
+    assert types[0] == "export"
+    assert types.count("patient") == 7
+    assert types.count("session") == 35
+    assert types.count("appointment") == 3
+    assert all(line["data"].get("user_id", USER_ID) == USER_ID for line in lines[1:])
+    # Paginado: várias consultas pequenas em vez de um SELECT de tudo
+    assert practice.count("sessions") >= 35 // 4
+
+
+def test_ndjson_export_is_lazy(practice):
+    chunks = export.iter_ndjson(USER_ID)
+    next(chunks)
+
+    assert practice == []  # cabeçalho sai antes de qualquer consulta
+
+
+def test_zip_export_contains_ndjson_and_one_pdf_per_session(practice):
+    archive = zipfile.ZipFile(io.BytesIO(b"".join(export.iter_zip(USER_ID))))
+
+    names = archive.namelist()
+    assert names[0] == "export.ndjson"
+    pdfs = [n for n in names if n.endswith(".pdf")]
+    assert len(pdfs) == 35
+    assert archive.read(pdfs[0]).startswith(b"%PDF")
+    assert archive.testzip() is None
+
+
+def test_zip_export_closes_cleanly_when_pagination_fails(practice, monkeypatch):
+    paginate, iter_ndjson, ndjson_done = export._paginate, export.iter_ndjson, []
+
+    def ndjson(user_id):
+        yield from iter_ndjson(user_id)
+        ndjson_done.append(True)
+
+    def failing(table, *args, **filters):
+        rows = paginate(table, *args, **filters)
+        # NDJSON completo; a falha vem na paginação das sessões para os PDFs
+        if table == "sessions" and ndjson_done:
+            yield next(rows)
+            raise RuntimeError("supabase fora do ar")
+        yield from rows
+
+    monkeypatch.setattr(export, "iter_ndjson", ndjson)
+    monkeypatch.setattr(export, "_paginate", failing)
+
+    archive = zipfile.ZipFile(io.BytesIO(b"".join(export.iter_zip(USER_ID))))
+
+    assert archive.testzip() is None
+    names = archive.namelist()
+    assert names[-1] == "erro.txt" and b"incompleta" in archive.read("erro.txt")
+    assert len([n for n in names if n.endswith(".pdf")]) == 1
+
+
+def test_chat_note_is_exported_as_the_note_itself(monkeypatch):
+    monkeypatch.setattr(rl_config, "pageCompression", 0)
+    note = "Queixa principal: insonia ha tres meses."
+    tables = {
+        "patients": [{"id": "p1", "user_id": USER_ID, "name": "Paciente 1"}],
+        "sessions": [],
+        "appointments": [],
+        "profiles": [{"id": USER_ID, "name": "Dra. Ana"}],
+    }
+
+    class Insert:
+        def __init__(self, name):
+            self.name = name
+
+        def insert(self, row):
+            tables[self.name].append({**row, "id": "s1", "created_at": "2026-03-10T14:00:00+00:00"})
+            return self
+
+        def execute(self):
+            return type("Res", (), {"data": tables[self.name][-1:]})()
+
+    monkeypatch.setattr(tools, "get_supabase_client", lambda: type("Supabase", (), {"table": lambda self, name: Insert(name)})())
+    tools.create_session_note("p1", note, USER_ID)
+    fake = type("Supabase", (), {"table": lambda self, name: FakeTable(tables[name], [], name)})()
+    monkeypatch.setattr(export, "get_supabase_client", lambda: fake)
+
+    archive = zipfile.ZipFile(io.BytesIO(b"".join(export.iter_zip(USER_ID))))
+
+    [pdf] = [n for n in archive.namelist() if n.endswith(".pdf")]
+    assert note.encode() in archive.read(pdf)
+    assert b"Registro via Chat" not in archive.read(pdf)
+    assert note in archive.read("export.ndjson").decode()
+
+
+def _pdf_pages(data: bytes):
+    """Conteúdo de cada página (PDF gerado sem compressão), na ordem do documento."""
+    return [m.group(1) for m in re.finditer(rb"stream\r?\n(.*?)endstream", data, re.S) if b"gina " in m.group(1)]
+
+
+def test_patient_record_pdf_has_toc_pointing_to_each_session(monkeypatch):
+    monkeypatch.setattr(rl_config, "pageCompression", 0)
+    # Sessões de tamanhos diferentes: algumas ocupam mais de uma página
+    sessions = [
+        {"date": f"0{i + 1}/03/2026", "record": {"registro_descritivo": "Relato <com> & marcação.\n" * (1 + 45 * (i % 3))}}
+        for i in range(6)
+    ]
+    output = io.BytesIO()
+
+    total = write_patient_record_pdf(output, sessions, {"name": "Paciente 1"}, {"name": "Dra. Ana", "crp": "06/123"})
+
+    pages = _pdf_pages(output.getvalue())
+    assert len(pages) == total
+    toc = {int(n): int(page) for n, page in re.findall(rb"\(Sess\\343o (\d+) - [^)]*\) Tj T\* ET\s+Q\s+Q\s+BT [^(]*\((\d+)\)", b"".join(pages))}
+    headings = {
+        int(n): page_number
+        for page_number, content in enumerate(pages, start=1)
+        for n in re.findall(rb"14 Tf [\d.]+ TL \(Sess\\343o (\d+) - ", content)
+    }
+    assert len(toc) == 6
+    assert toc == headings
+
+
+def test_patient_record_pdf_streams_from_export(practice):
+    patient_id = export.get_supabase_client().table("patients").rows[0]["id"]
+    sessions = export.fetch_record_sessions(patient_id)
+
+    chunks = list(export.iter_patient_record_pdf(sessions, {"name": "Paciente 0"}, {}, None))
+
+    assert len(sessions) == 5
+    assert b"".join(chunks).startswith(b"%PDF")
+
+
+def test_record_sessions_fetch_transcription_only_when_needed(monkeypatch):
+    rows = [
+        {"id": "s1", "patient_id": "p1", "created_at": "2026-03-01T14:00:00+00:00",
+         "registro_descritivo": "Registro salvo.", "transcription": "Transcrição longa 1"},
+        {"id": "s2", "patient_id": "p1", "created_at": "2026-03-08T14:00:00+00:00", "transcription": "Transcrição longa 2"},
+    ]
+    selects = []
+
+    class ProjectingTable(FakeTable):
+        def select(self, columns):
+            selects.append(columns)
+            self.columns = [c.strip() for c in columns.split(",")]
+            return self
+
+        def execute(self):
+            data = super().execute().data
+            return type("Res", (), {"data": [{c: r.get(c) for c in self.columns} for r in data]})()
+
+    fake = type("Supabase", (), {"table": lambda self, name: ProjectingTable(rows, [], name)})()
+    monkeypatch.setattr(export, "get_supabase_client", lambda: fake)
+
+    sessions = export.fetch_record_sessions("p1")
+
+    assert "transcription" not in selects[0]
+    assert selects[1] == "id, transcription"
+    assert sessions[0]["record"] == {"registro_descritivo": "Registro salvo."}
+    assert sessions[1]["record"] == {"registro_descritivo": "Transcrição longa 2"}
+
+
+def test_lazy_story_relies_on_platypus_consuming_the_story_from_the_front():
+    # _LazyStory depende de BaseDocTemplate.build fazer `while len(flowables)` e consumir
+    # flowables[0]: se o reportlab mudar isso, este teste quebra antes do prontuário
+    from reportlab.platypus import PageBreak, Paragraph, SimpleDocTemplate
+
+    from app.pdf_templates import get_styles
+    from app.report_generator import _LazyStory
+
+    pending_when_pulled = []
+
+    def groups():
+        for i in range(4):
+            pending_when_pulled.append(list.__len__(story))
+            yield [Paragraph(f"Sessão {i}", get_styles()["text"]), PageBreak()]
+
+    story = _LazyStory(groups())
+    doc = SimpleDocTemplate(io.BytesIO())
+    doc.build(story)
+
+    # Cada grupo só é montado quando o anterior já foi todo paginado
+    assert pending_when_pulled == [0, 0, 0, 0]
+    assert doc.page == 4
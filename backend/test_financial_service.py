@@ -0,0 +1,65 @@
+from app.services import financial_service
+from app.services.financial_service import FinancialService, _month_start
+
+
+class FakeQuery:
+    def __init__(self, table, data, calls):
+        self.table, self.data, self.calls = table, data, calls
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: self
+
+    def execute(self):
+        self.calls.append(self.table)
+        return type("Res", (), {"data": self.data[self.table]})()
+
+
+def _fake_supabase(monkeypatch, data):
+    calls = []
+    fake = type("Supabase", (), {"table": lambda self, name: FakeQuery(name, data, calls)})()
+    monkeypatch.setattr(financial_service, "get_supabase_client", lambda: fake)
+    FinancialService._cache.clear()
+    return calls
+
+
+def test_summary_reads_rollups_and_fills_empty_months(monkeypatch):
+    current = _month_start(financial_service.datetime.now(financial_service.LOCAL_TZ).date())
+    calls = _fake_supabase(monkeypatch, {
+        "financial_monthly_rollups": [{
+            "month": current.isoformat(), "appointments_count": 10, "completed_count": 6,
+            "cancelled_count": 2, "no_show_count": 2, "billed_amount": "1200.00",
+            "paid_amount": "750.00", "pending_amount": "450.00",
+        }],
+        "financial_patient_rollups": [
+            {"patient_id": "p1", "appointments_count": 4, "completed_count": 3, "no_show_count": 1,
+             "billed_amount": 600, "paid_amount": 300, "pending_amount": 300},
+            {"patient_id": "gone", "appointments_count": 1, "billed_amount": 150, "pending_amount": 150},
+        ],
+        "patients": [{"id": "p1", "name": "Paciente 1"}],
+    })
+
+    summary = FinancialService.get_summary("user-1", months=3)
+
+    assert [m["month"] for m in summary["months"]] == [_month_start(current, 2), _month_start(current, 1), current]
+    assert summary["months"][0]["billed_amount"] == 0.0
+    mtd = summary["month_to_date"]
+    assert mtd["billed_amount"] == 1200.0 and mtd["pending_amount"] == 450.0
+    assert mtd["no_show_rate"] == 0.25
+    assert [p["patient_id"] for p in summary["patients"]] == ["p1"]
+    assert summary["patients"][0]["patient_name"] == "Paciente 1"
+    # Nenhuma leitura de appointments: só rollups + nomes
+    assert "appointments" not in calls
+
+
+def test_summary_is_cached_until_invalidated(monkeypatch):
+    calls = _fake_supabase(monkeypatch, {
+        "financial_monthly_rollups": [], "financial_patient_rollups": [], "patients": [],
+    })
+
+    FinancialService.get_summary("user-1")
+    FinancialService.get_summary("user-1")
+    assert calls.count("financial_monthly_rollups") == 1
+
+    FinancialService.invalidate("user-1")
+    FinancialService.get_summary("user-1")
+    assert calls.count("financial_monthly_rollups") == 2
@@ -0,0 +1,43 @@
+import os
+import subprocess
+import sys
+
+# Orçamento do import de app.main (cold start do container). Antes da factory
+# com imports tardios ficava em ~2.1s; hoje ~0.6s, dominado pelo próprio FastAPI.
+IMPORT_TIME_BUDGET_MS = float(os.getenv("IMPORT_TIME_BUDGET_MS", "1500"))
+
+# SDKs que só devem ser carregados no primeiro uso (ou no warm-up pós-startup)
+LAZY_MODULES = {"stripe", "openai", "supabase", "reportlab", "httpx"}
+
+
+def _importtime(module):
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        env={**os.environ, "LOG_FILE": os.devnull},
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    cumulative = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cum, name = line.split("|")
+        if cum.strip().isdigit():
+            cumulative[name.strip()] = int(cum) / 1000
+    return cumulative
+
+
+def test_app_import_does_not_load_heavy_sdks():
+    cumulative = _importtime("app.main")
+
+    assert "app.main" in cumulative
+    assert LAZY_MODULES.isdisjoint(cumulative)
+
+
+def test_app_import_time_within_budget():
+    # Melhor de 3 para reduzir ruído da máquina
+    elapsed_ms = min(_importtime("app.main")["app.main"] for _ in range(3))
+
+    assert elapsed_ms < IMPORT_TIME_BUDGET_MS, f"import app.main: {elapsed_ms:.0f}ms (orçamento {IMPORT_TIME_BUDGET_MS:.0f}ms)"
@@ -0,0 +1,203 @@
+import os
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+import pytest
+from fastapi import HTTPException
+
+from app import jobs
+
+
+class FakeJobs:
+    """Tabela jobs em memória (update/select/delete com filtros) e o storage de arquivos."""
+
+    def __init__(self, rows):
+        self.rows = {row["id"]: dict(row) for row in rows}
+        self.removed = []
+        self.storage = SimpleNamespace(from_=lambda bucket: SimpleNamespace(remove=self.removed.extend))
+
+    def table(self, name):
+        assert name == jobs.JOBS_TABLE
+        return FakeQuery(self)
+
+
+class FakeQuery:
+    def __init__(self, db):
+        self.db, self.checks, self.action, self.values, self.n = db, [], "select", None, None
+
+    def select(self, columns):
+        return self
+
+    def update(self, values):
+        self.action, self.values = "update", values
+        return self
+
+    def delete(self):
+        self.action = "delete"
+        return self
+
+    def eq(self, column, value):
+        self.checks.append(lambda r: r.get(column) == value)
+        return self
+
+    def in_(self, column, values):
+        self.checks.append(lambda r: r.get(column) in values)
+        return self
+
+    def lt(self, column, value):
+        self.checks.append(lambda r: r.get(column) < value)
+        return self
+
+    def limit(self, n):
+        self.n = n
+        return self
+
+    def execute(self):
+        matched = [r for r in self.db.rows.values() if all(check(r) for check in self.checks)][: self.n]
+        for row in matched:
+            if self.action == "update":
+                row.update(self.values)
+            elif self.action == "delete":
+                del self.db.rows[row["id"]]
+        return SimpleNamespace(data=[dict(r) for r in matched])
+
+
+def _claimed(**overrides):
+    job = {"id": "j1", "user_id": "u1", "kind": "analyze", "payload": {"text": "transcrição"},
+           "status": "running", "attempts": 1, "max_attempts": 3, "locked_by": "w-0"}
+    job.update(overrides)
+    return job
+
+
+@pytest.fixture
+def db(monkeypatch):
+    db = FakeJobs([])
+    monkeypatch.setattr(jobs, "get_supabase_client", lambda: db)
+    return db
+
+
+def test_failures_back_off_exponentially(db, monkeypatch):
+    monkeypatch.setattr(jobs, "JOB_RETRY_BASE_SECONDS", 5)
+    delays = []
+    for attempt in (1, 2):
+        job = _claimed(attempts=attempt)
+        db.rows["j1"] = dict(job)
+        before = datetime.now(timezone.utc)
+        jobs.fail_job(job, RuntimeError("openai fora do ar"))
+        row = db.rows["j1"]
+        assert row["status"] == "queued" and row["locked_by"] is None
+        delays.append(round((datetime.fromisoformat(row["run_after"]) - before).total_seconds()))
+
+    assert delays == [5, 10]
+
+    last = _claimed(attempts=3)
+    db.rows["j1"] = dict(last)
+    jobs.fail_job(last, RuntimeError("openai fora do ar"))
+    assert db.rows["j1"]["status"] == "failed"
+
+
+def test_client_errors_are_not_retried(db):
+    job = _claimed()
+    db.rows["j1"] = dict(job)
+
+    jobs.fail_job(job, HTTPException(status_code=404, detail="Sessão não encontrada"))
+
+    assert db.rows["j1"]["status"] == "failed"
+    assert db.rows["j1"]["error"] == "Sessão não encontrada"
+
+
+def test_stale_worker_cannot_overwrite_a_reclaimed_job(db):
+    stale = _claimed()
+    # Lock expirou e outro worker reassumiu (claim_job incrementa attempts)
+    db.rows["j1"] = _claimed(attempts=2, locked_by="w-1")
+
+    assert not jobs.complete_job(stale, {"analise": "antiga"})
+    assert not jobs.fail_job(stale, RuntimeError("timeout"))
+    assert db.rows["j1"]["status"] == "running" and db.rows["j1"]["locked_by"] == "w-1"
+
+    assert jobs.complete_job(db.rows["j1"], {"analise": "nova"})
+    assert db.rows["j1"]["result"] == {"analise": "nova"}
+
+
+def test_sensitive_payload_is_purged_when_the_job_ends(db):
+    import app.main  # noqa: F401  (registra os handlers)
+
+    db.rows["j1"] = _claimed()
+    jobs.complete_job(_claimed(), {"analise": "..."})
+    assert db.rows["j1"]["payload"] == {}
+
+    db.rows["j2"] = _claimed(id="j2", kind="patient_report", payload={"patient_id": "p1"})
+    jobs.complete_job(db.rows["j2"], {"storage_path": "jobs/u1/j2/r.pdf"})
+    assert db.rows["j2"]["payload"] == {"patient_id": "p1"}
+
+
+def test_finished_jobs_and_files_expire(db, monkeypatch):
+    monkeypatch.setattr(jobs, "JOB_PURGE_BATCH", 2)
+    old = (datetime.now(timezone.utc) - timedelta(days=30)).isoformat()
+    recent = datetime.now(timezone.utc).isoformat()
+    db.rows.update({
+        "a": {"id": "a", "status": "succeeded", "updated_at": old, "result": {"storage_path": "jobs/u1/a/r.pdf"}},
+        "b": {"id": "b", "status": "failed", "updated_at": old, "result": None},
+        "c": {"id": "c", "status": "succeeded", "updated_at": old, "result": {"registro": "..."}},
+        "d": {"id": "d", "status": "succeeded", "updated_at": recent, "result": None},
+        "e": {"id": "e", "status": "queued", "updated_at": old, "result": None},
+    })
+
+    assert jobs.purge_finished_jobs() == 3
+
+    assert sorted(db.rows) == ["d", "e"]
+    assert db.removed == ["jobs/u1/a/r.pdf"]
+
+
+# --- claim_job no Postgres de verdade (SKIP LOCKED, reclaim) ---
+# Precisa do stack local do Supabase com o schema aplicado (ver loadtest.py):
+#   supabase start && python loadtest.py setup && JOBS_DB_TESTS=1 pytest test_jobs.py
+
+needs_db = pytest.mark.skipif(os.getenv("JOBS_DB_TESTS") != "1", reason="JOBS_DB_TESTS=1 + supabase local")
+
+
+@pytest.fixture
+def local_db(monkeypatch):
+    from supabase import create_client
+
+    from loadtest import LOCAL_JWT_SECRET, LOCAL_SUPABASE_URL, service_role_key
+
+    client = create_client(LOCAL_SUPABASE_URL, service_role_key(LOCAL_JWT_SECRET))
+    monkeypatch.setattr(jobs, "get_supabase_client", lambda: client)
+    # Fila isolada: jobs de outros testes/execuções ficam atrás (prioridade menor roda antes)
+    client.table(jobs.JOBS_TABLE).delete().eq("kind", "analyze").lt("priority", 0).execute()
+    yield client
+    client.table(jobs.JOBS_TABLE).delete().eq("kind", "analyze").lt("priority", 0).execute()
+
+
+def _insert(client, **fields):
+    row = {"user_id": str(uuid.uuid4()), "kind": "analyze", "payload": {}, "priority": -1, **fields}
+    return client.table(jobs.JOBS_TABLE).insert(row).execute().data[0]
+
+
+@needs_db
+def test_concurrent_claims_never_share_a_job(local_db):
+    created = {_insert(local_db)["id"] for _ in range(8)}
+
+    with ThreadPoolExecutor(8) as pool:
+        claimed = list(pool.map(lambda i: jobs.claim_job(f"w-{i}"), range(8)))
+
+    ids = [job["id"] for job in claimed if job]
+    assert len(ids) == len(set(ids)) == 8 and set(ids) == created
+    assert all(job["attempts"] == 1 and job["status"] == "running" for job in claimed)
+
+
+@needs_db
+def test_expired_locks_are_reclaimed_until_attempts_run_out(local_db, monkeypatch):
+    monkeypatch.setattr(jobs, "JOB_LOCK_TIMEOUT_SECONDS", 60)
+    expired = (datetime.now(timezone.utc) - timedelta(minutes=5)).isoformat()
+    retry = _insert(local_db, status="running", attempts=1, locked_by="morto", locked_at=expired)
+    exhausted = _insert(local_db, status="running", attempts=3, locked_by="morto", locked_at=expired)
+
+    job = jobs.claim_job("w-0")
+
+    assert job["id"] == retry["id"] and job["attempts"] == 2 and job["locked_by"] == "w-0"
+    row = local_db.table(jobs.JOBS_TABLE).select("status, attempts").eq("id", exhausted["id"]).execute().data[0]
+    assert row == {"status": "failed", "attempts": 3}
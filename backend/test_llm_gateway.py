@@ -0,0 +1,92 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from types import SimpleNamespace
+
+from app.llm import LLMGateway
+
+
+class FakeOpenAI:
+    """Cliente falso que conta as chamadas upstream e demora um pouco para responder."""
+
+    def __init__(self, delay=0.2, fail=False):
+        self.calls = 0
+        self.delay = delay
+        self.fail = fail
+        self._lock = threading.Lock()
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def create(self, **params):
+        with self._lock:
+            self.calls += 1
+        time.sleep(self.delay)
+        if self.fail:
+            raise RuntimeError("upstream error")
+        return SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(content='{"registro_descritivo": "ok"}'))]
+        )
+
+
+def _fire_concurrently(calls, return_exceptions=False):
+    """Dispara as chamadas em paralelo, uma thread por requisição (como os endpoints)."""
+    async def run():
+        loop = asyncio.get_running_loop()
+        with ThreadPoolExecutor(max_workers=len(calls)) as executor:
+            return await asyncio.gather(
+                *[loop.run_in_executor(executor, call) for call in calls],
+                return_exceptions=return_exceptions,
+            )
+    return asyncio.run(run())
+
+
+def _analysis_params(text="Paciente relata ansiedade no trabalho."):
+    return {
+        "model": "gpt-4o-mini",
+        "messages": [
+            {"role": "system", "content": "Você é um assistente clínico."},
+            {"role": "user", "content": text},
+        ],
+        "response_format": {"type": "json_object"},
+    }
+
+
+def test_concurrent_identical_requests_share_one_upstream_call():
+    fake = FakeOpenAI()
+    gateway = LLMGateway(client_factory=lambda: fake)
+    n = 10
+
+    results = _fire_concurrently(
+        [partial(gateway.chat.completions.create, **_analysis_params()) for _ in range(n)]
+    )
+
+    assert fake.calls == 1
+    assert len(results) == n
+    assert all(r is results[0] for r in results)
+    assert gateway._inflight.in_flight() == 0
+
+
+def test_different_prompts_and_uncoalesced_calls_are_not_shared():
+    fake = FakeOpenAI(delay=0.05)
+    gateway = LLMGateway(client_factory=lambda: fake)
+
+    _fire_concurrently([
+        partial(gateway.chat.completions.create, **_analysis_params("texto A da sessão")),
+        partial(gateway.chat.completions.create, **_analysis_params("texto B da sessão")),
+        partial(gateway.chat.completions.create, coalesce=False, **_analysis_params("texto A da sessão")),
+    ])
+    assert fake.calls == 3
+
+
+def test_upstream_error_is_propagated_to_all_waiters():
+    fake = FakeOpenAI(fail=True)
+    gateway = LLMGateway(client_factory=lambda: fake)
+
+    results = _fire_concurrently(
+        [partial(gateway.chat.completions.create, **_analysis_params()) for _ in range(5)],
+        return_exceptions=True,
+    )
+    assert fake.calls == 1
+    assert all(isinstance(r, RuntimeError) for r in results)
+    assert gateway._inflight.in_flight() == 0
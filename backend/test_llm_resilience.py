@@ -0,0 +1,201 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from openai import OpenAI
+
+from app.llm import CircuitBreaker, LLMGateway, LLMTimeoutError, LLMUnavailableError
+
+
+class FakeOpenAIServer:
+    """
+    Servidor local que imita POST /v1/chat/completions.
+    `script` define, por ordem de chegada, (atraso_em_s, status_http) de cada requisição;
+    depois que acaba, usa `default`.
+    """
+
+    def __init__(self, script=None, default=(0.0, 200)):
+        self.script = list(script or [])
+        self.default = default
+        self.requests = 0
+        self._lock = threading.Lock()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                with server._lock:
+                    server.requests += 1
+                    delay, status = server.script.pop(0) if server.script else server.default
+                time.sleep(delay)
+                if status == 200:
+                    body = {
+                        "id": "chatcmpl-test",
+                        "object": "chat.completion",
+                        "created": int(time.time()),
+                        "model": "gpt-4o-mini",
+                        "choices": [{
+                            "index": 0,
+                            "finish_reason": "stop",
+                            "message": {"role": "assistant", "content": '{"registro_descritivo": "ok"}'},
+                        }],
+                    }
+                else:
+                    body = {"error": {"message": "injected failure", "type": "server_error"}}
+                raw = json.dumps(body).encode()
+                try:
+                    self.send_response(status)
+                    self.send_header("Content-Type", "application/json")
+                    self.send_header("Content-Length", str(len(raw)))
+                    self.end_headers()
+                    self.wfile.write(raw)
+                except (BrokenPipeError, ConnectionResetError):
+                    pass
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.base_url = f"http://127.0.0.1:{self.httpd.server_address[1]}/v1"
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+@pytest.fixture
+def make_gateway():
+    servers = []
+
+    def factory(script=None, default=(0.0, 200), budget=2.0, hedge=False, breaker=None, hedge_min_delay=0.0,
+                max_concurrency=32):
+        server = FakeOpenAIServer(script, default)
+        servers.append(server)
+        gateway = LLMGateway(
+            client_factory=lambda: OpenAI(api_key="test", base_url=server.base_url, max_retries=0),
+            policies={"default": {"budget": budget, "hedge": hedge}},
+            breaker=breaker or CircuitBreaker(failure_threshold=3, cooldown=60),
+            hedge_min_delay=hedge_min_delay,
+            max_concurrency=max_concurrency,
+        )
+        return server, gateway
+
+    yield factory
+    for server in servers:
+        server.close()
+
+
+def _call(gateway):
+    return gateway.chat.completions.create(
+        model="gpt-4o-mini",
+        messages=[{"role": "user", "content": "Resumo da sessão"}],
+        coalesce=False,
+    )
+
+
+def test_call_is_bounded_by_latency_budget(make_gateway):
+    server, gateway = make_gateway(default=(2.0, 200), budget=0.3)
+
+    started = time.monotonic()
+    with pytest.raises(LLMTimeoutError) as exc:
+        _call(gateway)
+
+    assert time.monotonic() - started < 1.0
+    assert exc.value.status_code == 504
+
+
+def test_slow_primary_is_hedged_and_fast_duplicate_wins(make_gateway):
+    # 1ª requisição trava; a duplicata (hedge) responde na hora
+    server, gateway = make_gateway(script=[(1.5, 200)], budget=3.0, hedge=True)
+    for _ in range(25):
+        gateway.latency.record("default", 0.1)  # p95 histórico = 0.1s
+
+    started = time.monotonic()
+    completion = _call(gateway)
+
+    assert completion.choices[0].message.content == '{"registro_descritivo": "ok"}'
+    assert time.monotonic() - started < 1.0
+    assert server.requests == 2
+    assert gateway.hedges_sent == 1
+
+
+def test_fast_calls_are_not_hedged(make_gateway):
+    server, gateway = make_gateway(budget=3.0, hedge=True)
+
+    for _ in range(3):
+        _call(gateway)
+
+    assert server.requests == 3
+    assert gateway.hedges_sent == 0
+
+
+def test_circuit_breaker_fails_fast_with_503_while_provider_degraded(make_gateway):
+    server, gateway = make_gateway(default=(0.0, 500))
+
+    for _ in range(3):
+        with pytest.raises(Exception) as exc:
+            _call(gateway)
+        assert exc.value.status_code == 500
+
+    assert gateway.breaker.state == "open"
+    started = time.monotonic()
+    with pytest.raises(LLMUnavailableError) as exc:
+        _call(gateway)
+
+    assert exc.value.status_code == 503
+    assert "Retry-After" in exc.value.headers
+    assert time.monotonic() - started < 0.05
+    assert server.requests == 3  # a chamada com circuito aberto nem chegou ao servidor
+
+
+def test_circuit_breaker_recovers_after_cooldown(make_gateway):
+    breaker = CircuitBreaker(failure_threshold=2, cooldown=0.2)
+    server, gateway = make_gateway(script=[(0.0, 500), (0.0, 500)], breaker=breaker)
+
+    for _ in range(2):
+        with pytest.raises(Exception):
+            _call(gateway)
+    assert breaker.state == "open"
+
+    time.sleep(0.25)
+    assert breaker.state == "half_open"
+    _call(gateway)
+    assert breaker.state == "closed"
+
+
+def test_client_errors_do_not_open_the_circuit(make_gateway):
+    server, gateway = make_gateway(default=(0.0, 400))
+
+    for _ in range(5):
+        with pytest.raises(Exception) as exc:
+            _call(gateway)
+        assert exc.value.status_code == 400
+
+    assert gateway.breaker.state == "closed"
+
+
+def test_timeouts_queued_behind_busy_threads_do_not_open_the_circuit(make_gateway):
+    breaker = CircuitBreaker(failure_threshold=2, cooldown=0.2)
+    server, gateway = make_gateway(budget=0.2, hedge=True, breaker=breaker, max_concurrency=1)
+    release = threading.Event()
+    gateway._executor.submit(release.wait, 5)  # única thread ocupada
+
+    for _ in range(3):
+        with pytest.raises(LLMTimeoutError):
+            _call(gateway)
+
+    assert breaker.state == "closed"
+    assert server.requests == 0 and gateway.hedges_sent == 0
+
+    # Teste do half-open que expira na fila é devolvido, não fica preso
+    breaker.record_failure()
+    breaker.record_failure()
+    time.sleep(0.25)
+    with pytest.raises(LLMTimeoutError):
+        _call(gateway)
+    release.set()
+    _call(gateway)
+    assert breaker.state == "closed" and server.requests == 1
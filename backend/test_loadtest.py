@@ -0,0 +1,64 @@
+import asyncio
+import json
+
+from fastapi.testclient import TestClient
+from openai import OpenAI
+
+from app.deps import get_current_user
+from fake_openai import FakeOpenAIConfig, create_app
+from loadtest import RouteStats, mint_token, percentile
+
+
+def _client():
+    app = create_app(FakeOpenAIConfig(latency_ms=0, jitter_ms=0, seed=1))
+    http = TestClient(app, base_url="http://fake")
+    return OpenAI(api_key="loadtest", base_url="http://fake/v1", http_client=http, max_retries=0), http
+
+
+def test_fake_openai_scripts_a_multi_tool_copilot_turn():
+    client, http = _client()
+    messages = [{"role": "user", "content": "Horários livres da Maria?"}]
+    tools = [{"type": "function", "function": {"name": "search_patients", "parameters": {"type": "object"}}}]
+
+    names = []
+    for _ in range(3):
+        message = client.chat.completions.create(model="gpt-4o-mini", messages=messages, tools=tools).choices[0].message
+        if not message.tool_calls:
+            break
+        messages.append(message.model_dump(exclude_none=True))
+        for call in message.tool_calls:
+            names.append(call.function.name)
+            messages.append({"role": "tool", "tool_call_id": call.id, "content": "[]"})
+
+    assert names == ["search_patients", "find_free_slots"]
+    assert message.content and not message.tool_calls
+    assert http.get("/stats").json() == {"tool_call": 2, "text": 1}
+
+
+def test_fake_openai_json_answers_analysis_and_documents():
+    client, _ = _client()
+
+    completion = client.chat.completions.create(
+        model="gpt-4o-mini", messages=[{"role": "user", "content": "..."}], response_format={"type": "json_object"}
+    )
+
+    data = json.loads(completion.choices[0].message.content)
+    assert {"registro_descritivo", "hipoteses_clinicas", "temas_relevantes", "conclusao"} <= set(data)
+    assert completion.usage.total_tokens > 0
+
+
+def test_minted_tokens_pass_auth_and_stats_report_percentiles(monkeypatch):
+    monkeypatch.setenv("SUPABASE_JWT_SECRET", "s" * 40)
+
+    user = asyncio.run(get_current_user(f"Bearer {mint_token('s' * 40, sub='u1', email='a@b.c')}"))
+    assert (user.user_id, user.email) == ("u1", "a@b.c")
+
+    stats = RouteStats()
+    for i in range(1, 101):
+        stats.record(200, i / 1000)
+    stats.record(429, 0.001)
+    summary = stats.summary(elapsed=10)
+    assert (summary["requests"], summary["ok"], summary["rps"]) == (101, 100, 10.0)
+    assert (summary["p50_ms"], summary["p95_ms"], summary["p99_ms"]) == (50.0, 95.0, 99.0)
+    assert summary["statuses"] == {"200": 100, "429": 1}
+    assert percentile([], 99) == 0.0
@@ -0,0 +1,107 @@
+import io
+import threading
+import time
+
+from loguru import logger
+
+from app import logging_config
+from app.logging_config import REDACTED, BackgroundSink, current_route, redact, redact_text
+
+
+def test_free_text_identifiers_are_redacted():
+    text = (
+        "Paciente CPF 123.456.789-09 (ou 12345678909), e-mail maria.souza+1@gmail.com, "
+        "celular (11) 98765-4321, auth Bearer eyJhbGciOi.abc-def"
+    )
+
+    redacted = redact_text(text)
+
+    for secret in ("123.456.789-09", "12345678909", "maria.souza", "98765-4321", "eyJhbGciOi"):
+        assert secret not in redacted
+    assert redacted.count(REDACTED) == 5
+    # Ids, datas e valores continuam legíveis
+    assert redact_text("sessão 42 em 2026-10-18, R$ 150.00") == "sessão 42 em 2026-10-18, R$ 150.00"
+
+
+def test_phi_keys_are_redacted_at_any_depth():
+    data = {"session_id": "s1", "Transcription": "Paciente relata...", "patient": {"CPF": "123", "notes": ["ok"]}}
+
+    assert redact(data) == {"session_id": "s1", "Transcription": REDACTED, "patient": {"CPF": REDACTED, "notes": ["ok"]}}
+
+
+def _capture(route, hot=True, level="INFO", times=1, **extra):
+    lines = []
+    handler = logger.add(lambda m: lines.append(m.record), level="DEBUG", filter=logging_config._log_filter)
+    token = current_route.set(route)
+    try:
+        for _ in range(times):
+            logger.bind(hot=hot, **extra).log(level, "token validado")
+    finally:
+        current_route.reset(token)
+        logger.remove(handler)
+    return lines
+
+
+def test_filter_redacts_extra_fields():
+    [record] = _capture("/analyze", hot=False, transcription="Paciente relata insônia", user_id="u1")
+
+    assert record["extra"]["transcription"] == REDACTED
+    assert record["extra"]["user_id"] == "u1" and record["extra"]["route"] == "/analyze"
+
+
+def test_hot_path_sampling_per_route(monkeypatch):
+    monkeypatch.setattr(logging_config, "_ROUTE_RATES", {"/copilot": 1.0, "/health": 0.0})
+    monkeypatch.setattr(logging_config, "LOG_HOT_PATH_SAMPLE_RATE", 0.0)
+
+    assert len(_capture("/copilot/chat", times=20)) == 20
+    assert _capture("/health", times=20) == []
+    # Sem regra para a rota: vale a taxa padrão
+    assert _capture("/patients", times=20) == []
+    # Logs fora do hot path e warnings nunca são amostrados
+    assert len(_capture("/health", hot=False, times=3)) == 3
+    assert len(_capture("/health", level="WARNING", times=3)) == 3
+
+
+class BlockingStream(io.StringIO):
+    def __init__(self):
+        super().__init__()
+        self.release = threading.Event()
+
+    def write(self, text):
+        self.release.wait(5)
+        return super().write(text)
+
+
+def test_full_queue_drops_and_reports_the_count():
+    stream = BlockingStream()
+    sink = BackgroundSink(stream=stream, max_queue=2)
+
+    for i in range(20):
+        sink(f"linha {i}\n")
+    dropped = sink.dropped
+    stream.release.set()
+    sink.stop()
+
+    assert 17 <= dropped <= 18
+    output = stream.getvalue()
+    assert f"{dropped} registro(s) de log descartado(s)" in output
+    assert output.count("linha ") == 20 - dropped
+
+
+def test_rotated_files_beyond_retention_are_deleted(tmp_path):
+    path = tmp_path / "theramind.log"
+    for stamp in ("2026-10-01", "2026-10-02", "2026-10-03", "2026-10-04"):
+        (tmp_path / f"theramind.log.{stamp}_00-00-00_000000").write_text("antigo\n")
+    (tmp_path / "outro.log.2026-10-01").write_text("não é nosso\n")
+    sink = BackgroundSink(path=str(path), rotation_bytes=10, retention=2)
+
+    sink("x" * 20 + "\n")
+    deadline = time.monotonic() + 5
+    while len(list(tmp_path.glob("theramind.log.*"))) != 2 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    sink.stop()
+
+    names = sorted(p.name for p in tmp_path.iterdir())
+    rotated = [n for n in names if n.startswith("theramind.log.")]
+    assert len(rotated) == 2 and rotated[0].startswith("theramind.log.2026-10-04")
+    assert "outro.log.2026-10-01" in names
@@ -0,0 +1,150 @@
+import asyncio
+import time
+import uuid
+
+import pytest
+from fastapi import HTTPException
+
+from app.services import patient_import_service
+from app.services.patient_import_service import PatientImportService, normalize_email, normalize_phone
+
+
+class FakePatients:
+    """Tabela patients em memória com o índice único (user_id, email)."""
+
+    def __init__(self, rows=None):
+        self.rows = list(rows or [])
+        self.round_trips = 0
+
+    def table(self, name):
+        assert name == "patients"
+        return FakeQuery(self)
+
+
+class FakeQuery:
+    def __init__(self, db):
+        self.db, self.filters, self.or_filter, self.payload = db, {}, None, None
+
+    def select(self, columns):
+        return self
+
+    def eq(self, column, value):
+        self.filters[column] = value
+        return self
+
+    def or_(self, expression):
+        self.or_filter = {}
+        for condition in expression.split("),"):
+            column, _, values = condition.rstrip(")").partition(".in.(")
+            self.or_filter[column] = set(values.split(","))
+        return self
+
+    def upsert(self, rows, on_conflict=None, ignore_duplicates=False):
+        assert on_conflict == "user_id,email" and ignore_duplicates
+        self.payload = rows if isinstance(rows, list) else [rows]
+        return self
+
+    def execute(self):
+        self.db.round_trips += 1
+        if self.payload is not None:
+            taken = {(r["user_id"], r["email"]) for r in self.db.rows if r.get("email")}
+            inserted = []
+            for row in self.payload:
+                if row.get("email") and (row["user_id"], row["email"]) in taken:
+                    continue
+                row = {**row, "id": str(uuid.uuid4())}
+                self.db.rows.append(row)
+                inserted.append(row)
+                if row.get("email"):
+                    taken.add((row["user_id"], row["email"]))
+            return type("Res", (), {"data": inserted})()
+        data = [
+            r for r in self.db.rows
+            if all(r.get(k) == v for k, v in self.filters.items())
+            and any(r.get(col) in values for col, values in self.or_filter.items())
+        ]
+        return type("Res", (), {"data": data})()
+
+
+async def _chunks(data: bytes, size: int):
+    for i in range(0, len(data), size):
+        yield data[i:i + size]
+
+
+def _import(monkeypatch, db, csv_text, chunk_size=7):
+    monkeypatch.setattr(patient_import_service, "get_supabase_client", lambda: db)
+    return asyncio.run(PatientImportService.import_csv("user-1", _chunks(csv_text.encode(), chunk_size)))
+
+
+def test_normalizers():
+    assert normalize_email("  Ana.Silva@Exemplo.COM ") == "ana.silva@exemplo.com"
+    assert normalize_email("") is None
+    assert normalize_phone("+55 (11) 98765-4321") == "11987654321"
+    assert normalize_phone("(21) 3333-4444") == "2133334444"
+    with pytest.raises(ValueError):
+        normalize_email("sem-arroba")
+    with pytest.raises(ValueError):
+        normalize_phone("12345")
+
+
+def test_import_reports_each_row(monkeypatch):
+    db = FakePatients([{"id": "old-1", "user_id": "user-1", "name": "Bia", "email": "bia@x.com", "phone": None}])
+    csv_text = (
+        "Nome;E-mail;Celular;Observações\n"
+        "João Ávila;JOAO@x.com;(11) 98765-4321;\"primeira linha\nsegunda linha\"\n"
+        "Bia;bia@x.com;;\n"
+        "João de novo;joao@x.com;;\n"
+        ";sem@nome.com;;\n"
+        "Carla;;+55 21 3333-4444;\n"
+        "Carla 2;;21 3333 4444;\n"
+    )
+
+    result = _import(monkeypatch, db, csv_text)
+
+    assert [(r["row"], r["status"]) for r in result["rows"]] == [
+        (1, "created"), (2, "existing"), (3, "duplicate"), (4, "invalid"), (5, "created"), (6, "duplicate"),
+    ]
+    assert result["rows"][1]["patient_id"] == "old-1"
+    assert (result["created"], result["existing"], result["duplicate"], result["invalid"]) == (2, 1, 2, 1)
+    joao = next(r for r in db.rows if r["name"] == "João Ávila")
+    assert joao["email"] == "joao@x.com" and joao["phone"] == "11987654321"
+    assert joao["notes"] == "primeira linha\nsegunda linha"
+    # Um SELECT em conjunto + um INSERT em lote
+    assert db.round_trips == 2
+
+
+def test_import_requires_name_column(monkeypatch):
+    with pytest.raises(HTTPException) as exc:
+        _import(monkeypatch, FakePatients(), "email,telefone\na@b.com,11987654321\n")
+    assert exc.value.status_code == 400
+
+
+def test_import_5000_patients_in_batches(monkeypatch):
+    existing = [
+        {"id": f"old-{i}", "user_id": "user-1", "name": f"P{i}", "email": f"p{i}@x.com", "phone": None}
+        for i in range(0, 5000, 10)
+    ]
+    db = FakePatients(existing)
+    lines = ["nome,email,telefone"] + [f"Paciente {i},P{i}@x.com,(11) 9{i:04d}-0000" for i in range(5000)]
+
+    start = time.perf_counter()
+    result = _import(monkeypatch, db, "\n".join(lines) + "\n", chunk_size=64 * 1024)
+    elapsed = time.perf_counter() - start
+
+    assert result["total_rows"] == 5000
+    assert result["created"] == 4500 and result["existing"] == 500
+    # 10 lotes de 500, dois round trips cada (em vez de 2 por paciente)
+    assert db.round_trips == 20
+    assert elapsed < 5
+
+
+def test_import_over_the_limit_returns_a_truncated_report(monkeypatch):
+    monkeypatch.setattr(PatientImportService, "MAX_ROWS", 1200)
+    db = FakePatients()
+    lines = ["nome,email"] + [f"Paciente {i},p{i}@x.com" for i in range(1500)]
+
+    result = _import(monkeypatch, db, "\n".join(lines) + "\n", chunk_size=64 * 1024)
+
+    assert result["truncated"] is True
+    assert result["total_rows"] == 1200 and result["created"] == 1200
+    assert len(db.rows) == 1200 and result["rows"][-1]["row"] == 1200
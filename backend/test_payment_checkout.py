@@ -0,0 +1,129 @@
+import asyncio
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+import pytest
+
+from app import payment
+
+
+class StripeStub:
+    """Stub local da API do Stripe (só as rotas usadas no checkout)."""
+
+    def __init__(self, prices):
+        self.prices = prices
+        self.checkout_requests = []
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def _send(self, status, body):
+                raw = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(raw)))
+                self.end_headers()
+                self.wfile.write(raw)
+
+            def do_GET(self):
+                price_id = self.path.rsplit("/", 1)[-1]
+                price = stub.prices.get(price_id)
+                if price is None:
+                    self._send(404, {"error": {"type": "invalid_request_error", "message": "No such price"}})
+                else:
+                    self._send(200, {"id": price_id, "object": "price", **price})
+
+            def do_POST(self):
+                form = parse_qs(self.rfile.read(int(self.headers.get("Content-Length", 0))).decode())
+                stub.checkout_requests.append(form)
+                self._send(200, {
+                    "id": "cs_test_123",
+                    "object": "checkout.session",
+                    "url": "https://checkout.stripe.com/c/pay/cs_test_123",
+                })
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.base_url = f"http://127.0.0.1:{self.httpd.server_address[1]}"
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+@pytest.fixture
+def stripe_stub(monkeypatch):
+    stub = StripeStub({
+        "price_plus": {"active": True, "currency": "brl", "unit_amount": 4990, "recurring": {"interval": "month"}},
+        "price_premium": {"active": False, "currency": "brl", "unit_amount": 9990, "recurring": {"interval": "month"}},
+    })
+    monkeypatch.setattr(payment, "STRIPE_SECRET_KEY", "sk_test_local")
+    monkeypatch.setattr(payment, "STRIPE_API_BASE", stub.base_url)
+    monkeypatch.setattr(payment, "PRICE_ID_PLUS", "price_plus")
+    monkeypatch.setattr(payment, "PRICE_ID_PREMIUM", "price_premium")
+    monkeypatch.setattr(payment, "PRICE_METADATA", {})
+    yield stub
+    stub.close()
+
+
+def _run(coro):
+    async def wrapper():
+        try:
+            return await coro
+        finally:
+            await payment.aclose()
+    return asyncio.run(wrapper())
+
+
+def test_price_metadata_is_validated_and_cached(stripe_stub):
+    _run(payment.load_price_metadata())
+
+    assert payment.PRICE_METADATA == {
+        "plus": {"price_id": "price_plus", "unit_amount": 4990, "currency": "brl", "interval": "month"}
+    }
+
+
+def test_checkout_uses_async_client_and_cached_prices(stripe_stub):
+    async def flow():
+        await payment.load_price_metadata()
+        url = await payment.create_checkout_session("user-1", "psi@example.com", "plus")
+        with pytest.raises(payment.HTTPException) as exc:
+            # Preço do premium está inativo, então o plano não é oferecido
+            await payment.create_checkout_session("user-1", "psi@example.com", "premium")
+        return url, exc.value
+
+    url, error = _run(flow())
+
+    assert url == "https://checkout.stripe.com/c/pay/cs_test_123"
+    assert error.status_code == 400
+    assert len(stripe_stub.checkout_requests) == 1
+    form = stripe_stub.checkout_requests[0]
+    assert form["line_items[0][price]"] == ["price_plus"]
+    assert form["client_reference_id"] == ["user-1"]
+    assert payment.checkout_metrics()["count"] >= 1
+
+
+def test_checkout_metrics_are_served_to_admins(monkeypatch):
+    from fastapi import FastAPI
+    from fastapi.testclient import TestClient
+
+    from app import main, profiling
+
+    monkeypatch.setattr(profiling, "PROFILING_ENABLED", True)
+    monkeypatch.setattr(profiling, "PROFILING_SECRET", "segredo-de-teste")
+    monkeypatch.setattr(payment, "CHECKOUT_LATENCIES", payment.deque([0.1, 0.2, 0.3, 0.4], maxlen=500))
+    monkeypatch.setattr(payment, "CHECKOUT_ERRORS", 1)
+    app = FastAPI()
+    app.include_router(main.router)
+    client = TestClient(app)
+
+    assert client.get("/admin/metrics").status_code == 403
+    response = client.get("/admin/metrics", headers={"X-Profile": profiling.make_token(60)})
+
+    assert response.json() == {"checkout": {"count": 4, "errors": 1, "p50_ms": 300.0, "p95_ms": 400.0}}
@@ -0,0 +1,36 @@
+from app import pdf_templates
+from app.report_generator import generate_clinical_record_pdf
+
+
+def test_layouts_cover_the_six_cfp_documents():
+    for document_type, fields in pdf_templates.DOCUMENT_FIELDS.items():
+        layout = pdf_templates.get_layout(document_type)
+        assert layout.title == pdf_templates.DOCUMENT_TITLES[document_type]
+        assert layout.fields == fields
+    assert pdf_templates.get_layout("desconhecido").title == "Documento Psicológico"
+
+
+def test_labels_drop_symbols_the_font_cannot_draw():
+    # Fonte padrão (Helvetica/WinAnsi) não tem emojis: sobra só o texto, com acentos
+    assert pdf_templates.get_label("hipoteses_clinicas") == "Hipóteses Clínicas"
+    assert pdf_templates.get_label("procedimento") == "Procedimento"
+    assert pdf_templates.get_label("campo_novo") == "Campo Novo"
+
+
+def test_caller_controlled_keys_do_not_grow_the_caches():
+    for i in range(50):
+        pdf_templates.get_layout(f"tipo_{i}")
+        pdf_templates.get_label(f"campo_{i}")
+
+    assert pdf_templates._layout.cache_info().currsize <= len(pdf_templates.DOCUMENT_FIELDS) + 1
+    assert pdf_templates._known_label.cache_info().currsize <= len(pdf_templates.FIELD_LABELS)
+
+
+def test_styles_are_built_once_per_process():
+    generate_clinical_record_pdf({"registro_descritivo": "Texto"}, {"name": "Ana"}, "01/03/2026")
+    styles = pdf_templates.get_styles()
+    pdf = generate_clinical_record_pdf({"analise": "Texto"}, {"name": "Ana"}, "01/03/2026", document_type="laudo")
+
+    assert pdf.startswith(b"%PDF")
+    assert pdf_templates.get_styles() is styles
+    assert pdf_templates.get_styles.cache_info().misses == 1
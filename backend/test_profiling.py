@@ -0,0 +1,107 @@
+import asyncio
+import importlib.util
+import json
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app import profiling
+from app.profiling import ProfileStore, ProfilingMiddleware, make_token, span, traced, verify_token
+
+SECRET = "segredo-de-teste"
+
+
+def test_tokens_expire_and_are_signed():
+    token = make_token(60, SECRET, now=1000)
+
+    assert verify_token(token, SECRET, now=1059)
+    assert not verify_token(token, SECRET, now=1061)
+    assert not verify_token(token, "outro-segredo", now=1000)
+    assert not verify_token(token.replace(".", ".0", 1), SECRET, now=1000)
+    assert not verify_token("", SECRET)
+
+
+def _app(tmp_path, sample_rate=0.0, max_files=200):
+    @traced("reportlab")
+    def render():
+        return b"%PDF"
+
+    def query():
+        with span("supabase", "GET /rest/v1/sessions"):
+            return render()
+
+    app = FastAPI()
+
+    @app.get("/report")
+    async def report():
+        pdf = await asyncio.to_thread(query)
+        return {"size": len(pdf)}
+
+    app.add_middleware(ProfilingMiddleware, sample_rate=sample_rate, secret=SECRET,
+                       profile_store=ProfileStore(str(tmp_path), max_files))
+    return TestClient(app)
+
+
+def test_signed_header_profiles_the_request(tmp_path):
+    client = _app(tmp_path)
+
+    response = client.get("/report", headers={"X-Profile": make_token(60, SECRET)})
+
+    assert response.status_code == 200
+    profile_id = response.headers["x-profile-id"]
+    data = json.loads((tmp_path / f"{profile_id}.json").read_text())
+    assert data["path"] == "/report" and data["status"] == 200
+    # Spans de código rodando em thread (to_thread) entram no perfil do request
+    assert [(s["kind"], s["label"]) for s in data["spans"]] == [("reportlab", "render"), ("supabase", "GET /rest/v1/sessions")]
+    assert data["totals"]["supabase"]["count"] == 1
+    if importlib.util.find_spec("pyinstrument"):
+        assert data["call_tree"] and (tmp_path / f"{profile_id}.html").exists()
+
+
+def test_unprofiled_requests_leave_no_trace(tmp_path):
+    client = _app(tmp_path)
+
+    plain = client.get("/report")
+    forged = client.get("/report", headers={"X-Profile": make_token(60, "outro-segredo")})
+
+    assert "x-profile-id" not in plain.headers and "x-profile-id" not in forged.headers
+    assert list(tmp_path.iterdir()) == []
+    # Fora de um request perfilado, spans e decorators são transparentes
+    with span("openai"):
+        pass
+
+
+def test_sampling_and_store_retention(tmp_path):
+    client = _app(tmp_path, sample_rate=1.0, max_files=2)
+    store = ProfileStore(str(tmp_path))
+
+    ids = [client.get("/report").headers["x-profile-id"] for _ in range(3)]
+
+    # Só os dois mais recentes sobrevivem
+    assert store.ids() == ids[::-1][:2]
+    assert [p["id"] for p in store.list()] == store.ids()
+    assert "spans" not in store.list()[0]
+    assert store.read("../../etc/passwd") is None
+
+
+def test_admin_routes_require_the_token(tmp_path, monkeypatch):
+    from app import main
+
+    store = ProfileStore(str(tmp_path))
+    monkeypatch.setattr(profiling, "store", store)
+    monkeypatch.setattr(profiling, "PROFILING_ENABLED", True)
+    monkeypatch.setattr(profiling, "PROFILING_SECRET", SECRET)
+    profile = profiling.RequestProfile("GET", "/report")
+    profile.finish(200)
+    store.save(profile)
+
+    app = FastAPI()
+    app.include_router(main.router)
+    client = TestClient(app)
+
+    assert client.get("/admin/profiles").status_code == 403
+    headers = {"X-Profile": make_token(60)}
+    listed = client.get("/admin/profiles", headers=headers).json()["profiles"]
+    assert [p["id"] for p in listed] == [profile.id]
+    assert client.get(f"/admin/profiles/{profile.id}?format=json", headers=headers).json()["status"] == 200
+    assert client.get(f"/admin/profiles/{profile.id}", headers=headers).status_code == 404
@@ -0,0 +1,124 @@
+import time
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi import HTTPException
+
+from app.services.scheduling_service import LOCAL_TZ, SchedulingService, TherapistCalendar, expand_occurrences
+
+MONDAY = datetime(2026, 10, 19, tzinfo=LOCAL_TZ)
+
+
+def at(day_offset, hhmm):
+    hours, minutes = map(int, hhmm.split(":"))
+    return MONDAY + timedelta(days=day_offset, hours=hours, minutes=minutes)
+
+
+def appt(day_offset, hhmm, minutes=50, appointment_id=None):
+    start = at(day_offset, hhmm)
+    return (start, start + timedelta(minutes=minutes), appointment_id or f"{day_offset}-{hhmm}")
+
+
+def test_conflicts_detects_only_overlapping_intervals():
+    calendar = TherapistCalendar([appt(0, "09:00"), appt(0, "10:00"), appt(0, "14:00")])
+
+    assert [i[2] for i in calendar.conflicts(at(0, "09:30"), at(0, "10:20"))] == ["0-09:00", "0-10:00"]
+    # Fim exclusivo: começar exatamente quando a anterior termina não é conflito
+    assert calendar.conflicts(at(0, "09:50"), at(0, "10:00")) == []
+    assert calendar.conflicts(at(0, "11:00"), at(0, "13:00")) == []
+
+
+def test_free_slots_skip_busy_intervals_and_stay_on_grid():
+    calendar = TherapistCalendar([appt(0, "09:00"), appt(0, "10:30", minutes=60)])
+
+    slots = calendar.free_slots(at(0, "08:00"), at(0, "13:00"), timedelta(minutes=50), timedelta(minutes=30))
+
+    assert [s.strftime("%H:%M") for s, _ in slots] == ["08:00", "11:30", "12:00"]
+
+
+def test_find_free_slots_uses_working_days_and_hours(monkeypatch):
+    calendar = TherapistCalendar([appt(0, "08:00", minutes=600)])  # segunda ocupada até 18h
+    monkeypatch.setattr(SchedulingService, "get_calendar", classmethod(lambda cls, user_id: calendar))
+
+    slots = SchedulingService.find_free_slots("user-1", days=7, limit=500, now=at(0, "07:00"))
+
+    starts = [s for s, _ in slots]
+    assert starts[0] == at(0, "18:00")
+    assert all(s.weekday() < 5 for s in starts)
+    assert all(at(0, "08:00").time() <= s.time() and (s + timedelta(minutes=50)).time() <= at(0, "20:00").time() for s in starts)
+
+    with pytest.raises(HTTPException) as exc:
+        SchedulingService.find_free_slots("user-1", days=90)
+    assert exc.value.status_code == 400
+
+
+def test_free_slot_search_on_busy_calendar_is_fast(monkeypatch):
+    # ~60 dias com agenda cheia em horários alternados
+    intervals = [appt(d, f"{h:02d}:00", appointment_id=f"{d}-{h}") for d in range(60) for h in range(8, 20, 2)]
+    calendar = TherapistCalendar(intervals)
+    monkeypatch.setattr(SchedulingService, "get_calendar", classmethod(lambda cls, user_id: calendar))
+
+    started = time.perf_counter()
+    slots = SchedulingService.find_free_slots("user-1", days=60, limit=1000, now=at(0, "07:00"))
+    elapsed = time.perf_counter() - started
+
+    assert slots and all(not calendar.conflicts(s, e) for s, e in slots)
+    assert elapsed < 0.05
+
+
+def test_expand_occurrences_weekly_and_biweekly_with_exceptions():
+    first = at(0, "14:00")
+
+    weekly = expand_occurrences(first, "weekly", count=4, exceptions=[(first + timedelta(weeks=1)).date()])
+    assert weekly == [first, first + timedelta(weeks=2), first + timedelta(weeks=3)]
+
+    biweekly = expand_occurrences(first, "biweekly", until=(first + timedelta(weeks=6)).date())
+    assert biweekly == [first + timedelta(weeks=w) for w in (0, 2, 4, 6)]
+
+    with pytest.raises(HTTPException):
+        expand_occurrences(first, "weekly", until=(first + timedelta(weeks=200)).date())
+
+
+class FakeQuery:
+    def __init__(self, table, calls):
+        self.table, self.calls, self.payload = table, calls, None
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: self
+
+    def insert(self, rows):
+        self.payload = rows
+        return self
+
+    def execute(self):
+        self.calls.append((self.table, self.payload))
+        if self.table == "patients":
+            return type("Res", (), {"data": [{"id": "p1"}]})()
+        if self.payload is None:
+            # Consulta de conflitos: já existe consulta na 3ª semana
+            start = at(14, "14:00")
+            return type("Res", (), {"data": [{"id": "a0", "appointment_date": start.isoformat(), "duration_minutes": 50}]})()
+        return type("Res", (), {"data": [{"id": f"a{i + 1}", **row} for i, row in enumerate(self.payload)]})()
+
+
+def test_recurrence_checks_conflicts_once_and_inserts_in_one_batch(monkeypatch):
+    calls = []
+    fake = type("Supabase", (), {"table": lambda self, name: FakeQuery(name, calls)})()
+    monkeypatch.setattr("app.services.scheduling_service.get_supabase_client", lambda: fake)
+
+    with pytest.raises(HTTPException) as exc:
+        SchedulingService.create_recurring_appointments("user-1", "p1", at(0, "14:00"), count=26)
+    assert exc.value.status_code == 409
+    assert not any(payload for table, payload in calls if table == "appointments")
+
+    calls.clear()
+    result = SchedulingService.create_recurring_appointments(
+        "user-1", "p1", at(0, "14:00"), count=26, skip_conflicts=True
+    )
+
+    appointment_calls = [payload for table, payload in calls if table == "appointments"]
+    assert len(appointment_calls) == 2  # 1 query de conflitos + 1 INSERT
+    assert len(appointment_calls[1]) == 25
+    assert len({row["recurrence_id"] for row in appointment_calls[1]}) == 1
+    assert result["skipped"] == [at(14, "14:00")]
+    assert len(result["created"]) == 25
@@ -0,0 +1,53 @@
+import gzip
+import json
+from typing import List
+
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+
+from app import schemas
+from app.serialization import fast_json_response
+
+MESSAGES = [
+    {"id": f"m{i}", "role": "user", "content": "Como foi a semana? " * 10,
+     "created_at": "2026-10-18T12:00:00+00:00", "conversation_id": "c1"}
+    for i in range(50)
+]
+
+
+def _client():
+    app = FastAPI()
+
+    @app.get("/default", response_model=List[schemas.MessageOut])
+    async def default():
+        return MESSAGES
+
+    @app.get("/fast", response_model=List[schemas.MessageOut])
+    async def fast(request: Request):
+        return fast_json_response(request, List[schemas.MessageOut], MESSAGES)
+
+    return TestClient(app)
+
+
+def test_fast_path_matches_response_model_output():
+    client = _client()
+    default = client.get("/default", headers={"Accept-Encoding": "identity"})
+    fast = client.get("/fast", headers={"Accept-Encoding": "identity"})
+
+    assert fast.status_code == 200
+    assert fast.headers["content-type"] == "application/json"
+    assert fast.content == default.content
+    # Campos fora do modelo (conversation_id) continuam sendo removidos
+    assert "conversation_id" not in fast.json()[0]
+
+
+def test_large_payload_is_gzipped_when_accepted():
+    client = _client()
+    raw = client.get("/fast", headers={"Accept-Encoding": "gzip"})
+
+    assert raw.headers["content-encoding"] == "gzip"
+    assert raw.headers["vary"] == "Accept-Encoding"
+    assert len(raw.json()) == 50
+
+    plain = client.get("/fast", headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in plain.headers
@@ -0,0 +1,174 @@
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+import pytest
+
+from app import main
+from app.services import session_document_service
+from app.services.session_document_service import SessionDocumentService
+
+SESSION = {"id": "s1", "patient_id": "p1", "transcription": "Paciente relata ansiedade."}
+PATIENT = {"name": "Maria"}
+THERAPIST = {"name": "Dra. Ana", "theoretical_approach": "TCC"}
+
+
+class FakeDocuments:
+    """
+    Tabela session_documents em memória com o índice único (session_id, document_type)
+    e reserve_document_prefetch (contadores diários, reserva atômica como no UPDATE condicional).
+    """
+
+    def __init__(self):
+        self.rows = {}
+        self.usage = {}
+        self.lock = threading.Lock()
+
+    def rpc(self, name, params):
+        assert name == "reserve_document_prefetch"
+        with self.lock:
+            user, total = self.usage.get(params["p_user_id"], 0), self.usage.get("*", 0)
+            if user >= params["p_user_limit"]:
+                outcome = "user_limit"
+            elif total >= params["p_global_limit"]:
+                outcome = "global_limit"
+            else:
+                self.usage[params["p_user_id"]], self.usage["*"] = user + 1, total + 1
+                outcome = "ok"
+        return SimpleNamespace(execute=lambda: SimpleNamespace(data=outcome))
+
+    def table(self, name):
+        assert name == "session_documents"
+        return FakeQuery(self)
+
+
+class FakeQuery:
+    def __init__(self, db):
+        self.db, self.filters, self.since, self.payload, self.count = db, {}, None, None, None
+
+    def select(self, columns, count=None):
+        self.count = count
+        return self
+
+    def eq(self, column, value):
+        self.filters[column] = value
+        return self
+
+    def gte(self, column, value):
+        self.since = value
+        return self
+
+    def limit(self, n):
+        return self
+
+    def upsert(self, row, on_conflict=None):
+        assert on_conflict == "session_id,document_type"
+        self.payload = row
+        return self
+
+    def execute(self):
+        if self.payload is not None:
+            self.db.rows[(self.payload["session_id"], self.payload["document_type"])] = self.payload
+            return SimpleNamespace(data=[self.payload], count=None)
+        data = [
+            r for r in self.db.rows.values()
+            if all(r.get(k) == v for k, v in self.filters.items())
+            and (self.since is None or r["created_at"] >= self.since)
+        ]
+        return SimpleNamespace(data=data, count=len(data) if self.count else None)
+
+
+class FakeLLM:
+    def __init__(self):
+        self.calls = 0
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def create(self, messages, **params):
+        self.calls += 1
+        content = json.dumps({"registro_descritivo": "R", "hipoteses_clinicas": "H", "direcoes_intervencao": "D"})
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+
+@pytest.fixture
+def db(monkeypatch):
+    db = FakeDocuments()
+    llm = FakeLLM()
+    monkeypatch.setattr(session_document_service, "get_supabase_client", lambda: db)
+    monkeypatch.setattr(main, "client", SimpleNamespace(for_endpoint=lambda endpoint: llm))
+    monkeypatch.setattr(main, "_load_record_sources", lambda session_id, user_id: (dict(SESSION), PATIENT, dict(THERAPIST)))
+    monkeypatch.setattr(SessionDocumentService, "PREFETCH_ENABLED", True)
+    db.llm = llm
+    return db
+
+
+def _prefetch():
+    ctx = SimpleNamespace(user_id="u1")
+    return main._session_record_prefetch_job({"session_id": "s1"}, ctx)
+
+
+def test_prefetched_document_is_served_without_llm_call(db):
+    assert _prefetch() == {"session_id": "s1", "document_type": "registro_documental"}
+    assert db.llm.calls == 1
+    assert db.rows[("s1", "registro_documental")]["speculative"] is True
+
+    content = main._record_content(dict(SESSION), PATIENT, THERAPIST, "registro_documental", "u1")
+    assert content["registro_descritivo"] == "R"
+    assert db.llm.calls == 1
+
+    # Pré-geração repetida (ex.: job reenfileirado) não gasta outra chamada
+    assert _prefetch() == {"skipped": "já gerado"}
+    assert db.llm.calls == 1
+
+
+def test_edited_session_invalidates_stored_document(db):
+    _prefetch()
+    edited = {**SESSION, "transcription": "Paciente relata ansiedade e insônia."}
+    main._record_content(edited, PATIENT, THERAPIST, "registro_documental", "u1")
+    assert db.llm.calls == 2
+    # ...e a nova versão (gerada sob demanda) substitui a especulativa
+    assert db.rows[("s1", "registro_documental")]["speculative"] is False
+
+    main._record_content(edited, PATIENT, THERAPIST, "registro_documental", "u1", refresh=True)
+    assert db.llm.calls == 3
+
+
+def test_prefetch_respects_opt_out_and_cost_caps(db, monkeypatch):
+    monkeypatch.setattr(main, "_load_record_sources", lambda s, u: (dict(SESSION), PATIENT, {**THERAPIST, "prefetch_documents": False}))
+    assert _prefetch() == {"skipped": "opt-out do terapeuta"}
+
+    monkeypatch.setattr(main, "_load_record_sources", lambda s, u: ({**SESSION, "transcription": "x" * 50000}, PATIENT, THERAPIST))
+    assert _prefetch()["skipped"].startswith("sessão longa demais")
+
+    monkeypatch.setattr(main, "_load_record_sources", lambda s, u: (dict(SESSION), PATIENT, THERAPIST))
+    monkeypatch.setattr(SessionDocumentService, "PREFETCH_DAILY_LIMIT_PER_USER", 1)
+    db.usage["u1"] = 1
+    assert _prefetch() == {"skipped": "limite diário do terapeuta"}
+
+    monkeypatch.setattr(SessionDocumentService, "PREFETCH_DAILY_LIMIT_PER_USER", 15)
+    monkeypatch.setattr(SessionDocumentService, "PREFETCH_DAILY_LIMIT", 1)
+    db.usage["*"] = 1
+    assert _prefetch() == {"skipped": "limite diário global"}
+    assert db.llm.calls == 0
+
+
+def test_capped_user_is_skipped_even_after_on_demand_regeneration(db, monkeypatch):
+    monkeypatch.setattr(SessionDocumentService, "PREFETCH_DAILY_LIMIT_PER_USER", 1)
+    assert "skipped" not in _prefetch()
+
+    # Regerar sob demanda troca a linha especulativa, mas não devolve a cota
+    edited = {**SESSION, "transcription": "Paciente relata ansiedade e insônia."}
+    main._record_content(edited, PATIENT, THERAPIST, "registro_documental", "u1")
+    monkeypatch.setattr(main, "_load_record_sources", lambda s, u: ({**SESSION, "id": "s2"}, PATIENT, THERAPIST))
+    assert _prefetch() == {"skipped": "limite diário do terapeuta"}
+    assert db.llm.calls == 2
+
+
+def test_concurrent_prefetches_never_exceed_the_cap(db, monkeypatch):
+    monkeypatch.setattr(SessionDocumentService, "PREFETCH_DAILY_LIMIT_PER_USER", 5)
+
+    with ThreadPoolExecutor(8) as pool:
+        results = list(pool.map(lambda _: SessionDocumentService.prefetch_allowed("u1", SESSION, THERAPIST), range(20)))
+
+    assert sum(allowed for allowed, _ in results) == 5
+    assert db.usage == {"u1": 5, "*": 5}
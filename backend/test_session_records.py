@@ -0,0 +1,92 @@
+import asyncio
+import io
+import json
+import threading
+import time
+import zipfile
+from types import SimpleNamespace
+
+import pytest
+from fastapi import HTTPException
+
+from app import main
+from app.deps import AuthUser
+from app.pdf_templates import DOCUMENT_FIELDS
+
+SESSION = {"id": "s1234567-0000", "patient_id": "p1", "transcription": "Paciente relata ansiedade.", "created_at": "2026-03-10T14:00:00"}
+LLM_DELAY = 0.3
+
+
+class FakeLLM:
+    """Responde com os campos do tipo pedido (lido do prompt) depois de LLM_DELAY segundos."""
+
+    def __init__(self, fail=()):
+        self.fail, self.calls, self.lock = set(fail), [], threading.Lock()
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def create(self, messages, **params):
+        document_type = messages[1]["content"].split("Tipo de Documento: ")[1].split("\n")[0].strip()
+        with self.lock:
+            self.calls.append(document_type)
+        time.sleep(LLM_DELAY)
+        if document_type in self.fail:
+            raise HTTPException(status_code=504, detail="O serviço de IA demorou demais para responder")
+        content = json.dumps({field: f"Texto de {field}" for field in DOCUMENT_FIELDS[document_type]})
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+
+@pytest.fixture
+def records(monkeypatch):
+    llm = FakeLLM()
+    loads = []
+
+    def load(session_id, user_id):
+        loads.append(session_id)
+        return SESSION, {"name": "Maria"}, {"name": "Dra. Ana", "theoretical_approach": "TCC"}
+
+    monkeypatch.setattr(main, "_load_record_sources", load)
+    monkeypatch.setattr(main, "client", SimpleNamespace(for_endpoint=lambda endpoint: llm))
+    monkeypatch.setattr(main.SessionDocumentService, "get", classmethod(lambda cls, *args: None))
+    monkeypatch.setattr(main.SessionDocumentService, "store", classmethod(lambda cls, *args, **kwargs: None))
+    return llm, loads
+
+
+def _call(**kwargs):
+    return asyncio.run(main.get_session_records("s1234567-0000", user=AuthUser("u1"), **{"types": None, "format": "json", **kwargs}))
+
+
+def test_all_documents_are_generated_concurrently(records):
+    llm, loads = records
+
+    started = time.perf_counter()
+    bundle = _call()
+    elapsed = time.perf_counter() - started
+
+    assert set(bundle["documents"]) == set(DOCUMENT_FIELDS)
+    assert bundle["errors"] == {}
+    assert bundle["documents"]["laudo"]["diagnostico_provisorio"] == "Texto de diagnostico_provisorio"
+    assert loads == ["s1234567-0000"]  # sessão/paciente/perfil carregados uma vez
+    # Seis chamadas de 0,3s em paralelo: perto do tempo de uma só
+    assert elapsed < LLM_DELAY * 3
+
+
+def test_zip_bundle_has_one_pdf_per_type_and_reports_failures(records):
+    llm, _ = records
+    llm.fail = {"parecer"}
+
+    response = _call(types="relatorio,parecer,laudo", format="zip")
+
+    archive = zipfile.ZipFile(io.BytesIO(response.body))
+    assert sorted(archive.namelist()) == ["erros.json", "laudo_s1234567.pdf", "relatorio_s1234567.pdf"]
+    assert json.loads(archive.read("erros.json")) == {"parecer": "O serviço de IA demorou demais para responder"}
+    assert archive.read("laudo_s1234567.pdf").startswith(b"%PDF")
+
+
+def test_invalid_types_are_rejected_before_calling_the_llm(records):
+    llm, loads = records
+
+    with pytest.raises(HTTPException) as exc:
+        _call(types="relatorio,receita")
+
+    assert exc.value.status_code == 400
+    assert llm.calls == [] and loads == []
@@ -0,0 +1,133 @@
+import asyncio
+import json
+from types import SimpleNamespace
+
+import pytest
+from fastapi import BackgroundTasks, Request
+
+from app import main, schemas
+from app.compression import is_compressed
+from app.deps import AuthUser
+
+REGISTRO = "Paciente relata melhora no sono, mas mantém ruminação sobre o trabalho. " * 5
+
+
+class FakeDB:
+    """Tabelas patients/sessions em memória, só com o que as rotas de sessão usam."""
+
+    def __init__(self):
+        self.tables = {
+            "patients": [{"id": "p1", "user_id": "u1", "name": "Maria"}, {"id": "p2", "user_id": "u2", "name": "João"}],
+            "sessions": [],
+        }
+
+    def table(self, name):
+        return FakeQuery(self.tables[name])
+
+
+class FakeQuery:
+    def __init__(self, rows):
+        self.rows, self.filters, self.payload, self.one, self.n = rows, [], None, False, None
+
+    def select(self, columns):
+        return self
+
+    def eq(self, column, value):
+        self.filters.append(lambda r: r.get(column) == value)
+        return self
+
+    def in_(self, column, values):
+        self.filters.append(lambda r: r.get(column) in values)
+        return self
+
+    def order(self, column, desc=False):
+        return self
+
+    def limit(self, n):
+        self.n = n
+        return self
+
+    def single(self):
+        self.one = True
+        return self
+
+    def insert(self, row):
+        self.payload = {**row, "id": f"s{len(self.rows) + 1}", "created_at": "2026-03-10T14:00:00+00:00"}
+        return self
+
+    def execute(self):
+        if self.payload is not None:
+            self.rows.append(self.payload)
+            return SimpleNamespace(data=[self.payload])
+        data = [dict(r) for r in self.rows if all(f(r) for f in self.filters)][: self.n]
+        return SimpleNamespace(data=(data[0] if data else None) if self.one else data)
+
+
+@pytest.fixture
+def db(monkeypatch):
+    db = FakeDB()
+    monkeypatch.setattr(main, "get_supabase_client", lambda: db)
+    monkeypatch.setattr(main.SessionDocumentService, "PREFETCH_ENABLED", False)
+    return db
+
+
+def _save(db):
+    body = schemas.SaveTextSessionRequest(
+        patient_id="p1",
+        text="Transcrição da sessão",
+        registro_descritivo=REGISTRO,
+        hipoteses_clinicas="Ansiedade generalizada.",
+        direcoes_intervencao="Reestruturação cognitiva.",
+        temas_relevantes=["sono"],
+    )
+    return asyncio.run(main.save_text_session(body, BackgroundTasks(), user=AuthUser("u1")))
+
+
+def test_generated_text_is_stored_once(db):
+    _save(db)
+
+    row = db.tables["sessions"][0]
+    assert "summary" not in row and "insights" not in row
+    assert is_compressed(row["registro_descritivo"])
+
+
+def test_legacy_fields_are_derived_unless_the_client_opts_out(db):
+    session_id = _save(db)["id"]
+
+    # Cliente antigo (sem o parâmetro) continua recebendo summary/insights
+    legacy = asyncio.run(main.get_session(session_id, user=AuthUser("u1")))
+    assert legacy["summary"] == REGISTRO
+    assert legacy["insights"] == "Ansiedade generalizada.\n\nReestruturação cognitiva."
+
+    session = asyncio.run(main.get_session(session_id, legacy_fields=False, user=AuthUser("u1")))
+    assert session["registro_descritivo"] == REGISTRO
+    assert "summary" not in session
+
+
+def test_patient_sessions_derive_legacy_fields_by_default(db):
+    _save(db)
+    db.tables["sessions"].append({"id": "nota", "patient_id": "p1", "transcription": "Nota do chat",
+                                  "created_at": "2026-03-11T10:00:00+00:00"})
+    request = Request({"type": "http", "headers": []})
+
+    def fetch(**params):
+        response = asyncio.run(main.get_patient_sessions("p1", request, user=AuthUser("u1"), **params))
+        return json.loads(response.body)["sessions"]
+
+    saved, note = fetch()
+    assert saved["summary"] == REGISTRO and saved["insights"].startswith("Ansiedade")
+    # Sem campos CFP (nota do chat) não há o que derivar
+    assert note["summary"] is None and note["insights"] is None
+    assert {s["summary"] for s in fetch(legacy_fields=False)} == {None}
+
+
+def test_recent_sessions_only_ship_a_preview(db):
+    _save(db)
+    db.tables["sessions"].append({"id": "x", "patient_id": "p2", "created_at": "2026-03-11T10:00:00+00:00"})
+    request = Request({"type": "http", "headers": []})
+
+    response = asyncio.run(main.get_recent_sessions(request, user=AuthUser("u1")))
+
+    sessions = json.loads(response.body)["sessions"]
+    assert [s["patient_name"] for s in sessions] == ["Maria"]
+    assert sessions[0]["preview"] == REGISTRO[: main.SESSION_PREVIEW_CHARS]
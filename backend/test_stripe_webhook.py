@@ -0,0 +1,224 @@
+import hashlib
+import hmac
+import json
+import time
+from types import SimpleNamespace
+
+import pytest
+from fastapi import FastAPI, HTTPException
+from fastapi.testclient import TestClient
+
+from app import main, payment
+from app.jobs import JobContext
+
+SECRET = "whsec_teste"
+
+
+class FakeSupabase:
+    """stripe_events, jobs e profiles em memória; record_stripe_event replica a função SQL."""
+
+    def __init__(self):
+        self.events = {}
+        self.jobs = []
+        self.profiles = {"u1": {"id": "u1", "subscription_plan": "free", "stripe_customer_id": None,
+                                "subscription_event_at": "-infinity"}}
+        self.fail_profiles = False
+
+    def _active_job(self, event_id):
+        return any(j["payload"]["event_id"] == event_id and j["status"] in ("queued", "running") for j in self.jobs)
+
+    def rpc(self, name, params):
+        assert name == "record_stripe_event"
+        event_id = params["p_id"]
+        stored = self.events.get(event_id)
+        if stored is None:
+            self.events[event_id] = {"id": event_id, "type": params["p_type"], "payload": params["p_payload"],
+                                     "status": "pending", "error": None}
+            outcome = "created"
+        elif stored["status"] == "processed" or self._active_job(event_id):
+            outcome = "duplicate"
+        else:
+            stored["status"] = "pending"
+            outcome = "requeued"
+        if outcome != "duplicate":
+            self.jobs.append({"payload": {"event_id": event_id}, "status": "queued",
+                              "max_attempts": params["p_max_attempts"]})
+        return SimpleNamespace(execute=lambda: SimpleNamespace(data=outcome))
+
+    def table(self, name):
+        return FakeQuery(self, name)
+
+
+class FakeQuery:
+    def __init__(self, db, name):
+        self.db, self.name, self.filters, self.update_values = db, name, [], None
+
+    def select(self, columns):
+        return self
+
+    def update(self, values):
+        self.update_values = values
+        return self
+
+    def eq(self, column, value):
+        self.filters.append(lambda r: r.get(column) == value)
+        return self
+
+    # Timestamps ISO em UTC (e '-infinity') comparam como texto
+    def lt(self, column, value):
+        self.filters.append(lambda r: r[column] < value)
+        return self
+
+    def lte(self, column, value):
+        self.filters.append(lambda r: r[column] <= value)
+        return self
+
+    def limit(self, n):
+        return self
+
+    def execute(self):
+        rows = self.db.events if self.name == "stripe_events" else self.db.profiles
+        if self.name == "profiles" and self.db.fail_profiles:
+            raise RuntimeError("supabase fora do ar")
+        matched = [r for r in rows.values() if all(f(r) for f in self.filters)]
+        if self.update_values is not None:
+            for row in matched:
+                row.update(self.update_values)
+        return SimpleNamespace(data=[dict(r) for r in matched])
+
+
+@pytest.fixture
+def db(monkeypatch):
+    db = FakeSupabase()
+    monkeypatch.setattr(payment, "get_supabase_client", lambda: db)
+    monkeypatch.setattr(payment, "WEBHOOK_SECRET", SECRET)
+    return db
+
+
+@pytest.fixture
+def client():
+    app = FastAPI()
+    app.include_router(main.router)
+    return TestClient(app)
+
+
+def _event(event_id, event_type, obj, created=1_790_000_000):
+    return {"id": event_id, "object": "event", "type": event_type, "created": created, "data": {"object": obj}}
+
+
+def _post(client, event, secret=SECRET):
+    payload = json.dumps(event)
+    timestamp = int(time.time())
+    signature = hmac.new(secret.encode(), f"{timestamp}.{payload}".encode(), hashlib.sha256).hexdigest()
+    return client.post("/api/stripe/webhook", content=payload,
+                       headers={"stripe-signature": f"t={timestamp},v1={signature}", "content-type": "application/json"})
+
+
+def _process(event_id, attempt=1):
+    ctx = JobContext({"id": "job-1", "user_id": None, "attempts": attempt, "max_attempts": 5})
+    return payment.process_stripe_event({"event_id": event_id}, ctx)
+
+
+CHECKOUT = _event("evt_checkout", "checkout.session.completed", {
+    "client_reference_id": "u1", "customer": "cus_1", "metadata": {"plan": "plus"},
+})
+
+
+def test_invalid_signature_is_rejected(db, client):
+    response = _post(client, CHECKOUT, secret="whsec_outro")
+
+    assert response.status_code == 400
+    assert db.events == {} and db.jobs == []
+
+
+def test_duplicate_delivery_is_not_enqueued_twice(db, client):
+    assert _post(client, CHECKOUT).json() == {"status": "success"}
+    assert _post(client, CHECKOUT).json() == {"status": "duplicate"}
+    assert len(db.jobs) == 1
+
+    # Job perdido (ex.: worker caiu): o reenvio do Stripe volta a enfileirar
+    db.jobs[0]["status"] = "failed"
+    assert _post(client, CHECKOUT).json() == {"status": "success"}
+    assert len(db.jobs) == 2
+
+    _process("evt_checkout")
+    db.jobs[1]["status"] = "succeeded"
+    assert _post(client, CHECKOUT).json() == {"status": "duplicate"}
+    assert len(db.jobs) == 2
+
+
+def test_the_three_event_types_update_the_profile(db, client):
+    updated = _event("evt_updated", "customer.subscription.updated", {
+        "customer": "cus_1", "status": "past_due", "current_period_end": 1_800_000_000,
+    }, created=1_790_000_100)
+    deleted = _event("evt_deleted", "customer.subscription.deleted", {"customer": "cus_1"}, created=1_790_000_200)
+
+    for event in (CHECKOUT, updated, deleted):
+        assert _post(client, event).status_code == 200
+
+    _process("evt_checkout")
+    assert db.profiles["u1"]["subscription_plan"] == "plus"
+    assert db.profiles["u1"]["stripe_customer_id"] == "cus_1"
+
+    _process("evt_updated")
+    assert db.profiles["u1"]["subscription_status"] == "past_due"
+    assert db.profiles["u1"]["current_period_end"].startswith("2027-01-15")
+
+    _process("evt_deleted")
+    assert db.profiles["u1"]["subscription_plan"] == "free"
+    assert db.profiles["u1"]["subscription_status"] == "canceled"
+
+    assert {e["status"] for e in db.events.values()} == {"processed"}
+    # Reprocessar (job duplicado) não faz nada
+    assert _process("evt_checkout")["skipped"]
+
+
+def test_last_failed_attempt_marks_the_event_failed(db, client):
+    _post(client, CHECKOUT)
+    db.fail_profiles = True
+
+    with pytest.raises(RuntimeError):
+        _process("evt_checkout", attempt=1)
+    assert db.events["evt_checkout"]["status"] == "pending"
+
+    with pytest.raises(RuntimeError):
+        _process("evt_checkout", attempt=5)
+    assert db.events["evt_checkout"]["status"] == "failed"
+    assert db.events["evt_checkout"]["error"] == "supabase fora do ar"
+
+
+def test_permanent_errors_fail_on_the_first_attempt(db, client, monkeypatch):
+    _post(client, CHECKOUT)
+
+    def reject(session):
+        raise HTTPException(status_code=422, detail="plano desconhecido")
+
+    monkeypatch.setattr(payment, "_fulfill_checkout", reject)
+    with pytest.raises(HTTPException):
+        _process("evt_checkout", attempt=1)
+    assert db.events["evt_checkout"]["status"] == "failed"
+
+
+def test_subscription_events_out_of_order_keep_the_newest_state(db, client):
+    active = _event("evt_active", "customer.subscription.updated", {
+        "customer": "cus_1", "status": "active", "current_period_end": 1_800_000_000,
+    }, created=1_790_000_100)
+    deleted = _event("evt_deleted", "customer.subscription.deleted", {"customer": "cus_1"}, created=1_790_000_200)
+    # Mesmo segundo do cancelamento: o cancelamento vence o empate
+    same_second = _event("evt_same_second", "customer.subscription.updated", {
+        "customer": "cus_1", "status": "active",
+    }, created=1_790_000_200)
+    for event in (CHECKOUT, active, deleted, same_second):
+        _post(client, event)
+    _process("evt_checkout")
+
+    # Retry atrasado: o updated roda depois do deleted
+    _process("evt_deleted")
+    _process("evt_active")
+    _process("evt_same_second")
+
+    profile = db.profiles["u1"]
+    assert (profile["subscription_plan"], profile["subscription_status"]) == ("free", "canceled")
+    assert "current_period_end" not in profile
+    # Evento antigo ignorado conta como processado (não volta para a fila)
+    assert db.events["evt_active"]["status"] == "processed"
@@ -1,5 +1,6 @@
 import { useState, useEffect } from 'react';
 import { supabase } from '../lib/supabaseClient';
+import api from '../lib/api';
 import { Calendar, DollarSign, Clock, CheckCircle, XCircle, Plus, QrCode } from 'lucide-react';
 import { QRCodeSVG } from 'qrcode.react';
 import { generatePixKey } from '../lib/pix';
@@ -73,23 +74,17 @@ export default function AppointmentsPage() {
     const handleCreate = async (e) => {
         e.preventDefault();
         try {
-            const { data: { user } } = await supabase.auth.getUser();
-
             const fullDate = new Date(`${formData.appointment_date}T${formData.appointment_time}`);
 
-            const { error } = await supabase.from('appointments').insert({
-                user_id: user.id,
+            // Backend recusa horários que conflitam com outra consulta (409)
+            await api.post('/api/appointments', {
                 patient_id: formData.patient_id,
                 appointment_date: fullDate.toISOString(),
                 duration_minutes: parseInt(formData.duration_minutes),
                 price: parseFloat(formData.price),
-                status: 'scheduled',
-                payment_status: 'pending',
                 notes: formData.notes
             });
 
-            if (error) throw error;
-
             setShowModal(false);
             setFormData({ // Reset form
                 patient_id: '', appointment_date: '', appointment_time: '',
@@ -103,12 +98,7 @@ export default function AppointmentsPage() {
 
     const updateStatus = async (id, updates) => {
         try {
-            const { error } = await supabase
-                .from('appointments')
-                .update(updates)
-                .eq('id', id);
-
-            if (error) throw error;
+            await api.put(`/api/appointments/${id}`, updates);
             fetchData();
         } catch (error) {
             console.error('Error updating:', error);
@@ -31,7 +31,7 @@ export default function PatientPage() {
 
   const fetchSessions = async () => {
     try {
-      const sessionsData = await api.get(`/patient/${patientId}/sessions`);
+      const sessionsData = await api.get(`/patient/${patientId}/sessions?legacy_fields=false`);
       setSessions(sessionsData.sessions || []);
     } catch (err) {
       console.error('Erro ao carregar sessões:', err);
@@ -179,20 +179,9 @@ export default function PatientPage() {
                           </h3>
                           <p className="text-gray-600 dark:text-gray-300 text-sm mt-1 line-clamp-2">
                             {session.registro_descritivo ||
-                              session.summary ||
                               session.transcription?.substring(0, 150) ||
                               'Sem conteúdo disponível'}...
                           </p>
-                          {session.insights?.sentiment && (
-                            <span className={`inline-block mt-2 px-2 py-1 text-xs rounded-full ${session.insights.sentiment === 'positivo'
-                              ? 'bg-green-100 text-green-800 dark:bg-green-900 dark:text-green-100'
-                              : session.insights.sentiment === 'negativo'
-                                ? 'bg-red-100 text-red-800 dark:bg-red-900 dark:text-red-100'
-                                : 'bg-blue-100 text-blue-800 dark:bg-blue-900 dark:text-blue-100'
-                              }`}>
-                              {session.insights.sentiment}
-                            </span>
-                          )}
                         </div>
                         <div className="text-blue-600 hover:text-blue-800 dark:text-blue-400 dark:hover:text-blue-300 text-sm font-medium">
                           Ver detalhes →
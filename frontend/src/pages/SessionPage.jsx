@@ -21,7 +21,7 @@ export default function SessionPage() {
     const fetchSession = async () => {
         try {
             setLoading(true);
-            const sessionData = await api.get(`/session/${sessionId}`);
+            const sessionData = await api.get(`/session/${sessionId}?legacy_fields=false`);
             setSession(sessionData);
         } catch (err) {
             console.error('Erro ao carregar sessão:', err);
@@ -67,6 +67,33 @@ export default function SessionPage() {
         }
     };
 
+    const handleDownloadAllRecords = async () => {
+        try {
+            setGeneratingRecord(true);
+            // Um request só: o backend gera os seis documentos em paralelo
+            const response = await api.get(`/session/${sessionId}/records?format=zip`, {
+                responseType: 'blob'
+            });
+
+            const url = window.URL.createObjectURL(response);
+            const link = document.createElement('a');
+            link.href = url;
+            link.download = `documentos_sessao_${sessionId ? sessionId.slice(0, 8) : 'unknown'}.zip`;
+            document.body.appendChild(link);
+            link.click();
+            link.remove();
+
+            setTimeout(() => {
+                window.URL.revokeObjectURL(url);
+            }, 100);
+        } catch (err) {
+            console.error('Erro ao gerar documentos:', err);
+            alert('Erro ao gerar os documentos. Tente novamente.');
+        } finally {
+            setGeneratingRecord(false);
+        }
+    };
+
     const handleViewRecord = async () => {
         try {
             setGeneratingRecord(true);
@@ -157,6 +184,14 @@ export default function SessionPage() {
                             </>
                         )}
                     </button>
+                    <button
+                        onClick={handleDownloadAllRecords}
+                        disabled={generatingRecord}
+                        className="flex items-center justify-center px-4 py-3 sm:py-2 bg-white text-indigo-600 border border-indigo-600 rounded-md hover:bg-indigo-50 disabled:opacity-50 transition-colors"
+                    >
+                        <Download className="mr-2" size={18} />
+                        Todos (ZIP)
+                    </button>
                 </div>
             </div>
 
@@ -173,25 +208,25 @@ export default function SessionPage() {
                 </div>
 
                 {/* Registro Descritivo (CFP) */}
-                {(session.registro_descritivo || session.summary) && (
+                {session.registro_descritivo && (
                     <div className="bg-blue-50 dark:bg-blue-900/30 p-6 rounded-lg shadow-sm transition-colors">
                         <h2 className="text-lg font-semibold text-blue-900 dark:text-blue-200 mb-3 flex items-center">
                             <span className="mr-2">📝</span> Registro Descritivo
                         </h2>
                         <p className="text-gray-800 dark:text-gray-200 whitespace-pre-wrap">
-                            {session.registro_descritivo || session.summary}
+                            {session.registro_descritivo}
                         </p>
                     </div>
                 )}
 
                 {/* Hipóteses Clínicas (CFP) */}
-                {(session.hipoteses_clinicas || (session.insights && !session.direcoes_intervencao)) && (
+                {session.hipoteses_clinicas && (
                     <div className="bg-purple-50 dark:bg-purple-900/30 p-6 rounded-lg shadow-sm transition-colors">
                         <h2 className="text-lg font-semibold text-purple-900 dark:text-purple-200 mb-3 flex items-center">
                             <span className="mr-2">💡</span> Hipóteses Clínicas
                         </h2>
                         <p className="text-gray-800 dark:text-gray-200 whitespace-pre-wrap">
-                            {session.hipoteses_clinicas || session.insights}
+                            {session.hipoteses_clinicas}
                         </p>
                     </div>
                 )}
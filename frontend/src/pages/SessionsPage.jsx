@@ -1,5 +1,5 @@
 import { useState, useEffect } from 'react'
-import { supabase } from '../lib/supabaseClient.js'
+import api from '../lib/api'
 import { useNavigate } from 'react-router-dom'
 
 export default function SessionsPage() {
@@ -15,48 +15,10 @@ export default function SessionsPage() {
     const fetchSessions = async () => {
         try {
             setLoading(true)
-            const { data: { user } } = await supabase.auth.getUser()
-
-            if (!user) {
-                throw new Error('Usuário não autenticado')
-            }
-
-            // Buscar sessões de TODOS os pacientes do usuário
-            // Precisamos fazer um join manual ou usar view, mas por enquanto vamos buscar tudo
-            // A query abaixo depende de como o Supabase/Postgrest lida com RLS e joins.
-            // Vamos tentar buscar sessions onde patient_id está em (meus pacientes)
-
-            const { data: patients } = await supabase
-                .from('patients')
-                .select('id, name')
-                .eq('user_id', user.id)
-
-            if (!patients || patients.length === 0) {
-                setSessions([])
-                return
-            }
-
-            const patientIds = patients.map(p => p.id)
-
-            const { data, error } = await supabase
-                .from('sessions')
-                .select('*')
-                .in('patient_id', patientIds)
-                .order('created_at', { ascending: false })
-                .limit(20) // Limite inicial
-
-            if (error) throw error
-
-            // Enriquecer sessões com nomes dos pacientes
-            const sessionsWithNames = data.map(session => {
-                const patient = patients.find(p => p.id === session.patient_id)
-                return {
-                    ...session,
-                    patient_name: patient ? patient.name : 'Desconhecido'
-                }
-            })
-
-            setSessions(sessionsWithNames || [])
+            // Sessões de TODOS os pacientes do usuário, já com o nome do paciente
+            // e só um trecho do registro (o texto completo fica comprimido no banco)
+            const data = await api.get('/sessions/recent?limit=20')
+            setSessions(data.sessions || [])
         } catch (err) {
             console.error('Erro ao buscar sessões:', err)
             setError('Erro ao carregar sessões. Tente novamente.')
@@ -96,7 +58,7 @@ export default function SessionsPage() {
                                     </div>
                                 </div>
                                 <div className="mt-1">
-                                    <p className="text-sm text-gray-900 dark:text-gray-300 line-clamp-2">{session.summary || "Sem resumo disponível"}</p>
+                                    <p className="text-sm text-gray-900 dark:text-gray-300 line-clamp-2">{session.preview || "Sem resumo disponível"}</p>
                                 </div>
                             </li>
                         ))}
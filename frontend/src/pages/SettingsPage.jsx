@@ -13,7 +13,8 @@ export default function SettingsPage() {
         recovery_email: '',
         pix_key: '',
         pix_key_type: 'CPF',
-        theoretical_approach: 'Integrativa'
+        theoretical_approach: 'Integrativa',
+        prefetch_documents: true
     });
 
     useEffect(() => {
@@ -42,7 +43,8 @@ export default function SettingsPage() {
                     recovery_email: data.recovery_email || '',
                     pix_key: data.pix_key || '',
                     pix_key_type: data.pix_key_type || 'CPF',
-                    theoretical_approach: data.theoretical_approach || 'Integrativa'
+                    theoretical_approach: data.theoretical_approach || 'Integrativa',
+                    prefetch_documents: data.prefetch_documents !== false
                 });
             }
         } catch (error) {
@@ -76,6 +78,7 @@ export default function SettingsPage() {
                 pix_key: profile.pix_key,
                 pix_key_type: profile.pix_key_type,
                 theoretical_approach: profile.theoretical_approach,
+                prefetch_documents: profile.prefetch_documents,
                 updated_at: new Date()
             };
 
@@ -177,6 +180,21 @@ export default function SettingsPage() {
                                 Define como o Copiloto e as análises interpretam as sessões.
                             </p>
                         </div>
+
+                        <div>
+                            <label className="flex items-center text-sm font-medium text-gray-700 dark:text-gray-300">
+                                <input
+                                    type="checkbox"
+                                    checked={profile.prefetch_documents}
+                                    onChange={(e) => setProfile({ ...profile, prefetch_documents: e.target.checked })}
+                                    className="mr-2 h-4 w-4 rounded border-gray-300 focus:ring-2 focus:ring-blue-500"
+                                />
+                                Preparar o registro documental ao salvar a sessão
+                            </label>
+                            <p className="text-xs text-gray-500 mt-1">
+                                O documento é gerado em segundo plano e fica pronto para download na hora.
+                            </p>
+                        </div>
                     </div>
 
                     {/* Dados Financeiros */}